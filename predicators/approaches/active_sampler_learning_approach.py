@@ -26,7 +26,8 @@ from predicators.approaches.online_nsrt_learning_approach import \
 from predicators.competence_models import SkillCompetenceModel
 from predicators.explorers import BaseExplorer, create_explorer
 from predicators.ml_models import BinaryClassifier, BinaryClassifierEnsemble, \
-    KNeighborsClassifier, MLPBinaryClassifier, MLPRegressor
+    KNeighborsClassifier, MLPBinaryClassifier, MLPBinaryClassifierEnsemble, \
+    MLPRegressor
 from predicators.settings import CFG
 from predicators.structs import NSRT, Array, GroundAtom, LowLevelTrajectory, \
     Metrics, NSRTSampler, Object, ParameterizedOption, Predicate, Segment, \
@@ -346,6 +347,8 @@ class _ClassifierWrappedSamplerLearner(_WrappedSamplerLearner):
                 weight_decay=CFG.weight_decay,
                 use_torch_gpu=CFG.use_torch_gpu,
                 train_print_every=CFG.pytorch_train_print_every,
+                batch_size=CFG.pytorch_train_batch_size,
+                validation_frac=CFG.pytorch_train_validation_frac,
                 n_iter_no_change=CFG.mlp_classifier_n_iter_no_change,
                 hid_sizes=CFG.mlp_classifier_hid_sizes,
                 n_reinitialize_tries=CFG.
@@ -404,21 +407,34 @@ class _ClassifierEnsembleWrappedSamplerLearner(_WrappedSamplerLearner):
         X_arr_classifier = np.array(X_classifier)
         # output is binary signal
         y_arr_classifier = np.array(y_classifier)
-        classifier = BinaryClassifierEnsemble(
-            seed=CFG.seed,
-            ensemble_size=CFG.active_sampler_learning_num_ensemble_members,
-            member_cls=MLPBinaryClassifier,
-            balance_data=CFG.mlp_classifier_balance_data,
-            max_train_iters=CFG.sampler_mlp_classifier_max_itr,
-            learning_rate=CFG.learning_rate,
-            n_iter_no_change=CFG.mlp_classifier_n_iter_no_change,
-            hid_sizes=CFG.mlp_classifier_hid_sizes,
-            n_reinitialize_tries=CFG.
-            sampler_mlp_classifier_n_reinitialize_tries,
-            weight_init=CFG.predicate_mlp_classifier_init,
-            weight_decay=CFG.weight_decay,
-            use_torch_gpu=CFG.use_torch_gpu,
-            train_print_every=CFG.pytorch_train_print_every)
+        mlp_kwargs: Dict[str, Any] = {
+            "balance_data": CFG.mlp_classifier_balance_data,
+            "max_train_iters": CFG.sampler_mlp_classifier_max_itr,
+            "learning_rate": CFG.learning_rate,
+            "n_iter_no_change": CFG.mlp_classifier_n_iter_no_change,
+            "hid_sizes": CFG.mlp_classifier_hid_sizes,
+            "n_reinitialize_tries":
+            CFG.sampler_mlp_classifier_n_reinitialize_tries,
+            "weight_init": CFG.predicate_mlp_classifier_init,
+            "weight_decay": CFG.weight_decay,
+            "use_torch_gpu": CFG.use_torch_gpu,
+            "train_print_every": CFG.pytorch_train_print_every,
+            "batch_size": CFG.pytorch_train_batch_size,
+            "validation_frac": CFG.pytorch_train_validation_frac,
+        }
+        if CFG.mlp_classifier_ensemble_stacked:
+            classifier: BinaryClassifierEnsemble = \
+                MLPBinaryClassifierEnsemble(
+                    seed=CFG.seed,
+                    ensemble_size=CFG.
+                    active_sampler_learning_num_ensemble_members,
+                    **mlp_kwargs)
+        else:
+            classifier = BinaryClassifierEnsemble(
+                seed=CFG.seed,
+                ensemble_size=CFG.active_sampler_learning_num_ensemble_members,
+                member_cls=MLPBinaryClassifier,
+                **mlp_kwargs)
         classifier.fit(X_arr_classifier, y_arr_classifier)
 
         # Save the sampler classifier for external analysis.
@@ -567,6 +583,8 @@ class _FittedQWrappedSamplerLearner(_WrappedSamplerLearner):
             weight_decay=CFG.weight_decay,
             use_torch_gpu=CFG.use_torch_gpu,
             train_print_every=CFG.pytorch_train_print_every,
+            batch_size=CFG.pytorch_train_batch_size,
+            validation_frac=CFG.pytorch_train_validation_frac,
             n_iter_no_change=CFG.active_sampler_learning_n_iter_no_change)
         regressor.fit(X_arr_regressor, y_arr_regressor)
         return regressor
@@ -624,15 +642,23 @@ def _classifier_to_score_fn(classifier: BinaryClassifier,
 
 def _classifier_ensemble_to_score_fn(classifier: BinaryClassifierEnsemble,
                                      nsrt: NSRT, test_time: bool) -> _ScoreFn:
-    if test_time:
-        return _vector_score_fn_to_score_fn(
-            lambda x: np.mean(classifier.predict_member_probas(x), dtype=float
-                              ), nsrt)
-    # If we want the exploration score function, then we need to compute the
-    # entropy.
-    return _vector_score_fn_to_score_fn(
-        lambda x: utils.entropy(
-            float(np.mean(classifier.predict_member_probas(x)))), nsrt)
+
+    # All of the samples are scored by all of the members in one batch.
+    def _score_fn(state: State, objects: Sequence[Object],
+                  param_lst: List[Array]) -> List[float]:
+        X = np.array([
+            utils.construct_active_sampler_input(state, objects, p,
+                                                 nsrt.option)
+            for p in param_lst
+        ])
+        probas = np.mean(classifier.predict_member_probas_batch(X), axis=1)
+        if test_time:
+            return [float(p) for p in probas]
+        # If we want the exploration score function, then we need to compute
+        # the entropy.
+        return [utils.entropy(float(p)) for p in probas]
+
+    return _score_fn
 
 
 def _regressor_to_score_fn(regressor: MLPRegressor, nsrt: NSRT) -> _ScoreFn:
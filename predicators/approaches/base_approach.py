@@ -77,6 +77,17 @@ class BaseApproach(abc.ABC):
 
         return _policy
 
+    def replan(self, task: Task, timeout: int) -> Callable[[State], Action]:
+        """Called instead of solve() when replanning in the middle of an
+        episode, e.g., because an execution monitor was triggered.
+
+        The initial state of the task is the current state, and the goal
+        and objects are the same as in the previous call to solve() or
+        replan(). Defaults to solving the task from scratch, but
+        subclasses may reuse the work done in previous calls.
+        """
+        return self.solve(task, timeout)
+
     def _set_seed(self, seed: int) -> None:
         """Reset seed and rng."""
         self._seed = seed
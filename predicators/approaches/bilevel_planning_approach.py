@@ -14,7 +14,7 @@ from predicators.approaches import ApproachFailure, ApproachTimeout, \
     BaseApproach
 from predicators.option_model import _OptionModelBase, create_option_model
 from predicators.planning import PlanningFailure, PlanningTimeout, \
-    run_task_plan_once, sesame_plan
+    ReplanningCache, run_task_plan_once, sesame_plan
 from predicators.settings import CFG
 from predicators.structs import NSRT, Action, GroundAtom, Metrics, \
     ParameterizedOption, Predicate, State, Task, Type, _GroundNSRT, _Option
@@ -51,6 +51,18 @@ class BilevelPlanningApproach(BaseApproach):
         self._last_plan: List[_Option] = []  # used if plan WITH sim
         self._last_nsrt_plan: List[_GroundNSRT] = []  # plan WITHOUT sim
         self._last_atoms_seq: List[Set[GroundAtom]] = []  # plan WITHOUT sim
+        self._replanning_cache = ReplanningCache()
+        # Reused across tasks; the entries of relearned NSRTs are discarded.
+        self._grounding_cache = utils.StaticPruningGroundingCache()
+
+    def solve(self, task: Task, timeout: int) -> Callable[[State], Action]:
+        # Only the work done for the same task can be reused by replan().
+        self._replanning_cache = ReplanningCache()
+        return super().solve(task, timeout)
+
+    def replan(self, task: Task, timeout: int) -> Callable[[State], Action]:
+        # Reuse the grounding, heuristic, and previous skeleton of the task.
+        return super().solve(task, timeout)
 
     def _solve(self, task: Task, timeout: int) -> Callable[[State], Action]:
         self._num_calls += 1
@@ -112,6 +124,8 @@ class BilevelPlanningApproach(BaseApproach):
                 max_horizon=CFG.horizon,
                 allow_noops=CFG.sesame_allow_noops,
                 use_visited_state_set=CFG.sesame_use_visited_state_set,
+                replanning_cache=self._replanning_cache,
+                grounding_cache=self._grounding_cache,
                 **kwargs)
         except PlanningFailure as e:
             raise ApproachFailure(e.args[0], e.info)
@@ -135,6 +149,7 @@ class BilevelPlanningApproach(BaseApproach):
                 seed,
                 task_planning_heuristic=self._task_planning_heuristic,
                 max_horizon=float(CFG.horizon),
+                replanning_cache=self._replanning_cache,
                 **kwargs)
         except PlanningFailure as e:
             raise ApproachFailure(e.args[0], e.info)
@@ -143,6 +158,15 @@ class BilevelPlanningApproach(BaseApproach):
 
         return plan, atoms_seq, metrics
 
+    def set_num_calls(self, num_calls: int) -> None:
+        """Set the number of previous calls to solve().
+
+        The planning seed of each call is derived from this number, so,
+        e.g., tasks can be solved out of order or in separate processes
+        with the same seeds as when they are solved in order.
+        """
+        self._num_calls = num_calls
+
     def reset_metrics(self) -> None:
         super().reset_metrics()
         # Initialize min to inf (max gets initialized to 0 by default).
@@ -7,7 +7,8 @@ The input is always the same.
 import abc
 import functools
 import logging
-from typing import Any, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+from typing import Any, Dict, FrozenSet, Generic, List, Optional, Set, Tuple, \
+    TypeVar
 
 import dill as pkl
 import numpy as np
@@ -24,10 +25,16 @@ from predicators.gnn.gnn_utils import GraphDictDataset, compute_normalizers, \
     get_single_model_prediction, graph_batch_collate, normalize_graph, \
     train_model
 from predicators.settings import CFG
-from predicators.structs import Dataset, GroundAtom, ParameterizedOption, \
-    Predicate, State, Task, Type
+from predicators.structs import Dataset, GroundAtom, NDArray, Object, \
+    ParameterizedOption, Predicate, State, Task, Type
 
 _Output = TypeVar("_Output")  # a generic type for the output of this GNN
+# The parts of an input graph that only depend on the objects and goal:
+# object to node index, node features, edge features, and goal globals.
+_StaticGraph = Tuple[Dict[Object, int], NDArray[np.float64],
+                     NDArray[np.float64], NDArray[np.int64]]
+# The objects and the goal.
+_StaticGraphKey = Tuple[Tuple[Object, ...], FrozenSet[GroundAtom]]
 
 
 class GNNApproach(BaseApproach, Generic[_Output]):
@@ -46,6 +53,8 @@ class GNNApproach(BaseApproach, Generic[_Output]):
         self._input_normalizers: Dict = {}
         self._target_normalizers: Dict = {}
         self._data_exemplar: Tuple[Dict, Dict] = ({}, {})
+        self._static_graph_cache: Optional[Tuple[_StaticGraphKey,
+                                                 _StaticGraph]] = None
         # Seed torch.
         torch.manual_seed(self._seed)
 
@@ -220,6 +229,7 @@ class GNNApproach(BaseApproach, Generic[_Output]):
         self._nullary_predicates = info["nullary_predicates"]
         self._node_feature_to_index = info["node_feature_to_index"]
         self._edge_feature_to_index = info["edge_feature_to_index"]
+        self._static_graph_cache = None
         self._input_normalizers = info["input_normalizers"]
         self._target_normalizers = info["target_normalizers"]
         self._load_output_specific_fields_from_save_info(info)
@@ -266,6 +276,8 @@ class GNNApproach(BaseApproach, Generic[_Output]):
                 for feat in obj.type.feature_names:
                     obj_attrs_set.add(f"feat_{feat}")
         self._nullary_predicates = sorted(nullary_predicates_set)
+        # The feature indices are about to change.
+        self._static_graph_cache = None
         self._setup_output_specific_fields(data)
 
         obj_types = sorted(obj_types_set)
@@ -310,14 +322,11 @@ class GNNApproach(BaseApproach, Generic[_Output]):
 
     def _graphify_single_input(self, state: State, atoms: Set[GroundAtom],
                                goal: Set[GroundAtom]) -> Tuple[Dict, Dict]:
-        all_objects = list(state)
-        node_to_object = dict(enumerate(all_objects))
-        object_to_node = {v: k for k, v in node_to_object.items()}
-        num_objects = len(all_objects)
-        num_node_features = len(self._node_feature_to_index)
-        num_edge_features = len(self._edge_feature_to_index)
+        object_to_node, static_node_features, static_edge_features, \
+            goal_globals = self._graphify_static_input(list(state), goal)
+        num_objects = len(object_to_node)
+        num_edge_features = static_edge_features.shape[2]
 
-        G = functools.partial(utils.wrap_predicate, prefix="GOAL-")
         R = functools.partial(utils.wrap_predicate, prefix="REV-")
 
         graph = {}
@@ -328,22 +337,12 @@ class GNNApproach(BaseApproach, Generic[_Output]):
             if atom.predicate.arity != 0:
                 continue
             atoms_globals[self._nullary_predicates.index(atom.predicate)] = 1
-        goal_globals = np.zeros(len(self._nullary_predicates), dtype=np.int64)
-        for atom in goal:
-            if atom.predicate.arity != 0:
-                continue
-            goal_globals[self._nullary_predicates.index(atom.predicate)] = 1
         graph["globals"] = np.r_[atoms_globals, goal_globals]
 
-        # Add nodes (one per object) and node features.
+        # Add nodes (one per object) and node features, starting from the
+        # node features for the object types and goal.
         graph["n_node"] = np.array(num_objects)
-        node_features = np.zeros((num_objects, num_node_features))
-
-        ## Add node features for obj types.
-        for obj in state:
-            obj_index = object_to_node[obj]
-            type_index = self._node_feature_to_index[f"type_{obj.type.name}"]
-            node_features[obj_index, type_index] = 1
+        node_features = static_node_features.copy()
 
         ## Add node features for unary atoms.
         for atom in atoms:
@@ -353,14 +352,6 @@ class GNNApproach(BaseApproach, Generic[_Output]):
             atom_index = self._node_feature_to_index[atom.predicate]
             node_features[obj_index, atom_index] = 1
 
-        ## Add node features for unary atoms in goal.
-        for atom in goal:
-            if atom.predicate.arity != 1:
-                continue
-            obj_index = object_to_node[atom.objects[0]]
-            atom_index = self._node_feature_to_index[G(atom.predicate)]
-            node_features[obj_index, atom_index] = 1
-
         ## Add node features for state.
         for obj in state:
             obj_index = object_to_node[obj]
@@ -370,12 +361,9 @@ class GNNApproach(BaseApproach, Generic[_Output]):
 
         graph["nodes"] = node_features
 
-        # Deal with edge case (pun).
-        num_edge_features = max(num_edge_features, 1)
-
-        # Add edges (one between each pair of objects) and edge features.
-        all_edge_features = np.zeros(
-            (num_objects, num_objects, num_edge_features))
+        # Add edges (one between each pair of objects) and edge features,
+        # starting from the edge features for the goal.
+        all_edge_features = static_edge_features.copy()
 
         ## Add edge features for binary atoms.
         for atom in atoms:
@@ -396,6 +384,74 @@ class GNNApproach(BaseApproach, Generic[_Output]):
             # Note: the next line is reversed on purpose!
             all_edge_features[obj1_index, obj0_index, pred_index] = 1
 
+        # Organize into expected representation.
+        adjacency_mat = np.any(all_edge_features, axis=2)
+        receivers, senders, edges = [], [], []
+        for sender, receiver in np.argwhere(adjacency_mat):
+            edge = all_edge_features[sender, receiver]
+            senders.append(sender)
+            receivers.append(receiver)
+            edges.append(edge)
+
+        n_edge = len(edges)
+        graph["edges"] = np.reshape(edges, [n_edge, num_edge_features])
+        graph["receivers"] = np.reshape(receivers, [n_edge]).astype(np.int64)
+        graph["senders"] = np.reshape(senders, [n_edge]).astype(np.int64)
+        graph["n_edge"] = np.reshape(n_edge, [1]).astype(np.int64)
+
+        return graph, object_to_node
+
+    def _graphify_static_input(self, all_objects: List[Object],
+                               goal: Set[GroundAtom]) -> _StaticGraph:
+        """Get the parts of the input graph that only depend on the objects
+        and the goal, which stay the same over a task.
+
+        The result for the most recent (objects, goal) is cached, keyed on
+        their contents.
+        """
+        key = (tuple(all_objects), frozenset(goal))
+        if self._static_graph_cache is not None:
+            cached_key, static_graph = self._static_graph_cache
+            if cached_key == key:
+                return static_graph
+
+        object_to_node = {obj: i for i, obj in enumerate(all_objects)}
+        num_objects = len(all_objects)
+        num_node_features = len(self._node_feature_to_index)
+        num_edge_features = len(self._edge_feature_to_index)
+
+        G = functools.partial(utils.wrap_predicate, prefix="GOAL-")
+        R = functools.partial(utils.wrap_predicate, prefix="REV-")
+
+        # Globals: nullary predicates in goal.
+        goal_globals = np.zeros(len(self._nullary_predicates), dtype=np.int64)
+        for atom in goal:
+            if atom.predicate.arity != 0:
+                continue
+            goal_globals[self._nullary_predicates.index(atom.predicate)] = 1
+
+        node_features = np.zeros((num_objects, num_node_features))
+
+        ## Add node features for obj types.
+        for obj in all_objects:
+            obj_index = object_to_node[obj]
+            type_index = self._node_feature_to_index[f"type_{obj.type.name}"]
+            node_features[obj_index, type_index] = 1
+
+        ## Add node features for unary atoms in goal.
+        for atom in goal:
+            if atom.predicate.arity != 1:
+                continue
+            obj_index = object_to_node[atom.objects[0]]
+            atom_index = self._node_feature_to_index[G(atom.predicate)]
+            node_features[obj_index, atom_index] = 1
+
+        # Deal with edge case (pun).
+        num_edge_features = max(num_edge_features, 1)
+
+        all_edge_features = np.zeros(
+            (num_objects, num_objects, num_edge_features))
+
         ## Add edge features for binary atoms in goal.
         for atom in goal:
             if atom.predicate.arity != 2:
@@ -415,19 +471,7 @@ class GNNApproach(BaseApproach, Generic[_Output]):
             # Note: the next line is reversed on purpose!
             all_edge_features[obj1_index, obj0_index, pred_index] = 1
 
-        # Organize into expected representation.
-        adjacency_mat = np.any(all_edge_features, axis=2)
-        receivers, senders, edges = [], [], []
-        for sender, receiver in np.argwhere(adjacency_mat):
-            edge = all_edge_features[sender, receiver]
-            senders.append(sender)
-            receivers.append(receiver)
-            edges.append(edge)
-
-        n_edge = len(edges)
-        graph["edges"] = np.reshape(edges, [n_edge, num_edge_features])
-        graph["receivers"] = np.reshape(receivers, [n_edge]).astype(np.int64)
-        graph["senders"] = np.reshape(senders, [n_edge]).astype(np.int64)
-        graph["n_edge"] = np.reshape(n_edge, [1]).astype(np.int64)
-
-        return graph, object_to_node
+        static_graph = (object_to_node, node_features, all_edge_features,
+                        goal_globals)
+        self._static_graph_cache = (key, static_graph)
+        return static_graph
@@ -4,16 +4,20 @@ the candidates proposed from a grammar."""
 from __future__ import annotations
 
 import abc
+import contextlib
 import itertools
 import logging
+import os
 from dataclasses import dataclass, field
 from functools import cached_property
 from operator import le
-from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Sequence, \
-    Set, Tuple
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, \
+    Sequence, Set, Tuple
 
 import numpy as np
+import pathos.multiprocessing as mp
 from gym.spaces import Box
+from numpy.typing import NDArray
 from scipy.stats import kstest
 from sklearn.mixture import GaussianMixture as GMM
 
@@ -22,7 +26,8 @@ from predicators.approaches.nsrt_learning_approach import NSRTLearningApproach
 from predicators.nsrt_learning.segmentation import segment_trajectory
 from predicators.nsrt_learning.strips_learning import learn_strips_operators
 from predicators.predicate_search_score_functions import \
-    _PredicateSearchScoreFunction, create_score_function
+    _OperatorLearningBasedScoreFunction, _PredicateSearchScoreFunction, \
+    create_score_function
 from predicators.settings import CFG
 from predicators.structs import Dataset, GroundAtomTrajectory, Object, \
     ParameterizedOption, Predicate, Segment, State, Task, Type
@@ -79,6 +84,23 @@ def _create_grammar(dataset: Dataset,
     return grammar
 
 
+def _get_atom_cache_dir() -> str:
+    return os.path.join(CFG.data_dir, "ground_atom_cache")
+
+
+def _is_cacheable(predicate: Predicate) -> bool:
+    """Whether the truth values of the predicate can be stored in the ground
+    atom cache.
+
+    Only the classifiers generated by the grammar are cached. Those of
+    the given predicates may read values that the cache does not know
+    about (e.g., CFG or environment attributes), so they are always
+    evaluated.
+    """
+    # pylint: disable=protected-access
+    return isinstance(predicate._classifier, _ProgrammaticClassifier)
+
+
 class _ProgrammaticClassifier(abc.ABC):
     """A classifier implemented as an arbitrary program."""
 
@@ -155,6 +177,16 @@ class _SingleAttributeCompareClassifier(_UnaryClassifier):
         assert obj.type == self.object_type
         return self.compare(s.get(obj, self.attribute_name), self.constant)
 
+    def classify_batch(
+            self, states: Sequence[State],
+            choices: Sequence[Sequence[Object]]) -> NDArray[np.bool_]:
+        """Classify every choice of objects in every state at once."""
+        assert all(o[0].type == self.object_type for o in choices)
+        idx = self.object_type.feature_index(self.attribute_name)
+        values = np.array([[s[o[0]][idx] for o in choices] for s in states])
+        # The comparison is applied elementwise.
+        return self.compare(values, self.constant)  # type: ignore
+
     def __str__(self) -> str:
         return (
             f"(({self.object_index}:{self.object_type.name})."
@@ -193,6 +225,20 @@ class _AttributeDiffCompareClassifier(_BinaryClassifier):
                 s.get(obj1, self.attribute1_name) -
                 s.get(obj2, self.attribute2_name)), self.constant)
 
+    def classify_batch(
+            self, states: Sequence[State],
+            choices: Sequence[Sequence[Object]]) -> NDArray[np.bool_]:
+        """Classify every choice of objects in every state at once."""
+        assert all(o[0].type == self.object1_type for o in choices)
+        assert all(o[1].type == self.object2_type for o in choices)
+        idx1 = self.object1_type.feature_index(self.attribute1_name)
+        idx2 = self.object2_type.feature_index(self.attribute2_name)
+        values1 = np.array([[s[o[0]][idx1] for o in choices] for s in states])
+        values2 = np.array([[s[o[1]][idx2] for o in choices] for s in states])
+        diffs = np.abs(values1 - values2)
+        # The comparison is applied elementwise.
+        return self.compare(diffs, self.constant)  # type: ignore
+
     def __str__(self) -> str:
         return (f"(|({self.object1_index}:{self.object1_type.name})."
                 f"{self.attribute1_name} - ({self.object2_index}:"
@@ -221,6 +267,12 @@ class _NegationClassifier(_ProgrammaticClassifier):
     def __call__(self, s: State, o: Sequence[Object]) -> bool:
         return not self.body.holds(s, o)
 
+    def classify_batch(
+            self, states: Sequence[State],
+            choices: Sequence[Sequence[Object]]) -> NDArray[np.bool_]:
+        """Classify every choice of objects in every state at once."""
+        return ~self.body.holds_batch(states, choices)
+
     def __str__(self) -> str:
         return f"NOT-{self.body}"
 
@@ -640,30 +692,40 @@ class _PrunedGrammar(_DataBasedPredicateGrammar):
             seen[pred_id] = predicate
             yield (predicate, cost)
 
+    @cached_property
+    def _atom_cache(self) -> Optional[utils.GroundAtomCache]:
+        if not CFG.grammar_search_use_atom_cache:
+            return None
+        return utils.GroundAtomCache(self._get_state_sequences(),
+                                     _get_atom_cache_dir())
+
+    def _get_state_sequences(self) -> Sequence[Sequence[State]]:
+        if CFG.segmenter == "atom_changes":
+            # Use the entire dataset.
+            return [traj.states for traj in self.dataset.trajectories]
+        # This list may expand in the future if we add other segmentation
+        # methods, but leaving this assertion in as a safeguard anyway.
+        assert CFG.segmenter in ("option_changes", "contacts")
+        # Make use of the pre-computed segment-level state sequences.
+        return self._state_sequences
+
     def _get_predicate_identifier(
         self, predicate: Predicate
     ) -> FrozenSet[Tuple[int, int, FrozenSet[Tuple[Object, ...]]]]:
         """Returns frozenset identifiers for each data point."""
         raw_identifiers = set()
-        if CFG.segmenter == "atom_changes":
-            # Get atoms for this predicate alone on the dataset, and then
-            # go through the entire dataset.
-            atom_dataset = utils.create_ground_atom_dataset(
-                self.dataset.trajectories, {predicate})
-            for traj_idx, (_, atom_traj) in enumerate(atom_dataset):
-                for t, atoms in enumerate(atom_traj):
-                    atom_args = frozenset(tuple(a.objects) for a in atoms)
-                    raw_identifiers.add((traj_idx, t, atom_args))
+        # Get atoms for this predicate alone on the state sequences.
+        if self._atom_cache is not None and _is_cacheable(predicate):
+            atoms_seqs = self._atom_cache.abstract_states({predicate})
         else:
-            # This list may expand in the future if we add other segmentation
-            # methods, but leaving this assertion in as a safeguard anyway.
-            assert CFG.segmenter in ("option_changes", "contacts")
-            # Make use of the pre-computed segment-level state sequences.
-            for traj_idx, state_seq in enumerate(self._state_sequences):
-                for t, state in enumerate(state_seq):
-                    atoms = utils.abstract(state, {predicate})
-                    atom_args = frozenset(tuple(a.objects) for a in atoms)
-                    raw_identifiers.add((traj_idx, t, atom_args))
+            atoms_seqs = [
+                utils.abstract_states(state_seq, {predicate})
+                for state_seq in self._get_state_sequences()
+            ]
+        for traj_idx, atoms_seq in enumerate(atoms_seqs):
+            for t, atoms in enumerate(atoms_seq):
+                atom_args = frozenset(tuple(a.objects) for a in atoms)
+                raw_identifiers.add((traj_idx, t, atom_args))
         return frozenset(raw_identifiers)
 
 
@@ -733,6 +795,36 @@ class _ForallPredicateGrammarWrapper(_PredicateGrammar):
 #                                 Approach                                     #
 ################################################################################
 
+# Set in each worker process by _init_score_function_worker().
+_SCORE_FUNCTION_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_score_function_worker(score_function: _PredicateSearchScoreFunction,
+                                candidates: List[Predicate]) -> None:
+    """Initialize a worker process for parallel hill climbing in
+    GrammarSearchInventionApproach."""
+    _SCORE_FUNCTION_WORKER_STATE["score_function"] = score_function
+    _SCORE_FUNCTION_WORKER_STATE["candidates"] = candidates
+    _SCORE_FUNCTION_WORKER_STATE["base"] = None
+
+
+def _evaluate_in_score_function_worker(
+        args: Tuple[Tuple[int, ...], Tuple[int, ...]]) -> float:
+    """Evaluate a set of candidates in a worker process, given the indices of
+    a base set of candidates and of the candidates added to it."""
+    base_idxs, added_idxs = args
+    score_function = _SCORE_FUNCTION_WORKER_STATE["score_function"]
+    candidates = _SCORE_FUNCTION_WORKER_STATE["candidates"]
+    base = frozenset(candidates[i] for i in base_idxs)
+    if base != _SCORE_FUNCTION_WORKER_STATE["base"] and isinstance(
+            score_function, _OperatorLearningBasedScoreFunction):
+        # Segment with the base set first, so that the segmentations for its
+        # supersets with one more candidate are computed incrementally.
+        score_function.segment_trajectories(base)
+        _SCORE_FUNCTION_WORKER_STATE["base"] = base
+    added = frozenset(candidates[i] for i in added_idxs)
+    return score_function.evaluate(base | added)
+
 
 class GrammarSearchInventionApproach(NSRTLearningApproach):
     """An approach that invents predicates by searching over candidate sets,
@@ -764,9 +856,26 @@ class GrammarSearchInventionApproach(NSRTLearningApproach):
             logging.info(f"{predicate} {cost}")
         # Apply the candidate predicates to the data.
         logging.info("Applying predicates to data...")
-        atom_dataset = utils.create_ground_atom_dataset(
-            dataset.trajectories,
-            set(candidates) | self._initial_predicates)
+        if CFG.grammar_search_use_atom_cache:
+            atom_cache = utils.GroundAtomCache(
+                [traj.states for traj in dataset.trajectories],
+                _get_atom_cache_dir())
+            all_predicates = set(candidates) | self._initial_predicates
+            cacheable = {p for p in all_predicates if _is_cacheable(p)}
+            atoms_seqs = atom_cache.abstract_states(cacheable)
+            logging.info(f"Loaded {atom_cache.num_hits} predicates from the "
+                         f"cache and evaluated {atom_cache.num_misses}.")
+            for traj, atoms_seq in zip(dataset.trajectories, atoms_seqs):
+                uncached_atoms_seq = utils.abstract_states(
+                    traj.states, all_predicates - cacheable)
+                for atoms, uncached_atoms in zip(atoms_seq,
+                                                 uncached_atoms_seq):
+                    atoms.update(uncached_atoms)
+            atom_dataset = list(zip(dataset.trajectories, atoms_seqs))
+        else:
+            atom_dataset = utils.create_ground_atom_dataset(
+                dataset.trajectories,
+                set(candidates) | self._initial_predicates)
         logging.info("Done.")
         # Select a subset of the candidates to keep.
         logging.info("Selecting a subset...")
@@ -820,13 +929,51 @@ class GrammarSearchInventionApproach(NSRTLearningApproach):
 
         # Greedy local hill climbing search.
         if CFG.grammar_search_search_algorithm == "hill_climbing":
-            path, _, heuristics = utils.run_hill_climbing(
-                init,
-                _check_goal,
-                _get_successors,
-                score_function.evaluate,
-                enforced_depth=CFG.grammar_search_hill_climbing_depth,
-                parallelize=CFG.grammar_search_parallelize_hill_climbing)
+            with contextlib.ExitStack() as stack:
+                batch_heuristic: Optional[Callable[
+                    [List[FrozenSet[Predicate]]], List[float]]] = None
+                if CFG.grammar_search_parallelize_hill_climbing:
+                    # Create one pool for the whole search. Each worker keeps
+                    # its own copy of the score function, and with it the
+                    # atom dataset, so only predicate indices are sent.
+                    candidate_list = sorted(candidates)
+                    pool = stack.enter_context(
+                        mp.Pool(processes=mp.cpu_count(),
+                                initializer=_init_score_function_worker,
+                                initargs=(score_function, candidate_list)))
+                    candidate_to_idx = {
+                        p: i
+                        for i, p in enumerate(candidate_list)
+                    }
+
+                    def _evaluate_batch(
+                        candidate_sets: List[FrozenSet[Predicate]]
+                    ) -> List[float]:
+                        # Send each set as the predicates added to the
+                        # predicates common to all the sets, which is usually
+                        # the current node of the search.
+                        if not candidate_sets:
+                            return []
+                        base = frozenset.intersection(*candidate_sets)
+                        base_idxs = tuple(
+                            sorted(candidate_to_idx[p] for p in base))
+                        args = [(base_idxs,
+                                 tuple(
+                                     sorted(candidate_to_idx[p]
+                                            for p in s - base)))
+                                for s in candidate_sets]
+                        return pool.map(_evaluate_in_score_function_worker,
+                                        args)
+
+                    batch_heuristic = _evaluate_batch
+
+                path, _, heuristics = utils.run_hill_climbing(
+                    init,
+                    _check_goal,
+                    _get_successors,
+                    score_function.evaluate,
+                    enforced_depth=CFG.grammar_search_hill_climbing_depth,
+                    batch_heuristic=batch_heuristic)
             logging.info("\nHill climbing summary:")
             for i in range(1, len(path)):
                 new_additions = path[i] - path[i - 1]
@@ -1,7 +1,7 @@
 """An approach that learns predicates from a teacher."""
 
 import logging
-from typing import Callable, Dict, List, Optional, Sequence, Set
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
 
 import dill as pkl
 import numpy as np
@@ -11,7 +11,8 @@ from predicators import utils
 from predicators.approaches.nsrt_learning_approach import NSRTLearningApproach
 from predicators.explorers import create_explorer
 from predicators.ml_models import BinaryClassifierEnsemble, \
-    KNeighborsClassifier, LearnedPredicateClassifier, MLPBinaryClassifier
+    KNeighborsClassifier, LearnedPredicateClassifier, MLPBinaryClassifier, \
+    MLPBinaryClassifierEnsemble
 from predicators.settings import CFG
 from predicators.structs import Dataset, GroundAtom, GroundAtomsHoldQuery, \
     GroundAtomsHoldResponse, InteractionRequest, InteractionResult, \
@@ -103,21 +104,33 @@ class InteractiveLearningApproach(NSRTLearningApproach):
             X = np.array(input_examples)
             Y = np.array(output_examples)
             if CFG.predicate_classifier_model == "mlp":
-                model = BinaryClassifierEnsemble(
-                    seed=CFG.seed,
-                    ensemble_size=CFG.interactive_num_ensemble_members,
-                    member_cls=MLPBinaryClassifier,
-                    balance_data=CFG.mlp_classifier_balance_data,
-                    max_train_iters=CFG.predicate_mlp_classifier_max_itr,
-                    learning_rate=CFG.learning_rate,
-                    n_iter_no_change=CFG.mlp_classifier_n_iter_no_change,
-                    hid_sizes=CFG.mlp_classifier_hid_sizes,
-                    n_reinitialize_tries=CFG.
-                    predicate_mlp_classifier_n_reinitialize_tries,
-                    weight_init=CFG.predicate_mlp_classifier_init,
-                    weight_decay=CFG.weight_decay,
-                    use_torch_gpu=CFG.use_torch_gpu,
-                    train_print_every=CFG.pytorch_train_print_every)
+                mlp_kwargs: Dict[str, Any] = {
+                    "balance_data": CFG.mlp_classifier_balance_data,
+                    "max_train_iters": CFG.predicate_mlp_classifier_max_itr,
+                    "learning_rate": CFG.learning_rate,
+                    "n_iter_no_change": CFG.mlp_classifier_n_iter_no_change,
+                    "hid_sizes": CFG.mlp_classifier_hid_sizes,
+                    "n_reinitialize_tries":
+                    CFG.predicate_mlp_classifier_n_reinitialize_tries,
+                    "weight_init": CFG.predicate_mlp_classifier_init,
+                    "weight_decay": CFG.weight_decay,
+                    "use_torch_gpu": CFG.use_torch_gpu,
+                    "train_print_every": CFG.pytorch_train_print_every,
+                    "batch_size": CFG.pytorch_train_batch_size,
+                    "validation_frac": CFG.pytorch_train_validation_frac,
+                }
+                if CFG.mlp_classifier_ensemble_stacked:
+                    model: BinaryClassifierEnsemble = \
+                        MLPBinaryClassifierEnsemble(
+                            seed=CFG.seed,
+                            ensemble_size=CFG.interactive_num_ensemble_members,
+                            **mlp_kwargs)
+                else:
+                    model = BinaryClassifierEnsemble(
+                        seed=CFG.seed,
+                        ensemble_size=CFG.interactive_num_ensemble_members,
+                        member_cls=MLPBinaryClassifier,
+                        **mlp_kwargs)
             elif CFG.predicate_classifier_model == "knn":
                 model = BinaryClassifierEnsemble(
                     seed=CFG.seed,
@@ -84,7 +84,7 @@ class CogMan:
             logging.info("[CogMan] Replanning triggered.")
             assert self._current_goal is not None
             task = Task(state, self._current_goal)
-            self._reset_policy(task)
+            self._reset_policy(task, replanning=True)
             self._exec_monitor.reset(task)
             self._exec_monitor.update_approach_info(
                 self._approach.get_execution_monitoring_info())
@@ -170,10 +170,13 @@ class CogMan:
         return LowLevelTrajectory(self._episode_state_history,
                                   self._episode_action_history)
 
-    def _reset_policy(self, task: Task) -> None:
+    def _reset_policy(self, task: Task, replanning: bool = False) -> None:
         """Call the approach or use the override policy."""
         if self._override_policy is not None:
             self._current_policy = self._override_policy
+        elif replanning and CFG.cogman_incremental_replanning:
+            self._current_policy = self._approach.replan(task,
+                                                         timeout=CFG.timeout)
         else:
             self._current_policy = self._approach.solve(task,
                                                         timeout=CFG.timeout)
@@ -4,21 +4,24 @@ import functools
 import logging
 import os
 import re
-from typing import Callable, List, Set
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, \
+    Set, Tuple
 
 import dill as pkl
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
+import pathos.multiprocessing as mp
 
 from predicators import utils
 from predicators.approaches import ApproachFailure, ApproachTimeout
 from predicators.approaches.oracle_approach import OracleApproach
-from predicators.envs import BaseEnv
+from predicators.datasets.trajectory_store import TrajectoryStore
+from predicators.envs import BaseEnv, create_new_env
 from predicators.ground_truth_models import get_gt_options
 from predicators.settings import CFG
 from predicators.structs import Action, Dataset, LowLevelTrajectory, \
-    ParameterizedOption, State, Task
+    ParameterizedOption, State, Task, _GroundNSRT
 
 
 def create_demo_data(env: BaseEnv, train_tasks: List[Task],
@@ -29,6 +32,9 @@ def create_demo_data(env: BaseEnv, train_tasks: List[Task],
     dataset_fname, dataset_fname_template = utils.create_dataset_filename_str(
         saving_ground_atoms=False)
     os.makedirs(CFG.data_dir, exist_ok=True)
+    if CFG.offline_data_use_trajectory_store:
+        return _create_demo_data_with_store(env, train_tasks, known_options,
+                                            annotate_with_gt_ops)
     if CFG.load_data:
         dataset = _create_demo_data_with_loading(env, train_tasks,
                                                  known_options,
@@ -125,130 +131,83 @@ def _create_demo_data_with_loading(env: BaseEnv, train_tasks: List[Task],
     return dataset
 
 
+def _create_demo_data_with_store(env: BaseEnv, train_tasks: List[Task],
+                                 known_options: Set[ParameterizedOption],
+                                 annotate_with_gt_ops: bool) -> Dataset:
+    """Create demonstration data using a TrajectoryStore on disk.
+
+    Unlike the pickled datasets, a single store holds the demonstrations
+    for any number of train tasks. If the store covers more train tasks
+    than we need, only the demonstrations for the first
+    CFG.num_train_tasks are loaded. If it covers fewer, the remaining
+    demonstrations are generated and appended to the store.
+    """
+    store_dir = os.path.join(
+        CFG.data_dir,
+        f"{CFG.env}__{CFG.offline_data_method}__{CFG.demonstrator}__"
+        f"{CFG.included_options}__{CFG.seed}__store")
+    store = TrajectoryStore(store_dir)
+    if not CFG.load_data:
+        store.clear()
+    elif not store.exists():
+        raise ValueError(f"Cannot load data: {store_dir}")
+    # Demonstrations are only generated for the first CFG.max_initial_demos
+    # train tasks (see _generate_demonstrations()).
+    num_tasks = int(min(len(train_tasks), CFG.max_initial_demos))
+    if store.num_train_tasks < num_tasks:
+        train_tasks_start_idx = store.num_train_tasks
+        generated_dataset = _generate_demonstrations(
+            env,
+            train_tasks,
+            known_options,
+            train_tasks_start_idx=train_tasks_start_idx,
+            annotate_with_gt_ops=annotate_with_gt_ops)
+        logging.info(f"\n\nCREATED {len(generated_dataset.trajectories)} "
+                     "DEMONSTRATIONS")
+        store.append(generated_dataset, num_train_tasks=num_tasks)
+    dataset = store.load(num_train_tasks=CFG.num_train_tasks)
+    logging.info(f"\n\nLOADED DATASET OF {len(dataset.trajectories)} "
+                 "DEMONSTRATIONS")
+    return dataset
+
+
 def _generate_demonstrations(env: BaseEnv, train_tasks: List[Task],
                              known_options: Set[ParameterizedOption],
                              train_tasks_start_idx: int,
                              annotate_with_gt_ops: bool) -> Dataset:
     """Use the demonstrator to generate demonstrations, one per training task
     starting from train_tasks_start_idx."""
-    if CFG.demonstrator == "oracle":
-        options = get_gt_options(env.get_name())
-        oracle_approach = OracleApproach(
-            env.predicates,
-            options,
-            env.types,
-            env.action_space,
-            train_tasks,
-            task_planning_heuristic=CFG.offline_data_task_planning_heuristic,
-            max_skeletons_optimized=CFG.offline_data_max_skeletons_optimized,
-            bilevel_plan_without_sim=CFG.offline_data_bilevel_plan_without_sim)
-    else:  # pragma: no cover
-        # Disable all built-in keyboard shortcuts.
-        keymaps = {k for k in plt.rcParams if k.startswith("keymap.")}
-        for k in keymaps:
-            plt.rcParams[k].clear()
-        # Create the environment-specific method for turning events into
-        # actions. This should also log instructions.
-        event_to_action = env.get_event_to_action_fn()
-    trajectories = []
-    if annotate_with_gt_ops:
-        annotations = []
-    num_tasks = min(len(train_tasks), CFG.max_initial_demos)
-    rng = np.random.default_rng(CFG.seed)
+    # Note: we assume in main.py that demonstrations are only generated
+    # for train tasks whose index is less than CFG.max_initial_demos. If
+    # you modify code around here, make sure that this invariant holds.
+    num_tasks = int(min(len(train_tasks), CFG.max_initial_demos))
+    task_idxs = range(train_tasks_start_idx, num_tasks)
     if CFG.offline_data_bilevel_plan_without_sim is None:
         bilevel_plan_without_sim = CFG.bilevel_plan_without_sim
     else:
         bilevel_plan_without_sim = CFG.offline_data_bilevel_plan_without_sim
-    for idx, task in enumerate(train_tasks):
-        if idx < train_tasks_start_idx:  # ignore demos before this index
-            continue
-        # Note: we assume in main.py that demonstrations are only generated
-        # for train tasks whose index is less than CFG.max_initial_demos. If
-        # you modify code around here, make sure that this invariant holds.
-        if idx >= CFG.max_initial_demos:
-            break
-        try:
-            if CFG.demonstrator == "oracle":
-                timeout = CFG.offline_data_planning_timeout
-                if timeout == -1:
-                    timeout = CFG.timeout
-                oracle_approach.solve(task, timeout=timeout)
-                # Since we're running the oracle approach, we know that
-                # the policy is actually a plan under the hood, and we
-                # can retrieve it with get_last_plan(). We do this
-                # because we want to run the full plan.
-                if bilevel_plan_without_sim:
-                    last_nsrt_plan = oracle_approach.get_last_nsrt_plan()
-                    policy = utils.nsrt_plan_to_greedy_policy(
-                        last_nsrt_plan, task.goal, rng)
-                else:
-                    last_plan = oracle_approach.get_last_plan()
-                    policy = utils.option_plan_to_policy(last_plan)
-                # We will stop run_policy() when OptionExecutionFailure()
-                # is hit, which should only happen when the goal has been
-                # reached, as verified by the assertion later.
-                termination_function = lambda s: False
-            else:  # pragma: no cover
-                caption = (f"Task {idx+1} / {num_tasks}\nPlease demonstrate "
-                           f"achieving the goal:\n{task.goal}")
-                policy = functools.partial(human_demonstrator_policy, env,
-                                           caption, event_to_action)
-                termination_function = task.goal_holds
-
-            if CFG.make_demo_videos:
-                monitor = utils.VideoMonitor(env.render)
-            else:
-                monitor = None
-            traj, _ = utils.run_policy(
-                policy,
-                env,
-                "train",
-                idx,
-                termination_function=termination_function,
-                max_num_steps=CFG.horizon,
-                exceptions_to_break_on={
-                    utils.OptionExecutionFailure,
-                    utils.HumanDemonstrationFailure,
-                },
-                monitor=monitor)
-        except (ApproachTimeout, ApproachFailure,
-                utils.EnvironmentFailure) as e:
-            logging.warning("WARNING: Approach failed to solve with error: "
-                            f"{e}")
-            continue
-        # Check that the goal holds at the end. Print a warning if not.
-        if not task.goal_holds(traj.states[-1]):  # pragma: no cover
-            logging.warning("WARNING: Oracle failed on training task.")
+    # Demonstrations can only be generated in parallel when they do not
+    # depend on each other. Greedy policies from plans without simulation
+    # share a single rng across tasks, so they are generated sequentially.
+    if CFG.offline_data_num_workers > 1 and CFG.demonstrator == "oracle" \
+            and not bilevel_plan_without_sim and len(task_idxs) > 1:
+        results = _generate_demonstrations_in_parallel(train_tasks,
+                                                       known_options,
+                                                       task_idxs)
+    else:
+        results = _generate_demonstrations_sequentially(
+            env, train_tasks, known_options, task_idxs, num_tasks,
+            bilevel_plan_without_sim)
+    trajectories = []
+    annotations = []
+    for result in results:
+        if result is None:
             continue
-        if CFG.demonstrator == "human":  # pragma: no cover
-            logging.info("Successfully collected human demonstration of "
-                         f"length {len(traj.states)} for task {idx+1} / "
-                         f"{num_tasks}.")
-        # Add is_demo flag and task index information into the trajectory.
-        traj = LowLevelTrajectory(traj.states,
-                                  traj.actions,
-                                  _is_demo=True,
-                                  _train_task_idx=idx)
-        # To prevent cheating by option learning approaches, remove all oracle
-        # options from the trajectory actions, unless the options are known
-        # (via CFG.included_options or CFG.option_learner = 'no_learning').
-        if CFG.demonstrator == "oracle":
-            for act in traj.actions:
-                if act.get_option().parent not in known_options:
-                    assert CFG.option_learner != "no_learning"
-                    act.unset_option()
+        traj, nsrt_plan = result
         trajectories.append(traj)
         # If we're also annotating with ground truth operators,
-        # then get the last nsrt_plan and add the name of the
-        # nsrt used to the list of annotations.
-        if annotate_with_gt_ops:
-            last_nsrt_plan = oracle_approach.get_last_nsrt_plan()
-            annotations.append(list(last_nsrt_plan))
-        if CFG.make_demo_videos:
-            assert monitor is not None
-            video = monitor.get_video()
-            outfile = f"{CFG.env}__{CFG.seed}__demo__task{idx}.mp4"
-            utils.save_video(outfile, video)
+        # then add the name of the nsrt used to the list of annotations.
+        annotations.append(nsrt_plan)
     if annotate_with_gt_ops:
         dataset = Dataset(trajectories, annotations)
     else:
@@ -256,6 +215,210 @@ def _generate_demonstrations(env: BaseEnv, train_tasks: List[Task],
     return dataset
 
 
+def _create_oracle_approach(env: BaseEnv,
+                            train_tasks: List[Task]) -> OracleApproach:
+    """Create the oracle approach used to generate demonstrations."""
+    options = get_gt_options(env.get_name())
+    return OracleApproach(
+        env.predicates,
+        options,
+        env.types,
+        env.action_space,
+        train_tasks,
+        task_planning_heuristic=CFG.offline_data_task_planning_heuristic,
+        max_skeletons_optimized=CFG.offline_data_max_skeletons_optimized,
+        bilevel_plan_without_sim=CFG.offline_data_bilevel_plan_without_sim)
+
+
+def _generate_demonstrations_sequentially(
+    env: BaseEnv, train_tasks: List[Task],
+    known_options: Set[ParameterizedOption], task_idxs: Sequence[int],
+    num_tasks: int, bilevel_plan_without_sim: bool
+) -> Iterator[Optional[Tuple[LowLevelTrajectory, List[_GroundNSRT]]]]:
+    """Generate a demonstration for each of the given train task indices in
+    order, yielding None for tasks where the demonstrator failed."""
+    oracle_approach: Optional[OracleApproach] = None
+    event_to_action: Optional[Callable[[State, matplotlib.backend_bases.Event],
+                                       Action]] = None
+    if CFG.demonstrator == "oracle":
+        oracle_approach = _create_oracle_approach(env, train_tasks)
+    else:  # pragma: no cover
+        # Disable all built-in keyboard shortcuts.
+        keymaps = {k for k in plt.rcParams if k.startswith("keymap.")}
+        for k in keymaps:
+            plt.rcParams[k].clear()
+        # Create the environment-specific method for turning events into
+        # actions. This should also log instructions.
+        event_to_action = env.get_event_to_action_fn()
+    rng = np.random.default_rng(CFG.seed)
+    for idx in task_idxs:
+        if oracle_approach is not None:
+            # In a run that starts from the first train task, the oracle
+            # approach is called once per previous task. Set its number of
+            # calls accordingly, so that the demonstration for a task does
+            # not depend on where generation started (e.g., when adding
+            # demonstrations to a loaded dataset).
+            oracle_approach.set_num_calls(idx)
+        yield _generate_demonstration(env, train_tasks[idx], idx, num_tasks,
+                                      known_options, oracle_approach,
+                                      event_to_action, rng,
+                                      bilevel_plan_without_sim)
+
+
+# Module-level state for worker processes used to generate demonstrations in
+# parallel. Each worker initializes this once with its own environment and
+# oracle approach (see _init_demo_worker()).
+_DEMO_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_demo_worker(train_tasks: List[Task],
+                      known_options: Set[ParameterizedOption]) -> None:
+    """Initialize a worker process for
+    _generate_demonstrations_in_parallel()."""
+    env = create_new_env(CFG.env, do_cache=True, use_gui=False)
+    env.action_space.seed(CFG.seed)
+    _DEMO_WORKER_STATE["env"] = env
+    _DEMO_WORKER_STATE["train_tasks"] = train_tasks
+    _DEMO_WORKER_STATE["known_options"] = known_options
+    _DEMO_WORKER_STATE["oracle_approach"] = _create_oracle_approach(
+        env, train_tasks)
+
+
+def _generate_demonstration_in_worker(
+        idx: int) -> Optional[Tuple[LowLevelTrajectory, List[_GroundNSRT]]]:
+    """Run _generate_demonstration() in a worker process."""
+    oracle_approach = _DEMO_WORKER_STATE["oracle_approach"]
+    # Plan with the same seed as the sequential demonstrations (see
+    # _generate_demonstrations_sequentially()).
+    oracle_approach.set_num_calls(idx)
+    train_tasks = _DEMO_WORKER_STATE["train_tasks"]
+    # The rng is only used for plans without simulation, which are never
+    # generated in parallel.
+    rng = np.random.default_rng(CFG.seed)
+    return _generate_demonstration(_DEMO_WORKER_STATE["env"],
+                                   train_tasks[idx],
+                                   idx,
+                                   len(train_tasks),
+                                   _DEMO_WORKER_STATE["known_options"],
+                                   oracle_approach,
+                                   event_to_action=None,
+                                   rng=rng,
+                                   bilevel_plan_without_sim=False)
+
+
+def _generate_demonstrations_in_parallel(
+    train_tasks: List[Task], known_options: Set[ParameterizedOption],
+    task_idxs: Sequence[int]
+) -> Iterator[Optional[Tuple[LowLevelTrajectory, List[_GroundNSRT]]]]:
+    """Generate oracle demonstrations for the given train task indices in a
+    pool of CFG.offline_data_num_workers worker processes.
+
+    Results are yielded in the order of the train task indices.
+    """
+    num_workers = min(CFG.offline_data_num_workers, len(task_idxs))
+    logging.info(f"Generating {len(task_idxs)} demonstrations with "
+                 f"{num_workers} workers.")
+    with mp.Pool(processes=num_workers,
+                 initializer=_init_demo_worker,
+                 initargs=(train_tasks, known_options)) as pool:
+        yield from pool.imap(_generate_demonstration_in_worker, task_idxs)
+
+
+def _generate_demonstration(
+    env: BaseEnv, task: Task, idx: int, num_tasks: int,
+    known_options: Set[ParameterizedOption],
+    oracle_approach: Optional[OracleApproach],
+    event_to_action: Optional[Callable[[State, matplotlib.backend_bases.Event],
+                                       Action]], rng: np.random.Generator,
+    bilevel_plan_without_sim: bool
+) -> Optional[Tuple[LowLevelTrajectory, List[_GroundNSRT]]]:
+    """Use the demonstrator to generate a demonstration for the train task
+    with the given index.
+
+    Returns the trajectory and the last NSRT plan of the oracle (empty
+    for human demonstrations), or None if the demonstrator failed.
+    """
+    try:
+        if CFG.demonstrator == "oracle":
+            assert oracle_approach is not None
+            timeout = CFG.offline_data_planning_timeout
+            if timeout == -1:
+                timeout = CFG.timeout
+            oracle_approach.solve(task, timeout=timeout)
+            # Since we're running the oracle approach, we know that
+            # the policy is actually a plan under the hood, and we
+            # can retrieve it with get_last_plan(). We do this
+            # because we want to run the full plan.
+            if bilevel_plan_without_sim:
+                last_nsrt_plan = oracle_approach.get_last_nsrt_plan()
+                policy = utils.nsrt_plan_to_greedy_policy(
+                    last_nsrt_plan, task.goal, rng)
+            else:
+                last_plan = oracle_approach.get_last_plan()
+                policy = utils.option_plan_to_policy(last_plan)
+            # We will stop run_policy() when OptionExecutionFailure()
+            # is hit, which should only happen when the goal has been
+            # reached, as verified by the assertion later.
+            termination_function = lambda s: False
+        else:  # pragma: no cover
+            assert event_to_action is not None
+            caption = (f"Task {idx+1} / {num_tasks}\nPlease demonstrate "
+                       f"achieving the goal:\n{task.goal}")
+            policy = functools.partial(human_demonstrator_policy, env, caption,
+                                       event_to_action)
+            termination_function = task.goal_holds
+
+        if CFG.make_demo_videos:
+            monitor = utils.VideoMonitor(env.render)
+        else:
+            monitor = None
+        traj, _ = utils.run_policy(policy,
+                                   env,
+                                   "train",
+                                   idx,
+                                   termination_function=termination_function,
+                                   max_num_steps=CFG.horizon,
+                                   exceptions_to_break_on={
+                                       utils.OptionExecutionFailure,
+                                       utils.HumanDemonstrationFailure,
+                                   },
+                                   monitor=monitor)
+    except (ApproachTimeout, ApproachFailure, utils.EnvironmentFailure) as e:
+        logging.warning("WARNING: Approach failed to solve with error: "
+                        f"{e}")
+        return None
+    # Check that the goal holds at the end. Print a warning if not.
+    if not task.goal_holds(traj.states[-1]):  # pragma: no cover
+        logging.warning("WARNING: Oracle failed on training task.")
+        return None
+    if CFG.demonstrator == "human":  # pragma: no cover
+        logging.info("Successfully collected human demonstration of "
+                     f"length {len(traj.states)} for task {idx+1} / "
+                     f"{num_tasks}.")
+    # Add is_demo flag and task index information into the trajectory.
+    traj = LowLevelTrajectory(traj.states,
+                              traj.actions,
+                              _is_demo=True,
+                              _train_task_idx=idx)
+    # To prevent cheating by option learning approaches, remove all oracle
+    # options from the trajectory actions, unless the options are known
+    # (via CFG.included_options or CFG.option_learner = 'no_learning').
+    nsrt_plan: List[_GroundNSRT] = []
+    if CFG.demonstrator == "oracle":
+        assert oracle_approach is not None
+        for act in traj.actions:
+            if act.get_option().parent not in known_options:
+                assert CFG.option_learner != "no_learning"
+                act.unset_option()
+        nsrt_plan = list(oracle_approach.get_last_nsrt_plan())
+    if CFG.make_demo_videos:
+        assert monitor is not None
+        video = monitor.get_video()
+        outfile = f"{CFG.env}__{CFG.seed}__demo__task{idx}.mp4"
+        utils.save_video(outfile, video)
+    return traj, nsrt_plan
+
+
 def human_demonstrator_policy(env: BaseEnv, caption: str,
                               event_to_action: Callable[
                                   [State, matplotlib.backend_bases.Event],
@@ -0,0 +1,353 @@
+"""A chunked, memory-mapped on-disk store for datasets of trajectories.
+
+Unlike pickling a whole Dataset, the store keeps the numeric parts of
+trajectories in flat arrays. Each append writes one chunk. In a chunk,
+the feature vectors of all objects of each type are stored contiguously
+in one .npy file, and all action arrays are stored in another. The other
+parts of the trajectories (options, annotations, simulator states, and
+extra action info) are stored in a side index per chunk. A small
+top-level index lists the trajectories in the store, with their train
+task indices, so a prefix of the train tasks can be loaded without
+reading the rest of the store.
+
+Trajectories are loaded lazily. Their states and actions are only read
+from disk when they are first accessed.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+from functools import cached_property
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Type as TypingType
+
+import dill as pkl
+import numpy as np
+
+from predicators.structs import Action, Array, Dataset, LowLevelTrajectory, \
+    Object, State, Type
+
+_INDEX_FILENAME = "index.pkl"
+_CHUNK_INDEX_FILENAME = "chunk_index.pkl"
+_ACTIONS_FILENAME = "actions.npy"
+
+
+class TrajectoryStore:
+    """A dataset of trajectories stored on disk in chunks.
+
+    The store is created on the first call to append(). If the store
+    was created with annotations, every later append must also have
+    annotations, and vice versa.
+    """
+
+    def __init__(self, store_dir: str) -> None:
+        self._store_dir = store_dir
+        self._index_path = os.path.join(store_dir, _INDEX_FILENAME)
+        self._chunks: List[_TrajectoryStoreChunk] = []
+        # Each entry is (chunk idx, idx in chunk, is demo, train task idx).
+        self._trajectory_entries: List[Tuple[int, int, bool,
+                                             Optional[int]]] = []
+        self._has_annotations: Optional[bool] = None
+        self._num_train_tasks = 0
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "rb") as f:
+                index = pkl.load(f)
+            self._chunks = [
+                _TrajectoryStoreChunk(os.path.join(store_dir, chunk_name))
+                for chunk_name in index["chunks"]
+            ]
+            self._trajectory_entries = index["trajectories"]
+            self._has_annotations = index["has_annotations"]
+            self._num_train_tasks = index["num_train_tasks"]
+
+    def exists(self) -> bool:
+        """Whether anything has been appended to the store."""
+        return os.path.exists(self._index_path)
+
+    @property
+    def num_trajectories(self) -> int:
+        """The number of trajectories in the store."""
+        return len(self._trajectory_entries)
+
+    @property
+    def num_train_tasks(self) -> int:
+        """The number of train tasks covered by the store.
+
+        This can be larger than the number of trajectories, e.g., if the
+        demonstrator failed on some of the train tasks.
+        """
+        return self._num_train_tasks
+
+    @property
+    def has_annotations(self) -> bool:
+        """Whether the trajectories in the store have annotations."""
+        return bool(self._has_annotations)
+
+    def append(self,
+               dataset: Dataset,
+               num_train_tasks: Optional[int] = None) -> None:
+        """Append the trajectories (and annotations) in the dataset to the
+        store as a new chunk.
+
+        If num_train_tasks is given, it is the number of train tasks
+        covered by the store after this append.
+        """
+        if self._has_annotations is not None:
+            assert dataset.has_annotations == self._has_annotations
+        if dataset.has_annotations:
+            annotations: Optional[List[Any]] = dataset.annotations
+        else:
+            annotations = None
+        chunk_idx = len(self._chunks)
+        chunk_name = f"chunk_{chunk_idx}"
+        chunk_dir = os.path.join(self._store_dir, chunk_name)
+        _write_chunk(chunk_dir, dataset.trajectories, annotations)
+        self._chunks.append(_TrajectoryStoreChunk(chunk_dir))
+        for idx_in_chunk, traj in enumerate(dataset.trajectories):
+            train_task_idx = traj._train_task_idx  # pylint: disable=protected-access
+            self._trajectory_entries.append(
+                (chunk_idx, idx_in_chunk, traj.is_demo, train_task_idx))
+        self._has_annotations = dataset.has_annotations
+        if num_train_tasks is not None:
+            self._num_train_tasks = num_train_tasks
+        index = {
+            "chunks": [f"chunk_{i}" for i in range(len(self._chunks))],
+            "trajectories": self._trajectory_entries,
+            "has_annotations": self._has_annotations,
+            "num_train_tasks": self._num_train_tasks,
+        }
+        # Write the index atomically, so that an interrupted append leaves
+        # the store as it was before.
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pkl.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def load(self, num_train_tasks: Optional[int] = None) -> Dataset:
+        """Load the trajectories in the store as a Dataset.
+
+        If num_train_tasks is given, only load the trajectories whose
+        train task index is less than it. The states and actions of the
+        trajectories are read from disk lazily.
+        """
+        trajectories: List[LowLevelTrajectory] = []
+        annotations = []
+        for chunk_idx, idx_in_chunk, is_demo, train_task_idx in \
+                self._trajectory_entries:
+            if num_train_tasks is not None and (
+                    train_task_idx is None
+                    or train_task_idx >= num_train_tasks):
+                continue
+            chunk = self._chunks[chunk_idx]
+            trajectories.append(
+                StoredLowLevelTrajectory(chunk, idx_in_chunk, is_demo,
+                                         train_task_idx))
+            if self.has_annotations:
+                annotations.append(chunk.get_annotation(idx_in_chunk))
+        if self.has_annotations:
+            return Dataset(trajectories, annotations)
+        return Dataset(trajectories)
+
+    def clear(self) -> None:
+        """Delete everything in the store."""
+        if os.path.exists(self._store_dir):
+            shutil.rmtree(self._store_dir)
+        self._chunks = []
+        self._trajectory_entries = []
+        self._has_annotations = None
+        self._num_train_tasks = 0
+
+
+class StoredLowLevelTrajectory(LowLevelTrajectory):
+    """A LowLevelTrajectory whose states and actions are read from a chunk of
+    a TrajectoryStore when they are first accessed.
+
+    Should not be instantiated externally; use TrajectoryStore.load().
+    Pickling a StoredLowLevelTrajectory produces a regular
+    LowLevelTrajectory.
+    """
+    _chunk: _TrajectoryStoreChunk
+    _idx_in_chunk: int
+
+    def __init__(self, chunk: _TrajectoryStoreChunk, idx_in_chunk: int,
+                 is_demo: bool, train_task_idx: Optional[int]) -> None:
+        # pylint: disable=super-init-not-called
+        # LowLevelTrajectory is frozen, so set the fields directly.
+        object.__setattr__(self, "_chunk", chunk)
+        object.__setattr__(self, "_idx_in_chunk", idx_in_chunk)
+        object.__setattr__(self, "_is_demo", is_demo)
+        object.__setattr__(self, "_train_task_idx", train_task_idx)
+
+    @cached_property
+    def _states_and_actions(self) -> Tuple[List[State], List[Action]]:
+        return self._chunk.load_trajectory(self._idx_in_chunk)
+
+    @property
+    def states(self) -> List[State]:
+        return self._states_and_actions[0]
+
+    @property
+    def actions(self) -> List[Action]:
+        return self._states_and_actions[1]
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (LowLevelTrajectory, (self.states, self.actions, self._is_demo,
+                                     self._train_task_idx))
+
+
+class _TrajectoryStoreChunk:
+    """One chunk of a TrajectoryStore.
+
+    The side index and the arrays of the chunk are only read when they
+    are first needed. The arrays are memory-mapped.
+    """
+
+    def __init__(self, chunk_dir: str) -> None:
+        self._chunk_dir = chunk_dir
+
+    @cached_property
+    def _index(self) -> Dict[str, Any]:
+        with open(os.path.join(self._chunk_dir, _CHUNK_INDEX_FILENAME),
+                  "rb") as f:
+            return pkl.load(f)
+
+    @cached_property
+    def _feature_arrays(self) -> Dict[Type, Array]:
+        return {
+            t: np.load(os.path.join(self._chunk_dir, _features_filename(i)),
+                       mmap_mode="r")
+            for i, t in enumerate(self._index["types"])
+        }
+
+    @cached_property
+    def _action_array(self) -> Array:
+        return np.load(os.path.join(self._chunk_dir, _ACTIONS_FILENAME),
+                       mmap_mode="r")
+
+    def get_annotation(self, idx_in_chunk: int) -> Any:
+        """Get the annotation of a trajectory in this chunk."""
+        return self._index["trajectories"][idx_in_chunk]["annotation"]
+
+    def load_trajectory(self,
+                        idx_in_chunk: int) -> Tuple[List[State], List[Action]]:
+        """Read the states and actions of a trajectory in this chunk."""
+        meta = self._index["trajectories"][idx_in_chunk]
+        state_cls: TypingType[State] = meta["state_cls"]
+        simulator_states = meta["simulator_states"]
+        states: List[State] = []
+        for start, end, objects, type_to_row_start in meta["runs"]:
+            num_states = end - start
+            # Read the features of the whole run at once.
+            type_to_feats = {}
+            for t, row_start in type_to_row_start.items():
+                objs = [o for o in objects if o.type == t]
+                feats = np.array(
+                    self._feature_arrays[t][row_start:row_start +
+                                            num_states * len(objs)])
+                type_to_feats[t] = feats.reshape(
+                    (num_states, len(objs), t.dim))
+            for i in range(num_states):
+                type_to_count = {t: 0 for t in type_to_feats}
+                data: Dict[Object, Array] = {}
+                for obj in objects:
+                    data[obj] = type_to_feats[obj.type][
+                        i, type_to_count[obj.type]]
+                    type_to_count[obj.type] += 1
+                sim_state = None if simulator_states is None \
+                    else simulator_states[start + i]
+                states.append(state_cls(data, simulator_state=sim_state))
+        action_cls: TypingType[Action] = meta["action_cls"]
+        action_start = meta["action_start"]
+        options = meta["options"]
+        extra_infos = meta["extra_infos"]
+        action_arrs = np.array(self._action_array[action_start:action_start +
+                                                  len(options)])
+        actions: List[Action] = []
+        for i, (arr, option) in enumerate(zip(action_arrs, options)):
+            extra_info = None if extra_infos is None else extra_infos[i]
+            action = action_cls(arr, extra_info=extra_info)
+            if option is not None:
+                action.set_option(option)
+            actions.append(action)
+        return states, actions
+
+
+def _features_filename(type_idx: int) -> str:
+    return f"features_{type_idx}.npy"
+
+
+def _write_chunk(chunk_dir: str, trajectories: Sequence[LowLevelTrajectory],
+                 annotations: Optional[Sequence[Any]]) -> None:
+    """Write trajectories (and annotations) to a new chunk directory."""
+    assert not os.path.exists(chunk_dir)
+    type_to_rows: Dict[Type, List[Array]] = {}
+    action_rows: List[Array] = []
+    traj_metas = []
+    for traj_idx, traj in enumerate(trajectories):
+        states = traj.states
+        # Group consecutive states that have the same objects into runs.
+        # The features of each type in a run are stored contiguously,
+        # ordered by state and then by object.
+        runs = []
+        start = 0
+        while start < len(states):
+            objects = list(states[start])
+            end = start + 1
+            while end < len(states) and list(states[end]) == objects:
+                end += 1
+            type_to_row_start = {}
+            for obj in objects:
+                if obj.type not in type_to_row_start:
+                    rows = type_to_rows.setdefault(obj.type, [])
+                    type_to_row_start[obj.type] = len(rows)
+            for state in states[start:end]:
+                for t in type_to_row_start:
+                    for obj in objects:
+                        if obj.type == t:
+                            type_to_rows[t].append(np.asarray(state[obj]))
+            runs.append((start, end, objects, type_to_row_start))
+            start = end
+        # Only store simulator states and extra action info if present.
+        simulator_states: Optional[List[Any]] = None
+        if any(s.simulator_state is not None for s in states):
+            simulator_states = [s.simulator_state for s in states]
+        extra_infos: Optional[List[Any]] = None
+        if any(a.extra_info is not None for a in traj.actions):
+            extra_infos = [a.extra_info for a in traj.actions]
+        traj_metas.append({
+            "state_cls":
+            type(states[0]),
+            "runs":
+            runs,
+            "simulator_states":
+            simulator_states,
+            "action_cls":
+            type(traj.actions[0]) if traj.actions else Action,
+            "action_start":
+            len(action_rows),
+            "options":
+            [a.get_option() if a.has_option() else None for a in traj.actions],
+            "extra_infos":
+            extra_infos,
+            "annotation":
+            None if annotations is None else annotations[traj_idx],
+        })
+        action_rows.extend(np.asarray(a.arr) for a in traj.actions)
+    # Write everything to a temporary directory first, so that the chunk
+    # only appears once it is complete.
+    tmp_dir = f"{chunk_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir)
+    types = sorted(type_to_rows)
+    for i, t in enumerate(types):
+        feats = np.asarray(type_to_rows[t]).reshape(
+            (len(type_to_rows[t]), t.dim))
+        np.save(os.path.join(tmp_dir, _features_filename(i)), feats)
+    if action_rows:
+        actions = np.asarray(action_rows)
+    else:
+        actions = np.zeros((0, 0), dtype=np.float32)
+    np.save(os.path.join(tmp_dir, _ACTIONS_FILENAME), actions)
+    with open(os.path.join(tmp_dir, _CHUNK_INDEX_FILENAME), "wb") as f:
+        pkl.dump({"types": types, "trajectories": traj_metas}, f)
+    os.replace(tmp_dir, chunk_dir)
@@ -13,7 +13,7 @@ from gym.spaces import Box
 from predicators import utils
 from predicators.llm_interface import OpenAILLM
 from predicators.settings import CFG
-from predicators.structs import Action, DefaultEnvironmentTask, \
+from predicators.structs import Action, ArrayState, DefaultEnvironmentTask, \
     EnvironmentTask, GroundAtom, Object, Observation, Predicate, State, Type, \
     Video
 
@@ -164,7 +164,8 @@ class BaseEnv(abc.ABC):
     def get_train_tasks(self) -> List[EnvironmentTask]:
         """Return the ordered list of tasks for training."""
         if not self._train_tasks:
-            self._train_tasks = self._generate_train_tasks()
+            self._train_tasks = self._maybe_use_array_states(
+                self._generate_train_tasks())
         return self._train_tasks
 
     def get_test_tasks(self) -> List[EnvironmentTask]:
@@ -180,8 +181,31 @@ class BaseEnv(abc.ABC):
             else:
                 assert not CFG.override_json_with_input
                 self._test_tasks = self._generate_test_tasks()
+            self._test_tasks = self._maybe_use_array_states(self._test_tasks)
         return self._test_tasks
 
+    @staticmethod
+    def _maybe_use_array_states(
+            tasks: List[EnvironmentTask]) -> List[EnvironmentTask]:
+        """If CFG.use_array_states, convert the initial observations of the
+        tasks that are plain States (not subclasses) to ArrayStates.
+
+        Environments that copy and modify the given state in simulate()
+        then produce ArrayStates too.
+        """
+        if not CFG.use_array_states:
+            return tasks
+        array_tasks = []
+        for task in tasks:
+            init_obs = task.init_obs
+            # Subclasses of State may hold more than the features.
+            # pylint: disable=unidiomatic-typecheck
+            if type(init_obs) is State:
+                init_obs = ArrayState(init_obs.data, init_obs.simulator_state)
+                task = EnvironmentTask(init_obs, task.goal_description)
+            array_tasks.append(task)
+        return array_tasks
+
     @property
     def _current_state(self) -> State:
         """Default for environments where states are observations."""
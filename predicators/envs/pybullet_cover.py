@@ -136,14 +136,12 @@ class PyBulletCoverEnv(PyBulletEnv, CoverEnv):
 
         # Reset blocks based on the state.
         block_objs = state.get_objects(self._block_type)
-        self._block_id_to_block = {}
-        for i, block_obj in enumerate(block_objs):
-            block_id = self._block_ids[i]
+        self._reset_object_ids_and_visuals(state)
+        for block_id, block_obj in self._block_id_to_block.items():
             width_unnorm = p.getVisualShapeData(
                 block_id, physicsClientId=self._physics_client_id)[0][3][1]
             width = width_unnorm / self._max_obj_width * max_width
             assert width == state.get(block_obj, "width")
-            self._block_id_to_block[block_id] = block_obj
             bx = self.workspace_x
             # De-normalize block y to actual coordinates.
             y_norm = state.get(block_obj, "pose")
@@ -175,15 +173,11 @@ class PyBulletCoverEnv(PyBulletEnv, CoverEnv):
                 physicsClientId=self._physics_client_id)
 
         # Reset targets based on the state.
-        target_objs = state.get_objects(self._target_type)
-        self._target_id_to_target = {}
-        for i, target_obj in enumerate(target_objs):
-            target_id = self._target_ids[i]
+        for target_id, target_obj in self._target_id_to_target.items():
             width_unnorm = p.getVisualShapeData(
                 target_id, physicsClientId=self._physics_client_id)[0][3][1]
             width = width_unnorm / self._max_obj_width * max_width
             assert width == state.get(target_obj, "width")
-            self._target_id_to_target[target_id] = target_obj
             tx = self.workspace_x
             # De-normalize target y to actual coordinates.
             y_norm = state.get(target_obj, "pose")
@@ -212,6 +206,18 @@ class PyBulletCoverEnv(PyBulletEnv, CoverEnv):
                     lineWidth=5.0,
                     physicsClientId=self._physics_client_id)
 
+    def _reset_object_ids_and_visuals(self, state: State) -> None:
+        block_objs = state.get_objects(self._block_type)
+        self._block_id_to_block = {
+            self._block_ids[i]: block_obj
+            for i, block_obj in enumerate(block_objs)
+        }
+        target_objs = state.get_objects(self._target_type)
+        self._target_id_to_target = {
+            self._target_ids[i]: target_obj
+            for i, target_obj in enumerate(target_objs)
+        }
+
     def step(self, action: Action) -> State:
         # In the cover environment, we need to first check the hand region
         # constraint before we can call PyBullet.
@@ -4,7 +4,9 @@ Contains useful common code.
 """
 
 import abc
-from typing import Any, ClassVar, Dict, List, Optional, Sequence, Tuple, cast
+from collections import OrderedDict
+from typing import Any, ClassVar, Dict, Hashable, List, Optional, Sequence, \
+    Tuple, cast
 
 import matplotlib
 import numpy as np
@@ -67,6 +69,16 @@ class PyBulletEnv(BaseEnv):
             self.initialize_pybullet(self.using_gui)
         self._store_pybullet_bodies(pybullet_bodies)
 
+        # Snapshots of the PyBullet world right after resetting to a state,
+        # keyed by the state and ordered from least to most recently used.
+        # Each is a PyBullet state ID and the held object ID.
+        self._snapshots: OrderedDict[Hashable, Tuple[int, Optional[int]]] = \
+            OrderedDict()
+        # How often simulate() had to reset the state from scratch, and how
+        # often it restored a snapshot instead.
+        self.num_state_resets = 0
+        self.num_snapshot_restores = 0
+
     @classmethod
     def initialize_pybullet(
             cls, using_gui: bool
@@ -164,9 +176,67 @@ class PyBulletEnv(BaseEnv):
         if self._current_observation is None or \
             not state.allclose(self._current_state):
             self._current_observation = state
-            self._reset_state(state)
+            # Another optimization: restore a snapshot if we have been in
+            # this state before, since that is much faster than resetting.
+            if not self._restore_snapshot(state):
+                self.num_state_resets += 1
+                self._reset_state(state)
+                self._save_snapshot(state)
         return self.step(action)
 
+    @staticmethod
+    def _get_snapshot_key(state: State) -> Hashable:
+        # The simulator state is ignored by _reset_state().
+        return tuple((obj, state[obj].tobytes()) for obj in sorted(state))
+
+    def _save_snapshot(self, state: State) -> None:
+        """Save a snapshot of the PyBullet world, which should have just been
+        reset to the given state."""
+        if CFG.pybullet_max_snapshots == 0:
+            return
+        state_id = p.saveState(physicsClientId=self._physics_client_id)
+        self._snapshots[self._get_snapshot_key(state)] = (state_id,
+                                                          self._held_obj_id)
+        if len(self._snapshots) > CFG.pybullet_max_snapshots:
+            _, (old_state_id, _) = self._snapshots.popitem(last=False)
+            p.removeState(old_state_id,
+                          physicsClientId=self._physics_client_id)
+
+    def _restore_snapshot(self, state: State) -> bool:
+        """Restore the snapshot for the given state, if there is one.
+
+        Returns whether a snapshot was restored.
+        """
+        if CFG.pybullet_max_snapshots == 0:
+            return False
+        key = self._get_snapshot_key(state)
+        if key not in self._snapshots:
+            return False
+        self._snapshots.move_to_end(key)
+        state_id, held_obj_id = self._snapshots[key]
+        # PyBullet snapshots do not include constraints, so the grasp
+        # constraint is recreated if needed.
+        if self._held_constraint_id is not None:
+            p.removeConstraint(self._held_constraint_id,
+                               physicsClientId=self._physics_client_id)
+            self._held_constraint_id = None
+        p.restoreState(stateId=state_id,
+                       physicsClientId=self._physics_client_id)
+        self._held_obj_id = held_obj_id
+        if held_obj_id is not None:
+            self._create_grasp_constraint()
+        self._reset_object_ids_and_visuals(state)
+        self.num_snapshot_restores += 1
+        return True
+
+    def _reset_object_ids_and_visuals(self, state: State) -> None:
+        """Reset anything that maps PyBullet IDs to objects in the state, and
+        any visual shapes that depend on the state.
+
+        These are not included in PyBullet snapshots. Subclasses should
+        override as needed.
+        """
+
     def render_state_plt(
             self,
             state: State,
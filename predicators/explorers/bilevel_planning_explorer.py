@@ -31,6 +31,7 @@ class BilevelPlanningExplorer(BaseExplorer):
         self._nsrts = nsrts
         self._option_model = option_model
         self._num_calls = 0
+        self._grounding_cache = utils.StaticPruningGroundingCache()
 
     def _solve(self, task: Task, timeout: int) -> ExplorationStrategy:
         # Ensure random over successive calls.
@@ -51,7 +52,8 @@ class BilevelPlanningExplorer(BaseExplorer):
             CFG.sesame_max_skeletons_optimized,
             max_horizon=CFG.horizon,
             allow_noops=CFG.sesame_allow_noops,
-            use_visited_state_set=CFG.sesame_use_visited_state_set)
+            use_visited_state_set=CFG.sesame_use_visited_state_set,
+            grounding_cache=self._grounding_cache)
         policy = utils.option_plan_to_policy(plan)
         termination_function = task.goal_holds
 
@@ -49,6 +49,7 @@ class GreedyLookaheadExplorer(BaseExplorer):
         ground_nsrts: List[_GroundNSRT] = []
         for nsrt in sorted(self._nsrts):
             ground_nsrts.extend(utils.all_ground_nsrts(nsrt, list(init)))
+        successor_generator = utils.SuccessorGenerator(ground_nsrts)
         # Sample trajectories by sampling random sequences of NSRTs.
         best_score = -np.inf
         best_options = []
@@ -60,14 +61,15 @@ class GreedyLookaheadExplorer(BaseExplorer):
             while trajectory_length < CFG.greedy_lookahead_max_traj_length:
                 # Check that sampling for an NSRT is feasible.
                 ground_nsrt = utils.sample_applicable_ground_nsrt(
-                    state, ground_nsrts, self._predicates, self._rng)
+                    state, successor_generator, self._predicates, self._rng)
                 if ground_nsrt is None:  # No applicable NSRTs
                     break
                 for _ in range(CFG.greedy_lookahead_max_num_resamples):
                     # Sample an NSRT that has preconditions satisfied in the
                     # current state.
                     ground_nsrt = utils.sample_applicable_ground_nsrt(
-                        state, ground_nsrts, self._predicates, self._rng)
+                        state, successor_generator, self._predicates,
+                        self._rng)
                     assert ground_nsrt
                     assert all(a.holds for a in ground_nsrt.preconditions)
                     # Sample an option. Note that goal is assumed not used.
@@ -49,6 +49,7 @@ class RandomNSRTsExplorer(BaseExplorer):
         super().__init__(predicates, options, types, action_space, train_tasks,
                          max_steps_before_termination)
         self._nsrts = nsrts
+        self._grounding_cache = utils.StaticPruningGroundingCache()
 
     @classmethod
     def get_name(cls) -> str:
@@ -65,6 +66,11 @@ class RandomNSRTsExplorer(BaseExplorer):
         if CFG.sesame_grounder == "naive":
             for nsrt in self._nsrts:
                 ground_nsrt_set.update(utils.all_ground_nsrts(nsrt, objects))
+        elif CFG.sesame_grounder == "static_pruning":
+            atoms = utils.abstract(task.init, self._predicates)
+            ground_nsrt_set.update(
+                utils.all_ground_nsrts_with_static_pruning(
+                    self._nsrts, objects, atoms, self._grounding_cache))
         elif CFG.sesame_grounder == "fd_translator":  # pragma: no cover
             atoms = utils.abstract(task.init, self._predicates)
             ground_nsrt_set.update(
@@ -75,7 +81,7 @@ class RandomNSRTsExplorer(BaseExplorer):
         else:  # pragma: no cover
             raise ValueError(
                 f"Unrecognized sesame_grounder: {CFG.sesame_grounder}")
-        ground_nsrts = sorted(ground_nsrt_set)
+        successor_generator = utils.SuccessorGenerator(sorted(ground_nsrt_set))
 
         def fallback_policy(state: State) -> Action:
             del state  # unused
@@ -88,7 +94,7 @@ class RandomNSRTsExplorer(BaseExplorer):
             if cur_option is DummyOption or cur_option.terminal(state):
                 # Sample an applicable NSRT.
                 ground_nsrt = utils.sample_applicable_ground_nsrt(
-                    state, ground_nsrts, self._predicates, self._rng)
+                    state, successor_generator, self._predicates, self._rng)
                 if ground_nsrt is None:
                     return fallback_policy(state)
                 assert all(a.holds for a in ground_nsrt.preconditions)
@@ -193,22 +193,37 @@ def get_single_model_prediction(model: Any,
                                 single_input: Dict,
                                 device: Optional[torch.device] = None) -> Dict:
     """Get a prediction from the given model on the given input."""
+    graphs = get_batch_model_predictions(model, [single_input], device=device)
+    assert len(graphs) == 1
+    return graphs[0]
+
+
+def get_batch_model_predictions(
+        model: Any,
+        inputs: List[Dict],
+        device: Optional[torch.device] = None) -> List[Dict]:
+    """Get predictions from the given model on the given inputs.
+
+    The inputs are merged into one super graph, so the model is only run
+    once no matter how many inputs there are.
+    """
     model.train(False)
     model.eval()
-    inputs = _create_super_graph([single_input], device=device)
-    outputs = model(inputs.copy())
+    super_graph = _create_super_graph(inputs, device=device)
+    with torch.no_grad():
+        outputs = model(super_graph.copy())
     graphs = split_graphs(_convert_to_data(outputs[-1]))
-    assert len(graphs) == 1
-    graph = graphs[0]
-    graph['nodes'] = graph['nodes'].numpy()
-    graph['senders'] = graph['senders'].numpy()
-    graph['receivers'] = graph['receivers'].numpy()
-    graph['edges'] = graph['edges'].numpy()
-    if graph['globals'] is not None:
-        graph['globals'] = graph['globals'].numpy()
-    graph['n_node'] = graph['n_node'].item()
-    graph['n_edge'] = graph['n_edge'].item()
-    return graph
+    assert len(graphs) == len(inputs)
+    for graph in graphs:
+        graph['nodes'] = graph['nodes'].numpy()
+        graph['senders'] = graph['senders'].numpy()
+        graph['receivers'] = graph['receivers'].numpy()
+        graph['edges'] = graph['edges'].numpy()
+        if graph['globals'] is not None:
+            graph['globals'] = graph['globals'].numpy()
+        graph['n_node'] = graph['n_node'].item()
+        graph['n_edge'] = graph['n_edge'].item()
+    return graphs
 
 
 def _compute_stacked_offsets(sizes: List[Array],
@@ -354,29 +369,24 @@ class GraphDictDataset(Dataset):
 
 def _create_super_graph(batches: List[Dict],
                         device: Optional[torch.device] = None) -> Dict:
+    num_nodes = np.vstack([np.array(b['n_node'], ndmin=2) for b in batches])
+    num_edges = np.vstack([np.array(b['n_edge'], ndmin=2) for b in batches])
+    # The senders and receivers of each graph are offset by the total number
+    # of nodes in the graphs that come before it.
+    node_offsets = np.cumsum(np.r_[0, num_nodes[:-1, 0]])
     nodes = batches[0]['nodes']
     edges = batches[0]['edges']
-    receivers = batches[0]['receivers'][:, None]
-    senders = batches[0]['senders'][:, None]
-    globals_ = batches[0]['globals']
-    if globals_ is not None and len(globals_.shape) < 2:
-        globals_ = globals_[None, :]
-
-    num_nodes = np.array(batches[0]['n_node'], ndmin=2)
-    num_edges = np.array(batches[0]['n_edge'], ndmin=2)
-
-    for b in batches[1:]:
-        nodes = np.vstack((nodes, b['nodes']))
-        receivers = np.vstack(
-            (receivers, (b['receivers'] + np.sum(num_nodes))[:, None]))
-        senders = np.vstack(
-            (senders, (b['senders'] + np.sum(num_nodes))[:, None]))
-        if globals_ is not None:
-            globals_ = np.vstack((globals_, b['globals']))
-        edges = np.vstack((edges, b['edges']))
-
-        num_nodes = np.vstack((num_nodes, b['n_node']))
-        num_edges = np.vstack((num_edges, b['n_edge']))
+    if len(batches) > 1:
+        nodes = np.vstack([b['nodes'] for b in batches])
+        edges = np.vstack([b['edges'] for b in batches])
+    receivers = np.concatenate([
+        b['receivers'] + offset for b, offset in zip(batches, node_offsets)
+    ]).astype(np.int64)
+    senders = np.concatenate([
+        b['senders'] + offset for b, offset in zip(batches, node_offsets)
+    ]).astype(np.int64)
+    globals_ = (np.vstack([b['globals'] for b in batches])
+                if batches[0]['globals'] is not None else None)
 
     super_graph = {
         'n_node':
@@ -388,9 +398,9 @@ def _create_super_graph(batches: List[Dict],
         'edges':
         torch.from_numpy(edges).float().requires_grad_(),
         'receivers':
-        torch.LongTensor(list(map(int, receivers))),
+        torch.from_numpy(receivers),
         'senders':
-        torch.LongTensor(list(map(int, senders))),
+        torch.from_numpy(senders),
         'globals': (torch.from_numpy(globals_).float().requires_grad_()
                     if globals_ is not None else None),
     }
@@ -190,7 +190,8 @@ class DoorsGroundTruthOptionFactory(GroundTruthOptionFactory):
                                 rng,
                                 num_attempts=CFG.doors_birrt_num_attempts,
                                 num_iters=CFG.doors_birrt_num_iters,
-                                smooth_amt=CFG.doors_birrt_smooth_amt)
+                                smooth_amt=CFG.doors_birrt_smooth_amt,
+                                embed_fn=lambda pt: pt)
 
             # Set up the initial and target inputs for the motion planner.
             robot_x = state.get(robot, "x")
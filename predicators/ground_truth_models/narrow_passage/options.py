@@ -181,7 +181,8 @@ class NarrowPassageGroundTruthOptionFactory(GroundTruthOptionFactory):
                             rng,
                             num_attempts=CFG.narrow_passage_birrt_num_attempts,
                             num_iters=CFG.narrow_passage_birrt_num_iters,
-                            smooth_amt=CFG.narrow_passage_birrt_smooth_amt)
+                            smooth_amt=CFG.narrow_passage_birrt_smooth_amt,
+                            embed_fn=lambda pt: pt)
         # Run planning.
         robot_x = state.get(robot, "x")
         robot_y = state.get(robot, "y")
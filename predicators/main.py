@@ -40,10 +40,11 @@ import sys
 import time
 from collections import defaultdict
 from pathlib import Path
-from typing import List, Optional, Sequence, Set, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 from typing import Type as TypingType
 
 import dill as pkl
+import pathos.multiprocessing as mp
 
 from predicators import utils
 from predicators.approaches import ApproachFailure, ApproachTimeout, \
@@ -55,9 +56,11 @@ from predicators.execution_monitoring import create_execution_monitor
 from predicators.ground_truth_models import get_gt_options, \
     parse_config_included_options
 from predicators.perception import create_perceiver
+from predicators.results_store import ResultsStore
 from predicators.settings import CFG, get_allowed_query_type_names
 from predicators.structs import Action, Dataset, InteractionRequest, \
-    InteractionResult, Metrics, Observation, Response, Task, Video, _Option
+    InteractionResult, Metrics, Observation, ParameterizedOption, Response, \
+    Task, Video, _Option
 from predicators.teacher import Teacher, TeacherInteractionMonitorWithVideo
 
 assert os.environ.get("PYTHONHASHSEED") == "0", \
@@ -98,6 +101,29 @@ def main() -> None:
     # is often created during env __init__().
     env.action_space.seed(CFG.seed)
     assert env.goal_predicates.issubset(env.predicates)
+    cogman, train_tasks, stripped_train_tasks, options = _create_cogman(env)
+    if cogman.is_learning_based:
+        # Create the offline dataset. Note that this needs to be done using
+        # the non-stripped train tasks because dataset generation may need
+        # to use the oracle predicates (e.g. demo data generation).
+        offline_dataset = create_dataset(env, train_tasks, options)
+    else:
+        offline_dataset = None
+    # Run the full pipeline.
+    _run_pipeline(env, cogman, stripped_train_tasks, offline_dataset)
+    script_time = time.perf_counter() - script_start
+    logging.info(f"\n\nMain script terminated in {script_time:.5f} seconds")
+
+
+def _create_cogman(
+    env: BaseEnv
+) -> Tuple[CogMan, List[Task], List[Task], Set[ParameterizedOption]]:
+    """Create the approach and cognitive manager for the environment.
+
+    Returns a tuple of (the cognitive manager, the train tasks, the
+    train tasks with excluded predicates stripped, the options given to
+    the approach).
+    """
     preds, _ = utils.parse_config_excluded_predicates(env)
     # Create the train tasks.
     env_train_tasks = env.get_train_tasks()
@@ -128,20 +154,10 @@ def main() -> None:
         approach_name = f"{CFG.approach_wrapper}[{approach_name}]"
     approach = create_approach(approach_name, preds, options, env.types,
                                env.action_space, stripped_train_tasks)
-    if approach.is_learning_based:
-        # Create the offline dataset. Note that this needs to be done using
-        # the non-stripped train tasks because dataset generation may need
-        # to use the oracle predicates (e.g. demo data generation).
-        offline_dataset = create_dataset(env, train_tasks, options)
-    else:
-        offline_dataset = None
     # Create the cognitive manager.
     execution_monitor = create_execution_monitor(CFG.execution_monitor)
     cogman = CogMan(approach, perceiver, execution_monitor)
-    # Run the full pipeline.
-    _run_pipeline(env, cogman, stripped_train_tasks, offline_dataset)
-    script_time = time.perf_counter() - script_start
-    logging.info(f"\n\nMain script terminated in {script_time:.5f} seconds")
+    return cogman, train_tasks, stripped_train_tasks, options
 
 
 def _run_pipeline(env: BaseEnv,
@@ -219,7 +235,7 @@ def _run_pipeline(env: BaseEnv,
                 cogman.learn_from_interaction_results(interaction_results)
                 learning_time += time.perf_counter() - learning_start
             # Evaluate approach after every online learning cycle.
-            results = _run_testing(env, cogman)
+            results = _run_testing(env, cogman, online_learning_cycle=i)
             results["num_offline_transitions"] = num_offline_transitions
             results["num_online_transitions"] = num_online_transitions
             results["query_cost"] = total_query_cost
@@ -301,142 +317,63 @@ def _generate_interaction_results(
     return results, query_cost
 
 
-def _run_testing(env: BaseEnv, cogman: CogMan) -> Metrics:
-    test_tasks = env.get_test_tasks()
-    num_found_policy = 0
-    num_solved = 0
-    cogman.reset_metrics()
-    total_suc_time = 0.0
-    total_low_level_action_cost = 0.0
-    total_num_solve_timeouts = 0
-    total_num_solve_failures = 0
-    total_num_execution_timeouts = 0
-    total_num_execution_failures = 0
+def _run_testing(env: BaseEnv,
+                 cogman: CogMan,
+                 online_learning_cycle: Optional[int] = None) -> Metrics:
+    """Solve and execute all of the test tasks and aggregate the results.
 
-    save_prefix = utils.get_config_path_str()
+    If CFG.num_test_workers > 1, the test tasks are distributed over a
+    pool of worker processes, each with its own environment and
+    cognitive manager. If the approach is learning-based, each worker
+    loads the results of learning using online_learning_cycle.
+    """
+    num_test_tasks = len(env.get_test_tasks())
+    cogman.reset_metrics()
+    cogman_metrics = cogman.metrics
+    task_results: Iterator[Tuple[Metrics, Metrics, Metrics]]
+    if CFG.num_test_workers > 1:
+        task_results = _run_test_tasks_in_parallel(cogman.is_learning_based,
+                                                   online_learning_cycle,
+                                                   num_test_tasks)
+    else:
+        task_results = (_run_test_task(env, cogman, test_task_idx)
+                        for test_task_idx in range(num_test_tasks))
     metrics: Metrics = defaultdict(float)
-    curr_num_nodes_created = 0.0
-    curr_num_nodes_expanded = 0.0
-    for test_task_idx, env_task in enumerate(test_tasks):
-        solve_start = time.perf_counter()
-        try:
-            # We call reset here, outside of run_episode, so that we can log
-            # planning failures, timeouts, etc. This is mostly for legacy
-            # reasons (before cogman existed separately from approaches).
-            cogman.reset(env_task)
-        except (ApproachTimeout, ApproachFailure) as e:
-            logging.info(f"Task {test_task_idx+1} / {len(test_tasks)}: "
-                         f"Approach failed to solve with error: {e}")
-            if isinstance(e, ApproachTimeout):
-                total_num_solve_timeouts += 1
-            elif isinstance(e, ApproachFailure):
-                total_num_solve_failures += 1
-            if CFG.make_failure_videos and e.info.get("partial_refinements"):
-                video = utils.create_video_from_partial_refinements(
-                    e.info["partial_refinements"], env, "test", test_task_idx,
-                    CFG.horizon)
-                outfile = f"{save_prefix}__task{test_task_idx+1}_failure.mp4"
-                utils.save_video(outfile, video)
-            if CFG.crash_on_failure:
-                raise e
-            continue
-        solve_time = time.perf_counter() - solve_start
-        metrics[f"PER_TASK_task{test_task_idx}_solve_time"] = solve_time
-        metrics[
-            f"PER_TASK_task{test_task_idx}_nodes_created"] = cogman.metrics[
-                "total_num_nodes_created"] - curr_num_nodes_created
-        metrics[
-            f"PER_TASK_task{test_task_idx}_nodes_expanded"] = cogman.metrics[
-                "total_num_nodes_expanded"] - curr_num_nodes_expanded
-        curr_num_nodes_created = cogman.metrics["total_num_nodes_created"]
-        curr_num_nodes_expanded = cogman.metrics["total_num_nodes_expanded"]
-
-        num_found_policy += 1
-        make_video = False
-        solved = False
-        caught_exception = False
-        if CFG.make_test_videos or CFG.make_failure_videos:
-            monitor = utils.VideoMonitor(env.render)
-        else:
-            monitor = None
-        try:
-            # Now, measure success by running the policy in the environment.
-            traj, solved, execution_metrics = _run_episode(
-                cogman,
-                env,
-                "test",
-                test_task_idx,
-                max_num_steps=CFG.horizon,
-                monitor=monitor)
-            num_opt = execution_metrics["num_options_executed"]
-            metrics[f"PER_TASK_task{test_task_idx}_options_executed"] = num_opt
-            exec_time = execution_metrics["policy_call_time"]
-            metrics[f"PER_TASK_task{test_task_idx}_exec_time"] = exec_time
-            if CFG.refinement_data_include_execution_cost:
-                total_low_level_action_cost += (
-                    len(traj[1]) *
-                    CFG.refinement_data_low_level_execution_cost)
-            # Save the successful trajectory, e.g., for playback on a robot.
-            traj_file = f"{save_prefix}__task{test_task_idx+1}.traj"
-            traj_file_path = Path(CFG.eval_trajectories_dir) / traj_file
-            # Include the original task too so we know the goal.
-            traj_data = {
-                "task": env_task,
-                "trajectory": traj,
-                "pybullet_robot": CFG.pybullet_robot
-            }
-            with open(traj_file_path, "wb") as f:
-                pkl.dump(traj_data, f)
-        except utils.EnvironmentFailure as e:
-            log_message = f"Environment failed with error: {e}"
-            caught_exception = True
-        except (ApproachTimeout, ApproachFailure) as e:
-            log_message = ("Approach failed at policy execution time with "
-                           f"error: {e}")
-            if isinstance(e, ApproachTimeout):
-                total_num_execution_timeouts += 1
-            elif isinstance(e, ApproachFailure):
-                total_num_execution_failures += 1
-            caught_exception = True
-        if solved:
-            log_message = "SOLVED"
-            num_solved += 1
-            total_suc_time += (solve_time + exec_time)
-            make_video = CFG.make_test_videos
-            video_file = f"{save_prefix}__task{test_task_idx+1}.mp4"
-        else:
-            if not caught_exception:
-                log_message = "Policy failed to reach goal"
-            if CFG.crash_on_failure:
-                raise RuntimeError(log_message)
-            make_video = CFG.make_failure_videos
-            video_file = f"{save_prefix}__task{test_task_idx+1}_failure.mp4"
-        logging.info(f"Task {test_task_idx+1} / {len(test_tasks)}: "
-                     f"{log_message}")
-        if make_video:
-            assert monitor is not None
-            video = monitor.get_video()
-            utils.save_video(video_file, video)
+    counts: Metrics = defaultdict(float)
+    # The results are merged in the order of the test tasks.
+    for task_metrics, task_counts, task_cogman_metrics in task_results:
+        metrics.update(task_metrics)
+        for key, value in task_counts.items():
+            counts[key] += value
+        for key, value in task_cogman_metrics.items():
+            if key.startswith("min_"):
+                cogman_metrics[key] = min(cogman_metrics[key], value)
+            elif key.startswith("max_"):
+                cogman_metrics[key] = max(cogman_metrics[key], value)
+            else:
+                cogman_metrics[key] += value
+    num_found_policy = counts["num_found_policy"]
+    num_solved = counts["num_solved"]
     metrics["num_solved"] = num_solved
-    metrics["num_total"] = len(test_tasks)
-    metrics["avg_suc_time"] = (total_suc_time /
+    metrics["num_total"] = num_test_tasks
+    metrics["avg_suc_time"] = (counts["total_suc_time"] /
                                num_solved if num_solved > 0 else float("inf"))
-    metrics["avg_ref_cost"] = ((total_low_level_action_cost +
-                                cogman.metrics["total_refinement_time"]) /
+    metrics["avg_ref_cost"] = ((counts["total_low_level_action_cost"] +
+                                cogman_metrics["total_refinement_time"]) /
                                num_solved if num_solved > 0 else float("inf"))
-    metrics["min_num_samples"] = cogman.metrics[
-        "min_num_samples"] if cogman.metrics["min_num_samples"] < float(
+    metrics["min_num_samples"] = cogman_metrics[
+        "min_num_samples"] if cogman_metrics["min_num_samples"] < float(
             "inf") else 0
-    metrics["max_num_samples"] = cogman.metrics["max_num_samples"]
-    metrics["min_skeletons_optimized"] = cogman.metrics[
-        "min_num_skeletons_optimized"] if cogman.metrics[
+    metrics["max_num_samples"] = cogman_metrics["max_num_samples"]
+    metrics["min_skeletons_optimized"] = cogman_metrics[
+        "min_num_skeletons_optimized"] if cogman_metrics[
             "min_num_skeletons_optimized"] < float("inf") else 0
-    metrics["max_skeletons_optimized"] = cogman.metrics[
+    metrics["max_skeletons_optimized"] = cogman_metrics[
         "max_num_skeletons_optimized"]
-    metrics["num_solve_timeouts"] = total_num_solve_timeouts
-    metrics["num_solve_failures"] = total_num_solve_failures
-    metrics["num_execution_timeouts"] = total_num_execution_timeouts
-    metrics["num_execution_failures"] = total_num_execution_failures
+    metrics["num_solve_timeouts"] = counts["num_solve_timeouts"]
+    metrics["num_solve_failures"] = counts["num_solve_failures"]
+    metrics["num_execution_timeouts"] = counts["num_execution_timeouts"]
+    metrics["num_execution_failures"] = counts["num_execution_failures"]
     # Handle computing averages of total cogman metrics wrt the
     # number of found policies. Note: this is different from computing
     # an average wrt the number of solved tasks, which might be more
@@ -446,12 +383,187 @@ def _run_testing(env: BaseEnv, cogman: CogMan) -> Metrics:
             "num_nodes_created", "num_nsrts", "num_preds", "plan_length",
             "num_failures_discovered"
     ]:
-        total = cogman.metrics[f"total_{metric_name}"]
+        total = cogman_metrics[f"total_{metric_name}"]
         metrics[f"avg_{metric_name}"] = (
             total / num_found_policy if num_found_policy > 0 else float("inf"))
     return metrics
 
 
+def _run_test_task(env: BaseEnv, cogman: CogMan,
+                   test_task_idx: int) -> Tuple[Metrics, Metrics, Metrics]:
+    """Solve and execute one test task.
+
+    Returns a tuple of (the PER_TASK metrics, counts to be summed over
+    the test tasks, the changes to the cogman metrics). Videos and
+    trajectories are saved to files named by the test task index.
+    """
+    test_tasks = env.get_test_tasks()
+    env_task = test_tasks[test_task_idx]
+    save_prefix = utils.get_config_path_str()
+    metrics: Metrics = defaultdict(float)
+    counts: Metrics = defaultdict(float)
+    start_cogman_metrics = cogman.metrics
+    solve_start = time.perf_counter()
+    try:
+        # We call reset here, outside of run_episode, so that we can log
+        # planning failures, timeouts, etc. This is mostly for legacy
+        # reasons (before cogman existed separately from approaches).
+        cogman.reset(env_task)
+    except (ApproachTimeout, ApproachFailure) as e:
+        logging.info(f"Task {test_task_idx+1} / {len(test_tasks)}: "
+                     f"Approach failed to solve with error: {e}")
+        if isinstance(e, ApproachTimeout):
+            counts["num_solve_timeouts"] += 1
+        elif isinstance(e, ApproachFailure):
+            counts["num_solve_failures"] += 1
+        if CFG.make_failure_videos and e.info.get("partial_refinements"):
+            video = utils.create_video_from_partial_refinements(
+                e.info["partial_refinements"], env, "test", test_task_idx,
+                CFG.horizon)
+            outfile = f"{save_prefix}__task{test_task_idx+1}_failure.mp4"
+            utils.save_video(outfile, video)
+        if CFG.crash_on_failure:
+            raise e
+        return metrics, counts, _get_cogman_metrics_change(
+            start_cogman_metrics, cogman.metrics)
+    solve_time = time.perf_counter() - solve_start
+    metrics[f"PER_TASK_task{test_task_idx}_solve_time"] = solve_time
+    metrics[f"PER_TASK_task{test_task_idx}_nodes_created"] = cogman.metrics[
+        "total_num_nodes_created"] - start_cogman_metrics[
+            "total_num_nodes_created"]
+    metrics[f"PER_TASK_task{test_task_idx}_nodes_expanded"] = cogman.metrics[
+        "total_num_nodes_expanded"] - start_cogman_metrics[
+            "total_num_nodes_expanded"]
+
+    counts["num_found_policy"] += 1
+    make_video = False
+    solved = False
+    caught_exception = False
+    if CFG.make_test_videos or CFG.make_failure_videos:
+        monitor = utils.VideoMonitor(env.render)
+    else:
+        monitor = None
+    try:
+        # Now, measure success by running the policy in the environment.
+        traj, solved, execution_metrics = _run_episode(
+            cogman,
+            env,
+            "test",
+            test_task_idx,
+            max_num_steps=CFG.horizon,
+            monitor=monitor)
+        num_opt = execution_metrics["num_options_executed"]
+        metrics[f"PER_TASK_task{test_task_idx}_options_executed"] = num_opt
+        exec_time = execution_metrics["policy_call_time"]
+        metrics[f"PER_TASK_task{test_task_idx}_exec_time"] = exec_time
+        if CFG.refinement_data_include_execution_cost:
+            counts["total_low_level_action_cost"] += (
+                len(traj[1]) * CFG.refinement_data_low_level_execution_cost)
+        # Save the successful trajectory, e.g., for playback on a robot.
+        traj_file = f"{save_prefix}__task{test_task_idx+1}.traj"
+        traj_file_path = Path(CFG.eval_trajectories_dir) / traj_file
+        # Include the original task too so we know the goal.
+        traj_data = {
+            "task": env_task,
+            "trajectory": traj,
+            "pybullet_robot": CFG.pybullet_robot
+        }
+        with open(traj_file_path, "wb") as f:
+            pkl.dump(traj_data, f)
+    except utils.EnvironmentFailure as e:
+        log_message = f"Environment failed with error: {e}"
+        caught_exception = True
+    except (ApproachTimeout, ApproachFailure) as e:
+        log_message = ("Approach failed at policy execution time with "
+                       f"error: {e}")
+        if isinstance(e, ApproachTimeout):
+            counts["num_execution_timeouts"] += 1
+        elif isinstance(e, ApproachFailure):
+            counts["num_execution_failures"] += 1
+        caught_exception = True
+    if solved:
+        log_message = "SOLVED"
+        counts["num_solved"] += 1
+        counts["total_suc_time"] += (solve_time + exec_time)
+        make_video = CFG.make_test_videos
+        video_file = f"{save_prefix}__task{test_task_idx+1}.mp4"
+    else:
+        if not caught_exception:
+            log_message = "Policy failed to reach goal"
+        if CFG.crash_on_failure:
+            raise RuntimeError(log_message)
+        make_video = CFG.make_failure_videos
+        video_file = f"{save_prefix}__task{test_task_idx+1}_failure.mp4"
+    logging.info(f"Task {test_task_idx+1} / {len(test_tasks)}: "
+                 f"{log_message}")
+    if make_video:
+        assert monitor is not None
+        video = monitor.get_video()
+        utils.save_video(video_file, video)
+    return metrics, counts, _get_cogman_metrics_change(start_cogman_metrics,
+                                                       cogman.metrics)
+
+
+def _get_cogman_metrics_change(start_metrics: Metrics,
+                               end_metrics: Metrics) -> Metrics:
+    """Get the change in cogman metrics over one test task.
+
+    Totals are differenced. Running minimums and maximums are kept as
+    they are, since they can be merged with min() and max().
+    """
+    change: Metrics = defaultdict(float)
+    for key, value in end_metrics.items():
+        if key.startswith(("min_", "max_")):
+            change[key] = value
+        else:
+            change[key] = value - start_metrics.get(key, 0.0)
+    return change
+
+
+# Set in each worker process by _init_test_worker().
+_TEST_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_test_worker(is_learning_based: bool,
+                      online_learning_cycle: Optional[int]) -> None:
+    """Initialize a worker process for _run_test_tasks_in_parallel().
+
+    Each worker creates its own environment and cognitive manager, and
+    loads the results of learning if the approach is learning-based.
+    """
+    env = create_new_env(CFG.env, do_cache=True, use_gui=False)
+    env.action_space.seed(CFG.seed)
+    cogman, _, _, _ = _create_cogman(env)
+    assert cogman.is_learning_based == is_learning_based
+    if is_learning_based:
+        cogman.load(online_learning_cycle)
+    cogman.reset_metrics()
+    _TEST_WORKER_STATE["env"] = env
+    _TEST_WORKER_STATE["cogman"] = cogman
+
+
+def _run_test_task_in_worker(
+        test_task_idx: int) -> Tuple[Metrics, Metrics, Metrics]:
+    """Run _run_test_task() in a worker process."""
+    return _run_test_task(_TEST_WORKER_STATE["env"],
+                          _TEST_WORKER_STATE["cogman"], test_task_idx)
+
+
+def _run_test_tasks_in_parallel(
+        is_learning_based: bool, online_learning_cycle: Optional[int],
+        num_test_tasks: int) -> Iterator[Tuple[Metrics, Metrics, Metrics]]:
+    """Run _run_test_task() on all the test tasks in a pool of
+    CFG.num_test_workers worker processes.
+
+    Results are yielded in the order of the test tasks.
+    """
+    num_workers = min(CFG.num_test_workers, num_test_tasks)
+    with mp.Pool(processes=num_workers,
+                 initializer=_init_test_worker,
+                 initargs=(is_learning_based, online_learning_cycle)) as pool:
+        yield from pool.imap(_run_test_task_in_worker, range(num_test_tasks))
+
+
 def _run_episode(
     cogman: CogMan,
     env: BaseEnv,
@@ -546,15 +658,23 @@ def _save_test_results(results: Metrics,
     logging.info(f"Average time for successes: {avg_suc_time:.5f} seconds")
     outfile = (f"{CFG.results_dir}/{utils.get_config_path_str()}__"
                f"{online_learning_cycle}.pkl")
+    git_commit_hash = utils.get_git_commit_hash()
     # Save CFG alongside results.
     outdata = {
         "config": CFG,
         "results": results.copy(),
-        "git_commit_hash": utils.get_git_commit_hash()
+        "git_commit_hash": git_commit_hash
     }
     # Dump the CFG, results, and git commit hash to a pickle file.
     with open(outfile, "wb") as f:
         pkl.dump(outdata, f)
+    # Also append them to the results store, if one is used.
+    if CFG.results_store_path is not None:
+        store = ResultsStore(CFG.results_store_path)
+        store.add_run(utils.get_config_path_str(), online_learning_cycle,
+                      CFG.__dict__, results, git_commit_hash)
+        store.close()
+        logging.info(f"Added test results to {CFG.results_store_path}")
     # Before printing the results, filter out keys that start with the
     # special prefix "PER_TASK_", to prevent an annoyingly long printout.
     del_keys = [k for k in results if k.startswith("PER_TASK_")]
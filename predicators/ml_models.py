@@ -5,8 +5,7 @@ Note: to promote modularity, this file should NOT import CFG.
 
 import abc
 import logging
-import os
-import tempfile
+import time
 from collections import deque
 from dataclasses import dataclass
 from typing import Any, Callable, Collection, Deque, Dict, FrozenSet, \
@@ -146,7 +145,9 @@ class PyTorchRegressor(_NormalizingRegressor, nn.Module):
                  n_iter_no_change: int = 10000000,
                  use_torch_gpu: bool = False,
                  train_print_every: int = 1000,
-                 disable_normalization: bool = False) -> None:
+                 disable_normalization: bool = False,
+                 batch_size: Optional[int] = None,
+                 validation_frac: float = 0.0) -> None:
         torch.manual_seed(seed)
         _NormalizingRegressor.__init__(
             self, seed, disable_normalization=disable_normalization)
@@ -159,6 +160,8 @@ class PyTorchRegressor(_NormalizingRegressor, nn.Module):
         self._n_iter_no_change = n_iter_no_change
         self._device = _get_torch_device(use_torch_gpu)
         self._train_print_every = train_print_every
+        self._batch_size = batch_size
+        self._validation_frac = validation_frac
 
     @abc.abstractmethod
     def forward(self, tensor_X: Tensor) -> Tensor:
@@ -189,12 +192,11 @@ class PyTorchRegressor(_NormalizingRegressor, nn.Module):
         loss_fn = self._create_loss_fn()
         # Create the optimizer.
         optimizer = self._create_optimizer()
-        # Convert data to tensors.
-        tensor_X = torch.from_numpy(np.array(X, dtype=np.float32)).to(
-            self._device)
-        tensor_Y = torch.from_numpy(np.array(Y, dtype=np.float32)).to(
-            self._device)
-        batch_generator = _single_batch_generator(tensor_X, tensor_Y)
+        # Optionally hold out data for early stopping.
+        X, Y, validation_data = _hold_out_validation_data(
+            X, Y, self._validation_frac, self._rng, self._device)
+        batch_generator = _create_train_batch_generator(
+            X, Y, self._batch_size, self._device)
         # Run training.
         _train_pytorch_model(self,
                              loss_fn,
@@ -206,7 +208,9 @@ class PyTorchRegressor(_NormalizingRegressor, nn.Module):
                              dataset_size=X.shape[0],
                              clip_gradients=self._clip_gradients,
                              clip_value=self._clip_value,
-                             n_iter_no_change=self._n_iter_no_change)
+                             n_iter_no_change=self._n_iter_no_change,
+                             batch_size=self._batch_size,
+                             validation_data=validation_data)
 
     def _predict(self, x: Array) -> Array:
         tensor_x = torch.from_numpy(np.array(x, dtype=np.float32)).to(
@@ -237,6 +241,17 @@ class DistributionRegressor(abc.ABC):
         """
         raise NotImplementedError("Override me!")
 
+    def predict_samples(self, x: Array, num_samples: int,
+                        rng: np.random.Generator) -> Array:
+        """Return several sampled predictions on the given datapoint.
+
+        x is single-dimensional. The output is two-dimensional, with one
+        row per sample. Subclasses may override this to sample in a
+        single vectorized pass.
+        """
+        return np.array(
+            [self.predict_sample(x, rng) for _ in range(num_samples)])
+
 
 class BinaryClassifier(abc.ABC):
     """ABC for binary classifier classes."""
@@ -269,6 +284,14 @@ class BinaryClassifier(abc.ABC):
         """
         raise NotImplementedError("Override me!")
 
+    def predict_probas(self, X: Array) -> Array:
+        """Get the predicted probabilities that the inputs classify to 1.
+
+        X is two-dimensional. Subclasses may override this to predict
+        in a single vectorized pass.
+        """
+        return np.array([self.predict_proba(x) for x in X])
+
 
 class _ScikitLearnBinaryClassifier(BinaryClassifier):
     """A regressor that lightly wraps a scikit-learn classification model."""
@@ -383,7 +406,9 @@ class PyTorchBinaryClassifier(_NormalizingBinaryClassifier, nn.Module):
                  weight_init: str,
                  weight_decay: float = 0,
                  use_torch_gpu: bool = False,
-                 train_print_every: int = 1000) -> None:
+                 train_print_every: int = 1000,
+                 batch_size: Optional[int] = None,
+                 validation_frac: float = 0.0) -> None:
         torch.manual_seed(seed)
         _NormalizingBinaryClassifier.__init__(self, seed, balance_data)
         nn.Module.__init__(self)  # type: ignore
@@ -395,6 +420,8 @@ class PyTorchBinaryClassifier(_NormalizingBinaryClassifier, nn.Module):
         self._weight_init = weight_init
         self._device = _get_torch_device(use_torch_gpu)
         self._train_print_every = train_print_every
+        self._batch_size = batch_size
+        self._validation_frac = validation_frac
 
     @abc.abstractmethod
     def forward(self, tensor_X: Tensor) -> Tensor:
@@ -411,6 +438,22 @@ class PyTorchBinaryClassifier(_NormalizingBinaryClassifier, nn.Module):
         norm_x = (x - self._input_shift) / self._input_scale
         return self._forward_single_input_np(norm_x)
 
+    def predict_probas(self, X: Array) -> Array:
+        """Get the predicted probabilities that the inputs classify to 1.
+
+        The inputs are NOT normalized. All inputs are passed through the
+        network in one batch.
+        """
+        assert X.shape[1:] == self._x_dims
+        if self._do_single_class_prediction:
+            return np.full(X.shape[0], float(self._predicted_single_class))
+        norm_X = (X - self._input_shift) / self._input_scale
+        tensor_X = torch.from_numpy(np.array(norm_X, dtype=np.float32)).to(
+            self._device)
+        probas = self(tensor_X).detach().cpu().numpy()
+        assert probas.shape == (X.shape[0], )
+        return probas
+
     @abc.abstractmethod
     def _initialize_net(self) -> None:
         """Initialize the network once the data dimensions are known."""
@@ -450,12 +493,11 @@ class PyTorchBinaryClassifier(_NormalizingBinaryClassifier, nn.Module):
         self.to(self._device)
         # Create the loss function.
         loss_fn = self._create_loss_fn()
-        # Convert data to tensors.
-        tensor_X = torch.from_numpy(np.array(X, dtype=np.float32)).to(
-            self._device)
-        tensor_y = torch.from_numpy(np.array(y, dtype=np.float32)).to(
-            self._device)
-        batch_generator = _single_batch_generator(tensor_X, tensor_y)
+        # Optionally hold out data for early stopping.
+        X, y, validation_data = _hold_out_validation_data(
+            X, y, self._validation_frac, self._rng, self._device)
+        batch_generator = _create_train_batch_generator(
+            X, y, self._batch_size, self._device)
         # Run training.
         for _ in range(self._n_reinitialize_tries):
             # (Re-)initialize weights.
@@ -472,7 +514,9 @@ class PyTorchBinaryClassifier(_NormalizingBinaryClassifier, nn.Module):
                 print_every=self._train_print_every,
                 max_train_iters=self._max_train_iters,
                 dataset_size=X.shape[0],
-                n_iter_no_change=self._n_iter_no_change)
+                n_iter_no_change=self._n_iter_no_change,
+                batch_size=self._batch_size,
+                validation_data=validation_data)
             # Weights may not have converged during training.
             if best_loss < 1:
                 break  # success!
@@ -513,7 +557,9 @@ class MLPRegressor(PyTorchRegressor):
                  weight_decay: float = 0,
                  use_torch_gpu: bool = False,
                  train_print_every: int = 1000,
-                 n_iter_no_change: int = 10000000) -> None:
+                 n_iter_no_change: int = 10000000,
+                 batch_size: Optional[int] = None,
+                 validation_frac: float = 0.0) -> None:
         super().__init__(seed,
                          max_train_iters,
                          clip_gradients,
@@ -522,7 +568,9 @@ class MLPRegressor(PyTorchRegressor):
                          weight_decay=weight_decay,
                          n_iter_no_change=n_iter_no_change,
                          use_torch_gpu=use_torch_gpu,
-                         train_print_every=train_print_every)
+                         train_print_every=train_print_every,
+                         batch_size=batch_size,
+                         validation_frac=validation_frac)
         self._hid_sizes = hid_sizes
         # Set in fit().
         self._linears = nn.ModuleList()
@@ -605,15 +653,21 @@ class ImplicitMLPRegressor(PyTorchRegressor):
                  derivative_free_num_iters: Optional[int] = None,
                  derivative_free_sigma_init: Optional[float] = None,
                  derivative_free_shrink_scale: Optional[float] = None,
-                 grid_num_ticks_per_dim: Optional[int] = None) -> None:
+                 grid_num_ticks_per_dim: Optional[int] = None,
+                 n_iter_no_change: int = 10000000,
+                 batch_size: Optional[int] = None,
+                 validation_frac: float = 0.0) -> None:
         super().__init__(seed,
                          max_train_iters,
                          clip_gradients,
                          clip_value,
                          learning_rate,
                          weight_decay=weight_decay,
+                         n_iter_no_change=n_iter_no_change,
                          use_torch_gpu=use_torch_gpu,
-                         train_print_every=train_print_every)
+                         train_print_every=train_print_every,
+                         batch_size=batch_size,
+                         validation_frac=validation_frac)
         self._inference_method = inference_method
         self._derivative_free_num_iters = derivative_free_num_iters
         self._derivative_free_sigma_init = derivative_free_sigma_init
@@ -664,18 +718,15 @@ class ImplicitMLPRegressor(PyTorchRegressor):
 
         return _loss_fn
 
-    def _create_batch_generator(self, X: Array,
-                                Y: Array) -> Iterator[Tuple[Tensor, Tensor]]:
-        num_samples = X.shape[0]
+    def _create_contrastive_batch(self, tensor_X: Tensor,
+                                  tensor_Y: Tensor) -> Tuple[Tensor, Tensor]:
+        """Create network inputs and targets from positive (x, y) pairs by
+        sampling new negative outputs for each input."""
+        num_samples = tensor_X.shape[0]
         num_negatives = self._num_negatives_per_input
-        # Cast to torch first.
-        tensor_X = torch.from_numpy(np.array(X, dtype=np.float32)).to(
-            self._device)
-        tensor_Y = torch.from_numpy(np.array(Y, dtype=np.float32)).to(
-            self._device)
         assert tensor_X.shape == (num_samples, *self._x_dims)
         assert tensor_Y.shape == (num_samples, self._y_dim)
-        # Expand tensor_Y in preparation for concat in the loop below.
+        # Expand tensor_Y in preparation for concat below.
         tensor_Y = tensor_Y[:, None, :]
         assert tensor_Y.shape == (num_samples, 1, self._y_dim)
         # For each of the negative outputs, we need a corresponding input.
@@ -687,27 +738,35 @@ class ImplicitMLPRegressor(PyTorchRegressor):
         extended_X = tiled_X.reshape([-1, tensor_X.shape[-1]])
         assert extended_X.shape == (num_samples * (num_negatives + 1),
                                     *self._x_dims)
-        while True:
+        neg_Y = torch.rand(size=(num_samples, num_negatives, self._y_dim),
+                           dtype=tensor_Y.dtype)
+        # Create a multiclass classification-style target vector.
+        combined_Y = torch.cat([tensor_Y, neg_Y], axis=1)  # type: ignore
+        combined_Y = combined_Y.reshape([-1, tensor_Y.shape[-1]])
+        # Concatenate to create the final input to the network.
+        XY = torch.cat([extended_X, combined_Y], axis=1)  # type: ignore
+        assert XY.shape == (num_samples * (num_negatives + 1),
+                            self._x_dims[0] + self._y_dim)
+        # Create labels for multiclass loss. Note that the true inputs
+        # are first, so the target labels are all zeros (see docstring).
+        idxs = torch.zeros([num_samples], dtype=torch.int64)
+        labels = F.one_hot(idxs, num_classes=(num_negatives + 1)).float()
+        assert labels.shape == (num_samples, num_negatives + 1)
+        # Note that XY is flattened and labels is not. XY is flattened
+        # because we need to feed each entry through the network during
+        # training. Labels is unflattened because we will want to use
+        # F.kl_div in the loss function.
+        return (XY, labels)
+
+    def _create_batch_generator(self, X: Array,
+                                Y: Array) -> Iterator[Tuple[Tensor, Tensor]]:
+        batch_generator = _create_train_batch_generator(
+            X, Y, self._batch_size, self._device)
+        for tensor_X, tensor_Y in batch_generator:
             # Resample negative examples on each iteration.
-            neg_Y = torch.rand(size=(num_samples, num_negatives, self._y_dim),
-                               dtype=tensor_Y.dtype)
-            # Create a multiclass classification-style target vector.
-            combined_Y = torch.cat([tensor_Y, neg_Y], axis=1)  # type: ignore
-            combined_Y = combined_Y.reshape([-1, tensor_Y.shape[-1]])
-            # Concatenate to create the final input to the network.
-            XY = torch.cat([extended_X, combined_Y], axis=1)  # type: ignore
-            assert XY.shape == (num_samples * (num_negatives + 1),
-                                self._x_dims[0] + self._y_dim)
-            # Create labels for multiclass loss. Note that the true inputs
-            # are first, so the target labels are all zeros (see docstring).
-            idxs = torch.zeros([num_samples], dtype=torch.int64)
-            labels = F.one_hot(idxs, num_classes=(num_negatives + 1)).float()
-            assert labels.shape == (num_samples, num_negatives + 1)
-            # Note that XY is flattened and labels is not. XY is flattened
-            # because we need to feed each entry through the network during
-            # training. Labels is unflattened because we will want to use
-            # F.kl_div in the loss function.
-            yield (XY, labels)
+            yield self._create_contrastive_batch(
+                tensor_X.to(self._device, non_blocking=True),
+                tensor_Y.to(self._device, non_blocking=True))
 
     def _fit(self, X: Array, Y: Array) -> None:
         # Note: we need to override _fit() because we are not just training
@@ -720,6 +779,12 @@ class ImplicitMLPRegressor(PyTorchRegressor):
         loss_fn = self._create_loss_fn()
         # Create the optimizer.
         optimizer = self._create_optimizer()
+        # Optionally hold out data for early stopping. The held-out negative
+        # examples are sampled once.
+        X, Y, validation_data = _hold_out_validation_data(
+            X, Y, self._validation_frac, self._rng, self._device)
+        if validation_data is not None:
+            validation_data = self._create_contrastive_batch(*validation_data)
         # Create the batch generator, which creates negative data.
         batch_generator = self._create_batch_generator(X, Y)
         # Run training.
@@ -731,7 +796,10 @@ class ImplicitMLPRegressor(PyTorchRegressor):
                              max_train_iters=self._max_train_iters,
                              dataset_size=X.shape[0],
                              clip_gradients=self._clip_gradients,
-                             clip_value=self._clip_value)
+                             clip_value=self._clip_value,
+                             n_iter_no_change=self._n_iter_no_change,
+                             batch_size=self._batch_size,
+                             validation_data=validation_data)
 
     def _predict(self, x: Array) -> Array:
         assert x.shape == self._x_dims
@@ -914,15 +982,21 @@ class NeuralGaussianRegressor(PyTorchRegressor, DistributionRegressor):
                  learning_rate: float,
                  weight_decay: float = 0,
                  use_torch_gpu: bool = False,
-                 train_print_every: int = 1000) -> None:
+                 train_print_every: int = 1000,
+                 n_iter_no_change: int = 10000000,
+                 batch_size: Optional[int] = None,
+                 validation_frac: float = 0.0) -> None:
         super().__init__(seed,
                          max_train_iters,
                          clip_gradients,
                          clip_value,
                          learning_rate,
                          weight_decay=weight_decay,
+                         n_iter_no_change=n_iter_no_change,
                          use_torch_gpu=use_torch_gpu,
-                         train_print_every=train_print_every)
+                         train_print_every=train_print_every,
+                         batch_size=batch_size,
+                         validation_frac=validation_frac)
         self._hid_sizes = hid_sizes
         # Set in fit().
         self._linears = nn.ModuleList()
@@ -982,6 +1056,19 @@ class NeuralGaussianRegressor(PyTorchRegressor, DistributionRegressor):
             y.append(y_i)
         return np.array(y)
 
+    def predict_samples(self, x: Array, num_samples: int,
+                        rng: np.random.Generator) -> Array:
+        """Return several sampled predictions on the given datapoint.
+
+        x is single-dimensional. The network is only queried once.
+        """
+        assert x.ndim == 1
+        mean, variance = self._predict_mean_var(x)
+        samples = rng.normal(loc=mean,
+                             scale=np.sqrt(variance),
+                             size=(num_samples, len(mean)))
+        return np.array(samples)
+
     def _predict_mean_var(self, x: Array) -> Tuple[Array, Array]:
         # Note: we need to use _predict(), rather than predict(), because
         # we need to apply normalization separately to the mean and variance
@@ -1014,6 +1101,11 @@ class DegenerateMLPDistributionRegressor(MLPRegressor, DistributionRegressor):
         del rng  # unused
         return self.predict(x)
 
+    def predict_samples(self, x: Array, num_samples: int,
+                        rng: np.random.Generator) -> Array:
+        del rng  # unused
+        return np.tile(self.predict(x), (num_samples, 1))
+
 
 class KNeighborsRegressor(_ScikitLearnRegressor):
     """K nearest neighbors from scikit-learn."""
@@ -1119,7 +1211,9 @@ class MLPBinaryClassifier(PyTorchBinaryClassifier):
                  weight_init: str,
                  weight_decay: float = 0,
                  use_torch_gpu: bool = False,
-                 train_print_every: int = 1000) -> None:
+                 train_print_every: int = 1000,
+                 batch_size: Optional[int] = None,
+                 validation_frac: float = 0.0) -> None:
         super().__init__(seed,
                          balance_data,
                          max_train_iters,
@@ -1129,7 +1223,9 @@ class MLPBinaryClassifier(PyTorchBinaryClassifier):
                          weight_init,
                          weight_decay=weight_decay,
                          use_torch_gpu=use_torch_gpu,
-                         train_print_every=train_print_every)
+                         train_print_every=train_print_every,
+                         batch_size=batch_size,
+                         validation_frac=validation_frac)
         self._hid_sizes = hid_sizes
         # Set in fit().
         self._linears = nn.ModuleList()
@@ -1190,6 +1286,183 @@ class BinaryClassifierEnsemble(BinaryClassifier):
         """Return class probabilities predicted by each member."""
         return np.array([m.predict_proba(x) for m in self._members])
 
+    def predict_member_probas_batch(self, X: Array) -> Array:
+        """Return class probabilities predicted by each member for each
+        input, with shape (number of inputs, ensemble size)."""
+        return np.stack([m.predict_probas(X) for m in self._members], axis=1)
+
+
+class MLPBinaryClassifierEnsemble(BinaryClassifierEnsemble, nn.Module):
+    """An ensemble of MLPBinaryClassifiers whose weights are stacked, so that
+    all members are trained together and queried in one batched pass.
+
+    As in a BinaryClassifierEnsemble of MLPBinaryClassifiers, member i
+    balances the data with seed + i and normalizes its own copy of the
+    data. Each layer then applies the weights of all members to their
+    inputs with a single batched matrix multiplication. The training
+    loss is the sum of the member losses, so each member gets the same
+    gradients as it would if it were trained alone.
+    """
+
+    def __init__(self,
+                 seed: int,
+                 ensemble_size: int,
+                 balance_data: bool,
+                 max_train_iters: MaxTrainIters,
+                 learning_rate: float,
+                 n_iter_no_change: int,
+                 hid_sizes: List[int],
+                 n_reinitialize_tries: int,
+                 weight_init: str,
+                 weight_decay: float = 0,
+                 use_torch_gpu: bool = False,
+                 train_print_every: int = 1000,
+                 batch_size: Optional[int] = None,
+                 validation_frac: float = 0.0) -> None:
+        # pylint: disable=super-init-not-called,non-parent-init-called
+        # There are no member classifiers, so skip creating them.
+        torch.manual_seed(seed)
+        BinaryClassifier.__init__(self, seed)
+        nn.Module.__init__(self)  # type: ignore
+        self._ensemble_size = ensemble_size
+        self._member_rngs = [
+            np.random.default_rng(seed + i) for i in range(ensemble_size)
+        ]
+        self._balance_data = balance_data
+        self._max_train_iters = max_train_iters
+        self._learning_rate = learning_rate
+        self._n_iter_no_change = n_iter_no_change
+        self._hid_sizes = hid_sizes
+        self._n_reinitialize_tries = n_reinitialize_tries
+        self._weight_init = weight_init
+        self._weight_decay = weight_decay
+        self._device = _get_torch_device(use_torch_gpu)
+        self._train_print_every = train_print_every
+        self._batch_size = batch_size
+        self._validation_frac = validation_frac
+        # Set in fit().
+        self._x_dims: Tuple[int, ...] = tuple()
+        self._input_shift = np.zeros(1, dtype=np.float32)
+        self._input_scale = np.zeros(1, dtype=np.float32)
+        self._do_single_class_prediction = False
+        self._predicted_single_class = False
+        self._weights = nn.ParameterList()
+        self._biases = nn.ParameterList()
+
+    def forward(self, tensor_X: Tensor) -> Tensor:
+        """Map inputs of shape (N, ensemble size, D) to the probabilities
+        predicted by each member, with shape (N, ensemble size)."""
+        tensor_X = tensor_X.transpose(0, 1)
+        for i, (weight, bias) in enumerate(zip(self._weights, self._biases)):
+            tensor_X = torch.baddbmm(bias, tensor_X, weight)
+            if i < len(self._weights) - 1:
+                tensor_X = F.relu(tensor_X)
+        return torch.sigmoid(tensor_X.squeeze(dim=-1)).transpose(0, 1)
+
+    def fit(self, X: Array, y: Array) -> None:
+        num_data = X.shape[0]
+        self._x_dims = tuple(X.shape[1:])
+        assert len(self._x_dims) == 1, "X should be two-dimensional"
+        assert y.shape == (num_data, )
+        logging.info(f"Training {self.__class__.__name__} on {num_data} "
+                     f"datapoints ({sum(y)} positive)")
+        if np.all(y == 0) or np.all(y == 1):
+            self._do_single_class_prediction = True
+            self._predicted_single_class = bool(y[0])
+            return
+        self._do_single_class_prediction = False
+        # Balance and normalize the data for each member.
+        member_Xs, member_ys, shifts, scales = [], [], [], []
+        for rng in self._member_rngs:
+            member_X, member_y = X, y
+            if self._balance_data and len(y) // 2 > sum(y):
+                member_X, member_y = _balance_binary_classification_data(
+                    X, y, rng)
+            member_X, shift, scale = _normalize_data(member_X)
+            member_Xs.append(member_X)
+            member_ys.append(member_y)
+            shifts.append(shift)
+            scales.append(scale)
+        self._input_shift = np.array(shifts)
+        self._input_scale = np.array(scales)
+        # Stack the data so that the members are the second dimension.
+        stacked_X = np.stack(member_Xs, axis=1)
+        stacked_y = np.stack(member_ys, axis=1)
+        self._initialize_net()
+        self.to(self._device)
+        X_train, y_train, validation_data = _hold_out_validation_data(
+            stacked_X, stacked_y, self._validation_frac, self._rng,
+            self._device)
+        batch_generator = _create_train_batch_generator(
+            X_train, y_train, self._batch_size, self._device)
+        for _ in range(self._n_reinitialize_tries):
+            self._reset_weights()
+            optimizer = optim.Adam(self.parameters(),
+                                   lr=self._learning_rate,
+                                   weight_decay=self._weight_decay)
+            best_loss = _train_pytorch_model(
+                self,
+                self._loss_fn,
+                optimizer,
+                batch_generator,
+                device=self._device,
+                print_every=self._train_print_every,
+                max_train_iters=self._max_train_iters,
+                dataset_size=X_train.shape[0],
+                n_iter_no_change=self._n_iter_no_change,
+                batch_size=self._batch_size,
+                validation_data=validation_data)
+            # Weights may not have converged during training.
+            if best_loss / self._ensemble_size < 1:
+                break  # success!
+        else:
+            raise RuntimeError(f"Failed to converge within "
+                               f"{self._n_reinitialize_tries} tries")
+
+    @staticmethod
+    def _loss_fn(Y_hat: Tensor, Y: Tensor) -> Tensor:
+        # Sum the mean losses of the members.
+        losses = F.binary_cross_entropy(Y_hat, Y, reduction="none")
+        return losses.mean(dim=0).sum()
+
+    def _initialize_net(self) -> None:
+        sizes = [self._x_dims[0]] + self._hid_sizes + [1]
+        self._weights = nn.ParameterList([
+            nn.Parameter(torch.empty(self._ensemble_size, in_size, out_size))
+            for in_size, out_size in zip(sizes[:-1], sizes[1:])
+        ])
+        self._biases = nn.ParameterList([
+            nn.Parameter(torch.empty(self._ensemble_size, 1, out_size))
+            for out_size in sizes[1:]
+        ])
+
+    def _reset_weights(self) -> None:
+        """(Re-)initialize the weights of all members like those of an
+        nn.Linear."""
+        for weight, bias in zip(self._weights, self._biases):
+            bound = 1 / np.sqrt(weight.shape[1])
+            if self._weight_init == "default":
+                nn.init.uniform_(weight, -bound, bound)
+            elif self._weight_init == "normal":
+                nn.init.normal_(weight)
+            else:
+                raise NotImplementedError(
+                    f"{self._weight_init} weight initialization unknown")
+            nn.init.uniform_(bias, -bound, bound)
+
+    def predict_member_probas(self, x: Array) -> Array:
+        return self.predict_member_probas_batch(x[None])[0]
+
+    def predict_member_probas_batch(self, X: Array) -> Array:
+        assert X.shape[1:] == self._x_dims
+        if self._do_single_class_prediction:
+            return np.full((X.shape[0], self._ensemble_size),
+                           float(self._predicted_single_class))
+        norm_X = (X[:, None] - self._input_shift) / self._input_scale
+        tensor_X = torch.from_numpy(np.array(norm_X, dtype=np.float32)).to(
+            self._device)
+        return self(tensor_X).detach().cpu().numpy()
+
 
 ################################## Utilities ##################################
 
@@ -1248,40 +1521,122 @@ def _single_batch_generator(
         yield (tensor_X, tensor_Y)
 
 
-def _train_pytorch_model(model: nn.Module,
-                         loss_fn: Callable[[Tensor, Tensor], Tensor],
-                         optimizer: optim.Optimizer,
-                         batch_generator: Iterator[Tuple[Tensor, Tensor]],
-                         max_train_iters: MaxTrainIters,
-                         dataset_size: int,
-                         device: torch.device,
-                         print_every: int = 1000,
-                         clip_gradients: bool = False,
-                         clip_value: float = 5,
-                         n_iter_no_change: int = 10000000) -> float:
-    """Note that this currently does not use minibatches.
-
-    In the future, with very large datasets, we would want to switch to
-    minibatches. Returns the best loss seen during training.
+def _minibatch_generator(
+        tensor_X: Tensor,
+        tensor_Y: Tensor,
+        batch_size: int,
+        pin_memory: bool = False) -> Iterator[Tuple[Tensor, Tensor]]:
+    """Infinitely generate minibatches of the data, reshuffling the data
+    after every pass through it."""
+    dataloader = DataLoader(TensorDataset(tensor_X, tensor_Y),
+                            batch_size=batch_size,
+                            shuffle=True,
+                            pin_memory=pin_memory)
+    while True:
+        for X_batch, Y_batch in dataloader:
+            yield X_batch, Y_batch
+
+
+def _create_train_batch_generator(
+        X: Array, Y: Array, batch_size: Optional[int],
+        device: torch.device) -> Iterator[Tuple[Tensor, Tensor]]:
+    """Generate all of the data in one batch if batch_size is None, and
+    minibatches of the given size otherwise.
+
+    Minibatches stay on the CPU until they are used. If training on a
+    GPU, they are pinned so that they can be copied asynchronously.
+    """
+    tensor_X = torch.from_numpy(np.array(X, dtype=np.float32))
+    tensor_Y = torch.from_numpy(np.array(Y, dtype=np.float32))
+    if batch_size is None:
+        return _single_batch_generator(tensor_X.to(device),
+                                       tensor_Y.to(device))
+    return _minibatch_generator(tensor_X,
+                                tensor_Y,
+                                batch_size,
+                                pin_memory=device.type == "cuda")
+
+
+def _hold_out_validation_data(
+    X: Array, Y: Array, validation_frac: float, rng: np.random.Generator,
+    device: torch.device
+) -> Tuple[Array, Array, Optional[Tuple[Tensor, Tensor]]]:
+    """Randomly hold out a fraction of the data for early stopping.
+
+    Returns the remaining data and the held-out data as tensors, or None
+    if no data is held out. At least one datapoint is kept for training.
+    """
+    num_held_out = min(int(validation_frac * X.shape[0]), X.shape[0] - 1)
+    if num_held_out <= 0:
+        return X, Y, None
+    idxs = rng.permutation(X.shape[0])
+    held_out_idxs, train_idxs = idxs[:num_held_out], idxs[num_held_out:]
+    tensor_X = torch.from_numpy(np.array(X[held_out_idxs],
+                                         dtype=np.float32)).to(device)
+    tensor_Y = torch.from_numpy(np.array(Y[held_out_idxs],
+                                         dtype=np.float32)).to(device)
+    return X[train_idxs], Y[train_idxs], (tensor_X, tensor_Y)
+
+
+def _train_pytorch_model(
+        model: nn.Module,
+        loss_fn: Callable[[Tensor, Tensor], Tensor],
+        optimizer: optim.Optimizer,
+        batch_generator: Iterator[Tuple[Tensor, Tensor]],
+        max_train_iters: MaxTrainIters,
+        dataset_size: int,
+        device: torch.device,
+        print_every: int = 1000,
+        clip_gradients: bool = False,
+        clip_value: float = 5,
+        n_iter_no_change: int = 10000000,
+        batch_size: Optional[int] = None,
+        validation_data: Optional[Tuple[Tensor, Tensor]] = None) -> float:
+    """Take one optimizer step per batch from batch_generator, then load the
+    weights with the best loss seen.
+
+    By default, the best loss is the loss on the training batch. If
+    validation_data is given, the loss on it is used instead, computed
+    once per pass through the training data (of batch_size datapoints
+    per batch, or all of them if batch_size is None). Returns the best
+    loss seen during training.
     """
     model.train()
     itr = 0
     best_loss = float("inf")
     best_itr = 0
-    model_name = tempfile.NamedTemporaryFile(delete=False).name
+    best_state_dict: Dict[str, Tensor] = {}
     if isinstance(max_train_iters, int):
         max_iters = max_train_iters
     else:  # assume that it's a function from dataset size to max iters
         max_iters = max_train_iters(dataset_size)
     assert isinstance(max_iters, int)
+    if batch_size is None:
+        validate_every = 1
+    else:
+        validate_every = -(-dataset_size // batch_size)
+    eval_loss = float("inf")
+    num_examples = 0
+    start_time = time.perf_counter()
     for tensor_X, tensor_Y in batch_generator:
+        tensor_X = tensor_X.to(device, non_blocking=True)
+        tensor_Y = tensor_Y.to(device, non_blocking=True)
         Y_hat = model(tensor_X)
         loss = loss_fn(Y_hat, tensor_Y)
-        if loss.item() < best_loss:
-            best_loss = loss.item()
+        if validation_data is None:
+            eval_loss = loss.item()
+        elif itr % validate_every == 0:
+            with torch.no_grad():
+                val_X, val_Y = validation_data
+                eval_loss = loss_fn(model(val_X), val_Y).item()
+        if eval_loss < best_loss:
+            best_loss = eval_loss
             best_itr = itr
-            # Save this best model.
-            torch.save(model.state_dict(), model_name)
+            # Save this best model in memory.
+            best_state_dict = {
+                k: v.detach().clone()
+                for k, v in model.state_dict().items()
+            }
         if itr % print_every == 0:
             logging.info(f"Loss: {loss:.5f}, iter: {itr}/{max_iters}")
         optimizer.zero_grad()
@@ -1289,6 +1644,7 @@ def _train_pytorch_model(model: nn.Module,
         if clip_gradients:
             torch.nn.utils.clip_grad_norm_(model.parameters(), clip_value)
         optimizer.step()
+        num_examples += tensor_X.shape[0]
         if itr - best_itr > n_iter_no_change:
             logging.info(f"Loss did not improve after {n_iter_no_change} "
                          f"itrs, terminating at itr {itr}.")
@@ -1296,13 +1652,14 @@ def _train_pytorch_model(model: nn.Module,
         if itr == max_iters:
             break
         itr += 1
+    train_time = time.perf_counter() - start_time
     # Load best model.
-    model.load_state_dict(torch.load(model_name,
-                                     map_location='cpu'))  # type: ignore
-    model.to(device)
-    os.remove(model_name)
+    if best_state_dict:
+        model.load_state_dict(best_state_dict)
     model.eval()
-    logging.info(f"Loaded best model with loss: {best_loss:.5f}")
+    logging.info(f"Loaded best model with loss: {best_loss:.5f} (trained on "
+                 f"{num_examples} examples in {train_time:.2f}s, "
+                 f"{num_examples / max(train_time, 1e-9):.1f} examples/s)")
     return best_loss
 
 
@@ -1453,19 +1810,7 @@ class MapleQFunction(MLPRegressor):
             batch_size: int) -> Iterator[Tuple[Tensor, Tensor]]:
         """Assuming both tensor_X and tensor_Y are 2D with the batch dimension
         first, sample a minibatch of size batch_size to train on."""
-        train_dataset = TensorDataset(tensor_X, tensor_Y)
-        train_dataloader = DataLoader(train_dataset,
-                                      batch_size=batch_size,
-                                      shuffle=True)
-        iterable_loader = iter(train_dataloader)
-        while True:
-            try:
-                X_batch, Y_batch = next(iterable_loader)
-            # pylint:disable=stop-iteration-return
-            except StopIteration:
-                iterable_loader = iter(train_dataloader)
-                X_batch, Y_batch = next(iterable_loader)
-            yield X_batch, Y_batch
+        return _minibatch_generator(tensor_X, tensor_Y, batch_size)
 
     def _fit(self, X: Array, Y: Array) -> None:
         # Initialize the network.
@@ -699,7 +699,9 @@ class _DirectBehaviorCloningOptionLearner(_BehaviorCloningOptionLearner):
                             learning_rate=CFG.learning_rate,
                             weight_decay=CFG.weight_decay,
                             use_torch_gpu=CFG.use_torch_gpu,
-                            train_print_every=CFG.pytorch_train_print_every)
+                            train_print_every=CFG.pytorch_train_print_every,
+                            batch_size=CFG.pytorch_train_batch_size,
+                            validation_frac=CFG.pytorch_train_validation_frac)
 
 
 class _ImplicitBehaviorCloningOptionLearner(_BehaviorCloningOptionLearner):
@@ -723,6 +725,8 @@ class _ImplicitBehaviorCloningOptionLearner(_BehaviorCloningOptionLearner):
             weight_decay=CFG.weight_decay,
             use_torch_gpu=CFG.use_torch_gpu,
             train_print_every=CFG.pytorch_train_print_every,
+            batch_size=CFG.pytorch_train_batch_size,
+            validation_frac=CFG.pytorch_train_validation_frac,
             num_negative_data_per_input=num_neg,
             num_samples_per_inference=num_sam,
             temperature=CFG.implicit_mlp_regressor_temperature,
@@ -166,6 +166,8 @@ def _learn_neural_sampler(datastores: List[Datastore], nsrt_name: str,
         weight_decay=CFG.weight_decay,
         use_torch_gpu=CFG.use_torch_gpu,
         train_print_every=CFG.pytorch_train_print_every,
+        batch_size=CFG.pytorch_train_batch_size,
+        validation_frac=CFG.pytorch_train_validation_frac,
         n_iter_no_change=CFG.mlp_classifier_n_iter_no_change,
         hid_sizes=CFG.mlp_classifier_hid_sizes,
         n_reinitialize_tries=CFG.sampler_mlp_classifier_n_reinitialize_tries,
@@ -206,7 +208,9 @@ def _learn_neural_sampler(datastores: List[Datastore], nsrt_name: str,
             learning_rate=CFG.learning_rate,
             weight_decay=CFG.weight_decay,
             use_torch_gpu=CFG.use_torch_gpu,
-            train_print_every=CFG.pytorch_train_print_every)
+            train_print_every=CFG.pytorch_train_print_every,
+            batch_size=CFG.pytorch_train_batch_size,
+            validation_frac=CFG.pytorch_train_validation_frac)
     else:
         assert CFG.sampler_learning_regressor_model == "degenerate_mlp"
         regressor = DegenerateMLPDistributionRegressor(
@@ -218,13 +222,16 @@ def _learn_neural_sampler(datastores: List[Datastore], nsrt_name: str,
             learning_rate=CFG.learning_rate,
             weight_decay=CFG.weight_decay,
             use_torch_gpu=CFG.use_torch_gpu,
-            train_print_every=CFG.pytorch_train_print_every)
+            train_print_every=CFG.pytorch_train_print_every,
+            batch_size=CFG.pytorch_train_batch_size,
+            validation_frac=CFG.pytorch_train_validation_frac)
 
     regressor.fit(X_arr_regressor, Y_arr_regressor)
 
     # Construct and return sampler
-    return _LearnedSampler(classifier, regressor, variables,
-                           param_option).sampler
+    # The sampler object itself is returned, rather than its sampler method,
+    # so that planning can find its sample_batch method.
+    return _LearnedSampler(classifier, regressor, variables, param_option)
 
 
 def _create_sampler_data(
@@ -319,12 +326,59 @@ class _LearnedSampler:
     _variables: Sequence[Variable]
     _param_option: ParameterizedOption
 
+    def __call__(self, state: State, goal: Set[GroundAtom],
+                 rng: np.random.Generator, objects: Sequence[Object]) -> Array:
+        return self.sampler(state, goal, rng, objects)
+
     def sampler(self, state: State, goal: Set[GroundAtom],
                 rng: np.random.Generator, objects: Sequence[Object]) -> Array:
         """The sampler corresponding to the given models.
 
         May be used as the _sampler field in an NSRT.
         """
+        x = self._featurize(state, goal, objects)
+        num_rejections = 0
+        if CFG.sampler_disable_classifier:
+            params = np.array(self._regressor.predict_sample(x, rng),
+                              dtype=self._param_option.params_space.dtype)
+            return params
+        while num_rejections <= CFG.max_rejection_sampling_tries:
+            params = np.array(self._regressor.predict_sample(x, rng),
+                              dtype=self._param_option.params_space.dtype)
+            if self._param_option.params_space.contains(params) and \
+               self._classifier.classify(np.r_[x, params]):
+                break
+            num_rejections += 1
+        return params
+
+    def sample_batch(self, state: State, goal: Set[GroundAtom],
+                     rng: np.random.Generator, objects: Sequence[Object],
+                     num_samples: int) -> Array:
+        """Sample several candidate parameters at once.
+
+        The candidates are drawn from the regressor in one pass and
+        scored by the classifier in one pass. They are returned ordered
+        from most to least promising, with candidates outside of the
+        params space last.
+        """
+        x = self._featurize(state, goal, objects)
+        params_space = self._param_option.params_space
+        samples = self._regressor.predict_samples(x, num_samples, rng)
+        params_batch = np.array(samples, dtype=params_space.dtype)
+        if CFG.sampler_disable_classifier:
+            return params_batch
+        scores = self._classifier.predict_probas(
+            np.c_[np.tile(x, (num_samples, 1)), params_batch])
+        in_space = np.all((params_batch >= params_space.low)
+                          & (params_batch <= params_space.high),
+                          axis=1)
+        scores = np.where(in_space, scores, -1.0)
+        # Use a stable sort so that ties keep their sampled order.
+        order = np.argsort(-scores, kind="stable")
+        return params_batch[order]
+
+    def _featurize(self, state: State, goal: Set[GroundAtom],
+                   objects: Sequence[Object]) -> Array:
         x_lst: List[Any] = [1.0]  # start with bias term
         sub = dict(zip(self._variables, objects))
         for var in self._variables:
@@ -339,20 +393,7 @@ class _LearnedSampler:
             assert len(goal_atom.objects) == 1
             goal_obj = goal_atom.objects[0]
             x_lst.extend(state[goal_obj])  # add goal state
-        x = np.array(x_lst)
-        num_rejections = 0
-        if CFG.sampler_disable_classifier:
-            params = np.array(self._regressor.predict_sample(x, rng),
-                              dtype=self._param_option.params_space.dtype)
-            return params
-        while num_rejections <= CFG.max_rejection_sampling_tries:
-            params = np.array(self._regressor.predict_sample(x, rng),
-                              dtype=self._param_option.params_space.dtype)
-            if self._param_option.params_space.contains(params) and \
-               self._classifier.classify(np.r_[x, params]):
-                break
-            num_rejections += 1
-        return params
+        return np.array(x_lst)
 
 
 @dataclass(frozen=True, eq=False, repr=False)
@@ -24,7 +24,7 @@ def segment_trajectory(
                                              lambda _: True)
     # All segmenters below need atom_seq. Create it if it wasn't passed in.
     if atom_seq is None:
-        atom_seq = [utils.abstract(s, predicates) for s in ll_traj.states]
+        atom_seq = utils.abstract_states(ll_traj.states, predicates)
     if CFG.segmenter == "atom_changes":
         return _segment_with_atom_changes(ll_traj, predicates, atom_seq)
     if CFG.segmenter == "oracle":
@@ -84,9 +84,7 @@ def _segment_with_contact_changes(
     env = get_or_create_env(CFG.env)
     keep_preds = {p for p in env.predicates if p.name in keep_pred_names}
     assert len(keep_preds) == len(keep_pred_names)
-    all_keep_atoms = []
-    for state in ll_traj.states:
-        all_keep_atoms.append(utils.abstract(state, keep_preds))
+    all_keep_atoms = utils.abstract_states(ll_traj.states, keep_preds)
 
     def _switch_fn(t: int) -> bool:
         return all_keep_atoms[t] != all_keep_atoms[t + 1]
@@ -7,7 +7,9 @@ option in the environment.
 from __future__ import annotations
 
 import abc
-from typing import Callable, Set, Tuple
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Set, Tuple
 
 import numpy as np
 
@@ -20,7 +22,13 @@ from predicators.structs import Action, DefaultState, ParameterizedOption, \
 
 
 def create_option_model(name: str) -> _OptionModelBase:
-    """Create an option model given its name."""
+    """Create an option model given its name.
+
+    Prefixing the name with "cached_", e.g. "cached_oracle", wraps the
+    option model in a cache of its predictions.
+    """
+    if name.startswith("cached_"):
+        return _CachingOptionModel(create_option_model(name[len("cached_"):]))
     if name == "oracle":
         env = create_new_env(CFG.env,
                              do_cache=False,
@@ -51,6 +59,11 @@ class _OptionModelBase(abc.ABC):
         """
         raise NotImplementedError("Override me!")
 
+    def get_metrics(self) -> Dict[str, float]:
+        """Return metrics accumulated over the lifetime of this option
+        model."""
+        return {}
+
 
 class _OracleOptionModel(_OptionModelBase):
     """An oracle option model that uses the ground truth simulator.
@@ -129,3 +142,69 @@ class _OracleOptionModel(_OptionModelBase):
         # since we are not actually rolling out the option in the full
         # simulator, but that's okay; it leads to optimistic planning.
         return traj.states[-1], len(traj.actions)
+
+
+class _CachingOptionModel(_OptionModelBase):
+    """An option model that wraps another one and caches its predictions.
+
+    Predictions are keyed on a hash of the state's features, quantized
+    to CFG.option_model_cache_quantization, together with the option's
+    parameterized option name, objects, and parameters. The least
+    recently used predictions are evicted once the approximate size of
+    the cached next states exceeds CFG.option_model_cache_max_bytes.
+    States with a simulator state are never cached, since the simulator
+    state cannot be compared in general.
+    """
+
+    def __init__(self, option_model: _OptionModelBase) -> None:
+        super().__init__()
+        self._option_model = option_model
+        self._cache: OrderedDict[bytes, Tuple[State, int, int]] = \
+            OrderedDict()
+        self._cache_nbytes = 0
+        self._num_hits = 0
+        self._num_misses = 0
+
+    def get_next_state_and_num_actions(self, state: State,
+                                       option: _Option) -> Tuple[State, int]:
+        if state.simulator_state is not None:
+            return self._option_model.get_next_state_and_num_actions(
+                state, option)
+        key = self._get_key(state, option)
+        if key in self._cache:
+            self._num_hits += 1
+            self._cache.move_to_end(key)
+            next_state, num_actions, _ = self._cache[key]
+            # Return a copy in case the caller modifies the state.
+            return next_state.copy(), num_actions
+        self._num_misses += 1
+        next_state, num_actions = \
+            self._option_model.get_next_state_and_num_actions(state, option)
+        nbytes = len(key) + sum(
+            np.asarray(next_state[o]).nbytes for o in next_state.data)
+        self._cache[key] = (next_state.copy(), num_actions, nbytes)
+        self._cache_nbytes += nbytes
+        while self._cache_nbytes > CFG.option_model_cache_max_bytes:
+            _, (_, _, evicted_nbytes) = self._cache.popitem(last=False)
+            self._cache_nbytes -= evicted_nbytes
+        return next_state, num_actions
+
+    def get_metrics(self) -> Dict[str, float]:
+        metrics = dict(self._option_model.get_metrics())
+        metrics["num_option_model_cache_hits"] = float(self._num_hits)
+        metrics["num_option_model_cache_misses"] = float(self._num_misses)
+        return metrics
+
+    @staticmethod
+    def _get_key(state: State, option: _Option) -> bytes:
+        quantization = CFG.option_model_cache_quantization
+        hasher = hashlib.sha1()
+        hasher.update(option.parent.name.encode())
+        hasher.update(str(option.objects).encode())
+        hasher.update(np.asarray(option.params, dtype=np.float64).tobytes())
+        for obj, feats in state.data.items():
+            hasher.update(str(obj).encode())
+            quantized = np.round(
+                np.asarray(feats, dtype=np.float64) / quantization)
+            hasher.update(quantized.astype(np.int64).tobytes())
+        return hasher.digest()
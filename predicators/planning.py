@@ -5,6 +5,7 @@ Mainly, "SeSamE": SEarch-and-SAMple planning, then Execution.
 
 from __future__ import annotations
 
+import abc
 import heapq as hq
 import logging
 import os
@@ -15,17 +16,20 @@ import tempfile
 import time
 from collections import defaultdict
 from dataclasses import dataclass
-from itertools import islice
-from typing import Any, Collection, Dict, FrozenSet, Iterator, List, \
-    Optional, Sequence, Set, Tuple
+from itertools import chain, islice
+from typing import Any, Callable, Collection, Dict, FrozenSet, Generator, \
+    Generic, Hashable, Iterator, List, Optional, Sequence, Set, Tuple
+from typing import Type as TypingType
+from typing import TypeVar
 
 import numpy as np
+from pathos.helpers import mp
 
 from predicators import utils
 from predicators.option_model import _OptionModelBase
 from predicators.refinement_estimators import BaseRefinementEstimator
 from predicators.settings import CFG
-from predicators.structs import NSRT, AbstractPolicy, DefaultState, \
+from predicators.structs import NSRT, AbstractPolicy, Array, DefaultState, \
     DummyOption, GroundAtom, Metrics, Object, OptionSpec, \
     ParameterizedOption, Predicate, State, STRIPSOperator, Task, Type, \
     _GroundNSRT, _GroundSTRIPSOperator, _Option
@@ -33,15 +37,365 @@ from predicators.utils import EnvironmentFailure, _TaskPlanningHeuristic
 
 _NOT_CAUSES_FAILURE = "NotCausesFailure"
 
+_S = TypeVar("_S")  # an encoding of the atoms in the search over skeletons
+
 
 @dataclass(repr=False, eq=False)
-class _Node:
-    """A node for the search over skeletons."""
-    atoms: Set[GroundAtom]
-    skeleton: List[_GroundNSRT]
-    atoms_sequence: List[Set[GroundAtom]]  # expected state sequence
-    parent: Optional[_Node]
+class _Node(Generic[_S]):
+    """A node for the search over skeletons.
+
+    The skeleton and atoms sequence are not stored, but are instead
+    recovered by following the parent pointers.
+    """
+    atoms: _S  # encoded by a _StateEncoding
+    ground_nsrt: Optional[_GroundNSRT]  # the NSRT that led to this node
+    parent: Optional[_Node[_S]]
     cumulative_cost: float
+    node_id: int
+
+
+class _StateEncoding(abc.ABC, Generic[_S]):
+    """Represents the sets of atoms of a single task in the search over
+    skeletons, e.g., as integer bitsets."""
+
+    def __init__(self, goal: Set[GroundAtom],
+                 heuristic: _TaskPlanningHeuristic) -> None:
+        self._goal = goal
+        self._heuristic = heuristic
+
+    @abc.abstractmethod
+    def encode(self, atoms: Set[GroundAtom]) -> _S:
+        """Convert a set of atoms into a state."""
+        raise NotImplementedError("Override me!")
+
+    @abc.abstractmethod
+    def decode(self, state: _S) -> Set[GroundAtom]:
+        """Convert a state into a set of atoms."""
+        raise NotImplementedError("Override me!")
+
+    @abc.abstractmethod
+    def is_goal(self, state: _S) -> bool:
+        """Check whether the goal holds in the state."""
+        raise NotImplementedError("Override me!")
+
+    @abc.abstractmethod
+    def get_applicable(self, state: _S) -> Iterator[Tuple[_GroundNSRT, _S]]:
+        """Iterate over the ground NSRTs given at construction whose
+        preconditions hold, along with the successor states that they lead
+        to.
+
+        The order matches utils.get_applicable_operators().
+        """
+        raise NotImplementedError("Override me!")
+
+    @abc.abstractmethod
+    def apply(self, ground_nsrt: _GroundNSRT, state: _S) -> Optional[_S]:
+        """Apply a (possibly unindexed) ground NSRT to the state.
+
+        Returns None if the ground NSRT is not applicable.
+        """
+        raise NotImplementedError("Override me!")
+
+    @abc.abstractmethod
+    def get_key(self, state: _S) -> Hashable:
+        """Get a hashable key that identifies the state."""
+        raise NotImplementedError("Override me!")
+
+    def get_heuristic_value(self, state: _S) -> float:
+        """Evaluate the task planning heuristic in the state."""
+        return self._heuristic(self.decode(state))
+
+
+class _AtomSetEncoding(_StateEncoding[Set[GroundAtom]]):
+    """Represents sets of atoms as themselves."""
+
+    def __init__(self, ground_nsrts: Sequence[_GroundNSRT],
+                 goal: Set[GroundAtom],
+                 heuristic: _TaskPlanningHeuristic) -> None:
+        super().__init__(goal, heuristic)
+        self._successor_generator = utils.SuccessorGenerator(ground_nsrts)
+
+    def encode(self, atoms: Set[GroundAtom]) -> Set[GroundAtom]:
+        return atoms
+
+    def decode(self, state: Set[GroundAtom]) -> Set[GroundAtom]:
+        return state
+
+    def is_goal(self, state: Set[GroundAtom]) -> bool:
+        return self._goal.issubset(state)
+
+    def get_applicable(
+        self, state: Set[GroundAtom]
+    ) -> Iterator[Tuple[_GroundNSRT, Set[GroundAtom]]]:
+        for ground_nsrt in utils.get_applicable_operators(
+                self._successor_generator, state):
+            yield ground_nsrt, utils.apply_operator(ground_nsrt, set(state))
+
+    def apply(self, ground_nsrt: _GroundNSRT,
+              state: Set[GroundAtom]) -> Optional[Set[GroundAtom]]:
+        if not ground_nsrt.preconditions.issubset(state):
+            return None
+        return utils.apply_operator(ground_nsrt, set(state))
+
+    def get_key(self, state: Set[GroundAtom]) -> Hashable:
+        return frozenset(state)
+
+
+class _BitsetEncoding(_StateEncoding[int]):
+    """Indexes the ground atoms of a single task so that sets of atoms can be
+    represented as integer bitsets, and precompiles ground NSRTs into
+    precondition, add, delete, and ignore masks.
+
+    Applicability checks and successor generation then reduce to bitwise
+    operations. Atoms that were not indexed at construction time (e.g.,
+    atoms introduced by a ground NSRT proposed by an abstract policy)
+    are indexed on demand. Heuristic values are cached by bitset, so
+    states are only decoded the first time that they are evaluated.
+    """
+
+    def __init__(self, ground_nsrts: Sequence[_GroundNSRT],
+                 init_atoms: Collection[GroundAtom], goal: Set[GroundAtom],
+                 heuristic: _TaskPlanningHeuristic) -> None:
+        super().__init__(goal, heuristic)
+        self._atoms: List[GroundAtom] = []
+        self._atom_to_bit: Dict[GroundAtom, int] = {}
+        self._predicate_to_mask: Dict[Predicate, int] = defaultdict(int)
+        # Maps each ground NSRT to (preconditions mask, add mask, mask of
+        # atoms that survive the application, i.e., the complement of the
+        # delete and ignore masks).
+        self._compiled: Dict[_GroundNSRT, Tuple[int, int, int]] = {}
+        for atom in sorted(init_atoms) + sorted(goal):
+            self._get_bit(atom)
+        for ground_nsrt in ground_nsrts:
+            for atom in sorted(ground_nsrt.preconditions
+                               | ground_nsrt.add_effects
+                               | ground_nsrt.delete_effects):
+                self._get_bit(atom)
+        self._goal_mask = self.encode(goal)
+        self._ground_nsrts = list(ground_nsrts)
+        self._successor_generator = utils.SuccessorGenerator(
+            self._ground_nsrts, atom_to_bit=self._get_bit)
+        self._compiled_ground_nsrts: List[Tuple[int, int, int]] = []
+        self._compiled_num_atoms = -1
+        self._heuristic_cache: Dict[int, float] = {}
+
+    def _get_bit(self, atom: GroundAtom) -> int:
+        if atom not in self._atom_to_bit:
+            bit = 1 << len(self._atoms)
+            self._atom_to_bit[atom] = bit
+            self._atoms.append(atom)
+            self._predicate_to_mask[atom.predicate] |= bit
+            # Previously compiled ignore masks may be stale now.
+            self._compiled.clear()
+        return self._atom_to_bit[atom]
+
+    def encode(self, atoms: Collection[GroundAtom]) -> int:
+        bitset = 0
+        for atom in atoms:
+            bitset |= self._get_bit(atom)
+        return bitset
+
+    def decode(self, state: int) -> Set[GroundAtom]:
+        atoms = set()
+        while state:
+            low_bit = state & -state
+            atoms.add(self._atoms[low_bit.bit_length() - 1])
+            state ^= low_bit
+        return atoms
+
+    def compile(self, ground_nsrt: _GroundNSRT) -> Tuple[int, int, int]:
+        """Get the (preconditions, add, keep) masks for the ground NSRT."""
+        if ground_nsrt not in self._compiled:
+            pre_mask = self.encode(ground_nsrt.preconditions)
+            add_mask = self.encode(ground_nsrt.add_effects)
+            delete_mask = self.encode(ground_nsrt.delete_effects)
+            ignore_mask = 0
+            for pred in ground_nsrt.ignore_effects:
+                ignore_mask |= self._predicate_to_mask[pred]
+            # Note that, as in utils.apply_operator(), ignore effects are
+            # removed before the add effects are applied.
+            keep_mask = ~(delete_mask | ignore_mask)
+            self._compiled[ground_nsrt] = (pre_mask, add_mask, keep_mask)
+        return self._compiled[ground_nsrt]
+
+    def is_goal(self, state: int) -> bool:
+        return state & self._goal_mask == self._goal_mask
+
+    def get_applicable(self, state: int) -> Iterator[Tuple[_GroundNSRT, int]]:
+        if self._compiled_num_atoms != len(self._atoms):
+            # The atom index changed, so (re)compile all masks.
+            self._compiled_ground_nsrts = [
+                self.compile(ground_nsrt) for ground_nsrt in self._ground_nsrts
+            ]
+            self._compiled_num_atoms = len(self._atoms)
+        for idx in self._successor_generator.\
+                get_applicable_operator_idxs_for_bitset(state):
+            _, add_mask, keep_mask = self._compiled_ground_nsrts[idx]
+            yield self._ground_nsrts[idx], (state & keep_mask) | add_mask
+
+    def apply(self, ground_nsrt: _GroundNSRT, state: int) -> Optional[int]:
+        pre_mask, add_mask, keep_mask = self.compile(ground_nsrt)
+        if state & pre_mask != pre_mask:
+            return None
+        return (state & keep_mask) | add_mask
+
+    def get_key(self, state: int) -> Hashable:
+        return state
+
+    def get_heuristic_value(self, state: int) -> float:
+        if state not in self._heuristic_cache:
+            self._heuristic_cache[state] = self._heuristic(self.decode(state))
+        return self._heuristic_cache[state]
+
+
+class ReplanningCache:
+    """Reuses work between calls to the planner for the same task.
+
+    When replanning, e.g., because an execution monitor noticed that
+    the expected atoms do not hold, the objects, goal, NSRTs, and
+    predicates are unchanged, and only the initial state differs. The
+    ground NSRTs and task planning heuristic are then reused rather than
+    recomputed, and the skeleton of the previous plan is repaired before
+    searching from scratch (see repair_skeleton()).
+
+    Everything is discarded when the planner is called for a different
+    task. See BilevelPlanningApproach for usage.
+    """
+
+    def __init__(self) -> None:
+        self._task_key: Optional[Tuple[FrozenSet[Object],
+                                       FrozenSet[GroundAtom], FrozenSet[NSRT],
+                                       FrozenSet[Predicate]]] = None
+        self._ground_nsrts: Dict[str, List[_GroundNSRT]] = {}
+        self._heuristic_key: Optional[Tuple[str, List[_GroundNSRT],
+                                            FrozenSet[GroundAtom]]] = None
+        self._heuristic: Optional[_TaskPlanningHeuristic] = None
+        self._skeleton: Optional[List[_GroundNSRT]] = None
+
+    def set_task(self, task: Task, nsrts: Set[NSRT],
+                 predicates: Set[Predicate]) -> None:
+        """Called at the start of planning; discards everything if the
+        objects, goal, NSRTs, or predicates changed since the last call."""
+        task_key = (frozenset(task.init), frozenset(task.goal),
+                    frozenset(nsrts), frozenset(predicates))
+        if task_key != self._task_key:
+            self._task_key = task_key
+            self._ground_nsrts = {}
+            self._heuristic_key = None
+            self._heuristic = None
+            self._skeleton = None
+
+    def get_ground_nsrts(
+            self, name: str,
+            ground_fn: Callable[[], List[_GroundNSRT]]) -> List[_GroundNSRT]:
+        """Get the ground NSRTs with the given name, calling ground_fn if they
+        have not been cached yet.
+
+        The grounding must not depend on the initial state.
+        """
+        if name not in self._ground_nsrts:
+            self._ground_nsrts[name] = ground_fn()
+        return self._ground_nsrts[name]
+
+    def get_heuristic(self, heuristic_name: str, init_atoms: Set[GroundAtom],
+                      goal: Set[GroundAtom], ground_nsrts: List[_GroundNSRT],
+                      predicates: Set[Predicate],
+                      objects: Collection[Object]) -> _TaskPlanningHeuristic:
+        """Create a task planning heuristic, or reuse the previous one.
+
+        The heuristics only depend on the initial atoms through the
+        static atoms (those not in the effects of any ground NSRT), so
+        the previous heuristic can be reused if the ground NSRTs and
+        static atoms are unchanged.
+        """
+        effect_atoms: Set[GroundAtom] = set()
+        for ground_nsrt in ground_nsrts:
+            effect_atoms.update(ground_nsrt.add_effects,
+                                ground_nsrt.delete_effects)
+        static_atoms = frozenset(init_atoms - effect_atoms)
+        heuristic_key = (heuristic_name, ground_nsrts, static_atoms)
+        if self._heuristic is None or heuristic_key != self._heuristic_key:
+            self._heuristic = utils.create_task_planning_heuristic(
+                heuristic_name, init_atoms, goal, ground_nsrts, predicates,
+                objects)
+            self._heuristic_key = heuristic_key
+        return self._heuristic
+
+    def set_skeleton(self, skeleton: List[_GroundNSRT]) -> None:
+        """Record the skeleton of the plan that was found for the task."""
+        self._skeleton = list(skeleton)
+
+    def repair_skeleton(
+        self, init_atoms: Set[GroundAtom], goal: Set[GroundAtom],
+        ground_nsrts: List[_GroundNSRT]
+    ) -> Optional[Tuple[List[_GroundNSRT], List[Set[GroundAtom]]]]:
+        """Try to reconnect the initial atoms to a suffix of the previous
+        skeleton that achieves the goal.
+
+        Connections of up to CFG.sesame_repair_max_connection_length
+        ground NSRTs are tried in breadth-first order, and for each,
+        shorter suffixes are tried first. The suffix may only use the
+        given ground NSRTs. Returns the repaired skeleton and its atoms
+        sequence, or None if the previous skeleton cannot be repaired.
+        """
+        if not self._skeleton:
+            return None
+        # The previous skeleton may contain ground NSRTs that were modified
+        # by discovered failures, so map them back to the given ones.
+        key_to_ground_nsrt = {(n.parent, tuple(n.objects)): n
+                              for n in ground_nsrts}
+        previous_skeleton = [
+            key_to_ground_nsrt.get((n.parent, tuple(n.objects)))
+            for n in self._skeleton
+        ]
+        suffixes: List[List[_GroundNSRT]] = [[]]  # shortest first
+        for ground_nsrt in reversed(previous_skeleton):
+            if ground_nsrt is None:
+                break
+            suffixes.append([ground_nsrt] + suffixes[-1])
+
+        def _follow_suffix(
+                atoms: Set[GroundAtom],
+                suffix: List[_GroundNSRT]) -> Optional[List[Set[GroundAtom]]]:
+            atoms_sequence = []
+            for ground_nsrt in suffix:
+                if not ground_nsrt.preconditions.issubset(atoms):
+                    return None
+                atoms = utils.apply_operator(ground_nsrt, atoms)
+                atoms_sequence.append(atoms)
+            if not goal.issubset(atoms):
+                return None
+            return atoms_sequence
+
+        successor_generator = utils.SuccessorGenerator(ground_nsrts)
+        frontier: List[Tuple[List[_GroundNSRT],
+                             List[Set[GroundAtom]]]] = [([], [init_atoms])]
+        visited_atom_sets = {frozenset(init_atoms)}
+        for connection_length in range(
+                CFG.sesame_repair_max_connection_length + 1):
+            for connection, atoms_sequence in frontier:
+                for suffix in suffixes:
+                    suffix_atoms_sequence = _follow_suffix(
+                        atoms_sequence[-1], suffix)
+                    if suffix_atoms_sequence is not None:
+                        return (connection + suffix,
+                                atoms_sequence + suffix_atoms_sequence)
+            if connection_length == CFG.sesame_repair_max_connection_length:
+                break
+            new_frontier = []
+            for connection, atoms_sequence in frontier:
+                for ground_nsrt in utils.get_applicable_operators(
+                        successor_generator, atoms_sequence[-1]):
+                    child_atoms = utils.apply_operator(ground_nsrt,
+                                                       atoms_sequence[-1])
+                    frozen_atoms = frozenset(child_atoms)
+                    if frozen_atoms in visited_atom_sets:
+                        continue
+                    visited_atom_sets.add(frozen_atoms)
+                    new_frontier.append((connection + [ground_nsrt],
+                                         atoms_sequence + [child_atoms]))
+            frontier = new_frontier
+        return None
 
 
 def sesame_plan(
@@ -60,7 +414,9 @@ def sesame_plan(
     refinement_estimator: Optional[BaseRefinementEstimator] = None,
     check_dr_reachable: bool = True,
     allow_noops: bool = False,
-    use_visited_state_set: bool = False
+    use_visited_state_set: bool = False,
+    replanning_cache: Optional[ReplanningCache] = None,
+    grounding_cache: Optional[utils.StaticPruningGroundingCache] = None
 ) -> Tuple[List[_Option], List[_GroundNSRT], Metrics]:
     """Run bilevel planning.
 
@@ -71,37 +427,67 @@ def sesame_plan(
     ("fdopt") or satisficing mode ("fdsat"). With Fast Downward, we can
     only consider at most one skeleton, and DiscoveredFailures cannot be
     handled.
+
+    If a replanning_cache is given, the A* planner reuses the work done
+    for the same task in previous calls (see ReplanningCache). If a
+    grounding_cache is given, the A* planner reuses the ground NSRTs of
+    previous calls with the "static_pruning" grounder.
     """
+    option_model_metrics = option_model.get_metrics()
     if CFG.sesame_task_planner == "astar":
-        return _sesame_plan_with_astar(
-            task, option_model, nsrts, predicates, types, timeout, seed,
-            task_planning_heuristic, max_skeletons_optimized, max_horizon,
-            abstract_policy, max_policy_guided_rollout, refinement_estimator,
-            check_dr_reachable, allow_noops, use_visited_state_set)
-    if CFG.sesame_task_planner == "fdopt":
+        refinement_pool = None
+        if CFG.sesame_num_refinement_workers > 1:
+            refinement_pool = _RefinementPool(
+                task, option_model, nsrts, predicates,
+                CFG.sesame_num_refinement_workers)
+        try:
+            plan, skeleton, metrics = _sesame_plan_with_astar(
+                task, option_model, nsrts, predicates, types, timeout, seed,
+                task_planning_heuristic, max_skeletons_optimized, max_horizon,
+                abstract_policy, max_policy_guided_rollout,
+                refinement_estimator, check_dr_reachable, allow_noops,
+                use_visited_state_set, replanning_cache, grounding_cache,
+                refinement_pool)
+        finally:
+            if refinement_pool is not None:
+                refinement_pool.close()
+    elif CFG.sesame_task_planner == "fdopt":
         assert abstract_policy is None
-        return _sesame_plan_with_fast_downward(task,
-                                               option_model,
-                                               nsrts,
-                                               predicates,
-                                               types,
-                                               timeout,
-                                               seed,
-                                               max_horizon,
-                                               optimal=True)
-    if CFG.sesame_task_planner == "fdsat":
+        plan, skeleton, metrics = _sesame_plan_with_fast_downward(task,
+                                                                  option_model,
+                                                                  nsrts,
+                                                                  predicates,
+                                                                  types,
+                                                                  timeout,
+                                                                  seed,
+                                                                  max_horizon,
+                                                                  optimal=True)
+    elif CFG.sesame_task_planner == "fdsat":
         assert abstract_policy is None
-        return _sesame_plan_with_fast_downward(task,
-                                               option_model,
-                                               nsrts,
-                                               predicates,
-                                               types,
-                                               timeout,
-                                               seed,
-                                               max_horizon,
-                                               optimal=False)
-    raise ValueError("Unrecognized sesame_task_planner: "
-                     f"{CFG.sesame_task_planner}")
+        plan, skeleton, metrics = _sesame_plan_with_fast_downward(
+            task,
+            option_model,
+            nsrts,
+            predicates,
+            types,
+            timeout,
+            seed,
+            max_horizon,
+            optimal=False)
+    else:
+        raise ValueError("Unrecognized sesame_task_planner: "
+                         f"{CFG.sesame_task_planner}")
+    _add_option_model_metrics(option_model, option_model_metrics, metrics)
+    return plan, skeleton, metrics
+
+
+def _add_option_model_metrics(option_model: _OptionModelBase,
+                              start_metrics: Dict[str, float],
+                              metrics: Metrics) -> None:
+    """Add the change in the option model's metrics since start_metrics was
+    recorded (e.g., option model cache hits and misses) to metrics."""
+    for key, value in option_model.get_metrics().items():
+        metrics[key] += value - start_metrics.get(key, 0.0)
 
 
 def _sesame_plan_with_astar(
@@ -120,14 +506,32 @@ def _sesame_plan_with_astar(
     refinement_estimator: Optional[BaseRefinementEstimator] = None,
     check_dr_reachable: bool = True,
     allow_noops: bool = False,
-    use_visited_state_set: bool = False
+    use_visited_state_set: bool = False,
+    replanning_cache: Optional[ReplanningCache] = None,
+    grounding_cache: Optional[utils.StaticPruningGroundingCache] = None,
+    refinement_pool: Optional[_RefinementPool] = None
 ) -> Tuple[List[_Option], List[_GroundNSRT], Metrics]:
-    """The default version of SeSamE, which runs A* to produce skeletons."""
+    """The default version of SeSamE, which runs A* to produce skeletons.
+
+    If a refinement_pool is given, skeletons are refined in parallel in
+    its worker processes.
+    """
     init_atoms = utils.abstract(task.init, predicates)
     objects = list(task.init)
     start_time = time.perf_counter()
-    ground_nsrts = sesame_ground_nsrts(task, init_atoms, nsrts, objects,
-                                       predicates, types, start_time, timeout)
+    if replanning_cache is not None:
+        replanning_cache.set_task(task, nsrts, predicates)
+
+    def _ground() -> List[_GroundNSRT]:
+        return sesame_ground_nsrts(task, init_atoms, nsrts, objects,
+                                   predicates, types, start_time, timeout,
+                                   grounding_cache)
+
+    if replanning_cache is not None and CFG.sesame_grounder == "naive":
+        # Unlike the FD translator, naive grounding ignores the initial state.
+        ground_nsrts = replanning_cache.get_ground_nsrts("sesame", _ground)
+    else:
+        ground_nsrts = _ground()
     # Keep restarting the A* search while we get new discovered failures.
     metrics: Metrics = defaultdict(float)
     # Make a copy of the predicates set to avoid modifying the input set,
@@ -136,16 +540,25 @@ def _sesame_plan_with_astar(
     # Keep track of partial refinements: skeletons and partial plans. This is
     # for making videos of failed planning attempts.
     partial_refinements = []
+    # The reachability is updated incrementally when failures are discovered.
+    reachability = utils.RelaxedReachability(ground_nsrts, init_atoms)
     while True:
         # Optionally exclude NSRTs with empty effects, because they can slow
         # the search significantly, so we may want to exclude them. Note however
         # that we need to do this inside the while True here, because an NSRT
         # that initially has empty effects may later have a _NOT_CAUSES_FAILURE.
         reachable_nsrts = filter_nsrts(task, init_atoms, ground_nsrts,
-                                       check_dr_reachable, allow_noops)
-        heuristic = utils.create_task_planning_heuristic(
-            task_planning_heuristic, init_atoms, task.goal, reachable_nsrts,
-            predicates, objects)
+                                       check_dr_reachable, allow_noops,
+                                       reachability)
+        if replanning_cache is not None:
+            heuristic = replanning_cache.get_heuristic(task_planning_heuristic,
+                                                       init_atoms, task.goal,
+                                                       reachable_nsrts,
+                                                       predicates, objects)
+        else:
+            heuristic = utils.create_task_planning_heuristic(
+                task_planning_heuristic, init_atoms, task.goal,
+                reachable_nsrts, predicates, objects)
         try:
             new_seed = seed + int(metrics["num_failures_discovered"])
             gen = _skeleton_generator(
@@ -153,6 +566,17 @@ def _sesame_plan_with_astar(
                 timeout - (time.perf_counter() - start_time), metrics,
                 max_skeletons_optimized, abstract_policy,
                 max_policy_guided_rollout, use_visited_state_set)
+            # When replanning, try to repair the previous skeleton before
+            # searching from scratch. The repaired skeleton counts towards
+            # max_skeletons_optimized.
+            if replanning_cache is not None and \
+                    not metrics["num_failures_discovered"]:
+                repaired = replanning_cache.repair_skeleton(
+                    init_atoms, task.goal, reachable_nsrts)
+                if repaired is not None:
+                    metrics["num_skeletons_optimized"] += 1
+                    metrics["num_skeletons_repaired"] += 1
+                    gen = chain([repaired], gen)
             # If a refinement cost estimator is provided, generate a number of
             # skeletons first, then predict the refinement cost of each skeleton
             # and attempt to refine them in this order.
@@ -165,50 +589,330 @@ def _sesame_plan_with_astar(
                         proposed_skeletons.append(next(gen))
                     except _MaxSkeletonsFailure:
                         break
-                gen = iter(
-                    sorted(proposed_skeletons,
-                           key=lambda s: estimator.get_cost(task, *s)))
+                costs = estimator.get_costs(task, proposed_skeletons)
+                gen = iter([
+                    proposed_skeletons[i]
+                    for i in sorted(range(len(costs)), key=costs.__getitem__)
+                ])
             refinement_start_time = time.perf_counter()
-            for skeleton, atoms_sequence in gen:
-                if CFG.sesame_use_necessary_atoms:
-                    atoms_seq = utils.compute_necessary_atoms_seq(
-                        skeleton, atoms_sequence, task.goal)
-                else:
-                    atoms_seq = atoms_sequence
-                plan, suc = run_low_level_search(
-                    task, option_model, skeleton, atoms_seq, new_seed,
+            if refinement_pool is not None:
+                refinements = _refine_skeletons_in_parallel(
+                    refinement_pool, gen, new_seed,
                     timeout - (time.perf_counter() - start_time), metrics,
                     max_horizon)
-                if suc:
-                    # Success! It's a complete plan.
-                    logging.info(
-                        f"Planning succeeded! Found plan of length "
-                        f"{len(plan)} after "
-                        f"{int(metrics['num_skeletons_optimized'])} "
-                        f"skeletons with {int(metrics['num_samples'])}"
-                        f" samples, discovering "
-                        f"{int(metrics['num_failures_discovered'])} failures")
-                    metrics["plan_length"] = len(plan)
-                    metrics["refinement_time"] = (time.perf_counter() -
-                                                  refinement_start_time)
-                    return plan, skeleton, metrics
-                partial_refinements.append((skeleton, plan))
-                if time.perf_counter() - start_time > timeout:
-                    raise PlanningTimeout(
-                        "Planning timed out in refinement!",
-                        info={"partial_refinements": partial_refinements})
+            else:
+                refinements = _refine_skeletons(task, option_model, gen,
+                                                new_seed, start_time, timeout,
+                                                metrics, max_horizon)
+            try:
+                for skeleton, plan, suc in refinements:
+                    if suc:
+                        # Success! It's a complete plan.
+                        logging.info(
+                            f"Planning succeeded! Found plan of length "
+                            f"{len(plan)} after "
+                            f"{int(metrics['num_skeletons_optimized'])} "
+                            f"skeletons with {int(metrics['num_samples'])}"
+                            f" samples, discovering "
+                            f"{int(metrics['num_failures_discovered'])} "
+                            f"failures")
+                        metrics["plan_length"] = len(plan)
+                        metrics["refinement_time"] = (time.perf_counter() -
+                                                      refinement_start_time)
+                        if replanning_cache is not None:
+                            replanning_cache.set_skeleton(skeleton)
+                        return plan, skeleton, metrics
+                    partial_refinements.append((skeleton, plan))
+                    if time.perf_counter() - start_time > timeout:
+                        raise PlanningTimeout(
+                            "Planning timed out in refinement!",
+                            info={"partial_refinements": partial_refinements})
+            finally:
+                # Cancel any refinements that are still running now,
+                # rather than when the generator is garbage collected.
+                refinements.close()
         except _DiscoveredFailureException as e:
             metrics["num_failures_discovered"] += 1
             new_predicates, ground_nsrts = _update_nsrts_with_failure(
                 e.discovered_failure, ground_nsrts)
+            reachability.update(ground_nsrts)
             predicates |= new_predicates
             partial_refinements.append(
-                (skeleton, e.info["longest_failed_refinement"]))
+                (e.info["skeleton"], e.info["longest_failed_refinement"]))
         except (_MaxSkeletonsFailure, _SkeletonSearchTimeout) as e:
             e.info["partial_refinements"] = partial_refinements
             raise e
 
 
+def _get_refinement_atoms_seq(
+        task: Task, skeleton: List[_GroundNSRT],
+        atoms_sequence: List[Set[GroundAtom]]) -> List[Set[GroundAtom]]:
+    """Helper for _sesame_plan_with_astar(); get the atoms sequence that a
+    refinement of the skeleton must satisfy."""
+    if CFG.sesame_use_necessary_atoms:
+        return utils.compute_necessary_atoms_seq(skeleton, atoms_sequence,
+                                                 task.goal)
+    return atoms_sequence
+
+
+def _refine_skeletons(
+    task: Task, option_model: _OptionModelBase,
+    skeletons: Iterator[Tuple[List[_GroundNSRT],
+                              List[Set[GroundAtom]]]], seed: int,
+    start_time: float, timeout: float, metrics: Metrics, max_horizon: int
+) -> Generator[Tuple[List[_GroundNSRT], List[_Option], bool], None, None]:
+    """Helper for _sesame_plan_with_astar(); refine the skeletons one at a
+    time, yielding each skeleton along with the output of
+    run_low_level_search().
+
+    If a failure is discovered, the skeleton is added to the info of the
+    _DiscoveredFailureException.
+    """
+    for skeleton, atoms_sequence in skeletons:
+        atoms_seq = _get_refinement_atoms_seq(task, skeleton, atoms_sequence)
+        try:
+            plan, suc = run_low_level_search(
+                task, option_model, skeleton, atoms_seq, seed,
+                timeout - (time.perf_counter() - start_time), metrics,
+                max_horizon)
+        except _DiscoveredFailureException as e:
+            e.info["skeleton"] = skeleton
+            raise e
+        yield skeleton, plan, suc
+
+
+# A refinement result sent back from a worker process: the index of the
+# skeleton, the parameters of the (partial) plan, whether the refinement
+# succeeded, the worker's metrics, and, if a failure was discovered, the
+# index of the failing step and the type, message, and info of the
+# EnvironmentFailure. Options and exceptions are not sent directly because
+# options hold closures and exceptions lose their info when pickled.
+_WorkerRefinement = Tuple[int, List[Array], bool, Dict[str, float],
+                          Optional[Tuple[int, TypingType[EnvironmentFailure],
+                                         str, Dict]]]
+
+# The arguments of _refine_skeleton_in_worker(): the index of the skeleton,
+# the skeleton as (NSRT index, objects) pairs, the seed, the timeout, and the
+# max horizon. See _RefinementPool.get_worker_args().
+_WorkerArgs = Tuple[int, List[Tuple[int, Sequence[Object]]], int, float, int]
+
+# Set in each worker process by _init_refinement_worker().
+_REFINEMENT_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_refinement_worker(task: Task, option_model: _OptionModelBase,
+                            nsrts: List[NSRT],
+                            predicates: Set[Predicate]) -> None:
+    """Initialize a worker process for _refine_skeletons_in_parallel().
+
+    Each worker has its own copy of the option model, and therefore of
+    the environment that the option model simulates.
+    """
+    _REFINEMENT_WORKER_STATE["task"] = task
+    _REFINEMENT_WORKER_STATE["option_model"] = option_model
+    _REFINEMENT_WORKER_STATE["nsrts"] = nsrts
+    _REFINEMENT_WORKER_STATE["init_atoms"] = utils.abstract(
+        task.init, predicates)
+
+
+def _refine_skeleton_in_worker(args: _WorkerArgs) -> _WorkerRefinement:
+    """Run run_low_level_search() on one skeleton in a worker process."""
+    idx, nsrt_refs, seed, timeout, max_horizon = args
+    task = _REFINEMENT_WORKER_STATE["task"]
+    option_model = _REFINEMENT_WORKER_STATE["option_model"]
+    nsrts = _REFINEMENT_WORKER_STATE["nsrts"]
+    skeleton = [nsrts[nsrt_idx].ground(objs) for nsrt_idx, objs in nsrt_refs]
+    atoms_sequence = [_REFINEMENT_WORKER_STATE["init_atoms"]]
+    for ground_nsrt in skeleton:
+        atoms_sequence.append(
+            utils.apply_operator(ground_nsrt, atoms_sequence[-1]))
+    atoms_seq = _get_refinement_atoms_seq(task, skeleton, atoms_sequence)
+    metrics: Metrics = defaultdict(float)
+    # The worker's option model is a copy, so the parent cannot see changes
+    # to its metrics; send them back with the refinement metrics instead.
+    option_model_metrics = option_model.get_metrics()
+    try:
+        plan, suc = run_low_level_search(task, option_model, skeleton,
+                                         atoms_seq, seed, timeout, metrics,
+                                         max_horizon)
+    except _DiscoveredFailureException as e:
+        _add_option_model_metrics(option_model, option_model_metrics, metrics)
+        env_failure = e.discovered_failure.env_failure
+        failure = (e.info["failing_step"], type(env_failure),
+                   str(env_failure.args[0]), env_failure.info)
+        plan = e.info["longest_failed_refinement"]
+        return idx, [o.params for o in plan], False, dict(metrics), failure
+    _add_option_model_metrics(option_model, option_model_metrics, metrics)
+    return idx, [o.params for o in plan], suc, dict(metrics), None
+
+
+def _run_refinement_worker(conn: Any, task: Task,
+                           option_model: _OptionModelBase, nsrts: List[NSRT],
+                           predicates: Set[Predicate]) -> None:
+    """The main loop of a worker process of a _RefinementPool: receive the
+    arguments of _refine_skeleton_in_worker() over conn and send back the
+    results, until None is received."""
+    _init_refinement_worker(task, option_model, nsrts, predicates)
+    while True:
+        args = conn.recv()
+        if args is None:
+            break
+        conn.send(_refine_skeleton_in_worker(args))
+
+
+class _RefinementPool:
+    """The worker processes for _refine_skeletons_in_parallel().
+
+    The workers are started on first use, initialized once with the
+    task, option model, NSRTs, and predicates, and then reused for all
+    skeletons. Each worker has its own pipe, so a worker that is still
+    refining when its refinement is cancelled can be killed without
+    affecting the others; it is replaced on the next call to refine().
+    """
+
+    def __init__(self, task: Task, option_model: _OptionModelBase,
+                 nsrts: Set[NSRT], predicates: Set[Predicate],
+                 num_workers: int) -> None:
+        self._task = task
+        self._option_model = option_model
+        self._nsrts = sorted(nsrts)
+        self._predicates = predicates
+        self._nsrt_to_idx = {nsrt: i for i, nsrt in enumerate(self._nsrts)}
+        self.num_workers = num_workers
+        # Each worker is a process and the parent's end of its pipe.
+        self._workers: List[Tuple[Any, Any]] = []
+        self.num_starts = 0
+
+    def get_worker_args(self, idx: int, skeleton: List[_GroundNSRT], seed: int,
+                        timeout: float, max_horizon: int) -> _WorkerArgs:
+        """Get the arguments of _refine_skeleton_in_worker() for a skeleton.
+
+        The ground NSRTs are sent as references to the NSRTs that the
+        workers were initialized with, and the workers recompute the
+        atoms sequence, because sets of ground atoms cannot be unpickled
+        reliably (their predicates' classifiers may refer back to them).
+        The NotCausesFailure atoms of the skeleton are lost, but those
+        are ignored by run_low_level_search() anyway.
+        """
+        nsrt_refs = [(self._nsrt_to_idx[ground_nsrt.parent],
+                      ground_nsrt.objects) for ground_nsrt in skeleton]
+        return idx, nsrt_refs, seed, timeout, max_horizon
+
+    def refine(
+        self, worker_args: List[_WorkerArgs]
+    ) -> Generator[_WorkerRefinement, None, None]:
+        """Run _refine_skeleton_in_worker() on each of the given arguments
+        in a different worker, yielding the results in the order in which
+        they finish.
+
+        The workers that are still refining when the caller stops
+        iterating are killed.
+        """
+        assert len(worker_args) <= self.num_workers
+        while len(self._workers) < self.num_workers:
+            conn, worker_conn = mp.Pipe()
+            process = mp.Process(target=_run_refinement_worker,
+                                 args=(worker_conn, self._task,
+                                       self._option_model, self._nsrts,
+                                       self._predicates),
+                                 daemon=True)
+            process.start()
+            worker_conn.close()
+            self._workers.append((process, conn))
+            self.num_starts += 1
+        busy_workers = {}
+        for (process, conn), args in zip(self._workers, worker_args):
+            conn.send(args)
+            busy_workers[conn] = process
+        try:
+            while busy_workers:
+                results = []
+                for conn in mp.connection.wait(list(busy_workers)):
+                    del busy_workers[conn]
+                    results.append(conn.recv())
+                yield from results
+        finally:
+            for conn, process in busy_workers.items():
+                self._kill_worker(process, conn)
+
+    def close(self) -> None:
+        """Kill all of the workers, cancelling any running refinements."""
+        for process, conn in list(self._workers):
+            self._kill_worker(process, conn)
+
+    def _kill_worker(self, process: Any, conn: Any) -> None:
+        if (process, conn) not in self._workers:
+            return  # already killed
+        process.terminate()
+        process.join()
+        conn.close()
+        self._workers.remove((process, conn))
+
+
+def _refine_skeletons_in_parallel(
+    refinement_pool: _RefinementPool,
+    skeletons: Iterator[Tuple[List[_GroundNSRT], List[Set[GroundAtom]]]],
+    seed: int, timeout: float, metrics: Metrics, max_horizon: int
+) -> Generator[Tuple[List[_GroundNSRT], List[_Option], bool], None, None]:
+    """Helper for _sesame_plan_with_astar(); like _refine_skeletons(), but
+    takes a batch of skeletons at a time, one per worker in the pool, and
+    refines them concurrently.
+
+    Results are yielded in the order in which the refinements finish.
+    The remaining refinements in a batch are cancelled once a refinement
+    succeeds, a failure is discovered, or the caller stops iterating.
+    """
+    start_time = time.perf_counter()
+    num_workers = refinement_pool.num_workers
+    while True:
+        batch: List[List[_GroundNSRT]] = []
+        skeleton_search_error: Optional[utils.ExceptionWithInfo] = None
+        try:
+            for skeleton, _ in islice(skeletons, num_workers):
+                batch.append(skeleton)
+        except (_MaxSkeletonsFailure, _SkeletonSearchTimeout) as e:
+            # Refine the skeletons that were found before raising.
+            skeleton_search_error = e
+        if batch:
+            remaining_timeout = timeout - (time.perf_counter() - start_time)
+            worker_args = [
+                refinement_pool.get_worker_args(idx, skeleton, seed,
+                                                remaining_timeout, max_horizon)
+                for idx, skeleton in enumerate(batch)
+            ]
+            worker_refinements = refinement_pool.refine(worker_args)
+            try:
+                for idx, plan_params, suc, worker_metrics, failure in \
+                        worker_refinements:
+                    for key, value in worker_metrics.items():
+                        metrics[key] += value
+                    skeleton = batch[idx]
+                    plan = [
+                        nsrt.option.ground(nsrt.option_objs, params)
+                        for nsrt, params in zip(skeleton, plan_params)
+                    ]
+                    if failure is not None:
+                        failure_idx, failure_cls, message, info = failure
+                        discovered_failure = _DiscoveredFailure(
+                            failure_cls(message, info), skeleton[failure_idx])
+                        raise _DiscoveredFailureException(
+                            "Discovered a failure", discovered_failure, {
+                                "longest_failed_refinement": plan,
+                                "skeleton": skeleton,
+                                "failing_step": failure_idx
+                            })
+                    yield skeleton, plan, suc
+            finally:
+                # Kill the workers that are still refining now, rather than
+                # when the generator is garbage collected, which may be
+                # after the pool is closed.
+                worker_refinements.close()
+        if skeleton_search_error is not None:
+            raise skeleton_search_error
+        if len(batch) < num_workers:
+            return
+
+
 def sesame_ground_nsrts(
     task: Task,
     init_atoms: Set[GroundAtom],
@@ -218,8 +922,12 @@ def sesame_ground_nsrts(
     types: Set[Type],
     start_time: float,
     timeout: float,
+    grounding_cache: Optional[utils.StaticPruningGroundingCache] = None,
 ) -> List[_GroundNSRT]:
-    """Helper function for _sesame_plan_with_astar(); generate ground NSRTs."""
+    """Helper function for _sesame_plan_with_astar(); generate ground NSRTs.
+
+    The grounding_cache is only used by the "static_pruning" grounder.
+    """
     if CFG.sesame_grounder == "naive":
         ground_nsrts = []
         for nsrt in sorted(nsrts):
@@ -227,6 +935,11 @@ def sesame_ground_nsrts(
                 ground_nsrts.append(ground_nsrt)
                 if time.perf_counter() - start_time > timeout:
                     raise PlanningTimeout("Planning timed out in grounding!")
+    elif CFG.sesame_grounder == "static_pruning":
+        ground_nsrts = utils.all_ground_nsrts_with_static_pruning(
+            nsrts, objects, init_atoms, grounding_cache)
+        if time.perf_counter() - start_time > timeout:
+            raise PlanningTimeout("Planning timed out in grounding!")
     elif CFG.sesame_grounder == "fd_translator":
         # WARNING: there is no easy way to check the timeout within this call,
         # since Fast Downward's translator is a third-party function. We'll
@@ -248,20 +961,25 @@ def filter_nsrts(
     ground_nsrts: List[_GroundNSRT],
     check_dr_reachable: bool = True,
     allow_noops: bool = False,
+    reachability: Optional[utils.RelaxedReachability] = None,
 ) -> List[_GroundNSRT]:
     """Helper function for _sesame_plan_with_astar(); optionally filter out
-    NSRTs with empty effects and/or those that are unreachable."""
-    nonempty_ground_nsrts = [
-        nsrt for nsrt in ground_nsrts
-        if allow_noops or (nsrt.add_effects | nsrt.delete_effects)
-    ]
-    all_reachable_atoms = utils.get_reachable_atoms(nonempty_ground_nsrts,
-                                                    init_atoms)
-    if check_dr_reachable and not task.goal.issubset(all_reachable_atoms):
+    NSRTs with empty effects and/or those that are unreachable.
+
+    If reachability is given, it must have been computed for
+    ground_nsrts and init_atoms.
+    """
+    if reachability is None:
+        reachability = utils.RelaxedReachability(ground_nsrts, init_atoms)
+    # NSRTs with empty effects do not change the reachable atoms, so they
+    # can be filtered out afterward.
+    if check_dr_reachable and not task.goal.issubset(
+            reachability.reachable_atoms):
         raise PlanningFailure(f"Goal {task.goal} not dr-reachable")
     reachable_nsrts = [
-        nsrt for nsrt in nonempty_ground_nsrts
-        if nsrt.preconditions.issubset(all_reachable_atoms)
+        nsrt for idx, nsrt in enumerate(ground_nsrts)
+        if (allow_noops or (nsrt.add_effects | nsrt.delete_effects))
+        and reachability.is_reachable(idx)
     ]
     return reachable_nsrts
 
@@ -271,6 +989,7 @@ def task_plan_grounding(
     objects: Set[Object],
     nsrts: Collection[NSRT],
     allow_noops: bool = False,
+    replanning_cache: Optional[ReplanningCache] = None,
 ) -> Tuple[List[_GroundNSRT], Set[GroundAtom]]:
     """Ground all operators for task planning into dummy _GroundNSRTs,
     filtering out ones that are unreachable or have empty effects.
@@ -278,20 +997,32 @@ def task_plan_grounding(
     Also return the set of reachable atoms, which is used by task
     planning to quickly determine if a goal is unreachable.
 
+    If a replanning_cache is given, the ground NSRTs are cached in it
+    before filtering out the unreachable ones.
+
     See the task_plan docstring for usage instructions.
     """
-    ground_nsrts = []
-    for nsrt in sorted(nsrts):
-        for ground_nsrt in utils.all_ground_nsrts(nsrt, objects):
-            if allow_noops or (ground_nsrt.add_effects
-                               | ground_nsrt.delete_effects):
-                ground_nsrts.append(ground_nsrt)
-    reachable_atoms = utils.get_reachable_atoms(ground_nsrts, init_atoms)
+
+    def _ground() -> List[_GroundNSRT]:
+        ground_nsrts = []
+        for nsrt in sorted(nsrts):
+            for ground_nsrt in utils.all_ground_nsrts(nsrt, objects):
+                if allow_noops or (ground_nsrt.add_effects
+                                   | ground_nsrt.delete_effects):
+                    ground_nsrts.append(ground_nsrt)
+        return ground_nsrts
+
+    if replanning_cache is not None:
+        ground_nsrts = replanning_cache.get_ground_nsrts(
+            f"task_plan_allow_noops={allow_noops}", _ground)
+    else:
+        ground_nsrts = _ground()
+    reachability = utils.RelaxedReachability(ground_nsrts, init_atoms)
     reachable_nsrts = [
-        nsrt for nsrt in ground_nsrts
-        if nsrt.preconditions.issubset(reachable_atoms)
+        nsrt for idx, nsrt in enumerate(ground_nsrts)
+        if reachability.is_reachable(idx)
     ]
-    return reachable_nsrts, reachable_atoms
+    return reachable_nsrts, reachability.reachable_atoms
 
 
 def task_plan(
@@ -366,29 +1097,77 @@ def _skeleton_generator(
     use_visited_state_set is False (which is the default), then we may revisit
     the same abstract states multiple times, unlike in typical A*. See
     Issue #1117 for a discussion on why this is False by default.
-    """
 
+    If CFG.sesame_use_bitset_states is True, the search is run over
+    integer bitset encodings of the atoms (see _BitsetEncoding), which
+    is much faster for tasks with many ground NSRTs. The yielded
+    skeletons and atoms sequences are identical either way.
+    """
+    if CFG.sesame_use_bitset_states:
+        bitset_encoding = _BitsetEncoding(ground_nsrts, init_atoms, task.goal,
+                                          heuristic)
+        return _skeleton_search(task, bitset_encoding, init_atoms, seed,
+                                timeout, metrics, max_skeletons_optimized,
+                                abstract_policy,
+                                sesame_max_policy_guided_rollout,
+                                use_visited_state_set)
+    atom_set_encoding = _AtomSetEncoding(ground_nsrts, task.goal, heuristic)
+    return _skeleton_search(task, atom_set_encoding, init_atoms, seed, timeout,
+                            metrics, max_skeletons_optimized, abstract_policy,
+                            sesame_max_policy_guided_rollout,
+                            use_visited_state_set)
+
+
+def _skeleton_search(
+    task: Task,
+    encoding: _StateEncoding[_S],
+    init_atoms: Set[GroundAtom],
+    seed: int,
+    timeout: float,
+    metrics: Metrics,
+    max_skeletons_optimized: int,
+    abstract_policy: Optional[AbstractPolicy],
+    sesame_max_policy_guided_rollout: int,
+    use_visited_state_set: bool,
+) -> Iterator[Tuple[List[_GroundNSRT], List[Set[GroundAtom]]]]:
+    """Helper for _skeleton_generator() that runs the search over the states
+    of the given encoding."""
     start_time = time.perf_counter()
     current_objects = set(task.init)
-    queue: List[Tuple[float, float, _Node]] = []
-    root_node = _Node(atoms=init_atoms,
-                      skeleton=[],
-                      atoms_sequence=[init_atoms],
-                      parent=None,
-                      cumulative_cost=0)
+    queue: List[Tuple[float, float, _Node[_S]]] = []
+    root_node: _Node[_S] = _Node(atoms=encoding.encode(init_atoms),
+                                 ground_nsrt=None,
+                                 parent=None,
+                                 cumulative_cost=0,
+                                 node_id=0)
+    num_nodes = 1
     metrics["num_nodes_created"] += 1
     rng_prio = np.random.default_rng(seed)
-    hq.heappush(queue,
-                (heuristic(root_node.atoms), rng_prio.uniform(), root_node))
-    # Initialize with empty skeleton for root.
+    hq.heappush(queue, (encoding.get_heuristic_value(
+        root_node.atoms), rng_prio.uniform(), root_node))
     # We want to keep track of the visited skeletons so that we avoid
-    # repeatedly outputting the same faulty skeletons.
-    visited_skeletons: Set[Tuple[_GroundNSRT, ...]] = set()
-    visited_skeletons.add(tuple(root_node.skeleton))
-    if use_visited_state_set:
-        # This set will maintain (frozen) atom sets that have been fully
-        # expanded already, and ensure that we never expand redundantly.
-        visited_atom_sets = set()
+    # repeatedly outputting the same faulty skeletons. Because each node
+    # has a unique path from the root, it suffices to track the (parent node
+    # ID, ground NSRT) pairs that have already been used to create children.
+    visited_children: Set[Tuple[int, _GroundNSRT]] = set()
+    # If use_visited_state_set, this set will maintain the keys of states
+    # that have been fully expanded already, and ensure that we never expand
+    # redundantly.
+    visited_states: Set[Hashable] = set()
+
+    def _get_skeleton_and_atoms_sequence(
+            node: _Node[_S]
+    ) -> Tuple[List[_GroundNSRT], List[Set[GroundAtom]]]:
+        skeleton: List[_GroundNSRT] = []
+        atoms_sequence = [encoding.decode(node.atoms)]
+        cur_node = node
+        while cur_node.parent is not None:
+            assert cur_node.ground_nsrt is not None
+            skeleton.append(cur_node.ground_nsrt)
+            cur_node = cur_node.parent
+            atoms_sequence.append(encoding.decode(cur_node.atoms))
+        return skeleton[::-1], atoms_sequence[::-1]
+
     # Start search.
     while queue and (time.perf_counter() - start_time < timeout):
         if int(metrics["num_skeletons_optimized"]) == max_skeletons_optimized:
@@ -396,95 +1175,85 @@ def _skeleton_generator(
                 "Planning reached max_skeletons_optimized!")
         _, _, node = hq.heappop(queue)
         if use_visited_state_set:
-            frozen_atoms = frozenset(node.atoms)
-            visited_atom_sets.add(frozen_atoms)
+            visited_states.add(encoding.get_key(node.atoms))
         # Good debug point #1: print out the skeleton here to see what
         # the high-level search is doing. You can accomplish this via:
-        # for act in node.skeleton:
+        # for act in _get_skeleton_and_atoms_sequence(node)[0]:
         #     logging.info(f"{act.name} {act.objects}")
         # logging.info("")
-        if task.goal.issubset(node.atoms):
+        if encoding.is_goal(node.atoms):
             # If this skeleton satisfies the goal, yield it.
             metrics["num_skeletons_optimized"] += 1
-            yield node.skeleton, node.atoms_sequence
-        else:
-            # Generate successors.
-            metrics["num_nodes_expanded"] += 1
-            # If an abstract policy is provided, generate policy-based
-            # successors first.
-            if abstract_policy is not None:
-                current_node = node
-                for _ in range(sesame_max_policy_guided_rollout):
-                    if task.goal.issubset(current_node.atoms):
-                        yield current_node.skeleton, current_node.atoms_sequence
-                        break
-                    ground_nsrt = abstract_policy(current_node.atoms,
-                                                  current_objects, task.goal)
-                    if ground_nsrt is None:
-                        break
-                    # Make sure ground_nsrt is applicable.
-                    if not ground_nsrt.preconditions.issubset(
-                            current_node.atoms):
-                        break
-                    child_atoms = utils.apply_operator(ground_nsrt,
-                                                       set(current_node.atoms))
-                    child_skeleton = current_node.skeleton + [ground_nsrt]
-                    child_skeleton_tup = tuple(child_skeleton)
-                    if child_skeleton_tup in visited_skeletons:
-                        continue
-                    visited_skeletons.add(child_skeleton_tup)
-                    # Note: the cost of taking a policy-generated action is 1,
-                    # but the policy-generated skeleton is immediately yielded
-                    # once it reaches a goal. This allows the planner to always
-                    # trust the policy first, but it also allows us to yield a
-                    # policy-generated plan without waiting to exhaustively
-                    # rule out the possibility that some other primitive plans
-                    # are actually lower cost.
-                    child_cost = 1 + current_node.cumulative_cost
-                    child_node = _Node(
-                        atoms=child_atoms,
-                        skeleton=child_skeleton,
-                        atoms_sequence=current_node.atoms_sequence +
-                        [child_atoms],
-                        parent=current_node,
-                        cumulative_cost=child_cost)
-                    metrics["num_nodes_created"] += 1
-                    # priority is g [cost] plus h [heuristic]
-                    priority = (child_node.cumulative_cost +
-                                heuristic(child_node.atoms))
-                    hq.heappush(queue,
-                                (priority, rng_prio.uniform(), child_node))
-                    current_node = child_node
-                    if time.perf_counter() - start_time >= timeout:
-                        break
-            # Generate primitive successors.
-            for nsrt in utils.get_applicable_operators(ground_nsrts,
-                                                       node.atoms):
-                child_atoms = utils.apply_operator(nsrt, set(node.atoms))
-                if use_visited_state_set:
-                    frozen_atoms = frozenset(child_atoms)
-                    if frozen_atoms in visited_atom_sets:
-                        continue
-                child_skeleton = node.skeleton + [nsrt]
-                child_skeleton_tup = tuple(child_skeleton)
-                if child_skeleton_tup in visited_skeletons:  # pragma: no cover
+            yield _get_skeleton_and_atoms_sequence(node)
+            continue
+        # Generate successors.
+        metrics["num_nodes_expanded"] += 1
+        # If an abstract policy is provided, generate policy-based
+        # successors first.
+        if abstract_policy is not None:
+            current_node = node
+            for _ in range(sesame_max_policy_guided_rollout):
+                if encoding.is_goal(current_node.atoms):
+                    yield _get_skeleton_and_atoms_sequence(current_node)
+                    break
+                ground_nsrt = abstract_policy(
+                    encoding.decode(current_node.atoms), current_objects,
+                    task.goal)
+                if ground_nsrt is None:
+                    break
+                # Make sure ground_nsrt is applicable.
+                child_atoms = encoding.apply(ground_nsrt, current_node.atoms)
+                if child_atoms is None:
+                    break
+                child_key = (current_node.node_id, ground_nsrt)
+                if child_key in visited_children:
                     continue
-                visited_skeletons.add(child_skeleton_tup)
-                # Action costs are unitary.
-                child_cost = node.cumulative_cost + 1.0
+                visited_children.add(child_key)
+                # Note: the cost of taking a policy-generated action is 1,
+                # but the policy-generated skeleton is immediately yielded
+                # once it reaches a goal. This allows the planner to always
+                # trust the policy first, but it also allows us to yield a
+                # policy-generated plan without waiting to exhaustively
+                # rule out the possibility that some other primitive plans
+                # are actually lower cost.
                 child_node = _Node(atoms=child_atoms,
-                                   skeleton=child_skeleton,
-                                   atoms_sequence=node.atoms_sequence +
-                                   [child_atoms],
-                                   parent=node,
-                                   cumulative_cost=child_cost)
+                                   ground_nsrt=ground_nsrt,
+                                   parent=current_node,
+                                   cumulative_cost=1 +
+                                   current_node.cumulative_cost,
+                                   node_id=num_nodes)
+                num_nodes += 1
                 metrics["num_nodes_created"] += 1
                 # priority is g [cost] plus h [heuristic]
                 priority = (child_node.cumulative_cost +
-                            heuristic(child_node.atoms))
+                            encoding.get_heuristic_value(child_atoms))
                 hq.heappush(queue, (priority, rng_prio.uniform(), child_node))
+                current_node = child_node
                 if time.perf_counter() - start_time >= timeout:
                     break
+        # Generate primitive successors.
+        for nsrt, child_atoms in encoding.get_applicable(node.atoms):
+            if use_visited_state_set and \
+                encoding.get_key(child_atoms) in visited_states:
+                continue
+            child_key = (node.node_id, nsrt)
+            if child_key in visited_children:  # pragma: no cover
+                continue
+            visited_children.add(child_key)
+            # Action costs are unitary.
+            child_node = _Node(atoms=child_atoms,
+                               ground_nsrt=nsrt,
+                               parent=node,
+                               cumulative_cost=node.cumulative_cost + 1.0,
+                               node_id=num_nodes)
+            num_nodes += 1
+            metrics["num_nodes_created"] += 1
+            # priority is g [cost] plus h [heuristic]
+            priority = (child_node.cumulative_cost +
+                        encoding.get_heuristic_value(child_atoms))
+            hq.heappush(queue, (priority, rng_prio.uniform(), child_node))
+            if time.perf_counter() - start_time >= timeout:
+                break
     if not queue:
         raise _MaxSkeletonsFailure("Planning ran out of skeletons!")
     assert time.perf_counter() - start_time >= timeout
@@ -540,6 +1309,10 @@ def run_low_level_search(
     discovered_failures: List[Optional[_DiscoveredFailure]] = [
         None for _ in skeleton
     ]
+    # If sampling in batches, the not-yet-tried candidate options for each
+    # step, together with whether they are initiable in that step's state.
+    # Initiable candidates come first, in the order the sampler gave.
+    candidates: List[List[Tuple[_Option, bool]]] = [[] for _ in skeleton]
     plan_found = False
     while cur_idx < len(skeleton):
         if time.perf_counter() - start_time > timeout:
@@ -552,15 +1325,31 @@ def run_low_level_search(
         num_tries[cur_idx] += 1
         state = traj[cur_idx]
         nsrt = skeleton[cur_idx]
-        # Ground the NSRT's ParameterizedOption into an _Option.
-        # This invokes the NSRT's sampler.
-        option = nsrt.sample_option(state, task.goal, rng_sampler)
+        if CFG.sesame_sampler_batch_size > 1:
+            if not candidates[cur_idx]:
+                # Sample a batch of candidates, but never more than the
+                # number of tries left for this step.
+                num_tries_left = max_tries[cur_idx] - num_tries[cur_idx] + 1
+                num_candidates = min(CFG.sesame_sampler_batch_size,
+                                     num_tries_left)
+                batch = nsrt.sample_options(state, task.goal, rng_sampler,
+                                            num_candidates)
+                initiable = [o.initiable(state) for o in batch]
+                candidates[cur_idx] = \
+                    [(o, True) for o, i in zip(batch, initiable) if i] + \
+                    [(o, False) for o, i in zip(batch, initiable) if not i]
+            option, option_initiable = candidates[cur_idx].pop(0)
+        else:
+            # Ground the NSRT's ParameterizedOption into an _Option.
+            # This invokes the NSRT's sampler.
+            option = nsrt.sample_option(state, task.goal, rng_sampler)
+            option_initiable = option.initiable(state)
         plan[cur_idx] = option
         # Increment num_samples metric by 1
         metrics["num_samples"] += 1
         # Increment cur_idx. It will be decremented later on if we get stuck.
         cur_idx += 1
-        if option.initiable(state):
+        if option_initiable:
             try:
                 next_state, num_actions = \
                     option_model.get_next_state_and_num_actions(state, option)
@@ -641,14 +1430,17 @@ def run_low_level_search(
             if possible_failure is not None and \
                 CFG.sesame_propagate_failures == "immediately":
                 raise _DiscoveredFailureException(
-                    "Discovered a failure", possible_failure,
-                    {"longest_failed_refinement": longest_failed_refinement})
+                    "Discovered a failure", possible_failure, {
+                        "longest_failed_refinement": longest_failed_refinement,
+                        "failing_step": cur_idx - 1
+                    })
             # Decrement cur_idx to re-do the step we just did. If num_tries
             # is exhausted, backtrack.
             cur_idx -= 1
             assert cur_idx >= 0
             while num_tries[cur_idx] == max_tries[cur_idx]:
                 num_tries[cur_idx] = 0
+                candidates[cur_idx] = []
                 plan[cur_idx] = DummyOption
                 num_actions_per_option[cur_idx] = 0
                 traj[cur_idx + 1] = DefaultState
@@ -659,13 +1451,15 @@ def run_low_level_search(
                     # propagate up the EARLIEST one so that high-level search
                     # restarts. Otherwise, return a partial refinement so that
                     # high-level search continues.
-                    for possible_failure in discovered_failures:
+                    for failing_step, possible_failure in enumerate(
+                            discovered_failures):
                         if possible_failure is not None and \
                             CFG.sesame_propagate_failures == "after_exhaust":
                             raise _DiscoveredFailureException(
                                 "Discovered a failure", possible_failure, {
                                     "longest_failed_refinement":
-                                    longest_failed_refinement
+                                    longest_failed_refinement,
+                                    "failing_step": failing_step
                                 })
                     return longest_failed_refinement, False
     # Should only get here if the skeleton was empty.
@@ -904,6 +1698,7 @@ def task_plan_with_option_plan_constraint(
     heuristic = utils.create_task_planning_heuristic(
         CFG.sesame_task_planning_heuristic, init_atoms, goal, ground_nsrts,
         predicates, objects)
+    successor_generator = utils.SuccessorGenerator(ground_nsrts)
 
     def _check_goal(
             searchnode_state: Tuple[FrozenSet[GroundAtom], int]) -> bool:
@@ -922,7 +1717,7 @@ def task_plan_with_option_plan_constraint(
         gt_param_option = option_plan[idx_into_traj][0]
         gt_objects = option_plan[idx_into_traj][1]
         for applicable_nsrt in utils.get_applicable_operators(
-                ground_nsrts, atoms):
+                successor_generator, atoms):
             # NOTE: we check that the ParameterizedOptions are equal before
             # attempting to ground because otherwise, we might
             # get a parameter mismatch and trigger an AssertionError
@@ -1176,9 +1971,14 @@ def run_task_plan_once(
         default_cost: float = 1.0,
         cost_precision: int = 3,
         max_horizon: float = np.inf,
+        replanning_cache: Optional[ReplanningCache] = None,
         **kwargs: Any
 ) -> Tuple[List[_GroundNSRT], List[Set[GroundAtom]], Metrics]:
-    """Get a single abstract plan for a task."""
+    """Get a single abstract plan for a task.
+
+    If a replanning_cache is given, the A* planner reuses the work done
+    for the same task in previous calls (see ReplanningCache).
+    """
 
     init_atoms = utils.abstract(task.init, preds)
     goal = task.goal
@@ -1187,12 +1987,29 @@ def run_task_plan_once(
     start_time = time.perf_counter()
 
     if CFG.sesame_task_planner == "astar":
+        if replanning_cache is not None:
+            replanning_cache.set_task(task, nsrts, preds)
         ground_nsrts, reachable_atoms = task_plan_grounding(
-            init_atoms, objects, nsrts)
+            init_atoms, objects, nsrts, replanning_cache=replanning_cache)
         assert task_planning_heuristic is not None
-        heuristic = utils.create_task_planning_heuristic(
-            task_planning_heuristic, init_atoms, goal, ground_nsrts, preds,
-            objects)
+        if replanning_cache is not None:
+            repaired = replanning_cache.repair_skeleton(
+                init_atoms, goal, ground_nsrts)
+            if repaired is not None and len(repaired[0]) <= max_horizon:
+                plan, atoms_seq = repaired
+                metrics: Metrics = defaultdict(float)
+                metrics["num_skeletons_optimized"] = 1
+                metrics["num_skeletons_repaired"] = 1
+                replanning_cache.set_skeleton(plan)
+                return plan, atoms_seq, metrics
+            heuristic = replanning_cache.get_heuristic(task_planning_heuristic,
+                                                       init_atoms, goal,
+                                                       ground_nsrts, preds,
+                                                       objects)
+        else:
+            heuristic = utils.create_task_planning_heuristic(
+                task_planning_heuristic, init_atoms, goal, ground_nsrts, preds,
+                objects)
         duration = time.perf_counter() - start_time
         timeout -= duration
         plan, atoms_seq, metrics = next(
@@ -1209,6 +2026,8 @@ def run_task_plan_once(
         if len(plan) > max_horizon:
             raise PlanningFailure(
                 "Skeleton produced by A-star exceeds horizon!")
+        if replanning_cache is not None:
+            replanning_cache.set_skeleton(plan)
     elif "fd" in CFG.sesame_task_planner:  # pragma: no cover
         fd_exec_path = os.environ["FD_EXEC_PATH"]
         exec_str = os.path.join(fd_exec_path, "fast-downward.py")
@@ -6,7 +6,9 @@ import abc
 import logging
 import re
 import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Callable, Collection, Dict, FrozenSet, List, Sequence, \
     Set, Tuple
 
@@ -96,6 +98,10 @@ def create_score_function(
         f"Unknown score function: {score_function_name}.")
 
 
+# Segmenters whose segment boundaries do not depend on the atoms.
+_ATOM_INDEPENDENT_SEGMENTERS = ("option_changes", "every_step", "contacts")
+
+
 @dataclass(frozen=True, eq=False, repr=False)
 class _PredicateSearchScoreFunction(abc.ABC):
     """A score function for guiding search over predicate sets."""
@@ -122,6 +128,12 @@ class _PredicateSearchScoreFunction(abc.ABC):
 @dataclass(frozen=True, eq=False, repr=False)
 class _OperatorLearningBasedScoreFunction(_PredicateSearchScoreFunction):
     """A score function that learns operators given the set of predicates."""
+    # Maps sets of candidate predicates to the atoms at the segment boundaries
+    # in each trajectory; see _get_boundary_atoms().
+    _boundary_atoms_cache: OrderedDict[FrozenSet[Predicate],
+                                       List[List[Set[GroundAtom]]]] = field(
+                                           init=False,
+                                           default_factory=OrderedDict)
 
     def evaluate(self, candidate_predicates: FrozenSet[Predicate]) -> float:
         total_cost = sum(self._candidates[pred]
@@ -129,19 +141,8 @@ class _OperatorLearningBasedScoreFunction(_PredicateSearchScoreFunction):
         logging.info(f"Evaluating predicates: {candidate_predicates}, with "
                      f"total cost {total_cost}")
         start_time = time.perf_counter()
-        pruned_atom_data = utils.prune_ground_atom_dataset(
-            self._atom_dataset,
-            candidate_predicates | self._initial_predicates)
-        segmented_trajs = [
-            segment_trajectory(ll_traj, set(candidate_predicates), atom_seq)
-            for (ll_traj, atom_seq) in pruned_atom_data
-        ]
-        # Each entry in pruned_atom_data is a tuple of (low-level trajectory,
-        # low-level ground atoms sequence). We remove the latter, because
-        # it's prone to causing bugs -- we should rarely care about the
-        # low-level ground atoms sequence after segmentation.
-        low_level_trajs = [ll_traj for ll_traj, _ in pruned_atom_data]
-        del pruned_atom_data
+        segmented_trajs = self.segment_trajectories(candidate_predicates)
+        low_level_trajs = [ll_traj for ll_traj, _ in self._atom_dataset]
         try:
             pnads = learn_strips_operators(low_level_trajs,
                                            self._train_tasks,
@@ -178,6 +179,110 @@ class _OperatorLearningBasedScoreFunction(_PredicateSearchScoreFunction):
         candidate predicates."""
         raise NotImplementedError("Override me!")
 
+    def segment_trajectories(
+            self,
+            candidate_predicates: FrozenSet[Predicate]) -> List[List[Segment]]:
+        """Segment the trajectories in the atom dataset, keeping only the
+        atoms of the candidate and initial predicates.
+
+        If the segment boundaries do not depend on the atoms, they are
+        computed once, and the atoms at the boundaries are computed
+        incrementally from those of a recently segmented set with one
+        fewer predicate, e.g., the parent of the candidate set during
+        hill climbing, when possible.
+        """
+        if CFG.segmenter not in _ATOM_INDEPENDENT_SEGMENTERS:
+            pruned_atom_data = utils.prune_ground_atom_dataset(
+                self._atom_dataset,
+                candidate_predicates | self._initial_predicates)
+            return [
+                segment_trajectory(ll_traj, set(candidate_predicates),
+                                   atom_seq)
+                for (ll_traj, atom_seq) in pruned_atom_data
+            ]
+        segmented_trajs = []
+        for template_segments, boundary_atoms in zip(
+                self._template_segmented_trajs,
+                self._get_boundary_atoms(candidate_predicates)):
+            segments = []
+            for i, template_segment in enumerate(template_segments):
+                # Create new segments because operator learning may modify
+                # them, e.g., by setting their necessary add effects.
+                segment = Segment(template_segment.trajectory,
+                                  boundary_atoms[i], boundary_atoms[i + 1])
+                if template_segment.has_option():
+                    segment.set_option(template_segment.get_option())
+                segments.append(segment)
+            segmented_trajs.append(segments)
+        return segmented_trajs
+
+    @cached_property
+    def _template_segmented_trajs(self) -> List[List[Segment]]:
+        # Only the trajectories and options of these segments are used.
+        return [
+            segment_trajectory(ll_traj, set(), [set() for _ in atom_seq])
+            for ll_traj, atom_seq in self._atom_dataset
+        ]
+
+    @cached_property
+    def _predicate_to_boundary_atoms(
+            self) -> Dict[Predicate, List[List[Set[GroundAtom]]]]:
+        # For each predicate, for each trajectory, the atoms of that predicate
+        # at each segment boundary.
+        pred_to_boundary_atoms: Dict[Predicate,
+                                     List[List[Set[GroundAtom]]]] = {}
+        for traj_idx, ((_, atom_seq), segments) in enumerate(
+                zip(self._atom_dataset, self._template_segmented_trajs)):
+            boundaries = [0]
+            for segment in segments:
+                boundaries.append(boundaries[-1] + len(segment.actions))
+            for i, t in enumerate(boundaries):
+                for atom in atom_seq[t]:
+                    if atom.predicate not in pred_to_boundary_atoms:
+                        pred_to_boundary_atoms[atom.predicate] = [[
+                            set() for _ in range(len(segs) + 1)
+                        ] for segs in self._template_segmented_trajs]
+                    pred_to_boundary_atoms[atom.predicate][traj_idx][i].add(
+                        atom)
+        return pred_to_boundary_atoms
+
+    def _get_boundary_atoms(
+        self, candidate_predicates: FrozenSet[Predicate]
+    ) -> List[List[Set[GroundAtom]]]:
+        candidate_predicates = frozenset(candidate_predicates)
+        cache = self._boundary_atoms_cache
+        if candidate_predicates in cache:
+            cache.move_to_end(candidate_predicates)
+            return cache[candidate_predicates]
+        pred_to_boundary_atoms = self._predicate_to_boundary_atoms
+        for pred in candidate_predicates:
+            parent = candidate_predicates - {pred}
+            if parent not in cache:
+                continue
+            boundary_atoms = cache[parent]
+            if pred in pred_to_boundary_atoms and \
+                pred not in self._initial_predicates:
+                boundary_atoms = [[
+                    atoms | pred_atoms
+                    for atoms, pred_atoms in zip(traj_atoms, traj_pred_atoms)
+                ] for traj_atoms, traj_pred_atoms in zip(
+                    boundary_atoms, pred_to_boundary_atoms[pred])]
+            break
+        else:
+            preds = [
+                p for p in candidate_predicates | self._initial_predicates
+                if p in pred_to_boundary_atoms
+            ]
+            boundary_atoms = [[
+                set().union(*(pred_to_boundary_atoms[p][traj_idx][i]
+                              for p in preds)) for i in range(len(segs) + 1)
+            ] for traj_idx, segs in enumerate(self._template_segmented_trajs)]
+        cache[candidate_predicates] = boundary_atoms
+        # Keep enough entries for all the children of one hill climbing step.
+        while len(cache) > len(self._candidates) + 1:
+            cache.popitem(last=False)
+        return boundary_atoms
+
     @staticmethod
     def _get_operator_penalty(strips_ops: Collection[STRIPSOperator]) -> float:
         """Get a score penalty based on the operator complexities."""
@@ -528,12 +633,13 @@ class _HeuristicEnergyBasedScoreFunction(_HeuristicBasedScoreFunction):
                                   is_demo: bool) -> float:
         assert is_demo
         score = 0.0
+        successor_generator = utils.SuccessorGenerator(ground_ops)
         for i in range(len(atoms_sequence) - 1):
             atoms, next_atoms = atoms_sequence[i], atoms_sequence[i + 1]
             ground_op_demo_lpm = -np.inf  # total log prob mass for demo actions
             ground_op_total_lpm = -np.inf  # total log prob mass for all actions
             for predicted_next_atoms in utils.get_successors_from_ground_ops(
-                    atoms, ground_ops, unique=False):
+                    atoms, successor_generator, unique=False):
                 # Compute the heuristic for the successor atoms.
                 h = heuristic_fn(predicted_next_atoms)
                 # Compute the probability that the correct next atoms would be
@@ -586,13 +692,14 @@ class _HeuristicCountBasedScoreFunction(_HeuristicBasedScoreFunction):
         is_demo: bool,
     ) -> float:
         score = 0.0
+        successor_generator = utils.SuccessorGenerator(ground_ops)
         for i in range(len(atoms_sequence) - 1):
             atoms, next_atoms = atoms_sequence[i], atoms_sequence[i + 1]
             best_h = float("inf")
             on_sequence_h = float("inf")
             optimal_successors = set()
             for predicted_next_atoms in utils.get_successors_from_ground_ops(
-                    atoms, ground_ops, unique=False):
+                    atoms, successor_generator, unique=False):
                 # Compute the heuristic for the successor atoms.
                 h = heuristic_fn(predicted_next_atoms)
                 if h < best_h:
@@ -654,6 +761,7 @@ class _RelaxationHeuristicBasedScoreFunction(_HeuristicBasedScoreFunction):
             heuristic_name, init_atoms, goal, reachable_ops,
             set(candidate_predicates) | self._initial_predicates, objects)
         del init_atoms  # unused after this
+        successor_generator = utils.SuccessorGenerator(ground_ops)
         cache: Dict[Tuple[FrozenSet[GroundAtom], int], float] = {}
 
         def _relaxation_h(atoms: Set[GroundAtom], depth: int = 0) -> float:
@@ -668,7 +776,7 @@ class _RelaxationHeuristicBasedScoreFunction(_HeuristicBasedScoreFunction):
                 successor_hs = [
                     _relaxation_h(next_atoms, depth + 1)
                     for next_atoms in utils.get_successors_from_ground_ops(
-                        atoms, ground_ops)
+                        atoms, successor_generator)
                 ]
                 if not successor_hs:
                     return float("inf")
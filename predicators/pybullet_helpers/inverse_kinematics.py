@@ -4,12 +4,13 @@ The IKFast solver is preferred over PyBullet IK, if available for the
 given robot.
 """
 
-from typing import Sequence
+import os
+from typing import Dict, Optional, Sequence, Tuple
 
 import numpy as np
 import pybullet as p
 
-from predicators.pybullet_helpers.geometry import Pose3D, Quaternion
+from predicators.pybullet_helpers.geometry import Pose, Pose3D, Quaternion
 from predicators.pybullet_helpers.joint import JointPositions, \
     get_joint_infos, get_joints
 from predicators.pybullet_helpers.link import get_link_pose
@@ -28,6 +29,7 @@ def pybullet_inverse_kinematics(
     joints: Sequence[int],
     physics_client_id: int,
     validate: bool = True,
+    initial_joint_positions: Optional[JointPositions] = None,
 ) -> JointPositions:
     """Runs IK and returns joint positions for the given (free) joints.
 
@@ -35,6 +37,9 @@ def pybullet_inverse_kinematics(
     times, resetting the robot state each time, until the target
     position is reached. If the target position is not reached after a
     maximum number of iters, an exception is raised.
+
+    If initial_joint_positions is given, IK starts from these positions
+    for the given joints instead of from the current ones.
     """
     # Figure out which joint each dimension of the return of IK corresponds to.
     all_joints = get_joints(robot, physics_client_id=physics_client_id)
@@ -54,6 +59,23 @@ def pybullet_inverse_kinematics(
                                              physicsClientId=physics_client_id)
     if validate:
         assert len(initial_joints_states) == len(free_joints)
+    if initial_joint_positions is not None:
+        assert len(initial_joint_positions) == len(joints)
+        for joint, joint_val in zip(joints, initial_joint_positions):
+            p.resetJointState(robot,
+                              joint,
+                              targetValue=joint_val,
+                              physicsClientId=physics_client_id)
+
+    def _reset_initial_joints_states() -> None:
+        for joint, (pos, vel, _, _) in zip(free_joints, initial_joints_states):
+            p.resetJointState(
+                robot,
+                joint,
+                targetValue=pos,
+                targetVelocity=vel,
+                physicsClientId=physics_client_id,
+            )
 
     # Running IK once is often insufficient, so we run it multiple times until
     # convergence. If it does not converge, an error is raised.
@@ -84,19 +106,16 @@ def pybullet_inverse_kinematics(
                        atol=convergence_tol):
             break
     else:
+        # Don't leave the robot at the given initial joint positions, so that
+        # IK can be retried from the current ones.
+        if initial_joint_positions is not None:
+            _reset_initial_joints_states()
         raise InverseKinematicsError("Inverse kinematics failed to converge.")
 
     # Reset the joint state (positions and velocities) to their initial values
     # to avoid modifying the PyBullet internal state.
-    if validate:
-        for joint, (pos, vel, _, _) in zip(free_joints, initial_joints_states):
-            p.resetJointState(
-                robot,
-                joint,
-                targetValue=pos,
-                targetVelocity=vel,
-                physicsClientId=physics_client_id,
-            )
+    if validate or initial_joint_positions is not None:
+        _reset_initial_joints_states()
     # Order the found free_joint_vals based on the requested joints.
     joint_vals = []
     for joint in joints:
@@ -105,3 +124,96 @@ def pybullet_inverse_kinematics(
         joint_vals.append(joint_val)
 
     return joint_vals
+
+
+class InverseKinematicsCache:
+    """Joint positions that solve IK for previously seen end effector poses,
+    used to warm start IK for nearby poses.
+
+    Solutions are keyed on both the pose and the joint positions that IK
+    started from (the seed), and only solutions found from the same seed
+    are used to warm start IK. So, e.g., if IK is always started from the
+    same home joint positions, warm starts stay in the same solution
+    branch as IK without the cache. Poses (in both position and
+    quaternion components) and seeds are quantized to the given
+    resolution. If save_path is given, solutions are loaded from there,
+    and periodically saved there as new ones are added, so they can be
+    shared between runs.
+    """
+
+    def __init__(self,
+                 resolution: float,
+                 save_path: Optional[str] = None) -> None:
+        assert resolution > 0
+        self._resolution = resolution
+        self._save_path = save_path
+        # Keys are the quantized seed followed by the quantized pose.
+        self._solutions: Dict[Tuple[int, ...], JointPositions] = {}
+        if save_path is not None and os.path.exists(save_path):
+            with np.load(save_path) as data:
+                for key, solution in zip(data["keys"], data["solutions"]):
+                    self._solutions[tuple(key)] = list(solution)
+        self._num_saved = len(self._solutions)
+        # Stacked keys for nearest neighbor lookups, rebuilt when stale.
+        self._keys_arr = np.zeros((0, 0), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._solutions)
+
+    def _get_key(self, pose: Pose,
+                 seed_joint_positions: JointPositions) -> Tuple[int, ...]:
+        orientation = np.array(pose.orientation)
+        # The quaternions q and -q represent the same orientation, so make
+        # the largest component positive.
+        if orientation[np.argmax(abs(orientation))] < 0:
+            orientation = -orientation
+        arr = np.r_[seed_joint_positions, pose.position,
+                    orientation] / self._resolution
+        return tuple(np.round(arr).astype(np.int64))
+
+    def get_seed(
+            self, pose: Pose,
+            seed_joint_positions: JointPositions) -> Optional[JointPositions]:
+        """Get the cached solution, found from the given seed, for the pose
+        nearest to the given one, or None if there are no such solutions."""
+        key = self._get_key(pose, seed_joint_positions)
+        if key in self._solutions:
+            return self._solutions[key]
+        if len(self._keys_arr) != len(self._solutions):
+            self._keys_arr = np.array(list(self._solutions), dtype=np.int64)
+        if not self._solutions or self._keys_arr.shape[1] != len(key):
+            return None
+        num_seed_dims = len(seed_joint_positions)
+        same_seed_keys_arr = self._keys_arr[np.all(
+            self._keys_arr[:, :num_seed_dims] == key[:num_seed_dims], axis=1)]
+        if same_seed_keys_arr.shape[0] == 0:
+            return None
+        dists = np.sum((same_seed_keys_arr - key)**2, axis=1)
+        nearest_key = tuple(same_seed_keys_arr[np.argmin(dists)])
+        return self._solutions[nearest_key]
+
+    def add(self, pose: Pose, seed_joint_positions: JointPositions,
+            joint_positions: JointPositions) -> None:
+        """Cache a solution for the given pose, found from the given seed."""
+        key = self._get_key(pose, seed_joint_positions)
+        self._solutions[key] = list(joint_positions)
+        # Save whenever the cache has grown by 10%, so that saving takes
+        # amortized constant time per solution.
+        num_unsaved = len(self._solutions) - self._num_saved
+        if num_unsaved > self._num_saved // 10:
+            self.save()
+
+    def save(self) -> None:
+        """Save the solutions, if there is a save path."""
+        if self._save_path is None:
+            return
+        os.makedirs(os.path.dirname(self._save_path), exist_ok=True)
+        keys = np.array(list(self._solutions), dtype=np.int64)
+        solutions = np.array(list(self._solutions.values()))
+        # Write to a temporary file first so that other processes sharing
+        # the cache never see a partially written file.
+        tmp_path = f"{self._save_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=keys, solutions=solutions)
+        os.replace(tmp_path, self._save_path)
+        self._num_saved = len(self._solutions)
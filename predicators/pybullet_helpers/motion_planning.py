@@ -1,7 +1,8 @@
 """Motion Planning in PyBullet."""
 from __future__ import annotations
 
-from typing import Collection, Iterator, Optional, Sequence
+from typing import Collection, Hashable, Iterator, List, Optional, \
+    OrderedDict, Sequence, Tuple
 
 import numpy as np
 import pybullet as p
@@ -13,6 +14,16 @@ from predicators.pybullet_helpers.link import get_link_state
 from predicators.pybullet_helpers.robots import SingleArmPyBulletRobot
 from predicators.settings import CFG
 
+# An upper bound on how far apart two bodies can be while PyBullet still
+# reports contact points between them.
+_CONTACT_DISTANCE = 0.02
+
+# Collision checking results for the most recent scene, keyed by (quantized)
+# joint positions, in least to most recently used order. See
+# _get_collision_cache().
+_CollisionCache = OrderedDict[Tuple[float, ...], Tuple[bool, float]]
+_COLLISION_CACHE: Tuple[Hashable, _CollisionCache] = ((), OrderedDict())
+
 
 def run_motion_planning(
     robot: SingleArmPyBulletRobot,
@@ -68,17 +79,70 @@ def run_motion_planning(
         for i in range(1, num + 1):
             yield list(pt1_arr * (1 - i / num) + pt2_arr * i / num)
 
-    def _collision_fn(pt: JointPositions) -> bool:
+    collision_cache = _get_collision_cache(robot, collision_bodies,
+                                           physics_client_id, held_object,
+                                           base_link_to_held_obj)
+    resolution = CFG.pybullet_birrt_collision_cache_resolution
+    max_cache_size = CFG.pybullet_birrt_collision_cache_max_size
+    margin = CFG.pybullet_birrt_collision_margin
+    max_reach = CFG.pybullet_birrt_collision_max_reach
+    moving_bodies = [robot.robot_id]
+    if held_object is not None:
+        moving_bodies.append(held_object)
+
+    def _get_cache_key(pt: JointPositions) -> Tuple[float, ...]:
+        if resolution > 0:
+            return tuple(np.round(np.divide(pt, resolution)))
+        return tuple(pt)
+
+    def _check_collision(pt: JointPositions) -> Tuple[bool, float]:
+        """Returns whether the point is in collision and, if not, the distance
+        to the nearest collision body (capped at the margin)."""
+        key = _get_cache_key(pt)
+        if key in collision_cache:
+            collision_cache.move_to_end(key)
+            return collision_cache[key]
         _set_state(pt)
         p.performCollisionDetection(physicsClientId=physics_client_id)
-        for body in collision_bodies:
-            if p.getContactPoints(robot.robot_id,
-                                  body,
-                                  physicsClientId=physics_client_id):
-                return True
-            if held_object is not None and p.getContactPoints(
-                    held_object, body, physicsClientId=physics_client_id):
+        collision = any(
+            p.getContactPoints(
+                moving_body, body, physicsClientId=physics_client_id)
+            for body in collision_bodies for moving_body in moving_bodies)
+        clearance = 0.0 if collision else margin
+        if margin > 0 and not collision:
+            for body in collision_bodies:
+                for moving_body in moving_bodies:
+                    for closest_point in p.getClosestPoints(
+                            moving_body,
+                            body,
+                            distance=margin,
+                            physicsClientId=physics_client_id):
+                        clearance = min(clearance, closest_point[8])
+        collision_cache[key] = (collision, clearance)
+        while len(collision_cache) > max_cache_size:
+            collision_cache.popitem(last=False)
+        return collision, clearance
+
+    def _collision_fn(pt: JointPositions) -> bool:
+        return _check_collision(pt)[0]
+
+    def _edge_collision_fn(pts: List[JointPositions]) -> bool:
+        # Points in the middle of the largest unchecked gaps are the most
+        # likely to be in collision, so check them first.
+        safe = np.zeros(len(pts), dtype=bool)
+        pts_arr = np.array(pts)
+        for i in utils.get_bisection_order(len(pts)):
+            if safe[i]:
+                continue
+            collision, clearance = _check_collision(pts[i])
+            if collision:
                 return True
+            # No point on the robot or held object moves farther than
+            # max_reach times the L1 joint distance, so points close enough
+            # in joint space to a point with enough clearance cannot be in
+            # collision either.
+            joint_dists = np.sum(abs(pts_arr - pts_arr[i]), axis=1)
+            safe |= joint_dists * max_reach < clearance - _CONTACT_DISTANCE
         return False
 
     def _distance_fn(from_pt: JointPositions, to_pt: JointPositions) -> float:
@@ -88,6 +152,11 @@ def run_motion_planning(
         to_ee = robot.forward_kinematics(to_pt).position
         return sum(np.subtract(from_ee, to_ee)**2)
 
+    def _embed_fn(pt: JointPositions) -> NDArray:
+        # The distance is between end effector positions, so the BiRRT only
+        # needs to run forward kinematics once per point.
+        return np.array(robot.forward_kinematics(pt).position)
+
     birrt = utils.BiRRT(_sample_fn,
                         _extend_fn,
                         _collision_fn,
@@ -95,6 +164,49 @@ def run_motion_planning(
                         rng,
                         num_attempts=CFG.pybullet_birrt_num_attempts,
                         num_iters=CFG.pybullet_birrt_num_iters,
-                        smooth_amt=CFG.pybullet_birrt_smooth_amt)
+                        smooth_amt=CFG.pybullet_birrt_smooth_amt,
+                        embed_fn=_embed_fn,
+                        edge_collision_fn=_edge_collision_fn)
 
     return birrt.query(initial_positions, target_positions)
+
+
+def _get_collision_cache(
+        robot: SingleArmPyBulletRobot, collision_bodies: Collection[int],
+        physics_client_id: int, held_object: Optional[int],
+        base_link_to_held_obj: Optional[NDArray]) -> _CollisionCache:
+    """Get the collision checking results for the current scene.
+
+    Results are shared between motion planning queries in the same
+    scene, e.g., repeated queries from the same state while sampling
+    options. Only the most recent scene is kept, and at most
+    CFG.pybullet_birrt_collision_cache_max_size results for it.
+    """
+    global _COLLISION_CACHE  # pylint: disable=global-statement
+
+    def _get_shapes_key(body: int) -> Hashable:
+        return tuple(
+            p.getCollisionShapeData(body,
+                                    -1,
+                                    physicsClientId=physics_client_id))
+
+    def _get_body_key(body: int) -> Hashable:
+        pose = p.getBasePositionAndOrientation(
+            body, physicsClientId=physics_client_id)
+        return (body, pose, _get_shapes_key(body))
+
+    held_object_key: Hashable = None
+    if held_object is not None:
+        # The pose of the held object is determined by the joint positions.
+        assert base_link_to_held_obj is not None
+        held_object_key = (held_object, _get_shapes_key(held_object),
+                           tuple(base_link_to_held_obj[0]),
+                           tuple(base_link_to_held_obj[1]))
+    scene_key = (physics_client_id, robot.get_name(),
+                 _get_body_key(robot.robot_id), held_object_key,
+                 tuple(_get_body_key(b) for b in sorted(collision_bodies)),
+                 CFG.pybullet_birrt_collision_cache_resolution,
+                 CFG.pybullet_birrt_collision_margin)
+    if _COLLISION_CACHE[0] != scene_key:
+        _COLLISION_CACHE = (scene_key, OrderedDict())
+    return _COLLISION_CACHE[1]
@@ -1,6 +1,8 @@
 """Abstract class for single armed manipulators with PyBullet helper
 functions."""
 import abc
+import hashlib
+import os
 from functools import cached_property
 from typing import List, Optional
 
@@ -13,7 +15,8 @@ from predicators.pybullet_helpers.ikfast import IKFastInfo
 from predicators.pybullet_helpers.ikfast.utils import \
     ikfast_closest_inverse_kinematics
 from predicators.pybullet_helpers.inverse_kinematics import \
-    InverseKinematicsError, pybullet_inverse_kinematics
+    InverseKinematicsCache, InverseKinematicsError, \
+    pybullet_inverse_kinematics
 from predicators.pybullet_helpers.joint import JointInfo, JointPositions, \
     get_joint_infos, get_joint_lower_limits, get_joint_positions, \
     get_joint_upper_limits, get_joints, get_kinematic_chain
@@ -49,6 +52,9 @@ class SingleArmPyBulletRobot(abc.ABC):
             physicsClientId=self.physics_client_id,
         )
 
+        # Solutions for warm starting PyBullet IK, if enabled.
+        self._ik_cache = self._create_ik_cache()
+
         # Robot initially at home pose.
         self.go_home()
 
@@ -411,6 +417,81 @@ class SingleArmPyBulletRobot(abc.ABC):
 
         return final_joint_state
 
+    def _create_ik_cache(self) -> Optional[InverseKinematicsCache]:
+        """Create the cache of PyBullet IK solutions.
+
+        The cache is only used for robots without IKFast. If
+        CFG.pybullet_ik_cache_dir is set, the cache is saved there, in a
+        file specific to the robot URDF, base pose, and end effector.
+        """
+        if not CFG.pybullet_ik_use_cache or self.ikfast_info():
+            return None
+        save_path = None
+        if CFG.pybullet_ik_cache_dir is not None:
+            hasher = hashlib.sha1()
+            with open(self.urdf_path(), "rb") as f:
+                hasher.update(f.read())
+            hasher.update(
+                repr((self._base_pose, self.end_effector_name)).encode())
+            save_path = os.path.join(
+                CFG.pybullet_ik_cache_dir,
+                f"{self.get_name()}_{hasher.hexdigest()}.npz")
+        return InverseKinematicsCache(CFG.pybullet_ik_cache_resolution,
+                                      save_path)
+
+    def _pybullet_inverse_kinematics(self, end_effector_pose: Pose,
+                                     validate: bool) -> JointPositions:
+        """IK using PyBullet.
+
+        If validating and the IK cache is enabled, IK starts from the
+        cached solution for the nearest pose that was also found from
+        the current joint positions, which usually converges much faster
+        than starting from the current joint positions themselves. If it
+        fails to converge, IK is retried from the current joint
+        positions.
+        """
+        if not validate or self._ik_cache is None:
+            return pybullet_inverse_kinematics(
+                self.robot_id,
+                self.end_effector_id,
+                end_effector_pose.position,
+                end_effector_pose.orientation,
+                self.arm_joints,
+                physics_client_id=self.physics_client_id,
+                validate=validate,
+            )
+        current_joint_positions = self.get_joints()
+        seed = self._ik_cache.get_seed(end_effector_pose,
+                                       current_joint_positions)
+        joint_positions: Optional[JointPositions] = None
+        if seed is not None:
+            try:
+                joint_positions = pybullet_inverse_kinematics(
+                    self.robot_id,
+                    self.end_effector_id,
+                    end_effector_pose.position,
+                    end_effector_pose.orientation,
+                    self.arm_joints,
+                    physics_client_id=self.physics_client_id,
+                    validate=True,
+                    initial_joint_positions=seed,
+                )
+            except InverseKinematicsError:
+                pass
+        if joint_positions is None:
+            joint_positions = pybullet_inverse_kinematics(
+                self.robot_id,
+                self.end_effector_id,
+                end_effector_pose.position,
+                end_effector_pose.orientation,
+                self.arm_joints,
+                physics_client_id=self.physics_client_id,
+                validate=True,
+            )
+        self._ik_cache.add(end_effector_pose, current_joint_positions,
+                           joint_positions)
+        return joint_positions
+
     def inverse_kinematics(self,
                            end_effector_pose: Pose,
                            validate: bool,
@@ -447,15 +528,8 @@ class SingleArmPyBulletRobot(abc.ABC):
                     raise InverseKinematicsError(e)
 
         else:
-            joint_positions = pybullet_inverse_kinematics(
-                self.robot_id,
-                self.end_effector_id,
-                end_effector_pose.position,
-                end_effector_pose.orientation,
-                self.arm_joints,
-                physics_client_id=self.physics_client_id,
-                validate=validate,
-            )
+            joint_positions = self._pybullet_inverse_kinematics(
+                end_effector_pose, validate)
 
         if set_joints:
             self.set_joints(joint_positions)
@@ -2,7 +2,7 @@
 
 import abc
 from pathlib import Path
-from typing import List, Set
+from typing import List, Sequence, Set, Tuple
 
 import numpy as np
 
@@ -37,6 +37,21 @@ class BaseRefinementEstimator(abc.ABC):
         """Return an estimated cost for a proposed high-level skeleton."""
         raise NotImplementedError("Override me!")
 
+    def get_costs(
+        self, initial_task: Task,
+        skeletons: Sequence[Tuple[List[_GroundNSRT], List[Set[GroundAtom]]]]
+    ) -> List[float]:
+        """Return estimated costs for several proposed high-level skeletons,
+        each given as a (skeleton, atoms_sequence) pair.
+
+        Estimators that can score skeletons jointly should override
+        this.
+        """
+        return [
+            self.get_cost(initial_task, skeleton, atoms_sequence)
+            for skeleton, atoms_sequence in skeletons
+        ]
+
     def train(self, data: List) -> None:
         """Train the estimator on given training data.
 
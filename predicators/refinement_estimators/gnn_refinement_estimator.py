@@ -6,8 +6,10 @@ over individual actions in the skeleton."""
 import functools
 import logging
 from collections import defaultdict
+from itertools import islice
 from pathlib import Path
-from typing import Any, DefaultDict, Dict, List, Optional, Set, Tuple
+from typing import Any, DefaultDict, Dict, FrozenSet, List, Optional, \
+    Sequence, Set, Tuple
 
 import dill as pkl
 import numpy as np
@@ -17,14 +19,22 @@ from torch.utils.data import DataLoader
 from predicators import utils
 from predicators.gnn.gnn import EncodeProcessDecode, setup_graph_net
 from predicators.gnn.gnn_utils import GraphDictDataset, compute_normalizers, \
-    get_graph_batch_collate_with_device, get_single_model_prediction, \
-    normalize_graph, train_model
+    get_batch_model_predictions, get_graph_batch_collate_with_device, \
+    get_single_model_prediction, normalize_graph, train_model
 from predicators.ground_truth_models import get_gt_nsrts, get_gt_options
 from predicators.refinement_estimators import BaseRefinementEstimator
 from predicators.settings import CFG
-from predicators.structs import NSRT, GroundAtom, NDArray, Predicate, \
+from predicators.structs import NSRT, GroundAtom, NDArray, Object, Predicate, \
     RefinementDatapoint, State, Task, _GroundNSRT
 
+# The parts of an input graph that only depend on the initial state and goal:
+# object to node index, node features, goal edge features, and goal globals.
+_StaticGraph = Tuple[Dict[Object, int], NDArray[np.float64],
+                     Dict[Tuple[int, int],
+                          NDArray[np.float64]], NDArray[np.int64]]
+# The objects, their features in the initial state, and the goal.
+_StaticGraphKey = Tuple[Tuple[Object, ...], bytes, FrozenSet[GroundAtom]]
+
 
 class GNNRefinementEstimator(BaseRefinementEstimator):
     """A refinement cost estimator that uses a GNN to predict refinement cost
@@ -41,6 +51,8 @@ class GNNRefinementEstimator(BaseRefinementEstimator):
         self._nullary_predicates: List[Predicate] = []
         self._input_normalizers: Dict = {}
         self._target_normalizers: Dict = {}
+        self._static_graph_cache: Optional[Tuple[_StaticGraphKey,
+                                                 _StaticGraph]] = None
         self._mse_loss = torch.nn.MSELoss()
         self._device = torch.device("cuda:0" if CFG.use_torch_gpu
                                     and torch.cuda.is_available() else "cpu")
@@ -56,28 +68,47 @@ class GNNRefinementEstimator(BaseRefinementEstimator):
 
     def get_cost(self, initial_task: Task, skeleton: List[_GroundNSRT],
                  atoms_sequence: List[Set[GroundAtom]]) -> float:
+        return self.get_costs(initial_task, [(skeleton, atoms_sequence)])[0]
+
+    def get_costs(
+        self, initial_task: Task,
+        skeletons: Sequence[Tuple[List[_GroundNSRT], List[Set[GroundAtom]]]]
+    ) -> List[float]:
         assert self._gnn is not None, "Need to train"
-        cost = 0
         state, goal = initial_task.init, initial_task.goal
-        # Run each step of the skeleton through the GNN model to estimate cost
-        for i, action in enumerate(skeleton):
-            atoms = atoms_sequence[i]
-            in_graph = self._graphify_single_input(state, atoms, goal, action)
-            if CFG.gnn_do_normalization:
-                in_graph = normalize_graph(in_graph, self._input_normalizers)
-            out_graph = get_single_model_prediction(self._gnn,
-                                                    in_graph,
-                                                    device=self._device)
-            if CFG.gnn_do_normalization:
-                out_graph = normalize_graph(out_graph,
-                                            self._target_normalizers,
-                                            invert=True)
-            refinement_time, low_level_count = out_graph["globals"]
-            cost += refinement_time
-            if CFG.refinement_data_include_execution_cost:
-                cost += (low_level_count *
-                         CFG.refinement_data_low_level_execution_cost)
-        return cost
+        # Graphify each step of each skeleton, then run all of the graphs
+        # through the GNN model together to estimate the costs.
+        in_graphs = []
+        for skeleton, atoms_sequence in skeletons:
+            for i, action in enumerate(skeleton):
+                atoms = atoms_sequence[i]
+                in_graph = self._graphify_single_input(state, atoms, goal,
+                                                       action)
+                if CFG.gnn_do_normalization:
+                    in_graph = normalize_graph(in_graph,
+                                               self._input_normalizers)
+                in_graphs.append(in_graph)
+        out_graphs = []
+        if in_graphs:
+            out_graphs = get_batch_model_predictions(self._gnn,
+                                                     in_graphs,
+                                                     device=self._device)
+        costs: List[float] = []
+        out_graph_iter = iter(out_graphs)
+        for skeleton, _ in skeletons:
+            cost = 0.0
+            for out_graph in islice(out_graph_iter, len(skeleton)):
+                if CFG.gnn_do_normalization:
+                    out_graph = normalize_graph(out_graph,
+                                                self._target_normalizers,
+                                                invert=True)
+                refinement_time, low_level_count = out_graph["globals"]
+                cost += refinement_time
+                if CFG.refinement_data_include_execution_cost:
+                    cost += (low_level_count *
+                             CFG.refinement_data_low_level_execution_cost)
+            costs.append(cost)
+        return costs
 
     def train(self, data: List[RefinementDatapoint]) -> None:
         """Split up each RefinementDatapoint into distinct training data points
@@ -177,33 +208,24 @@ class GNNRefinementEstimator(BaseRefinementEstimator):
                                goal: Set[GroundAtom],
                                action: _GroundNSRT) -> Dict:
         """Convert (initial state, atoms, goal, action) to graph."""
-        all_objects = list(state)
-        object_to_node = {obj: i for i, obj in enumerate(all_objects)}
-        num_objects = len(all_objects)
-        num_node_features = len(self._node_feature_to_index)
+        object_to_node, static_node_features, goal_edge_features, \
+            goal_globals = self._graphify_static_input(state, goal)
         num_edge_features = max(len(self._edge_feature_to_index), 1)
 
-        G = functools.partial(utils.wrap_predicate, prefix="GOAL-")
         R = functools.partial(utils.wrap_predicate, prefix="REV-")
 
-        # Add 1 node per object and create node features array
+        # Add 1 node per object, starting from the node features for the
+        # state and goal
         graph: Dict[str, NDArray[np.float64]] = {
-            "n_node": np.reshape(num_objects, [1]).astype(np.int64)
+            "n_node": np.reshape(len(object_to_node), [1]).astype(np.int64)
         }
-        node_features = np.zeros((num_objects, num_node_features))
-        # Handle each object's state features
-        for obj in state:
-            obj_index = object_to_node[obj]
-            for feat, val in zip(obj.type.feature_names, state[obj]):
-                feat_index = self._node_feature_to_index[f"feat_{feat}"]
-                node_features[obj_index, feat_index] = val
+        node_features = static_node_features.copy()
 
         # Initialize feature vectors for nullary/binary predicates
         edge_features_dict: DefaultDict[
             Tuple[int, int],
             np.ndarray] = defaultdict(lambda: np.zeros(num_edge_features))
         atoms_globals = np.zeros(len(self._nullary_predicates), dtype=np.int64)
-        goal_globals = np.zeros(len(self._nullary_predicates), dtype=np.int64)
 
         # Handle atoms
         for atom in atoms:
@@ -223,23 +245,9 @@ class GNNRefinementEstimator(BaseRefinementEstimator):
                 rev_index = self._edge_feature_to_index[R(atom.predicate)]
                 edge_features_dict[(obj1_index, obj0_index)][rev_index] = 1
 
-        # Handle goal atoms
-        for atom in goal:
-            arity = atom.predicate.arity
-            if arity == 0:
-                goal_globals[self._nullary_predicates.index(
-                    atom.predicate)] = 1
-                continue
-            obj0_index = object_to_node[atom.objects[0]]
-            if arity == 1:
-                atom_index = self._node_feature_to_index[G(atom.predicate)]
-                node_features[obj0_index, atom_index] = 1
-            elif arity == 2:
-                obj1_index = object_to_node[atom.objects[1]]
-                atom_index = self._edge_feature_to_index[G(atom.predicate)]
-                edge_features_dict[(obj0_index, obj1_index)][atom_index] = 1
-                rev_index = self._edge_feature_to_index[G(R(atom.predicate))]
-                edge_features_dict[(obj1_index, obj0_index)][rev_index] = 1
+        # Add goal edge features, which never overlap with the atom ones
+        for edge_key, goal_edge in goal_edge_features.items():
+            edge_features_dict[edge_key] += goal_edge
 
         # Handle action globals
         action_globals = np.zeros(len(self._nsrts), dtype=np.int64)
@@ -265,6 +273,66 @@ class GNNRefinementEstimator(BaseRefinementEstimator):
 
         return graph
 
+    def _graphify_static_input(self, state: State,
+                               goal: Set[GroundAtom]) -> _StaticGraph:
+        """Convert the parts of the graph that only depend on the initial state
+        and goal, which are shared by every step of every skeleton for a task.
+
+        The result for the most recent (state, goal) is cached, keyed on
+        their contents, since the states and goals of tasks are often
+        copied, e.g., when tasks are recreated or sent to other processes.
+        """
+        all_objects = list(state)
+        key = (tuple(all_objects), state.vec(all_objects).tobytes(),
+               frozenset(goal))
+        if self._static_graph_cache is not None:
+            cached_key, static_graph = self._static_graph_cache
+            if cached_key == key:
+                return static_graph
+
+        object_to_node = {obj: i for i, obj in enumerate(all_objects)}
+        num_objects = len(all_objects)
+        num_node_features = len(self._node_feature_to_index)
+        num_edge_features = max(len(self._edge_feature_to_index), 1)
+
+        G = functools.partial(utils.wrap_predicate, prefix="GOAL-")
+        R = functools.partial(utils.wrap_predicate, prefix="REV-")
+
+        node_features = np.zeros((num_objects, num_node_features))
+        # Handle each object's state features
+        for obj in state:
+            obj_index = object_to_node[obj]
+            for feat, val in zip(obj.type.feature_names, state[obj]):
+                feat_index = self._node_feature_to_index[f"feat_{feat}"]
+                node_features[obj_index, feat_index] = val
+
+        # Handle goal atoms
+        goal_edge_features: DefaultDict[
+            Tuple[int, int],
+            np.ndarray] = defaultdict(lambda: np.zeros(num_edge_features))
+        goal_globals = np.zeros(len(self._nullary_predicates), dtype=np.int64)
+        for atom in goal:
+            arity = atom.predicate.arity
+            if arity == 0:
+                goal_globals[self._nullary_predicates.index(
+                    atom.predicate)] = 1
+                continue
+            obj0_index = object_to_node[atom.objects[0]]
+            if arity == 1:
+                atom_index = self._node_feature_to_index[G(atom.predicate)]
+                node_features[obj0_index, atom_index] = 1
+            elif arity == 2:
+                obj1_index = object_to_node[atom.objects[1]]
+                atom_index = self._edge_feature_to_index[G(atom.predicate)]
+                goal_edge_features[(obj0_index, obj1_index)][atom_index] = 1
+                rev_index = self._edge_feature_to_index[G(R(atom.predicate))]
+                goal_edge_features[(obj1_index, obj0_index)][rev_index] = 1
+
+        static_graph = (object_to_node, node_features,
+                        dict(goal_edge_features), goal_globals)
+        self._static_graph_cache = (key, static_graph)
+        return static_graph
+
     @staticmethod
     def _graphify_single_target(refinement_time: float,
                                 low_level_count: int) -> Dict:
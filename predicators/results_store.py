@@ -0,0 +1,257 @@
+"""A queryable SQLite store for the test results of experiments.
+
+Each call to main.py appends one row per (config, online learning cycle)
+to the runs table. The row has a column for every configuration field
+and every scalar metric. Per-task metrics, i.e., metrics whose names
+start with "PER_TASK_task<idx>_", are stored in a separate long table
+with one row per (run, task, metric).
+
+Unlike the pickled results in CFG.results_dir, the store can be queried
+for just the columns and runs that an analysis needs, and aggregated
+over seeds without loading every run into memory.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, \
+    Tuple
+
+import numpy as np
+
+from predicators.structs import Metrics
+
+# Columns of the runs table that are not configuration fields or metrics.
+_RUN_ID = "run_id"
+_CONFIG_PATH_STR = "config_path_str"
+_CYCLE = "cycle"
+_GIT_COMMIT_HASH = "git_commit_hash"
+_PER_TASK_KEY_REGEX = re.compile(r"PER_TASK_task(\d+)_(.+)")
+
+
+class ResultsStore:
+    """A SQLite database of experiment results.
+
+    Several processes can append to the same store, e.g., when running
+    many experiments locally, since every write is its own transaction.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 60.0) -> None:
+        self._db_path = db_path
+        self._conn = sqlite3.connect(db_path, timeout=timeout)
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS runs ({_RUN_ID} INTEGER PRIMARY "
+                f"KEY AUTOINCREMENT, {_CONFIG_PATH_STR} TEXT NOT NULL, "
+                f"{_CYCLE} INTEGER, {_GIT_COMMIT_HASH} TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS per_task_metrics (run_id INTEGER "
+                "NOT NULL, task_idx INTEGER NOT NULL, metric TEXT NOT NULL, "
+                "value REAL)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS per_task_metrics_run_id ON "
+                "per_task_metrics (run_id, metric)")
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        self._conn.close()
+
+    def get_columns(self) -> List[str]:
+        """The names of all columns in the runs table."""
+        rows = self._conn.execute("PRAGMA table_info(runs)").fetchall()
+        return [row[1] for row in rows]
+
+    def add_run(self, config_path_str: str,
+                online_learning_cycle: Optional[int], config: Mapping[str,
+                                                                      Any],
+                results: Metrics, git_commit_hash: str) -> None:
+        """Add the results of one run, replacing any previous results with the
+        same config_path_str and online_learning_cycle.
+
+        Configuration values that are not numbers, strings, or None are
+        stored as strings.
+        """
+        row: Dict[str, Any] = {}
+        per_task_rows: List[Tuple[int, str, float]] = []
+        for key, value in config.items():
+            row[key] = _to_sql_value(value)
+        for key, value in results.items():
+            match = _PER_TASK_KEY_REGEX.fullmatch(key)
+            if match is not None:
+                task_idx, metric = match.groups()
+                per_task_rows.append((int(task_idx), metric, float(value)))
+                continue
+            assert key not in row, f"Metric {key} is also a config field."
+            row[key] = _to_sql_value(value)
+        assert not {_RUN_ID, _CONFIG_PATH_STR, _CYCLE, _GIT_COMMIT_HASH} & \
+            set(row)
+        row[_CONFIG_PATH_STR] = config_path_str
+        row[_CYCLE] = online_learning_cycle
+        row[_GIT_COMMIT_HASH] = git_commit_hash
+        with self._conn:
+            # Lock the database for writing up front, so that columns added by
+            # other processes are seen before adding new ones.
+            self._conn.execute("BEGIN IMMEDIATE")
+            existing_columns = set(self.get_columns())
+            for key in row:
+                if key not in existing_columns:
+                    self._conn.execute(
+                        f"ALTER TABLE runs ADD COLUMN {_quote(key)}")
+            self._conn.execute(
+                "DELETE FROM per_task_metrics WHERE run_id IN (SELECT "
+                f"{_RUN_ID} FROM runs WHERE {_CONFIG_PATH_STR} = ? AND "
+                f"{_CYCLE} IS ?)", (config_path_str, online_learning_cycle))
+            self._conn.execute(
+                f"DELETE FROM runs WHERE {_CONFIG_PATH_STR} = ? AND "
+                f"{_CYCLE} IS ?", (config_path_str, online_learning_cycle))
+            columns = ", ".join(_quote(key) for key in row)
+            placeholders = ", ".join("?" for _ in row)
+            cursor = self._conn.execute(
+                f"INSERT INTO runs ({columns}) VALUES ({placeholders})",
+                list(row.values()))
+            run_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO per_task_metrics VALUES (?, ?, ?, ?)",
+                [(run_id, ) + r for r in per_task_rows])
+
+    def iter_runs(self,
+                  columns: Optional[Sequence[str]] = None,
+                  filters: Optional[Mapping[str, Any]] = None,
+                  batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Iterate over the runs that match the filters, as dicts from the
+        given columns (or all columns if None) to values.
+
+        The filters map columns to the values that they must equal.
+        Columns that are not in the store, e.g., metrics that no run
+        has logged, have None values.
+        """
+        existing_columns = self.get_columns()
+        if columns is None:
+            columns = existing_columns
+        selected = [c for c in columns if c in existing_columns]
+        where, params = _create_where_clause(filters, existing_columns)
+        select = ", ".join(_quote(c) for c in selected) or _RUN_ID
+        cursor = self._conn.execute(
+            f"SELECT {select} FROM runs{where} ORDER BY {_RUN_ID}", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                run = dict.fromkeys(columns)
+                run.update(zip(selected, row))
+                yield run
+
+    def iter_per_task_metrics(
+            self,
+            columns: Sequence[str] = (),
+            metric: Optional[str] = None,
+            filters: Optional[Mapping[str, Any]] = None,
+            batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Iterate over the per-task metrics of the runs that match the
+        filters, optionally only for one metric.
+
+        Each dict has the keys "task_idx", "metric", and "value", and
+        the given columns of the run.
+        """
+        existing_columns = self.get_columns()
+        selected = [c for c in columns if c in existing_columns]
+        where, params = _create_where_clause(filters,
+                                             existing_columns,
+                                             table="r")
+        if metric is not None:
+            where += " AND p.metric = ?" if where else " WHERE p.metric = ?"
+            params.append(metric)
+        select = ", ".join([f"r.{_quote(c)}" for c in selected] +
+                           ["p.task_idx", "p.metric", "p.value"])
+        cursor = self._conn.execute(
+            f"SELECT {select} FROM per_task_metrics p JOIN runs r ON "
+            f"p.run_id = r.{_RUN_ID}{where} ORDER BY p.run_id, p.task_idx",
+            params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                entry = dict.fromkeys(columns)
+                entry.update(zip(selected, row))
+                entry["task_idx"], entry["metric"], entry["value"] = row[-3:]
+                yield entry
+
+    def aggregate(
+        self,
+        group_by: Sequence[str],
+        value_columns: Sequence[str],
+        filters: Optional[Mapping[str, Any]] = None
+    ) -> List[Tuple[Tuple[Any, ...], int, Dict[str, Tuple[float, float]]]]:
+        """Aggregate the runs that match the filters, grouped by the given
+        columns, inside the database.
+
+        Returns a list of (group values, number of runs, column to
+        (mean, population standard deviation)) tuples, one per group.
+        Infinite and missing values are ignored, so a column without
+        finite values has a nan mean and standard deviation.
+        """
+        existing_columns = self.get_columns()
+        assert all(c in existing_columns for c in group_by)
+        selected = [c for c in value_columns if c in existing_columns]
+        where, params = _create_where_clause(filters, existing_columns)
+        aggregates = []
+        for column in selected:
+            # Infinite values are treated as missing.
+            value = f"NULLIF(NULLIF({_quote(column)}, 9e999), -9e999)"
+            aggregates.append(f"AVG({value}), AVG({value} * {value})")
+        groups = ", ".join(_quote(c) for c in group_by)
+        select = ", ".join([groups, "COUNT(*)"] + aggregates)
+        rows = self._conn.execute(
+            f"SELECT {select} FROM runs{where} GROUP BY {groups} "
+            f"ORDER BY {groups}", params).fetchall()
+        results = []
+        for row in rows:
+            group = tuple(row[:len(group_by)])
+            count = row[len(group_by)]
+            stats = {}
+            for column in value_columns:
+                mean, mean_sq = np.nan, np.nan
+                if column in selected:
+                    i = len(group_by) + 1 + 2 * selected.index(column)
+                    if row[i] is not None:
+                        mean, mean_sq = row[i], row[i + 1]
+                # Clip to avoid negative variances due to rounding.
+                std = np.sqrt(max(mean_sq - mean**2, 0.0))
+                stats[column] = (mean, std)
+            results.append((group, count, stats))
+        return results
+
+
+def _quote(column: str) -> str:
+    """Quote a column name for use in SQL."""
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _to_sql_value(value: Any) -> Any:
+    """Convert a configuration value or metric to a value for SQLite."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _create_where_clause(filters: Optional[Mapping[str, Any]],
+                         existing_columns: Sequence[str],
+                         table: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """Create a WHERE clause that checks that each column equals a value."""
+    if not filters:
+        return "", []
+    conditions = []
+    params = []
+    for column, value in filters.items():
+        assert column in existing_columns, f"Unknown column: {column}"
+        column = _quote(column)
+        if table is not None:
+            column = f"{table}.{column}"
+        conditions.append(f"{column} IS ?")
+        params.append(_to_sql_value(value))
+    return " WHERE " + " AND ".join(conditions), params
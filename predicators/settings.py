@@ -34,6 +34,9 @@ class GlobalSettings:
     test_env_seed_offset = 10000
     # Optionally define test tasks in JSON format
     test_task_json_dir = None
+    # If greater than 1, solve and execute the test tasks in a pool of this
+    # many worker processes, each with its own environment and approach.
+    num_test_workers = 1
     # The method to use for segmentation. By default, segment using options.
     # If you are learning options, you should change this via the command line.
     segmenter = "option_changes"
@@ -46,6 +49,10 @@ class GlobalSettings:
     # your call to utils.reset_config().
     render_state_dpi = 150
     approach_wrapper = None
+    # If True, the initial states of env tasks that are plain States are
+    # converted to ArrayStates, which are faster to read, compare, and copy.
+    # Their features are stored as float32, and state[obj] is read-only.
+    use_array_states = False
 
     # cover_multistep_options env parameters
     cover_multistep_action_limits = [-np.inf, np.inf]
@@ -137,12 +144,35 @@ class GlobalSettings:
     pybullet_sim_steps_per_action = 20
     pybullet_max_ik_iters = 100
     pybullet_ik_tol = 1e-3
+    # Warm start validated PyBullet IK (for robots without IKFast) from the
+    # solution for the nearest previously seen end effector pose. Poses are
+    # quantized to the resolution. If the directory is set, solutions are
+    # saved there and shared between runs.
+    pybullet_ik_use_cache = False
+    pybullet_ik_cache_resolution = 1e-3
+    pybullet_ik_cache_dir = None
     pybullet_robot = "fetch"
     pybullet_birrt_num_attempts = 10
     pybullet_birrt_num_iters = 100
     pybullet_birrt_smooth_amt = 50
     pybullet_birrt_extend_num_interp = 10
+    # Collision checking results are reused for joint positions that round
+    # to the same multiple of this resolution (0 means exact matches only).
+    pybullet_birrt_collision_cache_resolution = 0.0
+    # The maximum number of collision checking results to keep; the least
+    # recently used ones are discarded first.
+    pybullet_birrt_collision_cache_max_size = 100000
+    # If positive, distances to obstacles are computed up to this margin,
+    # and points along an edge that are too close in joint space to a
+    # collision-free point to have closed the gap are not checked. The
+    # max reach is an upper bound on how far any point on the robot or held
+    # object moves per unit of (L1) joint motion.
+    pybullet_birrt_collision_margin = 0.0
+    pybullet_birrt_collision_max_reach = 1.5
     pybullet_control_mode = "position"
+    # The maximum number of PyBullet world snapshots to keep for quickly
+    # returning to previously simulated states (0 disables snapshots).
+    pybullet_max_snapshots = 0
     pybullet_max_vel_norm = 0.05
     # env -> robot -> quaternion
     pybullet_robot_ee_orns = defaultdict(
@@ -355,6 +385,12 @@ class GlobalSettings:
     # option model parameters
     option_model_terminate_on_repeat = True
     option_model_use_gui = False
+    # Used by the "cached_" option models (e.g., "cached_oracle"). State
+    # features are rounded to multiples of this value before hashing, so states
+    # that differ by less than it may share a cached prediction.
+    option_model_cache_quantization = 1e-8
+    # The approximate memory budget, in bytes, for cached next states.
+    option_model_cache_max_bytes = 100 * 1024 * 1024
 
     # parameters for abstract GNN approach
     gnn_num_message_passing = 3
@@ -409,10 +445,30 @@ class GlobalSettings:
     # SeSamE parameters
     sesame_task_planner = "astar"  # "astar" or "fdopt" or "fdsat"
     sesame_task_planning_heuristic = "lmcut"
+    # The maximum number of heuristic values that each of the native
+    # relaxation heuristics ("native_hadd", "native_hmax", "native_hff", and
+    # "native_lmcut") caches. Each heuristic is created for a single task, so
+    # its cache lives only as long as the task does.
+    sesame_heuristic_cache_size = 100000
     sesame_allow_noops = True  # recommended to keep this False if using replays
     sesame_check_expected_atoms = True
     sesame_use_necessary_atoms = True
     sesame_use_visited_state_set = False
+    # If True, the A* skeleton search represents abstract states as integer
+    # bitsets and precompiles the ground NSRTs into bit masks. This is much
+    # faster when there are many ground NSRTs; the skeletons are identical.
+    sesame_use_bitset_states = False
+    # If greater than 1, SeSamE with A* pulls this many skeletons at a time
+    # and refines them concurrently, one skeleton per worker process. The
+    # first refinement to succeed is returned, so the plan found may differ
+    # from the one found when refining sequentially.
+    sesame_num_refinement_workers = 1
+    # If greater than 1, low-level search asks each NSRT sampler for this many
+    # candidate parameters at once, checks them all for initiability, and
+    # simulates them from most to least promising. Learned samplers draw and
+    # score the whole batch in one vectorized pass; other samplers are called
+    # once per candidate.
+    sesame_sampler_batch_size = 1
     # The algorithm used for grounding the planning problem. Choices are
     # "naive" or "fd_translator". The former does a type-aware cross product
     # of operators and objects to obtain ground operators, while the latter
@@ -421,7 +477,12 @@ class GlobalSettings:
     # is a bottleneck in your environment, but will not work when operators
     # with no effects need to be part of the ground planning problem, like the
     # OpenLid() operator in painting. So, we'll keep the former as the
-    # default.
+    # default. A third choice, "static_pruning", joins the static
+    # preconditions of each operator (those whose predicates are not in any
+    # operator's effects) with the initial atoms to skip groundings that can
+    # never be applied, and caches the groundings across tasks with the same
+    # objects and static atoms. After filtering out unreachable operators, the
+    # ground operators are the same as with "naive".
     sesame_grounder = "naive"
     sesame_check_static_object_changes = False
     # Warning: making this tolerance any lower breaks pybullet_blocks.
@@ -432,10 +493,21 @@ class GlobalSettings:
     # observed states match (at the abstract level) the expected states, and
     # replan if not. But for now, we just execute each step without checking.
     bilevel_plan_without_sim = False
+    # If True, when the execution monitor triggers replanning, CogMan asks the
+    # approach to replan rather than solve from scratch. Bilevel planning
+    # approaches then reuse the ground NSRTs and heuristic of the task, and
+    # first try to repair the previous skeleton: a suffix of it is reconnected
+    # to the current abstract state by inserting at most
+    # sesame_repair_max_connection_length ground NSRTs.
+    cogman_incremental_replanning = False
+    sesame_repair_max_connection_length = 1
 
     # evaluation parameters
     log_dir = "logs"
     results_dir = "results"
+    # If not None, test results are also appended to a SQLite ResultsStore at
+    # this path, which the analysis scripts can query instead of results_dir.
+    results_store_path = None
     eval_trajectories_dir = "eval_trajectories"
     approach_dir = "saved_approaches"
     data_dir = "saved_datasets"
@@ -455,6 +527,12 @@ class GlobalSettings:
     offline_data_num_replays = 500
     # Default to bilevel_plan_without_sim.
     offline_data_bilevel_plan_without_sim = None
+    # If greater than 1, generate oracle demonstrations in a pool of this many
+    # worker processes, each with its own environment and oracle approach.
+    offline_data_num_workers = 1
+    # If True, save and load demonstrations with a chunked, memory-mapped
+    # TrajectoryStore instead of one pickled Dataset per number of train tasks.
+    offline_data_use_trajectory_store = False
 
     # teacher dataset parameters
     # Number of positive examples and negative examples per predicate.
@@ -494,6 +572,9 @@ class GlobalSettings:
     mlp_regressor_gradient_clip_value = 5
     mlp_classifier_hid_sizes = [32, 32]
     mlp_classifier_balance_data = True
+    # If True, ensembles of MLP classifiers stack the weights of their
+    # members, so that all members are trained and queried together.
+    mlp_classifier_ensemble_stacked = False
     cnn_regressor_max_itr = 500
     cnn_regressor_conv_channel_nums = [3, 3]
     cnn_regressor_conv_kernel_sizes = [5, 3]
@@ -515,6 +596,12 @@ class GlobalSettings:
 
     # ml training parameters
     pytorch_train_print_every = 1000
+    # If not None, MLP models are trained on shuffled minibatches of this
+    # size rather than on all of the data at once.
+    pytorch_train_batch_size = None
+    # Fraction of the data held out to select the best weights and to stop
+    # early. If 0, the loss on the training batches is used instead.
+    pytorch_train_validation_frac = 0.0
 
     # sampler learning parameters
     sampler_learner = "neural"  # "neural" or "random" or "oracle"
@@ -644,6 +731,9 @@ class GlobalSettings:
     grammar_search_expected_nodes_backtracking_cost = 1e3
     grammar_search_expected_nodes_allow_noops = True
     grammar_search_classifier_pretty_str_names = ["?x", "?y", "?z"]
+    # If True, the truth values of candidate predicates on the dataset are
+    # cached on disk under CFG.data_dir and reused across runs.
+    grammar_search_use_atom_cache = False
 
     # grammar search clustering algorithm parameters
     grammar_search_clustering_gmm_num_components = 10
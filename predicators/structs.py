@@ -7,7 +7,8 @@ import itertools
 from dataclasses import dataclass, field
 from functools import cached_property, lru_cache
 from typing import Any, Callable, Collection, DefaultDict, Dict, Iterator, \
-    List, Optional, Sequence, Set, Tuple, TypeVar, Union, cast
+    List, Mapping, MutableMapping, Optional, Sequence, Set, Tuple, TypeVar, \
+    Union, cast
 
 import numpy as np
 from gym.spaces import Box
@@ -29,6 +30,22 @@ class Type:
         """Dimensionality of the feature vector of this object type."""
         return len(self.feature_names)
 
+    @cached_property
+    def _feature_name_to_idx(self) -> Dict[str, int]:
+        return {name: i for i, name in enumerate(self.feature_names)}
+
+    def feature_index(self, feature_name: str) -> int:
+        """Index of the given feature in this type's feature vectors.
+
+        Raises a ValueError if there is no such feature, like
+        feature_names.index() would.
+        """
+        try:
+            return self._feature_name_to_idx[feature_name]
+        except KeyError:
+            raise ValueError(f"{feature_name} is not a feature of type "
+                             f"{self.name}") from None
+
     def __call__(self, name: str) -> _TypedEntity:
         """Convenience method for generating _TypedEntities."""
         if name.startswith("?"):
@@ -124,12 +141,12 @@ class State:
 
     def get(self, obj: Object, feature_name: str) -> Any:
         """Look up an object feature by name."""
-        idx = obj.type.feature_names.index(feature_name)
+        idx = obj.type.feature_index(feature_name)
         return self.data[obj][idx]
 
     def set(self, obj: Object, feature_name: str, feature_val: Any) -> None:
         """Set the value of an object feature by name."""
-        idx = obj.type.feature_names.index(feature_name)
+        idx = obj.type.feature_index(feature_name)
         self.data[obj][idx] = feature_val
 
     def get_objects(self, object_type: Type) -> List[Object]:
@@ -147,14 +164,14 @@ class State:
         return np.hstack(feats)
 
     def copy(self) -> State:
-        """Return a copy of this state.
+        """Return a copy of this state, of the same class.
 
         The simulator state is assumed to be immutable.
         """
         new_data = {}
         for obj in self:
             new_data[obj] = self._copy_state_value(self.data[obj])
-        return State(new_data, simulator_state=self.simulator_state)
+        return self.__class__(new_data, simulator_state=self.simulator_state)
 
     def _copy_state_value(self, val: Any) -> Any:
         if val is None or isinstance(val, (float, bool, int, str)):
@@ -203,6 +220,176 @@ class State:
         return prefix + "\n\n".join(table_strs) + suffix
 
 
+class ArrayState(State):
+    """A State whose features are stored in one contiguous float32 array.
+
+    This is an alternative to State for states whose features are all
+    numeric. The objects are sorted once, and each object's features
+    occupy a fixed slice of the array, so iterating, looking up features
+    by name, and comparing states do not need to sort or search. Copies
+    share the array until one of them is modified (copy-on-write).
+
+    The data field is a mapping view of the array. Unlike with State,
+    state[obj] and state.data[obj] return read-only views of the
+    object's features, so reading them never copies the array, and the
+    views of a state that is later modified may not reflect the
+    modification. Modify features with set(), or by assigning whole
+    feature vectors to state.data[obj]. Features are stored as float32,
+    even if they were given as float64.
+
+    Subclasses such as utils.PyBulletState can be made array-backed by
+    mixing them in before ArrayState, e.g.
+    class ArrayPyBulletState(PyBulletState, ArrayState).
+    """
+
+    def __init__(self,
+                 data: Mapping[Object, Any],
+                 simulator_state: Optional[Any] = None) -> None:
+        self._objects: List[Object] = []
+        # The slice of the array that holds each object's features.
+        self._slices: Dict[Object, slice] = {}
+        self._values: Array = np.zeros(0, dtype=np.float32)
+        # A read-only view of the array, whose slices are returned by
+        # __getitem__().
+        self._readonly_values: Array = self._values
+        # Whether the array may be shared with copies of this state, in
+        # which case it is copied before it is modified.
+        self._owns_values = True
+        super().__init__(data, simulator_state)  # type: ignore
+
+    def __post_init__(self) -> None:
+        self._pack(self.data)
+        self.data = _ArrayStateData(self)  # type: ignore
+
+    def _pack(self, data: Mapping[Object, Any]) -> None:
+        """Build the array, slices, and sorted objects from a mapping."""
+        self._objects = sorted(data)
+        self._slices = {}
+        num_features = 0
+        for obj in self._objects:
+            self._slices[obj] = slice(num_features,
+                                      num_features + obj.type.dim)
+            num_features += obj.type.dim
+        self._values = np.empty(num_features, dtype=np.float32)
+        for obj in self._objects:
+            feats = np.asarray(data[obj], dtype=np.float32)
+            assert feats.shape == (obj.type.dim, )
+            self._values[self._slices[obj]] = feats
+        self._set_readonly_values()
+        self._owns_values = True
+
+    def _set_readonly_values(self) -> None:
+        self._readonly_values = self._values.view()
+        self._readonly_values.flags.writeable = False
+
+    def _get_writeable_values(self) -> Array:
+        """Copy the array first if it is shared with another state."""
+        if not self._owns_values:
+            self._values = self._values.copy()
+            self._set_readonly_values()
+            self._owns_values = True
+        return self._values
+
+    def get_array(self) -> Array:
+        """Get a read-only view of the array of all features, in which the
+        features of the objects are in the order of __iter__()."""
+        return self._readonly_values
+
+    def __iter__(self) -> Iterator[Object]:
+        """An iterator over the state's objects, in sorted order."""
+        return iter(self._objects)
+
+    def __getitem__(self, key: Object) -> Array:
+        return self._readonly_values[self._slices[key]]
+
+    def get(self, obj: Object, feature_name: str) -> Any:
+        idx = self._slices[obj].start + obj.type.feature_index(feature_name)
+        # Python floats are much faster than float32 scalars in arithmetic.
+        return self._values.item(idx)
+
+    def set(self, obj: Object, feature_name: str, feature_val: Any) -> None:
+        idx = self._slices[obj].start + obj.type.feature_index(feature_name)
+        self._get_writeable_values()[idx] = feature_val
+
+    def vec(self, objects: Sequence[Object]) -> Array:
+        if len(objects) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(
+            [self._values[self._slices[obj]] for obj in objects])
+
+    def copy(self) -> State:
+        """Return a copy of this state, of the same class.
+
+        The copy shares the feature array with this state until either
+        is modified. The simulator state is assumed to be immutable.
+        """
+        self._owns_values = False
+        new_state = self.__class__.__new__(self.__class__)
+        new_state.__dict__.update(self.__dict__)
+        new_state.data = _ArrayStateData(new_state)  # type: ignore
+        return new_state
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The data view refers back to the state, so it is rebuilt after
+        # unpickling instead.
+        state_dict = self.__dict__.copy()
+        del state_dict["data"]
+        return state_dict
+
+    def __setstate__(self, state_dict: Dict[str, Any]) -> None:
+        # States that were pickled together may still share the array.
+        self.__dict__.update(state_dict)
+        self.data = _ArrayStateData(self)  # type: ignore
+
+    def _allclose(self, other: State) -> bool:
+        if isinstance(other, ArrayState) and \
+            self._objects == list(other):
+            return np.allclose(self._values, other.get_array(), atol=1e-3)
+        return super()._allclose(other)
+
+
+class _ArrayStateData(MutableMapping[Object, NDArray[np.float32]]):
+    """The data of an ArrayState, as a mapping from objects to read-only
+    views of their feature vectors.
+
+    Should not be instantiated externally.
+    """
+
+    def __init__(self, state: ArrayState) -> None:
+        self.state = state
+
+    def __getitem__(self, key: Object) -> Array:
+        return self.state[key]
+
+    def __setitem__(self, key: Object, value: Any) -> None:
+        # pylint: disable=protected-access
+        state = self.state
+        if key in state._slices:
+            state._get_writeable_values()[state._slices[key]] = value
+        else:
+            new_data: Dict[Object, Any] = dict(self)
+            new_data[key] = value
+            state._pack(new_data)
+
+    def __delitem__(self, key: Object) -> None:
+        # pylint: disable=protected-access
+        new_data: Dict[Object, Any] = dict(self)
+        del new_data[key]
+        self.state._pack(new_data)
+
+    def __iter__(self) -> Iterator[Object]:
+        return iter(self.state)
+
+    def __len__(self) -> int:
+        return len(self.state._slices)  # pylint: disable=protected-access
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.state._slices  # pylint: disable=protected-access
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
 DefaultState = State({})
 
 
@@ -254,6 +441,31 @@ class Predicate:
             assert obj.is_instance(pred_type)
         return self._classifier(state, objects)
 
+    def holds_batch(self, states: Sequence[State],
+                    choices: Sequence[Sequence[Object]]) -> NDArray[np.bool_]:
+        """Call the classifier on every state for every choice of objects.
+
+        Returns a boolean array of shape (len(states), len(choices)). If
+        the classifier has a classify_batch method (see
+        BatchPredicateClassifier), it is called once. Otherwise, the
+        classifier is called once per state and choice.
+        """
+        for objects in choices:
+            assert len(objects) == self.arity
+            for obj, pred_type in zip(objects, self.types):
+                assert isinstance(obj, Object)
+                assert obj.is_instance(pred_type)
+        classify_batch: Optional[BatchPredicateClassifier] = getattr(
+            self._classifier, "classify_batch", None)
+        if classify_batch is not None:
+            result = np.asarray(classify_batch(states, choices),
+                                dtype=np.bool_)
+        else:
+            result = np.array([[self._classifier(s, o) for o in choices]
+                               for s in states],
+                              dtype=np.bool_)
+        return result.reshape((len(states), len(choices)))
+
     def __str__(self) -> str:
         return self.name
 
@@ -993,6 +1205,36 @@ class _GroundNSRT:
         params = np.clip(params, low, high)
         return self.option.ground(self.option_objs, params)
 
+    def sample_options(self, state: State, goal: Set[GroundAtom],
+                       rng: np.random.Generator,
+                       num_samples: int) -> List[_Option]:
+        """Sample several _Options for this ground NSRT at once.
+
+        If the contained sampler has a sample_batch method (see
+        BatchNSRTSampler), it is called once, and the options are
+        returned in the order that it gives. Otherwise, the sampler is
+        called once per option.
+        """
+        sample_batch: Optional[BatchNSRTSampler] = getattr(
+            self._sampler, "sample_batch", None)
+        if sample_batch is not None:
+            params_batch = sample_batch(state, goal, rng, self.objects,
+                                        num_samples)
+        else:
+            params_batch = np.array([
+                self._sampler(state, goal, rng, self.objects)
+                for _ in range(num_samples)
+            ])
+        assert len(params_batch) == num_samples
+        # Clip the params into the params_space of self.option, for safety.
+        low = self.option.params_space.low
+        high = self.option.params_space.high
+        params_batch = np.clip(params_batch, low, high)
+        return [
+            self.option.ground(self.option_objs, params)
+            for params in params_batch
+        ]
+
     def copy_with(self, **kwargs: Any) -> _GroundNSRT:
         """Create a copy of the ground NSRT, optionally while replacing any of
         the arguments."""
@@ -1813,6 +2055,18 @@ EntToEntSub = Dict[_TypedEntity, _TypedEntity]
 Datastore = List[Tuple[Segment, VarToObjSub]]
 NSRTSampler = Callable[
     [State, Set[GroundAtom], np.random.Generator, Sequence[Object]], Array]
+# An NSRTSampler may optionally declare a batch API by also having a
+# sample_batch method with this signature, which returns a two-dimensional
+# array of num_samples parameters, ordered from most to least promising.
+BatchNSRTSampler = Callable[
+    [State, Set[GroundAtom], np.random.Generator, Sequence[Object], int],
+    Array]
+# Similarly, a predicate's classifier may declare a vectorized API by having a
+# classify_batch method with this signature, which classifies every choice of
+# objects in every state and returns an array of shape
+# (len(states), len(choices)).
+BatchPredicateClassifier = Callable[
+    [Sequence[State], Sequence[Sequence[Object]]], NDArray[np.bool_]]
 Metrics = DefaultDict[str, float]
 LiftedOrGroundAtom = TypeVar("LiftedOrGroundAtom", LiftedAtom, GroundAtom,
                              _Atom)
@@ -6,8 +6,10 @@ import abc
 import contextlib
 import functools
 import gc
+import hashlib
 import heapq as hq
 import importlib
+import inspect
 import io
 import itertools
 import logging
@@ -19,12 +21,12 @@ import sys
 import tempfile
 import time
 from argparse import ArgumentParser
-from collections import defaultdict
-from dataclasses import dataclass, field
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass, field, fields, is_dataclass
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Callable, ClassVar, Collection, Dict, \
-    FrozenSet, Generator, Generic, Hashable, Iterator, List, Optional, \
-    Sequence, Set, Tuple
+    FrozenSet, Generator, Generic, Hashable, Iterable, Iterator, List, \
+    Optional, Sequence, Set, Tuple
 from typing import Type as TypingType
 from typing import TypeVar, Union, cast
 
@@ -43,9 +45,11 @@ import pathos.multiprocessing as mp
 from bosdyn.client import math_helpers
 from gym.spaces import Box
 from matplotlib import patches
+from numpy.typing import NDArray
 from pyperplan.heuristics.heuristic_base import \
     Heuristic as _PyperplanBaseHeuristic
 from pyperplan.planner import HEURISTICS as _PYPERPLAN_HEURISTICS
+from scipy.spatial import KDTree
 from scipy.stats import beta as BetaRV
 
 from predicators.args import create_arg_parser
@@ -1015,9 +1019,9 @@ class PyBulletState(State):
         return State(self.data).allclose(State(other.data))
 
     def copy(self) -> State:
-        state_dict_copy = super().copy().data
-        simulator_state_copy = list(self.joint_positions)
-        return PyBulletState(state_dict_copy, simulator_state_copy)
+        state_copy = super().copy()
+        state_copy.simulator_state = list(self.joint_positions)
+        return state_copy
 
 
 class StateWithCache(State):
@@ -1036,10 +1040,6 @@ class StateWithCache(State):
         # Ignores the simulator state.
         return State(self.data).allclose(State(other.data))
 
-    def copy(self) -> State:
-        state_dict_copy = super().copy().data
-        return StateWithCache(state_dict_copy, self.cache)
-
 
 class LoggingMonitor(abc.ABC):
     """Observes states and actions during environment interaction."""
@@ -1405,11 +1405,16 @@ def create_random_option_policy(
 
 
 def sample_applicable_ground_nsrt(
-        state: State, ground_nsrts: Sequence[_GroundNSRT],
+        state: State, ground_nsrts: Union[Sequence[_GroundNSRT],
+                                          SuccessorGenerator[_GroundNSRT]],
         predicates: Set[Predicate],
         rng: np.random.Generator) -> Optional[_GroundNSRT]:
     """Choose uniformly among the ground NSRTs that are applicable in the
-    state."""
+    state.
+
+    The ground NSRTs may be given as a SuccessorGenerator for
+    efficiency.
+    """
     atoms = abstract(state, predicates)
     applicable_nsrts = sorted(get_applicable_operators(ground_nsrts, atoms))
     if len(applicable_nsrts) == 0:
@@ -1776,7 +1781,8 @@ def run_hill_climbing(
     enforced_depth: int = 0,
     parallelize: bool = False,
     verbose: bool = True,
-    timeout: float = float('inf')
+    timeout: float = float('inf'),
+    batch_heuristic: Optional[Callable[[List[_S]], List[float]]] = None
 ) -> Tuple[List[_S], List[_A], List[float]]:
     """Enforced hill climbing local search.
 
@@ -1787,9 +1793,26 @@ def run_hill_climbing(
     be found. early_termination_heuristic_thresh allows for searching until
     heuristic reaches a specified value.
 
+    If batch_heuristic is given, it is used to compute the heuristics of all
+    the successors at each depth at once, e.g., in parallel. If parallelize
+    is True, the heuristic is computed in a pool of processes that persists
+    for the whole search.
+
     Lower heuristic is better.
     """
     assert enforced_depth >= 0
+    if parallelize and batch_heuristic is None:
+        with mp.Pool(processes=mp.cpu_count()) as pool:
+            return run_hill_climbing(
+                initial_state,
+                check_goal,
+                get_successors,
+                heuristic,
+                early_termination_heuristic_thresh,
+                enforced_depth,
+                verbose=verbose,
+                timeout=timeout,
+                batch_heuristic=lambda states: pool.map(heuristic, states))
     cur_node: _HeuristicSearchNode[_S, _A] = _HeuristicSearchNode(
         initial_state, 0, 0)
     last_heuristic = heuristic(cur_node.state)
@@ -1836,22 +1859,21 @@ def run_hill_climbing(
                         parent=parent,
                         action=action)
                     successors_at_depth.append(child_node)
-                    if parallelize:
-                        continue  # heuristic computation is parallelized later
+                    if batch_heuristic is not None:
+                        continue  # heuristic computation is batched later
                     child_heuristic = heuristic(child_node.state)
                     if child_heuristic < best_heuristic:
                         best_heuristic = child_heuristic
                         best_child_node = child_node
-            if parallelize:
-                # Parallelize the expensive part (heuristic computation).
-                num_cpus = mp.cpu_count()
-                fn = lambda n: (heuristic(n.state), n)
-                with mp.Pool(processes=num_cpus) as p:
-                    for child_heuristic, child_node in p.map(
-                            fn, successors_at_depth):
-                        if child_heuristic < best_heuristic:
-                            best_heuristic = child_heuristic
-                            best_child_node = child_node
+            if batch_heuristic is not None:
+                # Batch the expensive part (heuristic computation).
+                child_heuristics = batch_heuristic(
+                    [n.state for n in successors_at_depth])
+                for child_heuristic, child_node in zip(child_heuristics,
+                                                       successors_at_depth):
+                    if child_heuristic < best_heuristic:
+                        best_heuristic = child_heuristic
+                        best_child_node = child_node
             all_best_heuristics.append(best_heuristic)
             if last_heuristic > best_heuristic:
                 # Some improvement found.
@@ -1960,15 +1982,32 @@ _RRTState = TypeVar("_RRTState")
 
 
 class RRT(Generic[_RRTState]):
-    """Rapidly-exploring random tree."""
+    """Rapidly-exploring random tree.
+
+    If embed_fn is given, distance_fn must increase with the Euclidean
+    distance between the embeddings of its arguments. Each point is then
+    embedded once, and nearest neighbor candidates are found with a
+    KD-tree instead of calling distance_fn on every node in the tree.
+
+    If edge_collision_fn is given, it is called on all of the points
+    along an extension at once, and should return whether any of them is
+    in collision. Otherwise, the points are checked one at a time with
+    collision_fn.
+    """
 
-    def __init__(self, sample_fn: Callable[[_RRTState], _RRTState],
+    def __init__(self,
+                 sample_fn: Callable[[_RRTState], _RRTState],
                  extend_fn: Callable[[_RRTState, _RRTState],
                                      Iterator[_RRTState]],
                  collision_fn: Callable[[_RRTState], bool],
-                 distance_fn: Callable[[_RRTState, _RRTState],
-                                       float], rng: np.random.Generator,
-                 num_attempts: int, num_iters: int, smooth_amt: int):
+                 distance_fn: Callable[[_RRTState, _RRTState], float],
+                 rng: np.random.Generator,
+                 num_attempts: int,
+                 num_iters: int,
+                 smooth_amt: int,
+                 embed_fn: Optional[Callable[[_RRTState], Array]] = None,
+                 edge_collision_fn: Optional[Callable[[List[_RRTState]],
+                                                      bool]] = None):
         self._sample_fn = sample_fn
         self._extend_fn = extend_fn
         self._collision_fn = collision_fn
@@ -1977,6 +2016,8 @@ class RRT(Generic[_RRTState]):
         self._num_attempts = num_attempts
         self._num_iters = num_iters
         self._smooth_amt = smooth_amt
+        self._embed_fn = embed_fn
+        self._edge_collision_fn = edge_collision_fn
 
     def query(self,
               pt1: _RRTState,
@@ -2028,6 +2069,11 @@ class RRT(Generic[_RRTState]):
     def _try_direct_path(self, pt1: _RRTState,
                          pt2: _RRTState) -> Optional[List[_RRTState]]:
         path = [pt1]
+        if self._edge_collision_fn is not None:
+            newpts = list(self._extend_fn(pt1, pt2))
+            if self._edge_collision_fn(newpts):
+                return None
+            return path + newpts
         for newpt in self._extend_fn(pt1, pt2):
             if self._collision_fn(newpt):
                 return None
@@ -2041,33 +2087,56 @@ class RRT(Generic[_RRTState]):
         goal_fn: Optional[Callable[[_RRTState], bool]] = None,
         sample_goal_eps: float = 0.0,
     ) -> Optional[List[_RRTState]]:
-        root = _RRTNode(pt1)
-        nodes = [root]
+        tree = self._create_tree(_RRTNode(pt1))
 
         for _ in range(self._num_iters):
             # Sample the goal with a small probability, otherwise randomly
             # choose a point.
             sample_goal = self._rng.random() < sample_goal_eps
             samp = goal_sampler() if sample_goal else self._sample_fn(pt1)
-            min_key = functools.partial(self._get_pt_dist_to_node, samp)
-            nearest = min(nodes, key=min_key)
-            reached_goal = False
-            for newpt in self._extend_fn(nearest.data, samp):
-                if self._collision_fn(newpt):
-                    break
-                nearest = _RRTNode(newpt, parent=nearest)
-                nodes.append(nearest)
-            else:
-                reached_goal = sample_goal
+            nearest, reached_samp = self._extend_tree(tree, tree.nearest(samp),
+                                                      samp)
+            reached_goal = sample_goal and reached_samp
             # Check goal_fn if defined
             if reached_goal or goal_fn is not None and goal_fn(nearest.data):
                 path = nearest.path_from_root()
                 return [node.data for node in path]
         return None
 
-    def _get_pt_dist_to_node(self, pt: _RRTState,
-                             node: _RRTNode[_RRTState]) -> float:
-        return self._distance_fn(pt, node.data)
+    def _create_tree(self, root: _RRTNode[_RRTState]) -> _RRTTree[_RRTState]:
+        return _RRTTree(root, self._distance_fn, self._embed_fn)
+
+    def _extend_tree(self, tree: _RRTTree[_RRTState],
+                     nearest: _RRTNode[_RRTState],
+                     target: _RRTState) -> Tuple[_RRTNode[_RRTState], bool]:
+        """Extend the tree from the nearest node towards the target, stopping
+        before the first point in collision.
+
+        Returns the last node added (or the nearest node if none were
+        added) and whether the target was reached.
+        """
+        newpts: Iterable[_RRTState] = self._extend_fn(nearest.data, target)
+        collision_free = False
+        if self._edge_collision_fn is not None:
+            # If the whole extension is collision-free, there is no need to
+            # check the points one at a time.
+            newpts = list(newpts)
+            collision_free = not self._edge_collision_fn(newpts)
+        for newpt in newpts:
+            if not collision_free and self._collision_fn(newpt):
+                return nearest, False
+            nearest = _RRTNode(newpt, parent=nearest)
+            tree.add(nearest)
+        return nearest, True
+
+    def _path_has_collision(self, path: List[_RRTState]) -> bool:
+        if self._edge_collision_fn is not None:
+            return self._edge_collision_fn(path)
+        # Check the points in bisection order, since a collision is more
+        # likely to be found far away from the points already checked.
+        return any(
+            self._collision_fn(path[i])
+            for i in get_bisection_order(len(path)))
 
     def _smooth_path(self, path: List[_RRTState]) -> List[_RRTState]:
         assert len(path) > 2
@@ -2080,7 +2149,7 @@ class RRT(Generic[_RRTState]):
                 i, j = j, i
             shortcut = list(self._extend_fn(path[i], path[j]))
             if len(shortcut) < j - i and \
-                    all(not self._collision_fn(pt) for pt in shortcut):
+                    not self._path_has_collision(shortcut):
                 path = path[:i + 1] + shortcut + path[j + 1:]
         return path
 
@@ -2106,28 +2175,16 @@ class BiRRT(RRT[_RRTState]):
         # goal_fn and sample_goal_eps are unused
         pt2 = goal_sampler()
         root1, root2 = _RRTNode(pt1), _RRTNode(pt2)
-        nodes1, nodes2 = [root1], [root2]
+        tree1, tree2 = self._create_tree(root1), self._create_tree(root2)
 
         for _ in range(self._num_iters):
-            if len(nodes1) > len(nodes2):
-                nodes1, nodes2 = nodes2, nodes1
+            if len(tree1) > len(tree2):
+                tree1, tree2 = tree2, tree1
             samp = self._sample_fn(pt1)
-            min_key1 = functools.partial(self._get_pt_dist_to_node, samp)
-            nearest1 = min(nodes1, key=min_key1)
-            for newpt in self._extend_fn(nearest1.data, samp):
-                if self._collision_fn(newpt):
-                    break
-                nearest1 = _RRTNode(newpt, parent=nearest1)
-                nodes1.append(nearest1)
-            min_key2 = functools.partial(self._get_pt_dist_to_node,
-                                         nearest1.data)
-            nearest2 = min(nodes2, key=min_key2)
-            for newpt in self._extend_fn(nearest2.data, nearest1.data):
-                if self._collision_fn(newpt):
-                    break
-                nearest2 = _RRTNode(newpt, parent=nearest2)
-                nodes2.append(nearest2)
-            else:
+            nearest1, _ = self._extend_tree(tree1, tree1.nearest(samp), samp)
+            nearest2, connected = self._extend_tree(
+                tree2, tree2.nearest(nearest1.data), nearest1.data)
+            if connected:
                 path1 = nearest1.path_from_root()
                 path2 = nearest2.path_from_root()
                 # This is a tricky case to cover.
@@ -2158,6 +2215,89 @@ class _RRTNode(Generic[_RRTState]):
         return sequence[::-1]
 
 
+def get_bisection_order(num: int) -> List[int]:
+    """Order the indices of a sequence of the given length so that the last
+    index comes first, and each later index is in the middle of the largest
+    remaining gap between earlier ones.
+
+    This is the order in which to check points along a path when a
+    failure is expected to show up anywhere along it.
+    """
+    if num == 0:
+        return []
+    order = [num - 1]
+    # Each interval is a half-open range of indices that are not yet ordered.
+    intervals = deque([(0, num - 1)])
+    while intervals:
+        lo, hi = intervals.popleft()
+        if lo >= hi:
+            continue
+        mid = (lo + hi) // 2
+        order.append(mid)
+        intervals.append((lo, mid))
+        intervals.append((mid + 1, hi))
+    return order
+
+
+class _RRTTree(Generic[_RRTState]):
+    """The nodes of an RRT, supporting nearest neighbor queries.
+
+    Without an embed_fn, the nearest node is found by calling
+    distance_fn on every node. With an embed_fn, the embedding of each
+    node is computed once when it is added, and the nearest node is
+    found with a KD-tree over the embeddings. To avoid rebuilding the
+    KD-tree on every insertion, new embeddings are kept in a buffer that
+    is searched by brute force, and the KD-tree is only rebuilt once the
+    buffer is as large as the KD-tree. Insertion is then amortized
+    O(log n) and each query is O(log n) plus the size of the buffer.
+    """
+
+    def __init__(self, root: _RRTNode[_RRTState],
+                 distance_fn: Callable[[_RRTState, _RRTState], float],
+                 embed_fn: Optional[Callable[[_RRTState], Array]]) -> None:
+        self._nodes: List[_RRTNode[_RRTState]] = []
+        self._distance_fn = distance_fn
+        self._embed_fn = embed_fn
+        self._embeddings: List[Array] = []
+        self._kd_tree: Optional[KDTree] = None
+        self.add(root)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def add(self, node: _RRTNode[_RRTState]) -> None:
+        """Add a node to the tree."""
+        self._nodes.append(node)
+        if self._embed_fn is None:
+            return
+        self._embeddings.append(np.asarray(self._embed_fn(node.data)))
+        num_indexed = 0 if self._kd_tree is None else self._kd_tree.n
+        if len(self._embeddings) >= 2 * max(num_indexed, 16):
+            self._kd_tree = KDTree(np.array(self._embeddings))
+
+    def nearest(self, pt: _RRTState) -> _RRTNode[_RRTState]:
+        """Return the node in the tree that is nearest to pt."""
+        if self._embed_fn is None:
+            return min(self._nodes,
+                       key=lambda node: self._distance_fn(pt, node.data))
+        # Find the nearest embedding in the KD-tree and in the buffer, then
+        # let distance_fn choose between the two.
+        embedding = np.asarray(self._embed_fn(pt))
+        candidates = []
+        num_indexed = 0
+        if self._kd_tree is not None:
+            num_indexed = self._kd_tree.n
+            _, idx = self._kd_tree.query(embedding)
+            candidates.append(self._nodes[idx])
+        buffer = np.array(self._embeddings[num_indexed:])
+        if len(buffer):
+            sq_dists = np.sum((buffer - embedding)**2, axis=1)
+            candidates.append(self._nodes[num_indexed +
+                                          int(np.argmin(sq_dists))])
+        return min(candidates,
+                   key=lambda node: self._distance_fn(pt, node.data))
+
+
 def strip_predicate(predicate: Predicate) -> Predicate:
     """Remove the classifier from the given predicate to make a new Predicate.
 
@@ -2200,6 +2340,39 @@ def abstract(state: State, preds: Collection[Predicate]) -> Set[GroundAtom]:
     return atoms
 
 
+def abstract_states(states: Sequence[State],
+                    preds: Collection[Predicate]) -> List[Set[GroundAtom]]:
+    """Get the atomic representation of each of the given states, e.g., of
+    the states in a trajectory.
+
+    Equivalent to [abstract(s, preds) for s in states], but each
+    predicate is evaluated on all states with the same objects at once
+    (see Predicate.holds_batch()), which is much faster for predicates
+    with vectorized classifiers.
+    """
+    atoms_seq: List[Set[GroundAtom]] = [set() for _ in states]
+    # The object combinations depend on the objects, so group the states by
+    # their objects.
+    state_idxs_by_objects: Dict[Tuple[Object, ...], List[int]] = {}
+    for i, state in enumerate(states):
+        state_idxs_by_objects.setdefault(tuple(state), []).append(i)
+    for objects, state_idxs in state_idxs_by_objects.items():
+        group_states = [states[i] for i in state_idxs]
+        for pred in preds:
+            choices = list(get_object_combinations(objects, pred.types))
+            if not choices:
+                continue
+            holds = pred.holds_batch(group_states, choices)
+            # Share one ground atom between all the states where it holds.
+            choice_atoms: Dict[int, GroundAtom] = {}
+            for group_idx, choice_idx in zip(*np.nonzero(holds)):
+                if choice_idx not in choice_atoms:
+                    choice_atoms[choice_idx] = GroundAtom(
+                        pred, choices[choice_idx])
+                atoms_seq[state_idxs[group_idx]].add(choice_atoms[choice_idx])
+    return atoms_seq
+
+
 def all_ground_operators(
         operator: STRIPSOperator,
         objects: Collection[Object]) -> Iterator[_GroundSTRIPSOperator]:
@@ -2240,6 +2413,199 @@ def all_ground_nsrts(nsrt: NSRT,
         yield nsrt.ground(tuple(choice))
 
 
+class StaticPruningGroundingCache:
+    """Caches the outputs of all_ground_nsrts_with_static_pruning() across
+    calls, e.g., for other tasks with the same objects, or replanning.
+
+    The groundings of each NSRT are keyed by the objects, its static
+    preconditions, and their initial atoms. NSRTs are compared by their
+    string, which leaves out the sampler, so the cache is keyed on NSRT
+    identity instead: the ground NSRTs of a relearned NSRT are never
+    served from the cache, even if its string is unchanged. The entries
+    of NSRTs that are no longer planned with are discarded (see
+    set_nsrts()), so the cache does not grow across learning cycles.
+    """
+
+    def __init__(self) -> None:
+        self._nsrt_ids: FrozenSet[int] = frozenset()
+        self._static_preds: Set[Predicate] = set()
+        # Maps the id of an NSRT to the NSRT itself, which keeps the id from
+        # being reused, and to the groundings of the NSRT.
+        self._groundings: Dict[int, Tuple[NSRT,
+                                          Dict[Tuple[FrozenSet[Object],
+                                                     FrozenSet[LiftedAtom],
+                                                     FrozenSet[GroundAtom]],
+                                               List[_GroundNSRT]]]] = {}
+
+    def set_nsrts(self, nsrts: Collection[NSRT]) -> Set[Predicate]:
+        """Called at the start of grounding; discards the entries of NSRTs
+        that are not in the given ones, and returns the static predicates
+        that appear in their preconditions."""
+        nsrt_ids = frozenset(id(nsrt) for nsrt in nsrts)
+        if nsrt_ids != self._nsrt_ids:
+            self._nsrt_ids = nsrt_ids
+            self._static_preds = _get_static_precondition_preds(nsrts)
+            self._groundings = {
+                nsrt_id: entry
+                for nsrt_id, entry in self._groundings.items()
+                if nsrt_id in nsrt_ids
+            }
+        return self._static_preds
+
+    def get_ground_nsrts(
+            self, nsrt: NSRT, objects: FrozenSet[Object],
+            static_preconditions: FrozenSet[LiftedAtom],
+            static_atoms: FrozenSet[GroundAtom],
+            ground_fn: Callable[[], List[_GroundNSRT]]) -> List[_GroundNSRT]:
+        """Get the groundings of the NSRT with the given objects, static
+        preconditions, and initial atoms of the static preconditions,
+        calling ground_fn if they have not been cached yet."""
+        _, nsrt_groundings = self._groundings.setdefault(id(nsrt), (nsrt, {}))
+        key = (objects, static_preconditions, static_atoms)
+        if key not in nsrt_groundings:
+            nsrt_groundings[key] = ground_fn()
+        return nsrt_groundings[key]
+
+
+def all_ground_nsrts_with_static_pruning(
+        nsrts: Collection[NSRT],
+        objects: Collection[Object],
+        init_atoms: Collection[GroundAtom],
+        cache: Optional[StaticPruningGroundingCache] = None
+) -> List[_GroundNSRT]:
+    """Get the groundings of the given NSRTs with the given objects whose
+    static preconditions hold in init_atoms.
+
+    A precondition is static if its predicate is not in the add or
+    delete effects of any of the NSRTs, so groundings whose static
+    preconditions do not hold initially can never be applied. The output
+    is the same as that of all_ground_nsrts() for each NSRT in sorted
+    order, minus those groundings.
+
+    If a cache is given, repeated calls for the same scene skip grounding
+    entirely (see StaticPruningGroundingCache).
+    """
+    if cache is None:
+        static_preds = _get_static_precondition_preds(nsrts)
+    else:
+        static_preds = cache.set_nsrts(nsrts)
+    frozen_objects = frozenset(objects)
+    pred_to_atoms: Dict[Predicate, Set[GroundAtom]] = defaultdict(set)
+    for atom in init_atoms:
+        if atom.predicate in static_preds:
+            pred_to_atoms[atom.predicate].add(atom)
+    ground_nsrts = []
+    for nsrt in sorted(frozenset(nsrts)):
+        static_preconditions = frozenset(a for a in nsrt.preconditions
+                                         if a.predicate in static_preds)
+        static_atoms = frozenset(
+            atom for pred in {a.predicate
+                              for a in static_preconditions}
+            for atom in pred_to_atoms[pred])
+        ground_fn = functools.partial(_all_ground_nsrts_with_static_pruning,
+                                      nsrt, frozen_objects,
+                                      static_preconditions, static_atoms)
+        if cache is None:
+            ground_nsrts.extend(ground_fn())
+        else:
+            ground_nsrts.extend(
+                cache.get_ground_nsrts(nsrt, frozen_objects,
+                                       static_preconditions, static_atoms,
+                                       ground_fn))
+    return ground_nsrts
+
+
+def _get_static_precondition_preds(nsrts: Collection[NSRT]) -> Set[Predicate]:
+    """Helper for all_ground_nsrts_with_static_pruning() that gets the static
+    predicates that appear in the preconditions of the NSRTs."""
+    preds = {a.predicate for nsrt in nsrts for a in nsrt.preconditions}
+    return get_static_preds(nsrts, preds)
+
+
+def _all_ground_nsrts_with_static_pruning(
+        nsrt: NSRT, objects: FrozenSet[Object],
+        static_preconditions: FrozenSet[LiftedAtom],
+        static_atoms: FrozenSet[GroundAtom]) -> List[_GroundNSRT]:
+    """Helper for all_ground_nsrts_with_static_pruning() that grounds one
+    NSRT.
+
+    The bindings of the parameters are found by joining the static
+    preconditions one at a time, like a conjunctive database query. We
+    greedily join next the precondition that shares the most parameters
+    with the ones bound so far, breaking ties in favor of the one with
+    the fewest initial atoms. Parameters that are not in any static
+    precondition are bound to all objects of the right type at the end.
+    """
+    sorted_objects = sorted(objects)
+    # The index of each possible object for each parameter, used to check
+    # types and to sort the bindings in the order of all_ground_nsrts().
+    param_to_obj_idx = {
+        param: {
+            obj: i
+            for i, obj in enumerate(
+                o for o in sorted_objects if o.is_instance(param.type))
+        }
+        for param in nsrt.parameters
+    }
+    pred_to_objs: Dict[Predicate, List[Tuple[Object, ...]]] = defaultdict(list)
+    for atom in sorted(static_atoms):
+        pred_to_objs[atom.predicate].append(tuple(atom.objects))
+    bound_params: List[Variable] = []
+    bindings: List[Tuple[Object, ...]] = [()]
+    remaining = set(static_preconditions)
+
+    def _get_join_priority(atom: LiftedAtom) -> Tuple[int, int, str]:
+        num_bound = len(set(atom.variables) & set(bound_params))
+        return (-num_bound, len(pred_to_objs[atom.predicate]), str(atom))
+
+    while remaining and bindings:
+        precondition = min(remaining, key=_get_join_priority)
+        remaining.remove(precondition)
+        # Index the initial atoms by the objects of the bound parameters.
+        bound_positions = [(i, bound_params.index(v))
+                           for i, v in enumerate(precondition.variables)
+                           if v in bound_params]
+        new_params: List[Variable] = []
+        for v in precondition.variables:
+            if v not in bound_params and v not in new_params:
+                new_params.append(v)
+        key_to_new_objs: Dict[Tuple[Object, ...],
+                              List[Tuple[Object, ...]]] = defaultdict(list)
+        for objs in pred_to_objs[precondition.predicate]:
+            var_to_obj: Dict[Variable, Object] = {}
+            consistent = True
+            for v, obj in zip(precondition.variables, objs):
+                if obj not in param_to_obj_idx[v] or \
+                        var_to_obj.setdefault(v, obj) != obj:
+                    consistent = False
+                    break
+            if consistent:
+                key = tuple(objs[i] for i, _ in bound_positions)
+                key_to_new_objs[key].append(
+                    tuple(var_to_obj[v] for v in new_params))
+        bindings = [
+            binding + new_objs for binding in bindings
+            for new_objs in key_to_new_objs.get(
+                tuple(binding[j] for _, j in bound_positions), [])
+        ]
+        bound_params.extend(new_params)
+    # Bind the remaining parameters to all objects of the right type.
+    for param in nsrt.parameters:
+        if param not in bound_params:
+            bindings = [
+                binding + (obj, ) for binding in bindings
+                for obj in param_to_obj_idx[param]
+            ]
+            bound_params.append(param)
+    choices = [
+        tuple(binding[bound_params.index(p)] for p in nsrt.parameters)
+        for binding in bindings
+    ]
+    choices.sort(key=lambda choice: tuple(
+        param_to_obj_idx[p][o] for p, o in zip(nsrt.parameters, choice)))
+    return [nsrt.ground(choice) for choice in choices]
+
+
 def all_ground_nsrts_fd_translator(
         nsrts: Set[NSRT], objects: Collection[Object],
         predicates: Set[Predicate], types: Set[Type],
@@ -2531,7 +2897,7 @@ def create_ground_atom_dataset(
     """Apply all predicates to all trajectories in the dataset."""
     ground_atom_dataset = []
     for traj in trajectories:
-        atoms = [abstract(s, predicates) for s in traj.states]
+        atoms = abstract_states(traj.states, predicates)
         ground_atom_dataset.append((traj, atoms))
     return ground_atom_dataset
 
@@ -2550,6 +2916,166 @@ def prune_ground_atom_dataset(
     return new_ground_atom_dataset
 
 
+class GroundAtomCache:
+    """A persistent cache of the truth values of predicates on a fixed list
+    of state sequences, e.g., the states of the trajectories in a dataset.
+
+    For each predicate, the cache stores a flat boolean truth table with
+    one entry per (sequence, time step, object combination) in its own
+    file, so new predicates can be added without rewriting the entries of
+    existing ones, and the tables are memory-mapped when loaded. Entries
+    live in a directory named by a hash of the state sequences, and each
+    entry is named by a hash of the predicate's name, types, and a
+    fingerprint of its classifier (see _get_fingerprint()).
+
+    The fingerprint only covers what the classifier holds itself, so a
+    classifier that reads other mutable values, e.g., the attributes of
+    an environment or CFG, may be served stale truth tables. Only use the
+    cache for predicates whose classifiers are self-contained, like those
+    generated by grammar search.
+    """
+
+    def __init__(self, state_seqs: Sequence[Sequence[State]],
+                 cache_dir: str) -> None:
+        self._state_seqs = state_seqs
+        # Split each state sequence into maximal runs of consecutive states
+        # with the same objects, since the object combinations depend only
+        # on the objects. Each run is (sequence index, start, end, objects).
+        self._runs: List[Tuple[int, int, int, Tuple[Object, ...]]] = []
+        hasher = hashlib.sha1()
+        for seq_idx, state_seq in enumerate(state_seqs):
+            hasher.update(f"seq{seq_idx}:{len(state_seq)}".encode())
+            for t, state in enumerate(state_seq):
+                objects = tuple(sorted(state))
+                if t > 0 and self._runs[-1][3] == objects:
+                    start = self._runs[-1][1]
+                    self._runs[-1] = (seq_idx, start, t + 1, objects)
+                else:
+                    self._runs.append((seq_idx, t, t + 1, objects))
+                for obj in objects:
+                    hasher.update(f"{obj.name}:{obj.type.name}".encode())
+                    hasher.update(
+                        np.asarray(state[obj], dtype=np.float64).tobytes())
+        self._dir = os.path.join(cache_dir, hasher.hexdigest())
+        os.makedirs(self._dir, exist_ok=True)
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def abstract_states(
+            self,
+            predicates: Collection[Predicate]) -> List[List[Set[GroundAtom]]]:
+        """Get the atoms that hold in each state of each state sequence.
+
+        Equivalent to [abstract_states(seq, predicates) for seq in
+        state_seqs], but truth tables are loaded from the cache when
+        possible, and computed and saved to the cache otherwise.
+        """
+        atoms_seqs: List[List[Set[GroundAtom]]] = [
+            [set() for _ in state_seq] for state_seq in self._state_seqs
+        ]
+        for pred in predicates:
+            run_choices = [
+                list(get_object_combinations(objects, pred.types))
+                for _, _, _, objects in self._runs
+            ]
+            truth_table = self._get_truth_table(pred, run_choices)
+            offset = 0
+            for (seq_idx, start, end,
+                 _), choices in zip(self._runs, run_choices):
+                num_entries = (end - start) * len(choices)
+                holds = truth_table[offset:offset + num_entries].reshape(
+                    (end - start, len(choices)))
+                offset += num_entries
+                # Share one ground atom between all the states where it holds.
+                choice_atoms: Dict[int, GroundAtom] = {}
+                for run_idx, choice_idx in zip(*np.nonzero(holds)):
+                    if choice_idx not in choice_atoms:
+                        choice_atoms[choice_idx] = GroundAtom(
+                            pred, choices[choice_idx])
+                    atoms_seqs[seq_idx][start + run_idx].add(
+                        choice_atoms[choice_idx])
+        return atoms_seqs
+
+    def _get_truth_table(
+            self, pred: Predicate,
+            run_choices: List[List[List[Object]]]) -> NDArray[np.bool_]:
+        pred_str = f"{pred.name}({','.join(t.name for t in pred.types)})"
+        pred_hash = hashlib.sha1(
+            self._get_fingerprint(pred).encode()).hexdigest()
+        path = os.path.join(self._dir, f"{pred_hash}.npy")
+        num_entries = sum(
+            (end - start) * len(choices)
+            for (_, start, end, _), choices in zip(self._runs, run_choices))
+        if os.path.exists(path):
+            truth_table = np.load(path, mmap_mode="r")
+            if truth_table.shape == (num_entries, ):
+                self.num_hits += 1
+                return truth_table
+            logging.warning(f"Ignoring cached truth table for {pred_str} "
+                            "with an unexpected shape.")
+        self.num_misses += 1
+        tables = [np.zeros(0, dtype=np.bool_)]
+        for (seq_idx, start, end, _), choices in zip(self._runs, run_choices):
+            if not choices:
+                continue
+            states = self._state_seqs[seq_idx][start:end]
+            tables.append(pred.holds_batch(states, choices).ravel())
+        truth_table = np.concatenate(tables)
+        assert truth_table.shape == (num_entries, )
+        # Write to a temporary file first so that other processes sharing
+        # the cache never see a partially written entry.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, truth_table)
+        os.replace(tmp_path, path)
+        return truth_table
+
+    @classmethod
+    def _get_fingerprint(cls, value: Any) -> str:
+        """Get a string that identifies a predicate, a classifier, or a value
+        that a classifier holds.
+
+        Dataclasses, such as the classifiers generated by grammar search,
+        are identified by their qualified class name and the fingerprints
+        of their fields, and floats are written at full precision, so
+        classifiers that only differ in a constant get different
+        fingerprints. Functions are identified by their qualified name and
+        a hash of their code.
+        """
+        if isinstance(value, Predicate):
+            # pylint: disable=protected-access
+            types_str = ",".join(t.name for t in value.types)
+            classifier_str = cls._get_fingerprint(value._classifier)
+            return f"{value.name}({types_str}):{classifier_str}"
+        if is_dataclass(value) and not isinstance(value, type):
+            fields_str = ",".join(
+                f"{f.name}={cls._get_fingerprint(getattr(value, f.name))}"
+                for f in fields(value))
+            return f"{type(value).__qualname__}({fields_str})"
+        if isinstance(value, (list, tuple)):
+            return "[" + ",".join(cls._get_fingerprint(v) for v in value) + "]"
+        if inspect.ismethod(value):
+            return cls._get_fingerprint(value.__func__)
+        if inspect.isfunction(value):
+            return (f"{value.__module__}.{value.__qualname__}:"
+                    f"{cls._get_code_hash(value.__code__)}")
+        # Note that objects without a custom repr() include their address,
+        # so they never hit the cache, rather than hitting it wrongly.
+        return repr(value)
+
+    @classmethod
+    def _get_code_hash(cls, code: Any) -> str:
+        """Hash a code object's bytecode and constants, including nested
+        code objects (e.g., lambdas), whose repr() includes an address."""
+        hasher = hashlib.sha1(code.co_code)
+        for const in code.co_consts:
+            if inspect.iscode(const):
+                hasher.update(cls._get_code_hash(const).encode())
+            else:
+                hasher.update(repr(const).encode())
+        return hasher.hexdigest()
+
+
 def extract_preds_and_types(
     ops: Collection[NSRTOrSTRIPSOperator]
 ) -> Tuple[Dict[str, Predicate], Dict[str, Type]]:
@@ -2603,26 +3129,284 @@ def get_static_atoms(ground_ops: Collection[GroundNSRTOrSTRIPSOperator],
 def get_reachable_atoms(ground_ops: Collection[GroundNSRTOrSTRIPSOperator],
                         atoms: Collection[GroundAtom]) -> Set[GroundAtom]:
     """Get all atoms that are reachable from the init atoms."""
-    reachables = set(atoms)
-    while True:
-        fixed_point_reached = True
-        for op in ground_ops:
-            if op.preconditions.issubset(reachables):
-                for new_reachable_atom in op.add_effects - reachables:
-                    fixed_point_reached = False
-                    reachables.add(new_reachable_atom)
-        if fixed_point_reached:
-            break
-    return reachables
+    return RelaxedReachability(ground_ops, atoms).reachable_atoms
+
+
+class RelaxedReachability(Generic[GroundNSRTOrSTRIPSOperator]):
+    """Computes the atoms that are reachable from some init atoms when
+    delete effects are ignored, along with the ground operators whose
+    preconditions are reachable.
+
+    Each ground operator keeps a counter of its unsatisfied
+    preconditions, and each atom is indexed by the operators that have
+    it as a precondition. When an atom becomes reachable, the counters
+    of those operators are decremented, and an operator fires when its
+    counter reaches zero. Every atom and operator is therefore processed
+    once, rather than once per iteration of a fixed point loop.
+
+    When some ground operators are replaced by modified copies (e.g., by
+    adding a precondition to one operator and an add effect to others),
+    update() revises the result without starting over when possible.
+    """
+
+    def __init__(self, ground_ops: Collection[GroundNSRTOrSTRIPSOperator],
+                 atoms: Collection[GroundAtom]) -> None:
+        self._init_atoms = frozenset(atoms)
+        # These are all set by _compute().
+        self._ground_ops: List[GroundNSRTOrSTRIPSOperator] = []
+        self._atom_to_op_idxs: Dict[GroundAtom, List[int]] = {}
+        self._num_unsatisfied: List[int] = []
+        self._op_steps: List[int] = []
+        self._atom_to_step: Dict[GroundAtom, int] = {}
+        self._num_steps = 0
+        self._compute(list(ground_ops))
+
+    @property
+    def ground_ops(self) -> List[GroundNSRTOrSTRIPSOperator]:
+        """The ground operators."""
+        return self._ground_ops
+
+    @property
+    def reachable_atoms(self) -> Set[GroundAtom]:
+        """The atoms that are reachable from the init atoms."""
+        return set(self._atom_to_step)
+
+    def is_reachable(self, idx: int) -> bool:
+        """Whether all preconditions of the ground operator at the given
+        index into ground_ops are reachable."""
+        return self._op_steps[idx] >= 0
+
+    def _compute(self, ground_ops: List[GroundNSRTOrSTRIPSOperator]) -> None:
+        self._ground_ops = ground_ops
+        self._atom_to_op_idxs = defaultdict(list)
+        for idx, op in enumerate(ground_ops):
+            for atom in op.preconditions:
+                self._atom_to_op_idxs[atom].append(idx)
+        # Only meaningful for operators that have not fired.
+        self._num_unsatisfied = [len(op.preconditions) for op in ground_ops]
+        # The step at which each operator fired, or -1 if it never fired.
+        # The step of a reachable atom is that of the first operator that
+        # added it, or -1 for the init atoms. Every operator fires after
+        # all of its preconditions, which is what update() relies on.
+        self._op_steps = [-1 for _ in ground_ops]
+        self._atom_to_step = {}
+        self._num_steps = 0
+        self._propagate(
+            [(atom, -1) for atom in self._init_atoms],
+            [idx for idx, num in enumerate(self._num_unsatisfied) if num == 0])
+
+    def _propagate(self, new_atoms: List[Tuple[GroundAtom, int]],
+                   ready_op_idxs: List[int]) -> None:
+        """Make the given atoms reachable at the given steps, then fire
+        operators until a fixed point is reached."""
+        atom_to_step = self._atom_to_step
+        atom_to_op_idxs = self._atom_to_op_idxs
+        num_unsatisfied = self._num_unsatisfied
+        while True:
+            for atom, step in new_atoms:
+                if atom in atom_to_step:
+                    if step < atom_to_step[atom]:
+                        atom_to_step[atom] = step
+                    continue
+                atom_to_step[atom] = step
+                for idx in atom_to_op_idxs.get(atom, ()):
+                    num_unsatisfied[idx] -= 1
+                    if num_unsatisfied[idx] == 0:
+                        ready_op_idxs.append(idx)
+            if not ready_op_idxs:
+                break
+            new_atoms = []
+            for idx in ready_op_idxs:
+                step = self._num_steps
+                self._num_steps += 1
+                self._op_steps[idx] = step
+                new_atoms.extend(
+                    (atom, step) for atom in self._ground_ops[idx].add_effects)
+            ready_op_idxs = []
+
+    def update(self,
+               ground_ops: Collection[GroundNSRTOrSTRIPSOperator]) -> None:
+        """Replace the ground operators with modified ones and revise the
+        result.
+
+        The i-th new operator replaces the i-th old one; unchanged
+        operators should be the same objects. If the number of operators
+        changes, the result is recomputed. Added add effects and
+        removed preconditions only make more atoms reachable, so they
+        are propagated from the current result. An added precondition
+        of an operator that fired is kept only if it was reachable
+        before the operator fired. Otherwise, or if add effects are
+        removed from an operator that fired, the result is recomputed.
+        """
+        ground_ops = list(ground_ops)
+        if len(ground_ops) != len(self._ground_ops):
+            self._compute(ground_ops)
+            return
+        new_atoms: List[Tuple[GroundAtom, int]] = []
+        ready_op_idxs: List[int] = []
+        to_check: List[Tuple[int, Set[GroundAtom]]] = []
+        for idx, (old_op,
+                  new_op) in enumerate(zip(self._ground_ops, ground_ops)):
+            if old_op is new_op:
+                continue
+            step = self._op_steps[idx]
+            if step >= 0 and not old_op.add_effects.issubset(
+                    new_op.add_effects):
+                self._compute(ground_ops)
+                return
+            added_pre = new_op.preconditions - old_op.preconditions
+            removed_pre = old_op.preconditions - new_op.preconditions
+            for atom in added_pre:
+                self._atom_to_op_idxs[atom].append(idx)
+            for atom in removed_pre:
+                self._atom_to_op_idxs[atom].remove(idx)
+            if step >= 0:
+                if added_pre:
+                    to_check.append((idx, added_pre))
+                new_atoms.extend(
+                    (atom, step)
+                    for atom in new_op.add_effects - old_op.add_effects)
+                continue
+            self._num_unsatisfied[idx] += sum(
+                1 for atom in added_pre if atom not in self._atom_to_step)
+            self._num_unsatisfied[idx] -= sum(
+                1 for atom in removed_pre if atom not in self._atom_to_step)
+            if self._num_unsatisfied[idx] == 0:
+                ready_op_idxs.append(idx)
+        self._ground_ops = ground_ops
+        self._propagate(new_atoms, ready_op_idxs)
+        for idx, added_pre in to_check:
+            step = self._op_steps[idx]
+            if any(
+                    self._atom_to_step.get(atom, step) >= step
+                    for atom in added_pre):
+                self._compute(ground_ops)
+                return
+
+
+class SuccessorGenerator(Generic[GroundNSRTOrSTRIPSOperator]):
+    """Indexes ground operators by their precondition atoms so that the
+    operators that are applicable in a set of atoms can be found without
+    checking every ground operator.
+
+    For each atom, we store the indices of the ground operators that
+    have that atom as a precondition. To answer a query, we count, for
+    each ground operator, how many of its preconditions are among the
+    given atoms; the applicable operators are those for which all
+    preconditions are counted. The cost of a query is therefore
+    proportional to the number of satisfied (atom, operator) precondition
+    pairs, rather than to the total number of ground operators.
+
+    Build this once per planning problem and pass it wherever ground
+    operators are accepted by get_applicable_operators() or
+    get_successors_from_ground_ops(). Applicable operators are returned in
+    the order in which they were given.
+
+    If atom_to_bit is given, sets of atoms can also be queried as integer
+    bitsets in which each atom is the given bit. Each operator is then
+    put in the bucket of one of its precondition bits, and a query checks
+    the full preconditions mask of each operator in the buckets of the
+    bits that are set.
+    """
+
+    def __init__(
+            self,
+            ground_ops: Collection[GroundNSRTOrSTRIPSOperator],
+            atom_to_bit: Optional[Callable[[GroundAtom], int]] = None) -> None:
+        self._ground_ops: List[GroundNSRTOrSTRIPSOperator] = list(ground_ops)
+        self._num_preconditions = np.array(
+            [len(op.preconditions) for op in self._ground_ops], dtype=np.int64)
+        atom_to_op_idxs: Dict[GroundAtom, List[int]] = defaultdict(list)
+        for idx, op in enumerate(self._ground_ops):
+            for atom in op.preconditions:
+                atom_to_op_idxs[atom].append(idx)
+        self._atom_to_op_idxs = {
+            atom: np.array(idxs, dtype=np.int64)
+            for atom, idxs in atom_to_op_idxs.items()
+        }
+        # Operators without preconditions are always applicable.
+        self._no_precondition_idxs = np.flatnonzero(
+            self._num_preconditions == 0)
+        # Maps bits to lists of (operator index, preconditions mask). Each
+        # operator goes in the bucket of the precondition that the fewest
+        # operators share, since that one is likely to be rarely true.
+        self._bit_to_bucket: Optional[Dict[int, List[Tuple[int, int]]]] = None
+        self._bucket_mask = 0
+        if atom_to_bit is not None:
+            self._bit_to_bucket = defaultdict(list)
+            for idx, op in enumerate(self._ground_ops):
+                if not op.preconditions:
+                    continue
+                pre_mask = 0
+                for atom in op.preconditions:
+                    pre_mask |= atom_to_bit(atom)
+                bucket_atom = min(sorted(op.preconditions),
+                                  key=lambda a: len(atom_to_op_idxs[a]))
+                bit = atom_to_bit(bucket_atom)
+                self._bit_to_bucket[bit].append((idx, pre_mask))
+                self._bucket_mask |= bit
+
+    @property
+    def ground_ops(self) -> List[GroundNSRTOrSTRIPSOperator]:
+        """The indexed ground operators."""
+        return self._ground_ops
+
+    def get_applicable_operator_idxs(
+            self, atoms: Collection[GroundAtom]) -> NDArray[np.int64]:
+        """Get the sorted indices (into ground_ops) of the ground operators
+        whose preconditions are satisfied."""
+        op_idx_arrs = [
+            self._atom_to_op_idxs[atom] for atom in atoms
+            if atom in self._atom_to_op_idxs
+        ]
+        if not op_idx_arrs:
+            return self._no_precondition_idxs.copy()
+        op_idxs, counts = np.unique(np.concatenate(op_idx_arrs),
+                                    return_counts=True)
+        applicable_idxs = op_idxs[counts == self._num_preconditions[op_idxs]]
+        if len(self._no_precondition_idxs):
+            applicable_idxs = np.union1d(applicable_idxs,
+                                         self._no_precondition_idxs)
+        return applicable_idxs
+
+    def get_applicable_operator_idxs_for_bitset(self,
+                                                bitset: int) -> List[int]:
+        """Like get_applicable_operator_idxs(), but for a set of atoms
+        encoded with the atom_to_bit given at construction."""
+        assert self._bit_to_bucket is not None
+        applicable_idxs = self._no_precondition_idxs.tolist()
+        bits = bitset & self._bucket_mask
+        while bits:
+            bit = bits & -bits
+            for idx, pre_mask in self._bit_to_bucket[bit]:
+                if bitset & pre_mask == pre_mask:
+                    applicable_idxs.append(idx)
+            bits ^= bit
+        applicable_idxs.sort()
+        return applicable_idxs
+
+    def get_applicable_operators(
+            self, atoms: Collection[GroundAtom]
+    ) -> Iterator[GroundNSRTOrSTRIPSOperator]:
+        """Iterate over ground operators whose preconditions are satisfied."""
+        for idx in self.get_applicable_operator_idxs(atoms):
+            yield self._ground_ops[idx]
 
 
 def get_applicable_operators(
-        ground_ops: Collection[GroundNSRTOrSTRIPSOperator],
+        ground_ops: Union[Collection[GroundNSRTOrSTRIPSOperator],
+                          SuccessorGenerator[GroundNSRTOrSTRIPSOperator]],
         atoms: Collection[GroundAtom]) -> Iterator[GroundNSRTOrSTRIPSOperator]:
     """Iterate over ground operators whose preconditions are satisfied.
 
+    If ground_ops is a SuccessorGenerator, its index is used instead of
+    checking every ground operator.
+
     Note: the order may be nondeterministic. Users should be invariant.
     """
+    if isinstance(ground_ops, SuccessorGenerator):
+        yield from ground_ops.get_applicable_operators(atoms)
+        return
     for op in ground_ops:
         applicable = op.preconditions.issubset(atoms)
         if applicable:
@@ -2662,11 +3446,13 @@ def compute_necessary_atoms_seq(
 
 def get_successors_from_ground_ops(
         atoms: Set[GroundAtom],
-        ground_ops: Collection[GroundNSRTOrSTRIPSOperator],
+        ground_ops: Union[Collection[GroundNSRTOrSTRIPSOperator],
+                          SuccessorGenerator[GroundNSRTOrSTRIPSOperator]],
         unique: bool = True) -> Iterator[Set[GroundAtom]]:
     """Get all next atoms from ground operators.
 
-    If unique is true, only yield each unique successor once.
+    If unique is true, only yield each unique successor once. The ground
+    operators may be given as a SuccessorGenerator for efficiency.
     """
     seen_successors = set()
     for ground_op in get_applicable_operators(ground_ops, atoms):
@@ -2714,6 +3500,12 @@ def create_task_planning_heuristic(
                                            ground_ops, predicates, objects)
     if heuristic_name == GoalCountHeuristic.HEURISTIC_NAME:
         return GoalCountHeuristic(heuristic_name, init_atoms, goal, ground_ops)
+    if heuristic_name in _NATIVE_RELAXATION_HEURISTICS:
+        heuristic_cls = _NATIVE_RELAXATION_HEURISTICS[heuristic_name]
+        relaxed_task = _RelaxedTask.from_ground_ops(init_atoms, goal,
+                                                    ground_ops)
+        return heuristic_cls(heuristic_name, init_atoms, goal, ground_ops,
+                             relaxed_task)
     raise ValueError(f"Unrecognized heuristic name: {heuristic_name}.")
 
 
@@ -2737,6 +3529,328 @@ class GoalCountHeuristic(_TaskPlanningHeuristic):
         return len(self.goal.difference(atoms))
 
 
+######################### Native Relaxation Heuristics #########################
+
+
+@dataclass(frozen=True, eq=False)
+class _RelaxedTask:
+    """The delete relaxation of a task, compiled into integer-indexed arrays.
+
+    Facts (non-static ground atoms) and ground operators are identified
+    by integers. Two special facts are added: ALWAYS_TRUE, which holds
+    in every state and is a precondition of every operator (so that
+    every operator has at least one precondition), and GOAL, which is
+    the only add effect of an extra zero-cost goal operator whose
+    preconditions are the goal atoms. The heuristic value of a state is
+    then the value of the GOAL fact.
+
+    Preconditions are stored grouped by operator and add effects are
+    stored grouped by fact, so that the value of every operator and
+    every fact can be updated with one segmented NumPy reduction.
+    """
+    ALWAYS_TRUE: ClassVar[int] = 0
+    GOAL: ClassVar[int] = 1
+
+    fact_to_id: Dict[GroundAtom, int]
+    num_facts: int
+    num_ops: int  # including the goal operator, which is last
+    # The precondition fact and operator of each (precondition, operator)
+    # pair, sorted by operator, and the start index of each operator.
+    pre_facts: NDArray[np.int64]
+    pre_ops: NDArray[np.int64]
+    pre_starts: NDArray[np.int64]
+    # The add effect fact and operator of each (add effect, operator) pair,
+    # sorted by fact and then by operator, the facts that have at least one
+    # achiever, and the start index of each of those facts.
+    add_facts: NDArray[np.int64]
+    add_ops: NDArray[np.int64]
+    achieved_facts: NDArray[np.int64]
+    add_starts: NDArray[np.int64]
+    # The action costs (1 for every operator, 0 for the goal operator).
+    unit_costs: NDArray[np.float64]
+    # The same relations as lists, for graph traversals in Python.
+    op_preconditions: List[List[int]]
+    op_add_effects: List[List[int]]
+    fact_achievers: List[List[int]]
+
+    @classmethod
+    def from_ground_ops(
+            cls, init_atoms: Collection[GroundAtom],
+            goal: Collection[GroundAtom],
+            ground_ops: Collection[GroundNSRTOrSTRIPSOperator]
+    ) -> _RelaxedTask:
+        """Compile the relaxed task, removing static atoms as is done for the
+        pyperplan heuristics."""
+        effect_atoms: Set[GroundAtom] = set()
+        for op in ground_ops:
+            effect_atoms.update(op.add_effects, op.delete_effects)
+        static_atoms = set(init_atoms) - effect_atoms
+        fact_to_id: Dict[GroundAtom, int] = {}
+
+        def _get_ids(atoms: Collection[GroundAtom]) -> List[int]:
+            ids = []
+            for atom in sorted(atoms):
+                if atom not in fact_to_id:
+                    fact_to_id[atom] = len(fact_to_id) + 2
+                ids.append(fact_to_id[atom])
+            return ids
+
+        op_preconditions: List[List[int]] = []
+        op_add_effects: List[List[int]] = []
+        for op in ground_ops:
+            op_preconditions.append([cls.ALWAYS_TRUE] +
+                                    _get_ids(op.preconditions - static_atoms))
+            op_add_effects.append(_get_ids(op.add_effects))
+        op_preconditions.append([cls.ALWAYS_TRUE] +
+                                _get_ids(set(goal) - static_atoms))
+        op_add_effects.append([cls.GOAL])
+        num_facts = len(fact_to_id) + 2
+        num_ops = len(op_preconditions)
+        fact_achievers: List[List[int]] = [[] for _ in range(num_facts)]
+        for op_id, add_effects in enumerate(op_add_effects):
+            for fact in add_effects:
+                fact_achievers[fact].append(op_id)
+        pre_ops = np.array(
+            [o for o, pres in enumerate(op_preconditions) for _ in pres],
+            dtype=np.int64)
+        pre_facts = np.array([f for pres in op_preconditions for f in pres],
+                             dtype=np.int64)
+        pre_starts = np.cumsum([0] +
+                               [len(pres) for pres in op_preconditions[:-1]],
+                               dtype=np.int64)
+        add_facts = np.array(
+            [f for f, ops in enumerate(fact_achievers) for _ in ops],
+            dtype=np.int64)
+        add_ops = np.array([o for ops in fact_achievers for o in ops],
+                           dtype=np.int64)
+        achieved_facts, add_starts = np.unique(add_facts, return_index=True)
+        unit_costs = np.ones(num_ops, dtype=np.float64)
+        unit_costs[-1] = 0.0
+        return cls(fact_to_id, num_facts, num_ops, pre_facts, pre_ops,
+                   pre_starts, add_facts, add_ops, achieved_facts, add_starts,
+                   unit_costs, op_preconditions, op_add_effects,
+                   fact_achievers)
+
+    def get_fact_ids(self, atoms: Collection[GroundAtom]) -> NDArray[np.int64]:
+        """Get the sorted IDs of the facts that hold in the given atoms,
+        including ALWAYS_TRUE.
+
+        Atoms that are not facts (e.g., static atoms) are ignored.
+        """
+        ids = [self.ALWAYS_TRUE]
+        for atom in atoms:
+            if atom in self.fact_to_id:
+                ids.append(self.fact_to_id[atom])
+        return np.unique(np.array(ids, dtype=np.int64))
+
+    def propagate(
+        self,
+        fact_ids: NDArray[np.int64],
+        costs: NDArray[np.float64],
+        use_max: bool,
+        fact_values: Optional[NDArray[np.float64]] = None
+    ) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
+        """Compute the hmax (if use_max) or hadd values of all facts and
+        operators, given the facts that hold and the operator costs.
+
+        If fact_values is given, it must be an upper bound on the result
+        (e.g., the fact values under higher operator costs), and it is
+        used to warm-start the computation.
+
+        Returns the fact values and the operator values, where the value
+        of an operator is its cost plus the max or sum of the values of
+        its preconditions. Unreachable facts have infinite value.
+        """
+        if fact_values is None:
+            fact_values = np.full(self.num_facts, np.inf)
+            fact_values[fact_ids] = 0.0
+        reduce = np.maximum.reduceat if use_max else np.add.reduceat
+        # Generalized Bellman-Ford: update all operators and facts until
+        # no fact value changes.
+        while True:
+            op_values = reduce(fact_values[self.pre_facts],
+                               self.pre_starts) + costs
+            achiever_values = np.minimum.reduceat(op_values[self.add_ops],
+                                                  self.add_starts)
+            new_fact_values = fact_values.copy()
+            new_fact_values[self.achieved_facts] = np.minimum(
+                fact_values[self.achieved_facts], achiever_values)
+            if np.array_equal(new_fact_values, fact_values):
+                return fact_values, op_values
+            fact_values = new_fact_values
+
+
+@dataclass(frozen=True, eq=False)
+class _NativeRelaxationHeuristic(_TaskPlanningHeuristic):
+    """A delete relaxation heuristic that is evaluated on a _RelaxedTask.
+
+    Heuristic values are cached in a bounded LRU cache whose size is
+    CFG.sesame_heuristic_cache_size. The cache belongs to this
+    heuristic, so it is discarded along with the heuristic when the task
+    is done.
+    """
+    HEURISTIC_NAME: ClassVar[str]
+    _relaxed_task: _RelaxedTask
+    _cache: OrderedDict[bytes, float] = field(default_factory=OrderedDict,
+                                              repr=False)
+
+    def __call__(self, atoms: Collection[GroundAtom]) -> float:
+        fact_ids = self._relaxed_task.get_fact_ids(atoms)
+        key = fact_ids.tobytes()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        result = self._evaluate(fact_ids)
+        self._cache[key] = result
+        if len(self._cache) > CFG.sesame_heuristic_cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _evaluate(self, fact_ids: NDArray[np.int64]) -> float:
+        """Compute the heuristic value given the IDs of the facts that hold."""
+        raise NotImplementedError("Override me!")
+
+
+class HAddHeuristic(_NativeRelaxationHeuristic):
+    """The additive heuristic."""
+    HEURISTIC_NAME: ClassVar[str] = "native_hadd"
+
+    def _evaluate(self, fact_ids: NDArray[np.int64]) -> float:
+        task = self._relaxed_task
+        fact_values, _ = task.propagate(fact_ids, task.unit_costs, False)
+        return float(fact_values[task.GOAL])
+
+
+class HMaxHeuristic(_NativeRelaxationHeuristic):
+    """The max heuristic."""
+    HEURISTIC_NAME: ClassVar[str] = "native_hmax"
+
+    def _evaluate(self, fact_ids: NDArray[np.int64]) -> float:
+        task = self._relaxed_task
+        fact_values, _ = task.propagate(fact_ids, task.unit_costs, True)
+        return float(fact_values[task.GOAL])
+
+
+class HFFHeuristic(_NativeRelaxationHeuristic):
+    """The FF heuristic: the number of operators in a relaxed plan that is
+    extracted using the hadd values to choose the best achievers."""
+    HEURISTIC_NAME: ClassVar[str] = "native_hff"
+
+    def _evaluate(self, fact_ids: NDArray[np.int64]) -> float:
+        task = self._relaxed_task
+        fact_values, op_values = task.propagate(fact_ids, task.unit_costs,
+                                                False)
+        if fact_values[task.GOAL] == 0.0 or \
+                fact_values[task.GOAL] == float("inf"):
+            return float(fact_values[task.GOAL])
+        # For each fact, the best achiever is the lowest-ID operator whose
+        # value equals the value of the fact.
+        is_best = (op_values[task.add_ops] == fact_values[task.add_facts]) & \
+            np.isfinite(fact_values[task.add_facts])
+        best_facts, first_idxs = np.unique(task.add_facts[is_best],
+                                           return_index=True)
+        best_achievers = np.full(task.num_facts, -1, dtype=np.int64)
+        best_achievers[best_facts] = task.add_ops[is_best][first_idxs]
+        # Extract a relaxed plan backward from the goal.
+        relaxed_plan: Set[int] = set()
+        closed = {task.GOAL}
+        queue = [task.GOAL]
+        while queue:
+            fact = queue.pop()
+            if fact_values[fact] == 0.0:
+                continue
+            op = int(best_achievers[fact])
+            if op in relaxed_plan:
+                continue
+            relaxed_plan.add(op)
+            for pre in task.op_preconditions[op]:
+                if pre not in closed:
+                    closed.add(pre)
+                    queue.append(pre)
+        # Don't count the goal operator.
+        return float(len(relaxed_plan) - 1)
+
+
+class LMCutHeuristic(_NativeRelaxationHeuristic):
+    """The landmark-cut heuristic.
+
+    Each round computes hmax under the current operator costs, finds a
+    cut of operators that separates the state from the goal zone in the
+    justification graph, and reduces the costs of the cut operators by
+    their minimum cost, which is added to the heuristic value. Since
+    costs only decrease, the hmax values of each round are warm-started
+    from those of the previous round.
+    """
+    HEURISTIC_NAME: ClassVar[str] = "native_lmcut"
+
+    def _evaluate(self, fact_ids: NDArray[np.int64]) -> float:
+        task = self._relaxed_task
+        costs = task.unit_costs.copy()
+        fact_values, op_values = task.propagate(fact_ids, costs, True)
+        if fact_values[task.GOAL] == float("inf"):
+            return float("inf")
+        h = 0.0
+        while fact_values[task.GOAL] > 0.0:
+            # Precondition choice function: for each reachable operator, the
+            # lowest-ID precondition with the maximum value.
+            pre_values = fact_values[task.pre_facts]
+            op_max_pre_values = np.maximum.reduceat(pre_values,
+                                                    task.pre_starts)
+            is_max = (pre_values == op_max_pre_values[task.pre_ops])
+            _, first_idxs = np.unique(task.pre_ops[is_max], return_index=True)
+            supporters = task.pre_facts[is_max][first_idxs]
+            reachable_ops = np.flatnonzero(np.isfinite(op_values))
+            supported_ops: Dict[int, List[int]] = defaultdict(list)
+            for op, supporter in zip(reachable_ops.tolist(),
+                                     supporters[reachable_ops].tolist()):
+                supported_ops[supporter].append(op)
+            # The goal zone contains the facts from which the goal can be
+            # reached via zero-cost operators in the justification graph.
+            in_goal_zone = np.zeros(task.num_facts, dtype=bool)
+            in_goal_zone[task.GOAL] = True
+            queue = [task.GOAL]
+            while queue:
+                fact = queue.pop()
+                for op in task.fact_achievers[fact]:
+                    if costs[op] == 0.0 and np.isfinite(op_values[op]):
+                        supporter = supporters[op]
+                        if not in_goal_zone[supporter]:
+                            in_goal_zone[supporter] = True
+                            queue.append(supporter)
+            # The cut contains the operators that lead from facts reachable
+            # from the state (without passing through the goal zone) into
+            # the goal zone.
+            reached = np.zeros(task.num_facts, dtype=bool)
+            reached[fact_ids] = True
+            queue = fact_ids.tolist()
+            cut = set()
+            while queue:
+                fact = queue.pop()
+                for op in supported_ops[fact]:
+                    for eff in task.op_add_effects[op]:
+                        if in_goal_zone[eff]:
+                            cut.add(op)
+                        elif not reached[eff]:
+                            reached[eff] = True
+                            queue.append(eff)
+            cut_ops = np.array(sorted(cut), dtype=np.int64)
+            min_cost = costs[cut_ops].min()
+            h += min_cost
+            costs[cut_ops] -= min_cost
+            fact_values, op_values = task.propagate(fact_ids, costs, True,
+                                                    fact_values)
+        return h
+
+
+_NATIVE_RELAXATION_HEURISTICS: Dict[
+    str, TypingType[_NativeRelaxationHeuristic]] = {
+        cls.HEURISTIC_NAME: cls
+        for cls in
+        [HAddHeuristic, HMaxHeuristic, HFFHeuristic, LMCutHeuristic]
+    }
+
+####################### End Native Relaxation Heuristics #######################
+
 ############################### Pyperplan Glue ###############################
 
 
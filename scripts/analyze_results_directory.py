@@ -2,12 +2,13 @@
 
 import argparse
 import glob
-from typing import Callable, Dict, Sequence, Tuple
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
 
 import dill as pkl
 import numpy as np
 import pandas as pd
 
+from predicators.results_store import ResultsStore
 from predicators.settings import CFG
 
 GROUPS = [
@@ -49,6 +50,12 @@ COLUMN_NAMES_AND_KEYS = [
     # ("QUERY_COST", "query_cost"),
 ]
 
+# Keys whose values are not numbers, so they are never averaged.
+_NON_NUMERIC_KEYS = {
+    "env", "approach", "excluded_predicates", "included_options",
+    "experiment_id", "seed", "cycle"
+}
+
 
 def pd_create_equal_selector(
         key: str, value: str) -> Callable[[pd.DataFrame], pd.Series]:
@@ -91,8 +98,17 @@ def get_df_for_entry(
 def create_raw_dataframe(
     column_names_and_keys: Sequence[Tuple[str, str]],
     derived_keys: Sequence[Tuple[str, Callable[[Dict[str, float]], float]]],
+    results_store_path: Optional[str] = None,
 ) -> pd.DataFrame:
-    """Returns one dataframe with all data, not grouped."""
+    """Returns one dataframe with all data, not grouped.
+
+    If results_store_path is given, the data is queried from the
+    ResultsStore at that path instead of loaded from CFG.results_dir.
+    """
+    if results_store_path is not None:
+        return _create_raw_dataframe_from_store(column_names_and_keys,
+                                                derived_keys,
+                                                results_store_path)
     all_data = []
     git_commit_hashes = set()
     column_names = [c for (c, _) in column_names_and_keys]
@@ -142,13 +158,70 @@ def create_raw_dataframe(
     return df
 
 
+def _create_raw_dataframe_from_store(
+    column_names_and_keys: Sequence[Tuple[str, str]],
+    derived_keys: Sequence[Tuple[str, Callable[[Dict[str, float]], float]]],
+    results_store_path: str,
+) -> pd.DataFrame:
+    """Returns one dataframe with all data in a ResultsStore, not grouped.
+
+    Only the columns that are needed are read from the store. The values
+    are converted to match the dataframe created from CFG.results_dir.
+    """
+    store = ResultsStore(results_store_path)
+    git_commit_hashes = set()
+    # Derived keys may depend on any column, so read all of them.
+    columns = None if derived_keys else \
+        [k for (_, k) in column_names_and_keys] + ["git_commit_hash"]
+    all_data = []
+    for run_data in store.iter_runs(columns):
+        git_commit_hashes.add(run_data["git_commit_hash"])
+        _convert_store_run_data(run_data)
+        for key, fn in derived_keys:
+            run_data[key] = fn(run_data)
+        data = [run_data.get(k, np.nan) for (_, k) in column_names_and_keys]
+        all_data.append(data)
+    store.close()
+    if not all_data:
+        raise ValueError(f"No data found in {results_store_path}")
+    pd.set_option("display.max_rows", 999999)
+    df = pd.DataFrame(all_data,
+                      columns=[c for (c, _) in column_names_and_keys])
+    print(f"Git commit hashes seen in {results_store_path}:")
+    for commit_hash in git_commit_hashes:
+        print(commit_hash)
+    df = df.replace([np.inf, -np.inf, None], np.nan)
+    return df
+
+
+def _convert_store_run_data(run_data: Dict[str, Any]) -> None:
+    """Convert the values of a run from a ResultsStore in place, to match the
+    values that are parsed from the filenames in CFG.results_dir."""
+    for key in ["seed", "cycle"]:
+        if key in run_data:
+            run_data[key] = str(run_data[key])
+    if run_data.get("excluded_predicates") == "":
+        run_data["excluded_predicates"] = "none"
+
+
 def create_dataframes(
     column_names_and_keys: Sequence[Tuple[str, str]],
     groups: Sequence[str],
     derived_keys: Sequence[Tuple[str, Callable[[Dict[str, float]], float]]],
+    results_store_path: Optional[str] = None,
 ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    """Returns means, standard deviations, and sizes."""
-    df = create_raw_dataframe(column_names_and_keys, derived_keys)
+    """Returns means, standard deviations, and sizes.
+
+    If results_store_path is given, the data is queried from the
+    ResultsStore at that path instead of loaded from CFG.results_dir.
+    Without derived keys, the data is then aggregated by the store,
+    without loading the individual runs.
+    """
+    if results_store_path is not None and not derived_keys:
+        return _create_dataframes_from_store(column_names_and_keys, groups,
+                                             results_store_path)
+    df = create_raw_dataframe(column_names_and_keys, derived_keys,
+                              results_store_path)
     grouped = df.groupby(list(groups))
     means = grouped.mean(numeric_only=True)
     stds = grouped.std(numeric_only=True, ddof=0)
@@ -156,8 +229,46 @@ def create_dataframes(
     return means, stds, sizes
 
 
-def _main() -> None:
-    means, stds, sizes = create_dataframes(COLUMN_NAMES_AND_KEYS, GROUPS, [])
+def _create_dataframes_from_store(
+    column_names_and_keys: Sequence[Tuple[str, str]],
+    groups: Sequence[str],
+    results_store_path: str,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Returns means, standard deviations, and sizes, aggregated by a
+    ResultsStore."""
+    name_to_key = dict(column_names_and_keys)
+    group_keys = [name_to_key[g] for g in groups]
+    value_names = [
+        c for (c, k) in column_names_and_keys
+        if c not in groups and k not in _NON_NUMERIC_KEYS
+    ]
+    value_keys = [name_to_key[c] for c in value_names]
+    store = ResultsStore(results_store_path)
+    aggregates = store.aggregate(group_keys, value_keys)
+    store.close()
+    if not aggregates:
+        raise ValueError(f"No data found in {results_store_path}")
+    index_data = []
+    mean_data = []
+    std_data = []
+    size_data = []
+    for group, count, stats in aggregates:
+        run_data = dict(zip(group_keys, group))
+        _convert_store_run_data(run_data)
+        index_data.append(tuple(run_data[k] for k in group_keys))
+        mean_data.append([stats[k][0] for k in value_keys])
+        std_data.append([stats[k][1] for k in value_keys])
+        size_data.append(count)
+    index = pd.MultiIndex.from_tuples(index_data, names=list(groups))
+    means = pd.DataFrame(mean_data, index=index, columns=value_names)
+    stds = pd.DataFrame(std_data, index=index, columns=value_names)
+    sizes = pd.DataFrame(size_data, index=index)
+    return means, stds, sizes
+
+
+def _main(results_store_path: Optional[str]) -> None:
+    means, stds, sizes = create_dataframes(COLUMN_NAMES_AND_KEYS, GROUPS, [],
+                                           results_store_path)
     # Add standard deviations to the printout.
     for col in means:
         for row in means[col].keys():
@@ -175,6 +286,8 @@ def _main() -> None:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--sidelining", action="store_true")
+    # Path to a ResultsStore to query instead of the results directory.
+    parser.add_argument("--results_store", type=str, default=None)
     args = parser.parse_args()
 
     if args.sidelining:
@@ -185,4 +298,4 @@ if __name__ == "__main__":
         COLUMN_NAMES_AND_KEYS.append(
             ("SO_COMPLEXITY", "offline_learning_sidelining_obj_complexity"))
 
-    _main()
+    _main(args.results_store)
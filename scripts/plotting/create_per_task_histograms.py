@@ -4,28 +4,43 @@ Assumes that files in the results/ directory can be grouped by
 experiment ID alone.
 """
 
+import argparse
 import glob
 import os
 import re
 from collections import defaultdict
+from typing import DefaultDict, List, Optional
 
 import dill as pkl
 import matplotlib.pyplot as plt
 
+from predicators.results_store import ResultsStore
 from predicators.settings import CFG
 
 DPI = 500
 
 
-def _main() -> None:
+def _main(results_store_path: Optional[str]) -> None:
     outdir = os.path.join(os.path.dirname(os.path.realpath(__file__)),
                           "results")
     os.makedirs(outdir, exist_ok=True)
 
     experiment_ids = set()
-    solve_data = defaultdict(list)
-    exec_data = defaultdict(list)
-    for filepath in sorted(glob.glob(f"{CFG.results_dir}/*")):
+    solve_data: DefaultDict[str, List[float]] = defaultdict(list)
+    exec_data: DefaultDict[str, List[float]] = defaultdict(list)
+    if results_store_path is not None:
+        # Only read the per-task times from the store.
+        store = ResultsStore(results_store_path)
+        for metric, data in [("solve_time", solve_data),
+                             ("exec_time", exec_data)]:
+            for entry in store.iter_per_task_metrics(["experiment_id"],
+                                                     metric=metric):
+                experiment_ids.add(entry["experiment_id"])
+                data[entry["experiment_id"]].append(entry["value"])
+        store.close()
+    filepaths = [] if results_store_path is not None else \
+        sorted(glob.glob(f"{CFG.results_dir}/*"))
+    for filepath in filepaths:
         with open(filepath, "rb") as f:
             outdata = pkl.load(f)
         config = outdata["config"].__dict__.copy()
@@ -48,7 +63,8 @@ def _main() -> None:
             else:
                 exec_data[experiment_id].append(run_data[key])
     if not solve_data and not exec_data:
-        raise ValueError(f"No per-task data found in {CFG.results_dir}/")
+        source = results_store_path or f"{CFG.results_dir}/"
+        raise ValueError(f"No per-task data found in {source}")
     print("Found the following experiment IDs:")
     for experiment_id in experiment_ids:
         print(experiment_id)
@@ -65,4 +81,8 @@ def _main() -> None:
 
 
 if __name__ == "__main__":
-    _main()
+    parser = argparse.ArgumentParser()
+    # Path to a ResultsStore to query instead of the results directory.
+    parser.add_argument("--results_store", type=str, default=None)
+    args = parser.parse_args()
+    _main(args.results_store)
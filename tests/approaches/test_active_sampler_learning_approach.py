@@ -16,16 +16,17 @@ from predicators.structs import Dataset
 from predicators.teacher import Teacher
 
 
-@pytest.mark.parametrize("model_name,right_targets,num_demo,feat_type",
-                         [("myopic_classifier_mlp", False, 0, "all"),
-                          ("myopic_classifier_mlp", True, 1, "all"),
-                          ("myopic_classifier_ensemble", False, 0, "all"),
-                          ("myopic_classifier_ensemble", False, 1, "all"),
-                          ("fitted_q", False, 0, "all"),
-                          ("fitted_q", True, 0, "all"),
-                          ("myopic_classifier_knn", False, 0, "oracle")])
+@pytest.mark.parametrize(
+    "model_name,right_targets,num_demo,feat_type,stacked",
+    [("myopic_classifier_mlp", False, 0, "all", False),
+     ("myopic_classifier_mlp", True, 1, "all", False),
+     ("myopic_classifier_ensemble", False, 0, "all", False),
+     ("myopic_classifier_ensemble", False, 1, "all", False),
+     ("myopic_classifier_ensemble", False, 1, "all", True),
+     ("fitted_q", False, 0, "all", False), ("fitted_q", True, 0, "all", False),
+     ("myopic_classifier_knn", False, 0, "oracle", False)])
 def test_active_sampler_learning_approach(model_name, right_targets, num_demo,
-                                          feat_type):
+                                          feat_type, stacked):
     """Test for ActiveSamplerLearningApproach class, entire pipeline."""
     utils.reset_config({
         "env": "bumpy_cover",
@@ -51,6 +52,7 @@ def test_active_sampler_learning_approach(model_name, right_targets, num_demo,
         "active_sampler_learning_num_lookahead_samples": 2,
         "bumpy_cover_right_targets": right_targets,
         "active_sampler_learning_num_ensemble_members": 2,
+        "mlp_classifier_ensemble_stacked": stacked,
         "bilevel_plan_without_sim": True,
     })
     env = BumpyCoverEnv()
@@ -1,5 +1,6 @@
 """Test cases for the grammar search invention approach."""
 
+import tempfile
 from operator import gt
 
 import numpy as np
@@ -84,6 +85,21 @@ def test_predicate_grammar(segmenter):
     })
     forall_grammar = _create_grammar(dataset, env.predicates)
     assert len(forall_grammar.generate(max_num=100)) == 55
+    # Test the same thing with the ground atom cache. The second grammar
+    # loads the truth tables saved by the first.
+    default_data_dir = CFG.data_dir
+    with tempfile.TemporaryDirectory() as data_dir:
+        utils.update_config({
+            "grammar_search_use_atom_cache": True,
+            "data_dir": data_dir,
+        })
+        for _ in range(2):
+            forall_grammar = _create_grammar(dataset, env.predicates)
+            assert len(forall_grammar.generate(max_num=100)) == 55
+    utils.update_config({
+        "grammar_search_use_atom_cache": False,
+        "data_dir": default_data_dir,
+    })
     # Test CFG.grammar_search_predicate_cost_upper_bound.
     default = CFG.grammar_search_predicate_cost_upper_bound
     utils.reset_config({"grammar_search_predicate_cost_upper_bound": 0})
@@ -132,6 +148,16 @@ def test_single_attribute_compare_classifier():
     assert classifier(state0, [cup3])
     assert str(classifier) == "((2:cup_type).feat1>[idx 5]1.0)"
     assert classifier.pretty_str() == ("?z:cup_type", "(?z.feat1 > 1.0)")
+    # Test batch classification.
+    state1 = State({cup1: [3.0], cup2: [0.5], cup3: [1.5]})
+    choices = [[cup1], [cup2], [cup3]]
+    result = classifier.classify_batch([state0, state1], choices)
+    assert result.tolist() == [[False, False, True], [True, False, True]]
+    pred = Predicate("Pred", [cup_type], classifier)
+    negated = _NegationClassifier(pred)
+    assert negated.classify_batch([state0, state1],
+                                  choices).tolist() == [[True, True, False],
+                                                        [False, True, False]]
 
 
 def test_diff_attribute_compare_classifier():
@@ -146,6 +172,9 @@ def test_diff_attribute_compare_classifier():
                                                  gt, ">")
     state0 = State({cup1: [0.0], saucer1: [2.0]})
     assert classifier(state0, [cup1, saucer1])
+    state1 = State({cup1: [1.5], saucer1: [2.0]})
+    result = classifier.classify_batch([state0, state1], [[cup1, saucer1]])
+    assert result.tolist() == [[True], [False]]
     assert str(classifier
                ) == "(|(2:cup_type).feat1 - (0:saucer_type).feat1|>[idx 5]1.0)"
     assert classifier.pretty_str() == ('?z:cup_type, ?x:saucer_type',
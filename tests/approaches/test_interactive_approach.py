@@ -21,10 +21,12 @@ from predicators.structs import NSRT, Action, Array, Dataset, Object, State
 from predicators.teacher import Teacher
 
 
-@pytest.mark.parametrize("predicate_classifier_model,expectation",
-                         [("mlp", does_not_raise()), ("knn", does_not_raise()),
-                          ("not a real model", pytest.raises(ValueError))])
-def test_interactive_learning_approach(predicate_classifier_model,
+@pytest.mark.parametrize(
+    "predicate_classifier_model,stacked,expectation",
+    [("mlp", False, does_not_raise()), ("mlp", True, does_not_raise()),
+     ("knn", False, does_not_raise()),
+     ("not a real model", False, pytest.raises(ValueError))])
+def test_interactive_learning_approach(predicate_classifier_model, stacked,
                                        expectation):
     """Test for InteractiveLearningApproach class, entire pipeline."""
     utils.reset_config({
@@ -35,6 +37,7 @@ def test_interactive_learning_approach(predicate_classifier_model,
         "timeout": 10,
         "sampler_mlp_classifier_max_itr": 100,
         "predicate_classifier_model": predicate_classifier_model,
+        "mlp_classifier_ensemble_stacked": stacked,
         "predicate_mlp_classifier_max_itr": 100,
         "neural_gaus_regressor_max_itr": 100,
         "num_online_learning_cycles": 1,
@@ -367,6 +367,15 @@ def test_grammar_search_invention_approach():
                    sampler_learner="random",
                    num_train_tasks=3,
                    additional_settings=additional_settings)
+    # Test approach with parallel hill climbing.
+    additional_settings["grammar_search_parallelize_hill_climbing"] = True
+    _test_approach(env_name="cover",
+                   approach_name="grammar_search_invention",
+                   excluded_predicates="Holding",
+                   try_solving=False,
+                   sampler_learner="random",
+                   additional_settings=additional_settings)
+    del additional_settings["grammar_search_parallelize_hill_climbing"]
     # Test approach with unrecognized search algorithm.
     additional_settings["grammar_search_search_algorithm"] = \
         "not a real search algorithm"
@@ -378,8 +387,9 @@ def test_grammar_search_invention_approach():
                        sampler_learner="random",
                        additional_settings=additional_settings)
     assert "Unrecognized grammar_search_search_algorithm" in str(e.value)
-    # Test approach with gbfs.
+    # Test approach with gbfs and the ground atom cache.
     additional_settings["grammar_search_search_algorithm"] = "gbfs"
+    additional_settings["grammar_search_use_atom_cache"] = True
     _test_approach(env_name="cover",
                    approach_name="grammar_search_invention",
                    excluded_predicates="Holding",
@@ -1,19 +1,25 @@
 """Test cases for dataset generation."""
 import os
 import shutil
+import tempfile
 from contextlib import nullcontext as does_not_raise
 
+import dill as pkl
+import numpy as np
 import pytest
 
 from predicators import utils
 from predicators.datasets import create_dataset
+from predicators.datasets.demo_only import _generate_demonstrations
+from predicators.datasets.trajectory_store import TrajectoryStore
 from predicators.envs.blocks import BlocksEnv
 from predicators.envs.cluttered_table import ClutteredTableEnv
 from predicators.envs.cover import CoverEnv, CoverMultistepOptions
 from predicators.ground_truth_models import _get_predicates_by_names, \
     get_gt_options, parse_config_included_options
 from predicators.settings import CFG
-from predicators.structs import Dataset, GroundAtom, Task
+from predicators.structs import Action, ArrayState, Dataset, GroundAtom, \
+    LowLevelTrajectory, State, Task, Type
 
 
 def test_demo_dataset():
@@ -257,6 +263,207 @@ def test_demo_dataset_loading_tricky_case(num_train_tasks, load_data,
                for traj in dataset.trajectories)
 
 
+def test_demo_dataset_in_parallel():
+    """Test demo-only dataset creation with multiple worker processes."""
+    config = {
+        "env": "cover",
+        "approach": "random_actions",
+        "offline_data_method": "demo",
+        "offline_data_planning_timeout": 500,
+        "option_learner": "no_learning",
+        "num_train_tasks": 6,
+        "max_initial_demos": 5,
+    }
+    utils.reset_config(config)
+    env = CoverEnv()
+    train_tasks = [t.task for t in env.get_train_tasks()]
+    options = get_gt_options(env.get_name())
+    sequential_dataset = _generate_demonstrations(env,
+                                                  train_tasks,
+                                                  options,
+                                                  train_tasks_start_idx=2,
+                                                  annotate_with_gt_ops=True)
+    utils.reset_config({**config, "offline_data_num_workers": 2})
+    parallel_dataset = _generate_demonstrations(env,
+                                                train_tasks,
+                                                options,
+                                                train_tasks_start_idx=2,
+                                                annotate_with_gt_ops=True)
+    # The demonstrations should be identical and in task order.
+    assert [traj.train_task_idx
+            for traj in parallel_dataset.trajectories] == [2, 3, 4]
+    for seq_traj, par_traj in zip(sequential_dataset.trajectories,
+                                  parallel_dataset.trajectories):
+        assert par_traj.is_demo
+        assert len(seq_traj.states) == len(par_traj.states)
+        for seq_state, par_state in zip(seq_traj.states, par_traj.states):
+            assert seq_state.allclose(par_state)
+        for seq_act, par_act in zip(seq_traj.actions, par_traj.actions):
+            assert np.array_equal(seq_act.arr, par_act.arr)
+            assert par_act.has_option()
+            assert par_act.get_option().parent in options
+    for seq_plan, par_plan in zip(sequential_dataset.annotations,
+                                  parallel_dataset.annotations):
+        assert [str(n) for n in seq_plan] == [str(n) for n in par_plan]
+
+
+def test_demo_dataset_with_trajectory_store():
+    """Test demo-only dataset creation with a TrajectoryStore."""
+    config = {
+        "env": "cover",
+        "approach": "random_actions",
+        "offline_data_method": "demo+gt_operators",
+        "offline_data_planning_timeout": 500,
+        "option_learner": "no_learning",
+        "offline_data_use_trajectory_store": True,
+        "num_train_tasks": 3,
+        "load_data": False,
+    }
+    utils.reset_config(config)
+    env = CoverEnv()
+    train_tasks = [t.task for t in env.get_train_tasks()]
+    options = get_gt_options(env.get_name())
+    dataset = create_dataset(env, train_tasks, options)
+    assert len(dataset.trajectories) == 3
+    assert len(dataset.annotations) == 3
+    # Loading more data should generate and append the rest.
+    utils.reset_config({**config, "num_train_tasks": 5, "load_data": True})
+    env = CoverEnv()
+    train_tasks = [t.task for t in env.get_train_tasks()]
+    dataset = create_dataset(env, train_tasks, options)
+    assert [traj.train_task_idx
+            for traj in dataset.trajectories] == [0, 1, 2, 3, 4]
+    assert len(dataset.annotations) == 5
+    expected_dataset = _generate_demonstrations(env,
+                                                train_tasks,
+                                                options,
+                                                train_tasks_start_idx=0,
+                                                annotate_with_gt_ops=True)
+    for traj, expected_traj in zip(dataset.trajectories,
+                                   expected_dataset.trajectories):
+        assert traj.is_demo
+        assert len(traj.states) == len(expected_traj.states)
+        for state, expected_state in zip(traj.states, expected_traj.states):
+            assert state.allclose(expected_state)
+        for act, expected_act in zip(traj.actions, expected_traj.actions):
+            assert np.allclose(act.arr, expected_act.arr)
+            assert act.get_option().name == expected_act.get_option().name
+    # Loading less data should only load a prefix.
+    utils.reset_config({**config, "num_train_tasks": 2, "load_data": True})
+    env = CoverEnv()
+    train_tasks = [t.task for t in env.get_train_tasks()]
+    dataset = create_dataset(env, train_tasks, options)
+    assert [traj.train_task_idx for traj in dataset.trajectories] == [0, 1]
+    assert len(dataset.annotations) == 2
+    # The store should only cover the train tasks for which demonstrations
+    # were generated, given CFG.max_initial_demos.
+    utils.reset_config({**config, "max_initial_demos": 1})
+    dataset = create_dataset(env, train_tasks, options)
+    assert [traj.train_task_idx for traj in dataset.trajectories] == [0]
+    store_dir = os.path.join(CFG.data_dir,
+                             "cover__demo+gt_operators__oracle____123__store")
+    assert TrajectoryStore(store_dir).num_train_tasks == 1
+    # Loading from a store that does not exist should fail.
+    utils.reset_config({**config, "load_data": True})
+    shutil.rmtree(CFG.data_dir)
+    with pytest.raises(ValueError) as e:
+        create_dataset(env, train_tasks, options)
+    assert "Cannot load data" in str(e)
+
+
+def test_trajectory_store():
+    """Tests for TrajectoryStore."""
+    utils.reset_config()
+    cup_type = Type("cup_type", ["feat1"])
+    plate_type = Type("plate_type", ["feat1", "feat2"])
+    cup = cup_type("cup")
+    plate1 = plate_type("plate1")
+    plate2 = plate_type("plate2")
+    option = utils.SingletonParameterizedOption(
+        "Dummy", lambda s, m, o, p: Action(np.array([0.0]))).ground(
+            [], np.zeros(0, dtype=np.float32))
+    # The second plate appears halfway through the first trajectory.
+    states = [
+        State({
+            cup: np.array([0.1]),
+            plate1: np.array([1.0, 2.0])
+        }),
+        State({
+            cup: np.array([0.2]),
+            plate1: np.array([3.0, 4.0])
+        }),
+        State({
+            cup: np.array([0.3]),
+            plate1: np.array([5.0, 6.0]),
+            plate2: np.array([7.0, 8.0])
+        }),
+    ]
+    actions = [
+        Action(np.array([0.5], dtype=np.float32), option),
+        Action(np.array([0.6], dtype=np.float32), extra_info="info"),
+    ]
+    traj1 = LowLevelTrajectory(states, actions, True, 0)
+    array_states = [
+        ArrayState({cup: np.array([1.5])}, simulator_state="sim1"),
+        ArrayState({cup: np.array([2.5])}, simulator_state="sim2"),
+    ]
+    traj2 = LowLevelTrajectory(array_states,
+                               [Action(np.array([0.7], dtype=np.float32))])
+    traj3 = LowLevelTrajectory([State({plate2: np.array([9.0, 9.5])})], [],
+                               True, 2)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store_dir = os.path.join(tmpdir, "store")
+        store = TrajectoryStore(store_dir)
+        assert not store.exists()
+        assert store.num_trajectories == 0
+        store.append(Dataset([traj1, traj2], ["a1", "a2"]), num_train_tasks=2)
+        assert store.exists()
+        assert store.has_annotations
+        store.append(Dataset([traj3], ["a3"]))
+        with pytest.raises(AssertionError):
+            store.append(Dataset([traj3]))
+        # Reopen the store from disk.
+        store = TrajectoryStore(store_dir)
+        assert store.num_trajectories == 3
+        assert store.num_train_tasks == 2
+        dataset = store.load()
+        assert dataset.annotations == ["a1", "a2", "a3"]
+        loaded1, loaded2, loaded3 = dataset.trajectories
+        assert loaded1.is_demo and loaded1.train_task_idx == 0
+        assert not loaded2.is_demo
+        assert loaded3.train_task_idx == 2
+        for state, loaded_state in zip(states, loaded1.states):
+            assert list(state) == list(loaded_state)
+            assert state.allclose(loaded_state)
+        assert loaded1.actions[0].get_option().name == "Dummy"
+        assert not loaded1.actions[1].has_option()
+        assert loaded1.actions[1].extra_info == "info"
+        assert np.allclose(loaded1.actions[1].arr, [0.6])
+        assert isinstance(loaded2.states[0], ArrayState)
+        assert [s.simulator_state for s in loaded2.states] == ["sim1", "sim2"]
+        assert loaded2.states[1].get(cup, "feat1") == 2.5
+        assert len(loaded3.states) == 1 and not loaded3.actions
+        # The loaded states can be modified.
+        loaded1.states[0].set(cup, "feat1", 0.9)
+        assert loaded1.states[0].get(cup, "feat1") == 0.9
+        # Loading a prefix skips trajectories without train task indices.
+        dataset = store.load(num_train_tasks=1)
+        assert len(dataset.trajectories) == 1
+        assert dataset.annotations == ["a1"]
+        # Pickling produces a regular trajectory.
+        unpickled = pkl.loads(pkl.dumps(loaded1))
+        assert type(unpickled) is LowLevelTrajectory  # pylint: disable=unidiomatic-typecheck
+        assert unpickled.train_task_idx == 0
+        assert len(unpickled.states) == 3
+        store.clear()
+        assert not store.exists()
+        assert store.num_trajectories == 0
+        # An empty dataset without annotations can be appended.
+        store.append(Dataset([]))
+        assert not store.has_annotations
+        assert not TrajectoryStore(store_dir).load().trajectories
+
+
 def test_demo_replay_dataset():
     """Test demo+replay dataset creation with Covers env."""
     # Test that data contains options since
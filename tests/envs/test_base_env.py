@@ -9,6 +9,7 @@ import pytest
 import predicators.envs
 from predicators import utils
 from predicators.envs import BaseEnv, create_new_env, get_or_create_env
+from predicators.structs import Action, ArrayState
 from tests.approaches.test_oracle_approach import ENV_NAME_AND_CLS
 
 _MODULE_PATH = predicators.envs.__name__
@@ -38,6 +39,44 @@ def test_env_creation():
         create_new_env("Not a real env")
 
 
+def test_use_array_states():
+    """Tests for converting the initial states of tasks to ArrayStates."""
+    utils.reset_config({
+        "env": "cover",
+        "num_train_tasks": 2,
+        "num_test_tasks": 2,
+    })
+    env = create_new_env("cover")
+    state_tasks = env.get_train_tasks() + env.get_test_tasks()
+    utils.reset_config({
+        "env": "cover",
+        "num_train_tasks": 2,
+        "num_test_tasks": 2,
+        "use_array_states": True,
+    })
+    env = create_new_env("cover")
+    array_tasks = env.get_train_tasks() + env.get_test_tasks()
+    action = Action(env.action_space.sample())
+    for state_task, array_task in zip(state_tasks, array_tasks):
+        assert not isinstance(state_task.init, ArrayState)
+        assert isinstance(array_task.init, ArrayState)
+        assert array_task.init.allclose(state_task.init)
+        assert array_task.goal == state_task.goal
+        # Simulating copies the state, so the next state is an ArrayState.
+        next_state = env.simulate(array_task.init, action)
+        assert isinstance(next_state, ArrayState)
+        assert next_state.allclose(env.simulate(state_task.init, action))
+    # Subclasses of State are not converted.
+    utils.reset_config({
+        "env": "pddl_blocks_procedural_tasks",
+        "num_train_tasks": 1,
+        "num_test_tasks": 1,
+        "use_array_states": True,
+    })
+    env = create_new_env("pddl_blocks_procedural_tasks")
+    assert not isinstance(env.get_train_tasks()[0].init, ArrayState)
+
+
 @pytest.mark.parametrize("env_name", ("cover", "sandwich"))
 def test_load_task_from_json(env_name):
     """Tests for env._load_task_from_json()."""
@@ -13,7 +13,7 @@ from predicators import utils
 from predicators.envs.pybullet_blocks import PyBulletBlocksEnv
 from predicators.ground_truth_models import get_gt_options
 from predicators.settings import CFG
-from predicators.structs import Object, ParameterizedOption, State
+from predicators.structs import Action, Object, ParameterizedOption, State
 
 _GUI_ON = False  # toggle for debugging
 
@@ -176,6 +176,61 @@ def test_pybullet_blocks_picking(env):
     assert state.get(robot, "fingers") == 0.0
 
 
+def test_pybullet_blocks_snapshots(env):
+    """Tests for returning to previously simulated states in
+    PyBulletBlocksEnv."""
+    block = Object("block0", env.block_type)
+    robot = env.robot
+    bx = (env.x_lb + env.x_ub) / 2
+    by = (env.y_lb + env.y_ub) / 2
+    bz = env.table_height + 0.5 * env.block_size
+    rx, ry, rz = env.robot_init_x, env.robot_init_y, env.robot_init_z
+    init_state = State({
+        robot: np.array([rx, ry, rz, 1.0]),
+        block: np.array([bx, by, bz, 0.0, 1.0, 0.0, 0.0]),
+    })
+    env.set_state(init_state)
+    state0 = env.get_state()
+    option = env.Pick.ground([robot, block], [])
+    held_state = env.execute_option(option)
+    assert held_state.get(block, "held") == 1.0
+    other_state = state0.copy()
+    other_state.set(block, "color_g", 1.0)
+
+    def _simulate(state):
+        # Keep the robot where it is.
+        action = Action(np.array(state.joint_positions, dtype=np.float32))
+        return env.simulate(state, action)
+
+    utils.update_config({"pybullet_max_snapshots": 2})
+    num_resets = env.num_state_resets
+    num_restores = env.num_snapshot_restores
+    next_state0 = _simulate(state0)
+    next_held_state = _simulate(held_state)
+    assert env.num_state_resets == num_resets + 2
+    # Returning to the same states should restore snapshots, including the
+    # grasp of the held block.
+    assert _simulate(state0).allclose(next_state0)
+    next_state = _simulate(held_state)
+    assert next_state.allclose(next_held_state)
+    assert next_state.get(block, "held") == 1.0
+    assert env.num_state_resets == num_resets + 2
+    assert env.num_snapshot_restores == num_restores + 2
+    # The least recently used snapshot should be removed.
+    next_state = _simulate(other_state)
+    assert next_state.get(block, "color_g") == 1.0
+    assert _simulate(held_state).allclose(next_held_state)
+    assert env.num_snapshot_restores == num_restores + 3
+    assert _simulate(state0).allclose(next_state0)
+    assert env.num_state_resets == num_resets + 4
+    # Test disabling snapshots.
+    utils.update_config({"pybullet_max_snapshots": 0})
+    _simulate(other_state)
+    _simulate(state0)
+    assert env.num_state_resets == num_resets + 6
+    assert env.num_snapshot_restores == num_restores + 3
+
+
 def test_pybullet_blocks_picking_corners(env):
     """Test that the block can be picked at the extremes of the workspace."""
     block = Object("block0", env.block_type)
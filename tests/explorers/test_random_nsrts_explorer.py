@@ -41,3 +41,14 @@ def test_random_nsrts_explorer():
     with pytest.raises(utils.RequestActPolicyFailure) as e:
         policy(task.init)
     assert "No applicable NSRT in this state!" in str(e)
+
+    # Test the static pruning grounder.
+    utils.reset_config({
+        "env": "touch_open",
+        "explorer": "random_nsrts",
+        "sesame_grounder": "static_pruning",
+    })
+    explorer = create_explorer("random_nsrts", env.predicates, options,
+                               env.types, env.action_space, train_tasks, nsrts)
+    policy, _ = explorer.get_exploration_strategy(task_idx, 500)
+    assert env.action_space.contains(policy(task.init).arr)
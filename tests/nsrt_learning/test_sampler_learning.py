@@ -176,12 +176,27 @@ def test_learned_sampler_with_goal():
         lambda s, m, o, p: Action(np.array([0.0])),
         params_space=Box(0, 1, (1, )))
 
-    ls = _LearnedSampler(classifier, regressor, variables,
-                         parameterized_option).sampler
+    learned_sampler = _LearnedSampler(classifier, regressor, variables,
+                                      parameterized_option)
+    ls = learned_sampler.sampler
     params = ls(state, goal, rng, objects)
     assert not params is None
+    params = learned_sampler(state, goal, rng, objects)
+    assert params.shape == (output_size, )
+
+    # Test sampling in batches. The classifier is untrained, so give it fixed
+    # scores to check that the candidates are sorted by them.
+    scores = np.array([0.2, 0.9, 0.5, 0.9])
+    classifier.predict_probas = lambda X: scores[:len(X)]
+    regressor.predict_samples = lambda x, n, r: np.array([[0.1], [0.2], [1.5],
+                                                          [0.4]])[:n]
+    params_batch = learned_sampler.sample_batch(state, goal, rng, objects, 4)
+    # The out-of-bounds candidate goes last; ties keep their order.
+    assert np.allclose(params_batch, [[0.2], [0.4], [0.1], [1.5]])
 
     # Should still work when the classifier is disabled.
     utils.update_config({"sampler_disable_classifier": True})
     params = ls(state, goal, rng, objects)
     assert not params is None
+    params_batch = learned_sampler.sample_batch(state, goal, rng, objects, 3)
+    assert np.allclose(params_batch, [[0.1], [0.2], [1.5]])
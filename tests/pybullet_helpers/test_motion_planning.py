@@ -7,6 +7,7 @@ import pybullet as p
 
 from predicators import utils
 from predicators.envs.pybullet_env import create_pybullet_block
+from predicators.pybullet_helpers import motion_planning
 from predicators.pybullet_helpers.camera import create_gui_connection
 from predicators.pybullet_helpers.geometry import Pose
 from predicators.pybullet_helpers.joint import JointPositions
@@ -132,6 +133,101 @@ def test_run_motion_planning(physics_client_id):
     p.removeBody(block_id, physicsClientId=physics_client_id)
 
 
+def test_motion_planning_collision_checking(physics_client_id):
+    """Tests for skipping and reusing collision checks in
+    run_motion_planning()."""
+    # pylint: disable=protected-access
+    utils.reset_config()
+    home_pose = Pose((1.35, 0.75, 0.75), (0.7071, 0.7071, 0.0, 0.0))
+    robot = create_single_arm_pybullet_robot("panda", physics_client_id,
+                                             home_pose)
+    joint_initial = robot.get_joints()
+    # Rotate the base joint, with a block in the way of the end effector.
+    joint_target = list(joint_initial)
+    joint_target[0] += 1.5
+    joint_middle = list(joint_initial)
+    joint_middle[0] += 0.75
+    block_id = create_pybullet_block(color=(1.0, 0.0, 0.0, 1.0),
+                                     half_extents=(0.05, 0.05, 0.05),
+                                     mass=0,
+                                     friction=1,
+                                     orientation=(0.0, 0.0, 0.0, 1.0),
+                                     physics_client_id=physics_client_id)
+    p.resetBasePositionAndOrientation(
+        block_id,
+        robot.forward_kinematics(joint_middle).position, (0.0, 0.0, 0.0, 1.0),
+        physicsClientId=physics_client_id)
+
+    def _check_path(path):
+        assert path is not None
+        assert np.allclose(path[0], joint_initial)
+        assert np.allclose(path[-1], joint_target)
+        for pt in path:
+            robot.set_joints(pt)
+            p.performCollisionDetection(physicsClientId=physics_client_id)
+            assert not p.getContactPoints(
+                robot.robot_id, block_id, physicsClientId=physics_client_id)
+
+    num_checks = {}
+    for margin in [0.0, 0.5]:
+        utils.reset_config({
+            "pybullet_birrt_extend_num_interp": 50,
+            "pybullet_birrt_collision_margin": margin,
+        })
+        path = run_motion_planning(robot,
+                                   joint_initial,
+                                   joint_target,
+                                   collision_bodies={block_id},
+                                   seed=123,
+                                   physics_client_id=physics_client_id)
+        _check_path(path)
+        num_checks[margin] = len(motion_planning._COLLISION_CACHE[1])
+    # Points close to others with enough clearance should not be checked.
+    assert num_checks[0.5] < num_checks[0.0]
+    # Results should be reused between queries in the same scene.
+    utils.reset_config({"pybullet_birrt_collision_cache_resolution": 1e-3})
+    path = run_motion_planning(robot,
+                               joint_initial,
+                               joint_target,
+                               collision_bodies={block_id},
+                               seed=123,
+                               physics_client_id=physics_client_id)
+    _check_path(path)
+    cache = motion_planning._COLLISION_CACHE[1]
+    num_entries = len(cache)
+    path = run_motion_planning(robot,
+                               joint_initial,
+                               joint_target,
+                               collision_bodies={block_id},
+                               seed=123,
+                               physics_client_id=physics_client_id)
+    _check_path(path)
+    assert motion_planning._COLLISION_CACHE[1] is cache
+    assert len(cache) == num_entries
+    # Moving a collision body should invalidate the results.
+    p.resetBasePositionAndOrientation(block_id, (0.0, 0.0, 5.0),
+                                      (0.0, 0.0, 0.0, 1.0),
+                                      physicsClientId=physics_client_id)
+    path = run_motion_planning(robot,
+                               joint_initial,
+                               joint_target,
+                               collision_bodies={block_id},
+                               seed=123,
+                               physics_client_id=physics_client_id)
+    _check_path(path)
+    assert motion_planning._COLLISION_CACHE[1] is not cache
+    # The number of results kept should be bounded.
+    utils.reset_config({"pybullet_birrt_collision_cache_max_size": 10})
+    path = run_motion_planning(robot,
+                               joint_initial,
+                               joint_target,
+                               collision_bodies={block_id},
+                               seed=123,
+                               physics_client_id=physics_client_id)
+    _check_path(path)
+    assert len(motion_planning._COLLISION_CACHE[1]) == 10
+
+
 def test_move_to_shelf():
     """Test for Panda robot moving to put a held block into a shelf.
 
@@ -1,5 +1,9 @@
 """Test cases for pybullet_robots."""
 
+import os
+import tempfile
+from unittest.mock import patch
+
 import numpy as np
 import pybullet as p
 import pytest
@@ -7,6 +11,7 @@ import pytest
 from predicators import utils
 from predicators.pybullet_helpers.geometry import Pose
 from predicators.pybullet_helpers.inverse_kinematics import \
+    InverseKinematicsCache, InverseKinematicsError, \
     pybullet_inverse_kinematics
 from predicators.pybullet_helpers.joint import get_kinematic_chain
 from predicators.pybullet_helpers.link import BASE_LINK, get_link_pose, \
@@ -245,3 +250,101 @@ def test_create_single_arm_pybullet_robot(physics_client_id):
     with pytest.raises(NotImplementedError) as e:
         create_single_arm_pybullet_robot("not a real robot", physics_client_id)
     assert "Unrecognized robot name" in str(e)
+
+
+def test_inverse_kinematics_cache(physics_client_id):
+    """Tests for InverseKinematicsCache and warm starting PyBullet IK."""
+    orn = (0.7071, 0.7071, 0.0, 0.0)
+    cache = InverseKinematicsCache(resolution=1e-3)
+    pose = Pose((1.0, 0.5, 0.5), orn)
+    home_joints = [0.0, 0.0]
+    assert cache.get_seed(pose, home_joints) is None
+    cache.add(pose, home_joints, [0.0, 1.0])
+    cache.add(Pose((1.0, 0.5, 0.8), orn), home_joints, [2.0, 3.0])
+    cache.add(Pose((1.0, 0.5, 0.7), orn), [1.0, 1.0], [4.0, 5.0])
+    assert len(cache) == 3
+    # Poses and seeds are quantized, and q and -q are the same orientation.
+    close_pose = Pose((1.0001, 0.5, 0.5), np.negative(orn))
+    # pylint: disable=protected-access
+    assert cache._get_key(close_pose, [1e-4, 0.0]) == \
+        cache._get_key(pose, home_joints)
+    assert cache.get_seed(close_pose, home_joints) == [0.0, 1.0]
+    # Otherwise, the solution for the nearest pose with the same seed is
+    # used, so solutions found from other seeds are never used.
+    assert cache.get_seed(Pose((1.0, 0.5, 0.7), orn), home_joints) == \
+        [2.0, 3.0]
+    assert cache.get_seed(pose, [1.0, 1.0]) == [4.0, 5.0]
+    assert cache.get_seed(pose, [2.0, 2.0]) is None
+    assert cache.get_seed(pose, [0.0, 0.0, 0.0]) is None
+    cache.save()  # no save path, so nothing happens
+    utils.reset_config({"pybullet_control_mode": "reset"})
+    home_pose = Pose((1.35, 0.75, 0.75), orn)
+    base_pose = Pose((0.8, 0.7441, 0.195))
+    robot_states = [
+        np.array([1.35 + dx, 0.75, 0.6, *orn, 0.04])
+        for dx in [-0.1, 0.0, 0.1, 0.0]
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir, \
+            patch.object(PandaPyBulletRobot, "ikfast_info", return_value=None):
+        # The cache is only used if enabled.
+        robot = PandaPyBulletRobot(home_pose, physics_client_id, base_pose)
+        assert robot._ik_cache is None
+        cache_dir = os.path.join(tmpdir, "ik_cache")
+        utils.reset_config({
+            "pybullet_control_mode": "reset",
+            "pybullet_ik_use_cache": True,
+            "pybullet_ik_cache_dir": cache_dir,
+        })
+        robot = PandaPyBulletRobot(home_pose, physics_client_id, base_pose)
+        for robot_state in robot_states:
+            robot.reset_state(robot_state)
+            assert np.allclose(robot.get_state()[:3],
+                               robot_state[:3],
+                               atol=CFG.pybullet_ik_tol)
+        # The home pose and the three distinct poses are cached.
+        cache = robot._ik_cache
+        assert len(cache) == 4
+        # Solutions found from other joint positions are not used when
+        # resetting, so resetting stays in the same solution branch as IK
+        # without the cache.
+        robot.set_joints(robot.initial_joint_positions)
+        robot.inverse_kinematics(Pose((1.35, 0.75, 0.6), orn), validate=True)
+        robot.inverse_kinematics(Pose((1.3, 0.75, 0.6), orn), validate=True)
+        assert len(cache) == 5
+        uncached_robot = PandaPyBulletRobot(home_pose, physics_client_id,
+                                            base_pose)
+        uncached_robot._ik_cache = None
+        for robot_state in robot_states:
+            robot.reset_state(robot_state)
+            uncached_robot.reset_state(robot_state)
+            assert np.allclose(robot.get_joints(),
+                               uncached_robot.get_joints(),
+                               atol=5e-2)
+        assert len(cache) == 5
+        cache.save()
+        assert len(os.listdir(cache_dir)) == 1
+        # Unvalidated IK does not use the cache.
+        robot.inverse_kinematics(Pose((1.3, 0.75, 0.6), orn), validate=False)
+        assert len(cache) == 5
+        # If IK fails from the given joint positions, the robot is reset to
+        # its current joint positions.
+        joints = robot.get_joints()
+        seed = cache.get_seed(home_pose, robot.initial_joint_positions)
+        with pytest.raises(InverseKinematicsError):
+            pybullet_inverse_kinematics(robot.robot_id,
+                                        robot.end_effector_id,
+                                        (1.35, 0.75, 100.0),
+                                        orn,
+                                        robot.arm_joints,
+                                        physics_client_id=physics_client_id,
+                                        validate=True,
+                                        initial_joint_positions=seed)
+        assert np.allclose(robot.get_joints(), joints)
+        # If IK fails from the cached solution, it is retried from the
+        # current joint positions before failing.
+        with pytest.raises(InverseKinematicsError):
+            robot.inverse_kinematics(Pose((1.35, 0.75, 100.0), orn),
+                                     validate=True)
+        # Solutions are shared with new robots through the saved cache.
+        robot = PandaPyBulletRobot(home_pose, physics_client_id, base_pose)
+        assert len(robot._ik_cache) == 5
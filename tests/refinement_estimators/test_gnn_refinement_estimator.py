@@ -204,6 +204,28 @@ def test_gnn_refinement_estimator_arities():
     test_cost = estimator.get_cost(task, skeleton, atoms_sequence)
     assert test_cost < float('inf')
 
+    # Test that batched costs match the individual costs
+    skeleton2 = [ZeroArityNSRT.ground([]), ZeroArityNSRT.ground([])]
+    atoms_sequence2 = [goal, set(), goal]
+    test_cost2 = estimator.get_cost(task, skeleton2, atoms_sequence2)
+    test_costs = estimator.get_costs(task, [(skeleton, atoms_sequence),
+                                            ([], [goal]),
+                                            (skeleton2, atoms_sequence2)])
+    assert np.allclose(test_costs, [test_cost, 0.0, test_cost2])
+    assert not estimator.get_costs(task, [])
+    # The static parts of the graph are reused for a copy of the task
+    graphify_static = estimator._graphify_static_input  # pylint: disable=protected-access
+    static_graph = graphify_static(initial_state, goal)
+    task2 = Task(initial_state.copy(), set(goal))
+    assert np.isclose(estimator.get_cost(task2, skeleton, atoms_sequence),
+                      test_cost)
+    assert graphify_static(task2.init, task2.goal) is static_graph
+    # ...and recomputed for a task with a different initial state
+    state3 = initial_state.copy()
+    state3.set(robot, "x", state3.get(robot, "x") + 0.01)
+    estimator.get_cost(Task(state3, goal), skeleton, atoms_sequence)
+    assert graphify_static(initial_state, goal) is not static_graph
+
     # Create fake directory to test saving and loading model
     parent_dir = os.path.dirname(__file__)
     approach_dir = os.path.join(parent_dir, "_fake_approach")
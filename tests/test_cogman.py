@@ -72,3 +72,47 @@ def test_cogman_with_expected_atoms_monitor():
     next_obs = env.step(act)
     next_act = cogman.step(next_obs)
     assert not np.allclose(act.arr, next_act.arr)
+
+
+def test_cogman_incremental_replanning():
+    """Tests for CogMan() with cogman_incremental_replanning."""
+    env_name = "cover"
+    utils.reset_config({
+        "env": env_name,
+        "num_train_tasks": 0,
+        "num_test_tasks": 2,
+        "approach": "oracle",
+        "cogman_incremental_replanning": True,
+    })
+    env = get_or_create_env(env_name)
+    env_test_tasks = env.get_test_tasks()
+    options = get_gt_options(env.get_name())
+    perceiver = create_perceiver("trivial")
+    # Approaches replan from scratch by default.
+    approach = create_approach("random_actions", env.predicates, options,
+                               env.types, env.action_space, [])
+    cogman = CogMan(approach, perceiver, create_execution_monitor("mpc"))
+    env.reset("test", 0)
+    env_task = env_test_tasks[0]
+    cogman.reset(env_task)
+    obs = env.step(cogman.step(env_task.init_obs))
+    assert env.action_space.contains(cogman.step(obs).arr)
+    # Bilevel planning approaches repair the previous skeleton.
+    approach = create_approach("oracle", env.predicates, options, env.types,
+                               env.action_space, [])
+    cogman = CogMan(approach, perceiver, create_execution_monitor("mpc"))
+    obs = env.reset("test", 0)
+    cogman.reset(env_task)
+    metrics = approach.metrics
+    plan_length = metrics["total_plan_length"]
+    for _ in range(int(plan_length)):
+        assert not env.goal_reached()
+        obs = env.step(cogman.step(obs))
+    assert env.goal_reached()
+    # The MPC monitor replans after every step, and each time, the suffix of
+    # the previous skeleton is refined without searching.
+    new_metrics = approach.metrics
+    assert new_metrics["total_num_skeletons_optimized"] == \
+        metrics["total_num_skeletons_optimized"] + plan_length - 1
+    assert new_metrics["total_num_nodes_expanded"] == \
+        metrics["total_num_nodes_expanded"]
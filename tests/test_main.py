@@ -19,6 +19,7 @@ from predicators.execution_monitoring import create_execution_monitor
 from predicators.ground_truth_models import get_gt_options
 from predicators.main import _run_episode, _run_testing, main
 from predicators.perception import create_perceiver
+from predicators.results_store import ResultsStore
 from predicators.structs import Action, DefaultState, State, Task
 
 _GROUND_TRUTH_MODULE_PATH = predicators.ground_truth_models.__name__
@@ -115,13 +116,28 @@ def test_main():
     video_dir = os.path.join(parent_dir, "_fake_videos")
     results_dir = os.path.join(parent_dir, "_fake_results")
     eval_traj_dir = os.path.join(parent_dir, "_fake_trajs")
+    results_store_dir = tempfile.TemporaryDirectory()
+    results_store_path = os.path.join(results_store_dir.name, "results.db")
     sys.argv = [
         "dummy", "--env", "cover", "--approach", "oracle", "--seed", "123",
         "--make_test_videos", "--make_cogman_videos", "--num_test_tasks", "1",
         "--video_dir", video_dir, "--results_dir", results_dir,
-        "--eval_trajectories_dir", eval_traj_dir
+        "--eval_trajectories_dir", eval_traj_dir, "--results_store_path",
+        results_store_path
     ]
     main()
+    # Test that the results were also added to the results store.
+    store = ResultsStore(results_store_path)
+    runs = list(store.iter_runs(["env", "seed", "cycle", "num_solved"]))
+    assert runs == [{
+        "env": "cover",
+        "seed": 123,
+        "cycle": None,
+        "num_solved": 1
+    }]
+    assert len(list(store.iter_per_task_metrics(metric="solve_time"))) == 1
+    store.close()
+    results_store_dir.cleanup()
     # Test making videos of failures and local logging.
     temp_log_file = tempfile.NamedTemporaryFile(delete=False).name
     sys.argv = [
@@ -165,6 +181,14 @@ def test_main():
         "--load_experiment_id", "foobar", "--experiment_id", "baz"
     ]
     main()
+    # Try loading approaches in parallel test workers.
+    sys.argv = [
+        "dummy", "--env", "cover", "--approach", "nsrt_learning", "--seed",
+        "123", "--load_approach", "--cover_initial_holding_prob", "0.0",
+        "--load_experiment_id", "foobar", "--experiment_id", "baz",
+        "--num_test_tasks", "2", "--num_test_workers", "2"
+    ]
+    main()
     # Run NSRT learning with option learning.
     sys.argv = [
         "dummy", "--env", "blocks", "--approach", "nsrt_learning", "--seed",
@@ -220,6 +244,36 @@ def test_main():
     main()
 
 
+def test_run_testing_in_parallel():
+    """Tests for _run_testing() with multiple test workers."""
+    eval_traj_dir = tempfile.TemporaryDirectory()
+    utils.reset_config({
+        "env": "cover",
+        "approach": "oracle",
+        "num_test_tasks": 3,
+        "eval_trajectories_dir": eval_traj_dir.name,
+    })
+    env = CoverEnv()
+    train_tasks = [t.task for t in env.get_train_tasks()]
+    approach = create_approach("oracle", env.predicates,
+                               get_gt_options(env.get_name()), env.types,
+                               env.action_space, train_tasks)
+    cogman = CogMan(approach, create_perceiver("trivial"),
+                    create_execution_monitor("trivial"))
+    sequential_metrics = _run_testing(env, cogman)
+    utils.update_config({"num_test_workers": 2})
+    parallel_metrics = _run_testing(env, cogman)
+    # The results should be merged in the same order. Note that the values
+    # may differ because each worker has its own approach, e.g., with its own
+    # random number generator.
+    assert list(parallel_metrics) == list(sequential_metrics)
+    assert parallel_metrics["num_solved"] == 3
+    assert parallel_metrics["num_total"] == 3
+    # Each worker saves the trajectories of its test tasks.
+    assert len(os.listdir(eval_traj_dir.name)) == 3
+    eval_traj_dir.cleanup()
+
+
 def test_bilevel_planning_approach_failure_and_timeout():
     """Test coverage for ApproachFailure and ApproachTimeout in
     run_testing()."""
@@ -13,8 +13,8 @@ from predicators.ground_truth_models import get_gt_nsrts, get_gt_options
 from predicators.ml_models import BinaryClassifierEnsemble, CNNRegressor, \
     DegenerateMLPDistributionRegressor, ImplicitMLPRegressor, \
     KNeighborsClassifier, KNeighborsRegressor, MapleQFunction, \
-    MLPBinaryClassifier, MLPRegressor, MonotonicBetaRegressor, \
-    NeuralGaussianRegressor
+    MLPBinaryClassifier, MLPBinaryClassifierEnsemble, MLPRegressor, \
+    MonotonicBetaRegressor, NeuralGaussianRegressor
 
 
 def test_basic_mlp_regressor():
@@ -46,6 +46,20 @@ def test_basic_mlp_regressor():
     expected_y = 75 * np.ones(output_size)
     assert predicted_y.shape == expected_y.shape
     assert np.allclose(predicted_y, expected_y, atol=1e-2)
+    # Test with minibatches and held-out data for early stopping.
+    model = MLPRegressor(seed=123,
+                         hid_sizes=[32, 32],
+                         max_train_iters=100,
+                         n_iter_no_change=1000,
+                         clip_gradients=True,
+                         clip_value=5,
+                         learning_rate=1e-3,
+                         batch_size=2,
+                         validation_frac=0.4)
+    model.fit(X, Y)
+    predicted_y = model.predict(x)
+    assert predicted_y.shape == expected_y.shape
+    assert np.allclose(predicted_y, expected_y, atol=1e-2)
 
 
 def test_implicit_mlp_regressor():
@@ -96,6 +110,24 @@ def test_implicit_mlp_regressor():
     model._inference_method = "not a real inference method"  # pylint: disable=protected-access
     with pytest.raises(NotImplementedError):
         model.predict(x)
+    # Test with minibatches and held-out data for early stopping.
+    model = ImplicitMLPRegressor(seed=123,
+                                 hid_sizes=[32, 32],
+                                 max_train_iters=100,
+                                 clip_gradients=False,
+                                 clip_value=5,
+                                 learning_rate=1e-3,
+                                 num_samples_per_inference=100,
+                                 num_negative_data_per_input=5,
+                                 temperature=1.0,
+                                 inference_method="grid",
+                                 grid_num_ticks_per_dim=100,
+                                 batch_size=2,
+                                 validation_frac=0.2)
+    model.fit(X, Y)
+    predicted_y = model.predict(x)
+    assert predicted_y.shape == expected_y.shape
+    assert np.allclose(predicted_y, expected_y, atol=1e-1)
 
 
 def test_basic_cnn_regressor():
@@ -153,6 +185,19 @@ def test_neural_gaussian_regressor():
     rng = np.random.default_rng(123)
     sample = model.predict_sample(x, rng)
     assert sample.shape == expected_y.shape
+    samples = model.predict_samples(x, 4, rng)
+    assert samples.shape == (4, output_size)
+    # Test with minibatches.
+    model = NeuralGaussianRegressor(seed=123,
+                                    hid_sizes=[32, 32],
+                                    max_train_iters=100,
+                                    clip_gradients=False,
+                                    clip_value=5,
+                                    learning_rate=1e-3,
+                                    batch_size=3)
+    model.fit(X, Y)
+    mean = model.predict_mean(x)
+    assert np.allclose(mean, expected_y, atol=1e-2)
 
 
 def test_degenerate_mlp_distribution_regressor():
@@ -180,6 +225,9 @@ def test_degenerate_mlp_distribution_regressor():
     assert sample.shape == expected_y.shape
     assert np.allclose(sample, expected_y, atol=1e-2)
     assert np.allclose(sample, mean, atol=1e-6)
+    samples = model.predict_samples(x, 3, rng)
+    assert samples.shape == (3, output_size)
+    assert np.allclose(samples, mean, atol=1e-6)
 
 
 def test_monotonic_beta_regressor():
@@ -203,6 +251,9 @@ def test_monotonic_beta_regressor():
     sample = model.predict_sample(x, rng)
     assert sample.shape == expected_y.shape
     assert 0 < sample[0] < 1
+    samples = model.predict_samples(x, 3, rng)
+    assert samples.shape == (3, 1)
+    assert np.all((0 < samples) & (samples < 1))
 
 
 def test_mlp_classifier():
@@ -232,6 +283,26 @@ def test_mlp_classifier():
     prediction = model.classify(np.ones(input_size))
     assert prediction
     assert model.predict_proba(np.ones(input_size)) > 0.5
+    probas = model.predict_probas(
+        np.array([np.zeros(input_size),
+                  np.ones(input_size)]))
+    assert probas.shape == (2, )
+    assert probas[0] < 0.5 < probas[1]
+    assert np.isclose(probas[1], model.predict_proba(np.ones(input_size)))
+    # Test with minibatches and held-out data for early stopping.
+    model = MLPBinaryClassifier(seed=123,
+                                balance_data=True,
+                                max_train_iters=100,
+                                learning_rate=1e-3,
+                                n_iter_no_change=1000000,
+                                hid_sizes=[32, 32],
+                                n_reinitialize_tries=1,
+                                weight_init="default",
+                                batch_size=4,
+                                validation_frac=0.2)
+    model.fit(X, y)
+    assert not model.classify(np.zeros(input_size))
+    assert model.classify(np.ones(input_size))
     # Test for early stopping
     model = MLPBinaryClassifier(seed=123,
                                 balance_data=True,
@@ -270,6 +341,7 @@ def test_mlp_classifier():
     assert not prediction
     proba = model.predict_proba(np.zeros(input_size))
     assert abs(proba - 0.0) < 1e-6
+    assert np.allclose(model.predict_probas(X[:3]), 0.0)
     # Test with no negative examples.
     y = np.ones(len(X))
     model = MLPBinaryClassifier(seed=123,
@@ -368,6 +440,9 @@ def test_binary_classifier_ensemble():
     probas = model.predict_member_probas(np.ones(input_size))
     assert all(p > 0.5 for p in probas)
     assert len(probas) == 3
+    batch_probas = model.predict_member_probas_batch(X)
+    assert batch_probas.shape == (len(X), 3)
+    assert np.allclose(batch_probas[-1], probas)
     # Test the KNN classifier with n_neighbors = num_class_samples.
     # Since there are num_class_samples data points of each class,
     # the probas should be all 0's or all 1's.
@@ -402,6 +477,91 @@ def test_binary_classifier_ensemble():
     assert len(probas) == 3
 
 
+def test_mlp_binary_classifier_ensemble():
+    """Tests for MLPBinaryClassifierEnsemble."""
+    utils.reset_config()
+    input_size = 3
+    X = np.concatenate([
+        np.zeros((10, input_size)),
+        np.ones((5, input_size)),
+    ])
+    y = np.concatenate([np.zeros(10), np.ones(5)])
+    model = MLPBinaryClassifierEnsemble(seed=123,
+                                        ensemble_size=3,
+                                        balance_data=True,
+                                        max_train_iters=100,
+                                        learning_rate=1e-3,
+                                        n_iter_no_change=1000000,
+                                        hid_sizes=[32, 32],
+                                        n_reinitialize_tries=1,
+                                        weight_init="default")
+    model.fit(X, y)
+    with pytest.raises(Exception) as e:
+        model.predict_proba(np.zeros(input_size))
+    assert "Can't call predict_proba()" in str(e)
+    assert not model.classify(np.zeros(input_size))
+    probas = model.predict_member_probas(np.zeros(input_size))
+    assert probas.shape == (3, )
+    assert all(p < 0.5 for p in probas)
+    assert probas[0] != probas[1]  # there should be some variation
+    assert model.classify(np.ones(input_size))
+    batch_probas = model.predict_member_probas_batch(X)
+    assert batch_probas.shape == (len(X), 3)
+    assert np.allclose(batch_probas[0], probas)
+    assert all(p > 0.5 for p in batch_probas[-1])
+    # Test with minibatches, held-out data, and normal initialization.
+    model = MLPBinaryClassifierEnsemble(seed=123,
+                                        ensemble_size=2,
+                                        balance_data=False,
+                                        max_train_iters=100,
+                                        learning_rate=1e-3,
+                                        n_iter_no_change=1000000,
+                                        hid_sizes=[32],
+                                        n_reinitialize_tries=1,
+                                        weight_init="normal",
+                                        batch_size=4,
+                                        validation_frac=0.2)
+    model.fit(X, y)
+    assert model.predict_member_probas_batch(X).shape == (len(X), 2)
+    # Test with only one class.
+    model = MLPBinaryClassifierEnsemble(seed=123,
+                                        ensemble_size=2,
+                                        balance_data=True,
+                                        max_train_iters=100,
+                                        learning_rate=1e-3,
+                                        n_iter_no_change=1000000,
+                                        hid_sizes=[32],
+                                        n_reinitialize_tries=1,
+                                        weight_init="default")
+    model.fit(X, np.ones(len(X)))
+    assert model.classify(np.zeros(input_size))
+    assert np.all(model.predict_member_probas_batch(X) == 1.0)
+    # Test with invalid weight initialization.
+    model = MLPBinaryClassifierEnsemble(seed=123,
+                                        ensemble_size=2,
+                                        balance_data=True,
+                                        max_train_iters=100,
+                                        learning_rate=1e-3,
+                                        n_iter_no_change=1000000,
+                                        hid_sizes=[32],
+                                        n_reinitialize_tries=1,
+                                        weight_init="foo")
+    with pytest.raises(NotImplementedError):
+        model.fit(X, y)
+    # Test failing to converge.
+    model = MLPBinaryClassifierEnsemble(seed=123,
+                                        ensemble_size=2,
+                                        balance_data=True,
+                                        max_train_iters=100,
+                                        learning_rate=1e-3,
+                                        n_iter_no_change=1000000,
+                                        hid_sizes=[32],
+                                        n_reinitialize_tries=0,
+                                        weight_init="default")
+    with pytest.raises(RuntimeError):
+        model.fit(X, y)
+
+
 def test_k_neighbors_regressor():
     """Tests for KNeighborsRegressor()."""
     utils.reset_config()
@@ -436,6 +596,7 @@ def test_k_neighbors_classifier():
     assert isinstance(predicted_y, bool)
     assert predicted_y == expected_y
     assert model.predict_proba(x) == expected_y
+    assert np.array_equal(model.predict_probas(X[:1]), [expected_y])
     # Test with no negative examples.
     Y = np.ones_like(Y)
     model = KNeighborsClassifier(seed=123, n_neighbors=1)
@@ -1,9 +1,11 @@
 """Test cases for option models."""
+import numpy as np
 import pytest
 from gym.spaces import Box
 
 from predicators import utils
-from predicators.option_model import _OracleOptionModel, create_option_model
+from predicators.option_model import _CachingOptionModel, _OptionModelBase, \
+    _OracleOptionModel, create_option_model
 from predicators.structs import Action, ParameterizedOption, State, Type
 
 
@@ -168,6 +170,96 @@ def test_default_option_model():
     assert num_act == 5
 
 
+def test_caching_option_model():
+    """Tests for _CachingOptionModel."""
+    utils.reset_config({"env": "cover"})
+    model = create_option_model("cached_oracle")
+    assert isinstance(model, _CachingOptionModel)
+    assert set(model.get_metrics()) == {
+        "num_option_model_cache_hits", "num_option_model_cache_misses"
+    }
+
+    type1 = Type("type1", ["feat1", "feat2"])
+    obj1 = type1("obj1")
+    obj2 = type1("obj2")
+    params_space = Box(-10, 10, (2, ))
+    parameterized_option = ParameterizedOption("Move", [type1], params_space,
+                                               lambda s, m, o, p: Action(p),
+                                               lambda s, m, o, p: True,
+                                               lambda s, m, o, p: True)
+
+    class _CountingOptionModel(_OptionModelBase):
+        """Moves the option's object by the option's parameters."""
+
+        def __init__(self) -> None:
+            self.num_calls = 0
+
+        def get_next_state_and_num_actions(self, state, option):
+            self.num_calls += 1
+            next_state = state.copy()
+            obj = option.objects[0]
+            next_state.data[obj] = next_state[obj] + option.params
+            return next_state, 1
+
+    base_model = _CountingOptionModel()
+    model = _CachingOptionModel(base_model)
+    state = State({obj1: np.array([0.0, 0.0]), obj2: np.array([1.0, 1.0])})
+    option = parameterized_option.ground([obj1], np.array([1.0, 2.0]))
+    next_state, num_act = model.get_next_state_and_num_actions(state, option)
+    assert num_act == 1
+    assert np.allclose(next_state[obj1], [1.0, 2.0])
+    assert base_model.num_calls == 1
+    # An identical query is a hit, and the returned state is a copy.
+    next_state.data[obj1][0] = 100.0
+    next_state2, num_act = model.get_next_state_and_num_actions(
+        state.copy(), parameterized_option.ground([obj1], np.array([1.0,
+                                                                    2.0])))
+    assert num_act == 1
+    assert np.allclose(next_state2[obj1], [1.0, 2.0])
+    assert base_model.num_calls == 1
+    # States within the quantization tolerance share predictions.
+    close_state = State({
+        obj1: np.array([1e-10, 0.0]),
+        obj2: np.array([1.0, 1.0])
+    })
+    model.get_next_state_and_num_actions(close_state, option)
+    assert base_model.num_calls == 1
+    # Different states, objects, or parameters are misses.
+    far_state = State({
+        obj1: np.array([1e-3, 0.0]),
+        obj2: np.array([1.0, 1.0])
+    })
+    model.get_next_state_and_num_actions(far_state, option)
+    assert base_model.num_calls == 2
+    model.get_next_state_and_num_actions(
+        state, parameterized_option.ground([obj2], np.array([1.0, 2.0])))
+    assert base_model.num_calls == 3
+    model.get_next_state_and_num_actions(
+        state, parameterized_option.ground([obj1], np.array([1.0, 3.0])))
+    assert base_model.num_calls == 4
+    assert model.get_metrics() == {
+        "num_option_model_cache_hits": 2.0,
+        "num_option_model_cache_misses": 4.0,
+    }
+    # States with a simulator state are not cached.
+    sim_state = State(state.data, simulator_state="sim")
+    model.get_next_state_and_num_actions(sim_state, option)
+    model.get_next_state_and_num_actions(sim_state, option)
+    assert base_model.num_calls == 6
+    assert model.get_metrics()["num_option_model_cache_hits"] == 2.0
+    # Test eviction when over the memory budget: only the most recent
+    # prediction fits.
+    utils.reset_config({"option_model_cache_max_bytes": 100})
+    base_model = _CountingOptionModel()
+    model = _CachingOptionModel(base_model)
+    model.get_next_state_and_num_actions(state, option)
+    model.get_next_state_and_num_actions(far_state, option)
+    model.get_next_state_and_num_actions(far_state, option)
+    assert base_model.num_calls == 2
+    model.get_next_state_and_num_actions(state, option)
+    assert base_model.num_calls == 3
+
+
 def test_option_model_notimplemented():
     """Tests for various NotImplementedErrors."""
     utils.reset_config({
@@ -1,5 +1,6 @@
 """Test cases for planning algorithms."""
 import time
+from collections import defaultdict
 from contextlib import nullcontext as does_not_raise
 
 import numpy as np
@@ -9,6 +10,7 @@ from gym.spaces import Box
 from predicators import utils
 from predicators.approaches import ApproachFailure, ApproachTimeout
 from predicators.approaches.oracle_approach import OracleApproach
+from predicators.envs import create_new_env
 from predicators.envs.blocks import BlocksEnv
 from predicators.envs.cluttered_table import ClutteredTableEnv
 from predicators.envs.cover import CoverEnv
@@ -17,10 +19,14 @@ from predicators.ground_truth_models import get_gt_nsrts, get_gt_options
 from predicators.option_model import _OptionModelBase, _OracleOptionModel, \
     create_option_model
 from predicators.planning import PlanningFailure, PlanningTimeout, \
+    ReplanningCache, _DiscoveredFailureException, _init_refinement_worker, \
+    _MaxSkeletonsFailure, _refine_skeleton_in_worker, _refine_skeletons, \
+    _refine_skeletons_in_parallel, _RefinementPool, _skeleton_generator, \
     run_task_plan_once, sesame_plan, task_plan, task_plan_grounding
 from predicators.settings import CFG
-from predicators.structs import NSRT, Action, ParameterizedOption, Predicate, \
-    State, STRIPSOperator, Task, Type, _GroundNSRT, _Option
+from predicators.structs import NSRT, Action, GroundAtom, \
+    ParameterizedOption, Predicate, State, STRIPSOperator, Task, Type, \
+    _GroundNSRT, _Option
 
 
 @pytest.mark.parametrize(
@@ -30,6 +36,7 @@ from predicators.structs import NSRT, Action, ParameterizedOption, Predicate, \
      (True, "naive", does_not_raise(), False),
      (False, "naive", does_not_raise(), True),
      (True, "fd_translator", does_not_raise(), True),
+     (True, "static_pruning", does_not_raise(), True),
      (True, "not a real grounder", pytest.raises(ValueError), True)])
 def test_sesame_plan(sesame_check_expected_atoms, sesame_grounder, expectation,
                      sesame_use_necessary_atoms):
@@ -116,6 +123,129 @@ def test_task_plan():
                       max_skeletons_optimized=3))
 
 
+@pytest.mark.parametrize("env_name,use_visited_state_set",
+                         [("blocks", False), ("painting", False),
+                          ("repeated_nextto", True)])
+def test_bitset_skeleton_generator(env_name, use_visited_state_set):
+    """Tests that task planning over bitset-encoded states produces the same
+    skeletons, atoms sequences, and metrics as over sets of atoms."""
+    utils.reset_config({"env": env_name, "num_train_tasks": 1})
+    env = create_new_env(env_name)
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    task = env.get_train_tasks()[0].task
+    init_atoms = utils.abstract(task.init, env.predicates)
+    objects = set(task.init)
+    ground_nsrts, reachable_atoms = task_plan_grounding(
+        init_atoms, objects, nsrts)
+    heuristic = utils.create_task_planning_heuristic("hadd", init_atoms,
+                                                     task.goal, ground_nsrts,
+                                                     env.predicates, objects)
+    all_results = []
+    for use_bitset_states in [False, True]:
+        utils.update_config({"sesame_use_bitset_states": use_bitset_states})
+        all_results.append(
+            list(
+                task_plan(init_atoms,
+                          task.goal,
+                          ground_nsrts,
+                          reachable_atoms,
+                          heuristic,
+                          timeout=10,
+                          seed=123,
+                          max_skeletons_optimized=5,
+                          use_visited_state_set=use_visited_state_set)))
+    assert len(all_results[0]) == len(all_results[1]) > 0
+    assert all_results[0] == all_results[1]
+
+
+def test_bitset_skeleton_generator_with_policy():
+    """Tests that policy-guided task planning over bitset-encoded states is
+    equivalent to policy-guided task planning over sets of atoms."""
+    utils.reset_config({"env": "cover", "cover_initial_holding_prob": 0})
+    env = CoverEnv()
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    nsrt_name_to_nsrt = {n.name: n for n in nsrts}
+    task = env.get_train_tasks()[0].task
+    init_atoms = utils.abstract(task.init, env.predicates)
+    objects = set(task.init)
+    ground_nsrts, _ = task_plan_grounding(init_atoms, objects, nsrts)
+    heuristic = utils.create_task_planning_heuristic("hadd", init_atoms,
+                                                     task.goal, ground_nsrts,
+                                                     env.predicates, objects)
+
+    def _abstract_policy(atoms, objs, goal):
+        del objs  # unused
+        held_blocks = [
+            a.objects[0] for a in atoms if a.predicate.name == "Holding"
+        ]
+        if held_blocks:
+            targets = [
+                a.objects[1] for a in goal if a.objects[0] == held_blocks[0]
+            ]
+            if not targets:
+                return None
+            return nsrt_name_to_nsrt["Place"].ground(
+                [held_blocks[0], targets[0]])
+        unrealized_blocks = sorted(a.objects[0] for a in goal - atoms)
+        return nsrt_name_to_nsrt["Pick"].ground([unrealized_blocks[0]])
+
+    def _slow_heuristic(atoms):
+        time.sleep(0.03)
+        return heuristic(atoms)
+
+    all_results = []
+    for use_bitset_states in [False, True]:
+        utils.update_config({"sesame_use_bitset_states": use_bitset_states})
+        metrics = defaultdict(float)
+        generator = _skeleton_generator(task,
+                                        ground_nsrts,
+                                        init_atoms,
+                                        heuristic,
+                                        seed=123,
+                                        timeout=10,
+                                        metrics=metrics,
+                                        max_skeletons_optimized=10,
+                                        abstract_policy=_abstract_policy,
+                                        sesame_max_policy_guided_rollout=5)
+        results = []
+        with pytest.raises(_MaxSkeletonsFailure):
+            for result in generator:
+                results.append(result)
+        all_results.append((results, metrics))
+        # Test timeout during node expansion.
+        generator = _skeleton_generator(task,
+                                        ground_nsrts,
+                                        init_atoms,
+                                        _slow_heuristic,
+                                        seed=123,
+                                        timeout=0.05,
+                                        metrics=defaultdict(float),
+                                        max_skeletons_optimized=10)
+        with pytest.raises(PlanningTimeout):
+            list(generator)
+        # Test running out of skeletons.
+        holding = next(p for p in env.predicates if p.name == "Holding")
+        impossible_goal = {
+            GroundAtom(holding, [b])
+            for b in task.init.get_objects(holding.types[0])
+        }
+        generator = _skeleton_generator(Task(task.init, impossible_goal),
+                                        ground_nsrts,
+                                        init_atoms,
+                                        heuristic,
+                                        seed=123,
+                                        timeout=10,
+                                        metrics=defaultdict(float),
+                                        max_skeletons_optimized=10,
+                                        use_visited_state_set=True)
+        with pytest.raises(_MaxSkeletonsFailure) as e:
+            list(generator)
+        assert "ran out of skeletons" in str(e)
+    assert all_results[0] == all_results[1]
+
+
 def test_sesame_plan_failures():
     """Tests for failures in the planner using the OracleApproach on CoverEnv
     and PaintingEnv."""
@@ -150,6 +280,9 @@ def test_sesame_plan_failures():
     with pytest.raises(ApproachTimeout):
         approach.solve(impossible_task, timeout=-100)  # times out
     utils.reset_config({"env": "cover", "sesame_grounder": "fd_translator"})
+    with pytest.raises(ApproachTimeout):
+        approach.solve(impossible_task, timeout=-100)  # times out
+    utils.reset_config({"env": "cover", "sesame_grounder": "static_pruning"})
     with pytest.raises(ApproachTimeout):
         approach.solve(impossible_task, timeout=-100)  # times out
     utils.reset_config({"env": "cover", "sesame_grounder": "naive"})
@@ -251,6 +384,185 @@ def test_sesame_plan_failures():
         approach.solve(task, timeout=0.1)
 
 
+def test_sesame_plan_parallel_refinement():
+    """Tests for refining skeletons in parallel worker processes."""
+    utils.reset_config({
+        "env": "painting",
+        "num_train_tasks": 3,
+        "sesame_num_refinement_workers": 3,
+    })
+    env = PaintingEnv()
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    option_model = create_option_model(CFG.option_model_name)
+    num_failures_discovered = 0
+    for env_task in env.get_train_tasks():
+        task = env_task.task
+        plan, skeleton, metrics = sesame_plan(
+            task,
+            option_model,
+            nsrts,
+            env.predicates,
+            env.types,
+            500,  # timeout
+            123,  # seed
+            CFG.sesame_task_planning_heuristic,
+            CFG.sesame_max_skeletons_optimized,
+            max_horizon=CFG.horizon)
+        assert len(plan) == len(skeleton)
+        assert [o.parent for o in plan] == [n.option for n in skeleton]
+        traj = utils.run_policy_with_simulator(
+            utils.option_plan_to_policy(plan),
+            env.simulate,
+            task.init,
+            task.goal_holds,
+            max_num_steps=CFG.horizon)
+        assert task.goal_holds(traj.states[-1])
+        num_failures_discovered += metrics["num_failures_discovered"]
+    # One of the tasks requires discovering that the box lid is closed.
+    assert num_failures_discovered > 0
+    # Test running out of skeletons after refining a partial batch.
+    with pytest.raises(PlanningFailure):
+        sesame_plan(
+            task,
+            option_model,
+            nsrts,
+            env.predicates,
+            env.types,
+            500,  # timeout
+            123,  # seed
+            CFG.sesame_task_planning_heuristic,
+            max_skeletons_optimized=4,
+            max_horizon=0)
+    # Test timing out during refinement.
+    with pytest.raises(PlanningTimeout):
+        sesame_plan(
+            task,
+            option_model,
+            nsrts,
+            env.predicates,
+            env.types,
+            0.5,  # timeout
+            123,  # seed
+            CFG.sesame_task_planning_heuristic,
+            max_skeletons_optimized=float("inf"),
+            max_horizon=0)
+    # Refining in parallel should match refining sequentially when there are
+    # fewer skeletons than workers (and the same seed is used).
+    for env_task in env.get_train_tasks():
+        task = env_task.task
+        init_atoms = utils.abstract(task.init, env.predicates)
+        ground_nsrts, reachable_atoms = task_plan_grounding(
+            init_atoms, set(task.init), nsrts)
+        heuristic = utils.create_task_planning_heuristic(
+            "hadd", init_atoms, task.goal, ground_nsrts, env.predicates,
+            set(task.init))
+        skeleton, atoms_sequence, _ = next(
+            task_plan(init_atoms, task.goal, ground_nsrts, reachable_atoms,
+                      heuristic, 123, 500, 1))
+        refinements = []
+        refinement_pool = _RefinementPool(task, option_model, nsrts,
+                                          env.predicates, 2)
+        for refinement_gen in [
+                _refine_skeletons(task, option_model,
+                                  iter([(skeleton, atoms_sequence)]), 123,
+                                  time.perf_counter(), 500, defaultdict(float),
+                                  CFG.horizon),
+                _refine_skeletons_in_parallel(
+                    refinement_pool, iter([(skeleton, atoms_sequence)]), 123,
+                    500, defaultdict(float), CFG.horizon)
+        ]:
+            try:
+                refinements.append(list(refinement_gen))
+            except _DiscoveredFailureException as e:
+                assert e.info["skeleton"] == skeleton
+                refinements.append(e.discovered_failure.failing_nsrt)
+        refinement_pool.close()
+        assert len(refinements) == 2
+        if isinstance(refinements[0], _GroundNSRT):
+            assert refinements[0] == refinements[1]
+            continue
+        ((seq_skeleton, seq_plan, seq_suc), ) = refinements[0]
+        ((par_skeleton, par_plan, par_suc), ) = refinements[1]
+        assert seq_skeleton == par_skeleton == skeleton
+        assert seq_suc and par_suc
+        assert len(seq_plan) == len(par_plan)
+        for seq_option, par_option in zip(seq_plan, par_plan):
+            assert seq_option.parent == par_option.parent
+            assert seq_option.objects == par_option.objects
+            assert np.allclose(seq_option.params, par_option.params)
+        # The workers are reused across batches of skeletons.
+        refinement_pool = _RefinementPool(task, option_model, nsrts,
+                                          env.predicates, 1)
+        par_refinements = list(
+            _refine_skeletons_in_parallel(
+                refinement_pool, iter([(skeleton, atoms_sequence)] * 2), 123,
+                500, defaultdict(float), CFG.horizon))
+        assert len(par_refinements) == 2
+        assert refinement_pool.num_starts == 1
+        refinement_pool.close()
+        # Also run the worker in this process.
+        _init_refinement_worker(task, option_model, sorted(nsrts),
+                                env.predicates)
+        idx, plan_params, suc, metrics, failure = _refine_skeleton_in_worker(
+            refinement_pool.get_worker_args(0, skeleton, 123, 500,
+                                            CFG.horizon))
+        assert idx == 0 and suc and failure is None
+        assert metrics["num_samples"] >= len(skeleton)
+        assert all(
+            np.allclose(params, o.params)
+            for params, o in zip(plan_params, seq_plan))
+    # The last task requires discovering that the box lid is closed.
+    refinement_pool = _RefinementPool(task, option_model, nsrts,
+                                      env.predicates, 1)
+    _init_refinement_worker(task, option_model, sorted(nsrts), env.predicates)
+    _, plan_params, suc, _, failure = _refine_skeleton_in_worker(
+        refinement_pool.get_worker_args(0, skeleton, 123, 500, CFG.horizon))
+    assert not suc
+    failure_idx, failure_cls, _, info = failure
+    assert skeleton[failure_idx] == refinements[0]
+    assert failure_cls is utils.EnvironmentFailure
+    assert info["offending_objects"]
+    assert len(plan_params) <= len(skeleton)
+    # Test that the failing step is reported correctly when the failing
+    # ground NSRT appears more than once in the skeleton.
+    utils.reset_config({"env": "cover"})
+    env = CoverEnv()
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    nsrt_by_name = {nsrt.name: nsrt for nsrt in nsrts}
+    task = env.get_train_tasks()[0].task
+    block0 = [obj for obj in task.init if obj.name == "block0"][0]
+    target0 = [obj for obj in task.init if obj.name == "target0"][0]
+    pick = nsrt_by_name["Pick"].ground([block0])
+    place = nsrt_by_name["Place"].ground([block0, target0])
+    skeleton = [pick, place, pick, place]
+
+    class _FailOnFourthOptionModel(_OracleOptionModel):
+        """Fails the fourth time that an option is simulated."""
+
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self._num_calls = 0
+
+        def get_next_state_and_num_actions(self, state, option):
+            self._num_calls += 1
+            if self._num_calls == 4:
+                raise utils.EnvironmentFailure("Failed.",
+                                               {"offending_objects": set()})
+            return super().get_next_state_and_num_actions(state, option)
+
+    option_model = _FailOnFourthOptionModel(get_gt_options(env.get_name()),
+                                            env.simulate)
+    refinement_pool = _RefinementPool(task, option_model, nsrts,
+                                      env.predicates, 1)
+    _init_refinement_worker(task, option_model, sorted(nsrts), env.predicates)
+    _, _, suc, _, failure = _refine_skeleton_in_worker(
+        refinement_pool.get_worker_args(0, skeleton, 123, 500, CFG.horizon))
+    assert not suc
+    assert failure[0] == 3
+
+
 def test_sesame_plan_uninitiable_option():
     """Tests planning in the presence of an option whose initiation set is
     nontrivial."""
@@ -291,6 +603,142 @@ def test_sesame_plan_uninitiable_option():
     assert "Planning reached max_skeletons_optimized!" in str(e.value)
 
 
+def test_sesame_plan_batched_sampling():
+    """Tests sesame_plan() with sesame_sampler_batch_size > 1."""
+    # pylint: disable=protected-access
+    utils.reset_config({
+        "env": "cover",
+        "num_test_tasks": 1,
+        "sesame_sampler_batch_size": 5,
+    })
+    env = CoverEnv()
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    task = env.get_test_tasks()[0].task
+    option_model = create_option_model(CFG.option_model_name)
+    # Legacy samplers are called once per candidate.
+    plan, _, metrics = sesame_plan(task,
+                                   option_model,
+                                   nsrts,
+                                   env.predicates,
+                                   env.types,
+                                   10,
+                                   123,
+                                   CFG.sesame_task_planning_heuristic,
+                                   CFG.sesame_max_skeletons_optimized,
+                                   max_horizon=CFG.horizon)
+    assert len(plan) == 3
+    assert all(isinstance(act, _Option) for act in plan)
+    assert metrics["num_samples"] >= 3
+
+    # Samplers that declare a batch API are called once per batch, and
+    # their candidates are tried in the order given.
+    class _BatchSampler:
+        """Wraps an NSRT sampler and records the requested batch sizes."""
+
+        def __init__(self, nsrt):
+            self._nsrt = nsrt
+            self.batch_sizes = []
+
+        def __call__(self, state, goal, rng, objects):
+            raise AssertionError("Should not be called.")
+
+        def sample_batch(self, state, goal, rng, objects, num_samples):
+            """Sample a batch of parameters."""
+            self.batch_sizes.append(num_samples)
+            return np.array([
+                self._nsrt._sampler(state, goal, rng, objects)
+                for _ in range(num_samples)
+            ])
+
+    batch_nsrts = set()
+    batch_samplers = []
+    for nsrt in nsrts:
+        batch_sampler = _BatchSampler(nsrt)
+        batch_samplers.append(batch_sampler)
+        batch_nsrts.add(
+            NSRT(nsrt.name, nsrt.parameters, nsrt.preconditions,
+                 nsrt.add_effects, nsrt.delete_effects, nsrt.ignore_effects,
+                 nsrt.option, nsrt.option_vars, batch_sampler))
+    plan, _, metrics = sesame_plan(task,
+                                   option_model,
+                                   batch_nsrts,
+                                   env.predicates,
+                                   env.types,
+                                   10,
+                                   123,
+                                   CFG.sesame_task_planning_heuristic,
+                                   CFG.sesame_max_skeletons_optimized,
+                                   max_horizon=CFG.horizon)
+    assert len(plan) == 3
+    assert metrics["num_samples"] >= 3
+    batch_sizes = [b for s in batch_samplers for b in s.batch_sizes]
+    assert batch_sizes
+    assert all(1 <= b <= 5 for b in batch_sizes)
+
+    # Uninitiable candidates are never simulated.
+    old_option = next(iter(get_gt_options(env.get_name())))
+    new_option = ParameterizedOption(old_option.name, old_option.types,
+                                     old_option.params_space,
+                                     old_option.policy,
+                                     lambda s, m, o, p: False,
+                                     old_option.terminal)
+    new_nsrts = {
+        NSRT(nsrt.name, nsrt.parameters, nsrt.preconditions, nsrt.add_effects,
+             nsrt.delete_effects, nsrt.ignore_effects, new_option,
+             nsrt.option_vars, nsrt._sampler)
+        for nsrt in nsrts
+    }
+
+    class _NoSimulationOptionModel(_OptionModelBase):
+        """An option model that should never be queried."""
+
+        def get_next_state_and_num_actions(self, state, option):
+            raise AssertionError("Should not be called.")
+
+    with pytest.raises(PlanningFailure):
+        sesame_plan(task,
+                    _NoSimulationOptionModel(),
+                    new_nsrts,
+                    env.predicates,
+                    env.types,
+                    10,
+                    123,
+                    CFG.sesame_task_planning_heuristic,
+                    2,
+                    max_horizon=CFG.horizon)
+
+
+def test_sesame_plan_cached_option_model():
+    """Tests that sesame_plan() reports option model cache metrics."""
+    utils.reset_config({
+        "env": "cover",
+        "num_test_tasks": 1,
+        "option_model_name": "cached_oracle",
+    })
+    env = CoverEnv()
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    task = env.get_test_tasks()[0].task
+    option_model = create_option_model(CFG.option_model_name)
+    for _ in range(2):
+        plan, _, metrics = sesame_plan(task,
+                                       option_model,
+                                       nsrts,
+                                       env.predicates,
+                                       env.types,
+                                       10,
+                                       123,
+                                       CFG.sesame_task_planning_heuristic,
+                                       CFG.sesame_max_skeletons_optimized,
+                                       max_horizon=CFG.horizon)
+        assert len(plan) == 3
+        assert metrics["num_option_model_cache_hits"] + \
+            metrics["num_option_model_cache_misses"] >= 3
+    # Planning again with the same seed only revisits cached predictions.
+    assert metrics["num_option_model_cache_misses"] == 0
+
+
 def test_sesame_check_static_object_changes():
     """Tests for sesame_check_static_object_changes = True."""
     utils.reset_config({
@@ -499,12 +947,14 @@ def test_planning_determinism():
         assert plan == all_plans[0]
 
 
-def test_policy_guided_sesame():
+@pytest.mark.parametrize("sesame_use_bitset_states", [False, True])
+def test_policy_guided_sesame(sesame_use_bitset_states):
     """Tests for sesame_plan() with an abstract policy used for guidance."""
     utils.reset_config({
         "env": "cover",
         "num_test_tasks": 1,
         "cover_initial_holding_prob": 0,
+        "sesame_use_bitset_states": sesame_use_bitset_states,
     })
     env = CoverEnv()
     nsrts = get_gt_nsrts(env.get_name(), env.predicates,
@@ -712,3 +1162,127 @@ def test_task_planning_only():
                            task_planning_heuristic="lmcut",
                            max_horizon=0.0)
     assert "exceeds horizon" in str(e)
+
+
+def test_replanning_cache():
+    """Tests for ReplanningCache."""
+    utils.reset_config({
+        "env": "blocks",
+        "num_test_tasks": 1,
+        "blocks_num_blocks_test": [3],
+    })
+    env = BlocksEnv()
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    task = env.get_test_tasks()[0].task
+    preds = env.predicates
+    cache = ReplanningCache()
+    plan, atoms_seq, metrics = run_task_plan_once(
+        task,
+        nsrts,
+        preds,
+        env.types,
+        100000.0,
+        123,
+        task_planning_heuristic="hadd",
+        replanning_cache=cache)
+    assert len(plan) == 2
+    assert "num_skeletons_repaired" not in metrics
+    # The grounding and heuristic are cached.
+    ground_nsrts, _ = task_plan_grounding(atoms_seq[0],
+                                          set(task.init),
+                                          nsrts,
+                                          replanning_cache=cache)
+    new_ground_nsrts, _ = task_plan_grounding(atoms_seq[0],
+                                              set(task.init),
+                                              nsrts,
+                                              replanning_cache=cache)
+    assert all(n1 is n2 for n1, n2 in zip(new_ground_nsrts, ground_nsrts))
+    heuristic = cache.get_heuristic("hadd", atoms_seq[0], task.goal,
+                                    ground_nsrts, preds, set(task.init))
+    assert cache.get_heuristic("hadd", atoms_seq[1], task.goal, ground_nsrts,
+                               preds, set(task.init)) is heuristic
+    assert cache.get_heuristic("hmax", atoms_seq[1], task.goal, ground_nsrts,
+                               preds, set(task.init)) is not heuristic
+    # Repair the skeleton from states along the plan.
+    assert cache.repair_skeleton(atoms_seq[0], task.goal,
+                                 ground_nsrts) == (plan, atoms_seq)
+    assert cache.repair_skeleton(atoms_seq[1], task.goal,
+                                 ground_nsrts) == (plan[1:], atoms_seq[1:])
+    assert cache.repair_skeleton(atoms_seq[2], task.goal,
+                                 ground_nsrts) == ([], atoms_seq[2:])
+    # Repair the skeleton after an unexpected action, which requires
+    # reconnecting to the previous skeleton.
+    unexpected_nsrt = next(
+        n for n in utils.get_applicable_operators(ground_nsrts, atoms_seq[0])
+        if n.name == "Unstack")
+    atoms = utils.apply_operator(unexpected_nsrt, atoms_seq[0])
+    repaired_skeleton, repaired_atoms_seq = cache.repair_skeleton(
+        atoms, task.goal, ground_nsrts)
+    assert repaired_skeleton[1:] == plan
+    assert repaired_atoms_seq[0] == atoms
+    assert task.goal.issubset(repaired_atoms_seq[-1])
+    utils.update_config({"sesame_repair_max_connection_length": 0})
+    assert cache.repair_skeleton(atoms, task.goal, ground_nsrts) is None
+    # Longer connections may be needed.
+    put_on_table_nsrt = next(
+        n for n in utils.get_applicable_operators(ground_nsrts, atoms)
+        if n.name == "PutOnTable")
+    atoms = utils.apply_operator(put_on_table_nsrt, atoms)
+    utils.update_config({"sesame_repair_max_connection_length": 1})
+    assert cache.repair_skeleton(atoms, task.goal, ground_nsrts) is None
+    utils.update_config({"sesame_repair_max_connection_length": 2})
+    repaired_skeleton, _ = cache.repair_skeleton(atoms, task.goal,
+                                                 ground_nsrts)
+    assert repaired_skeleton[2:] == plan
+    utils.update_config({"sesame_repair_max_connection_length": 1})
+    # Only the given ground NSRTs may be used.
+    assert cache.repair_skeleton(
+        atoms_seq[1], task.goal,
+        [n for n in ground_nsrts if n != plan[0]]) == (plan[1:], atoms_seq[1:])
+    # Replanning returns the repaired skeleton without searching.
+    new_task = Task(task.init, task.goal)
+    new_plan, _, metrics = run_task_plan_once(new_task,
+                                              nsrts,
+                                              preds,
+                                              env.types,
+                                              100000.0,
+                                              123,
+                                              task_planning_heuristic="hadd",
+                                              replanning_cache=cache)
+    assert new_plan == plan
+    assert metrics["num_skeletons_repaired"] == 1
+    assert metrics["num_nodes_expanded"] == 0
+    # A new goal resets the cache.
+    new_task = Task(task.init, {next(iter(task.goal))})
+    cache.set_task(new_task, nsrts, preds)
+    assert cache.repair_skeleton(atoms_seq[0], task.goal, ground_nsrts) is None
+    # Test bilevel planning with a cache.
+    option_model = create_option_model(CFG.option_model_name)
+    cache = ReplanningCache()
+    _, skeleton, metrics = sesame_plan(task,
+                                       option_model,
+                                       nsrts,
+                                       preds,
+                                       env.types,
+                                       timeout=1,
+                                       seed=123,
+                                       task_planning_heuristic="hadd",
+                                       max_skeletons_optimized=1,
+                                       max_horizon=100,
+                                       replanning_cache=cache)
+    assert "num_skeletons_repaired" not in metrics
+    _, new_skeleton, metrics = sesame_plan(task,
+                                           option_model,
+                                           nsrts,
+                                           preds,
+                                           env.types,
+                                           timeout=1,
+                                           seed=123,
+                                           task_planning_heuristic="hadd",
+                                           max_skeletons_optimized=1,
+                                           max_horizon=100,
+                                           replanning_cache=cache)
+    assert new_skeleton == skeleton
+    assert metrics["num_skeletons_repaired"] == 1
+    assert metrics["num_nodes_expanded"] == 0
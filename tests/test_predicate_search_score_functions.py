@@ -168,6 +168,29 @@ def test_prediction_error_score_function():
     none_included_s = score_function.evaluate(set())
     assert all_included_s < holding_included_s < none_included_s
     assert all_included_s < handempty_included_s  # not better than none
+    # The segmentations computed incrementally from previously evaluated
+    # predicate sets should match segmenting from scratch.
+    handempty = name_to_pred["HandEmpty"]
+    for preds in [
+            frozenset(),
+            frozenset({handempty}),
+            frozenset(candidates),
+            frozenset({name_to_pred["Holding"]}),
+    ]:
+        segmented_trajs = score_function.segment_trajectories(preds)
+        pruned_atom_data = utils.prune_ground_atom_dataset(
+            atom_dataset, preds | initial_predicates)
+        assert len(segmented_trajs) == len(pruned_atom_data)
+        for segments, (ll_traj, atom_seq) in zip(segmented_trajs,
+                                                 pruned_atom_data):
+            expected_segments = segment_trajectory(ll_traj, set(preds),
+                                                   atom_seq)
+            assert len(segments) == len(expected_segments)
+            for seg, expected_seg in zip(segments, expected_segments):
+                assert seg.init_atoms == expected_seg.init_atoms
+                assert seg.final_atoms == expected_seg.final_atoms
+                assert seg.states == expected_seg.states
+                assert seg.get_option() is expected_seg.get_option()
 
 
 def test_hadd_match_score_function():
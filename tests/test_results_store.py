@@ -0,0 +1,136 @@
+"""Tests for results_store.py."""
+
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from predicators.results_store import ResultsStore
+
+
+def test_results_store():
+    """Tests for ResultsStore."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "results.db")
+        store = ResultsStore(db_path)
+        assert not list(store.iter_runs())
+        for seed in range(3):
+            config = {
+                "env": "cover",
+                "seed": seed,
+                "experiment_id": "exp1",
+                "excluded_predicates": "",
+                "sesame_max_samples_per_step": [1, 2],
+                "timeout": np.float64(10.0),
+            }
+            results = {
+                "num_solved": float(seed),
+                "min_num_samples": float("inf"),
+                "PER_TASK_task0_solve_time": 0.5 + seed,
+                "PER_TASK_task1_solve_time": 1.5 + seed,
+                "PER_TASK_task1_exec_time": 2.5,
+            }
+            for cycle in [None, 0]:
+                store.add_run(f"cover__{seed}__exp1", cycle, config, results,
+                              "hash1")
+        # A run from another experiment logs a new metric.
+        store.add_run("cover__0__exp2", None, {
+            "env": "cover",
+            "seed": 0,
+            "experiment_id": "exp2",
+        }, {
+            "num_solved": 5.0,
+            "learning_time": 3.0
+        }, "hash2")
+        # Rerunning replaces the previous results.
+        store.add_run("cover__0__exp2", None, {
+            "env": "cover",
+            "seed": 0,
+            "experiment_id": "exp2",
+        }, {
+            "num_solved": 4.0,
+            "PER_TASK_task0_solve_time": 7.0
+        }, "hash3")
+        with pytest.raises(AssertionError):
+            store.add_run("cover__0__exp3", None, {"num_solved": 1.0},
+                          {"num_solved": 1.0}, "hash4")
+        store.close()
+        # Reopen the store.
+        store = ResultsStore(db_path)
+        columns = store.get_columns()
+        assert {"env", "seed", "num_solved", "learning_time",
+                "cycle"}.issubset(columns)
+        assert not any(c.startswith("PER_TASK_") for c in columns)
+        runs = list(
+            store.iter_runs(["seed", "cycle", "num_solved", "foo"],
+                            filters={"experiment_id": "exp1"},
+                            batch_size=2))
+        assert len(runs) == 6
+        assert runs[0] == {
+            "seed": 0,
+            "cycle": None,
+            "num_solved": 0.0,
+            "foo": None
+        }
+        runs = list(store.iter_runs(filters={"experiment_id": "exp2"}))
+        assert len(runs) == 1
+        assert runs[0]["num_solved"] == 4.0
+        assert runs[0]["learning_time"] is None
+        assert runs[0]["git_commit_hash"] == "hash3"
+        runs = list(
+            store.iter_runs(["sesame_max_samples_per_step", "timeout"],
+                            filters={
+                                "seed": 1,
+                                "cycle": None
+                            }))
+        assert runs == [{
+            "sesame_max_samples_per_step": "[1, 2]",
+            "timeout": 10.0
+        }]
+        with pytest.raises(AssertionError):
+            list(store.iter_runs(filters={"foo": 1}))
+        # Test per-task metrics.
+        entries = list(
+            store.iter_per_task_metrics(["seed", "foo"],
+                                        metric="solve_time",
+                                        filters={"cycle": 0}))
+        assert [(e["seed"], e["task_idx"], e["value"])
+                for e in entries] == [(0, 0, 0.5), (0, 1, 1.5), (1, 0, 1.5),
+                                      (1, 1, 2.5), (2, 0, 2.5), (2, 1, 3.5)]
+        assert all(e["metric"] == "solve_time" for e in entries)
+        assert all(e["foo"] is None for e in entries)
+        entries = list(
+            store.iter_per_task_metrics(filters={"experiment_id": "exp2"}))
+        assert entries == [{
+            "task_idx": 0,
+            "metric": "solve_time",
+            "value": 7.0
+        }]
+        assert len(list(store.iter_per_task_metrics(metric="exec_time"))) == 6
+        # Test aggregation.
+        aggregates = store.aggregate(
+            ["experiment_id", "cycle"],
+            ["num_solved", "min_num_samples", "learning_time"])
+        assert len(aggregates) == 3
+        group, count, stats = aggregates[0]
+        assert group == ("exp1", None)
+        assert count == 3
+        mean, std = stats["num_solved"]
+        assert np.isclose(mean, 1.0)
+        assert np.isclose(std, np.std([0.0, 1.0, 2.0]))
+        # Infinite values are ignored.
+        assert all(np.isnan(v) for v in stats["min_num_samples"])
+        assert all(np.isnan(v) for v in stats["learning_time"])
+        group, count, stats = aggregates[2]
+        assert group == ("exp2", None)
+        assert count == 1
+        assert stats["num_solved"] == (4.0, 0.0)
+        aggregates = store.aggregate(["env"], ["num_solved", "bar"],
+                                     filters={"cycle": 0})
+        assert len(aggregates) == 1
+        group, count, stats = aggregates[0]
+        assert group == ("cover", )
+        assert count == 3
+        assert all(np.isnan(v) for v in stats["bar"])
+        store.close()
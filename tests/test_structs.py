@@ -1,11 +1,13 @@
 """Test cases for structs."""
 
+import pickle as pkl
+
 import numpy as np
 import pytest
 from gym.spaces import Box
 
 from predicators import utils
-from predicators.structs import NSRT, PNAD, Action, DefaultState, \
+from predicators.structs import NSRT, PNAD, Action, ArrayState, DefaultState, \
     DemonstrationQuery, DummyOption, GroundAtom, GroundMacro, \
     InteractionRequest, InteractionResult, LDLRule, LiftedAtom, \
     LiftedDecisionList, LowLevelTrajectory, Macro, Object, \
@@ -187,6 +189,127 @@ obj9                11       12       13
     return state
 
 
+def test_array_state():
+    """Tests for ArrayState class."""
+    type1 = Type("type1", ["feat1", "feat2"])
+    type2 = Type("type2", ["feat3", "feat4", "feat5"])
+    obj3 = type1("obj3")
+    obj7 = type1("obj7")
+    obj1 = type2("obj1")
+    obj2 = type2("obj2")
+    with pytest.raises(AssertionError):
+        ArrayState({obj3: [1, 2, 3]})  # bad feature vector dimension
+    state = ArrayState({obj3: [1, 2], obj7: [3, 4], obj1: [5, 6, 7]})
+    assert isinstance(state, State)
+    assert list(state) == list(state.data) == [obj1, obj3, obj7]
+    assert len(state.data) == 3
+    assert obj3 in state.data and obj2 not in state.data
+    assert np.array_equal(state[obj1], [5, 6, 7])
+    assert np.array_equal(state.data[obj1], [5, 6, 7])
+    assert state[obj1].dtype == np.float32
+    assert state.get(obj3, "feat2") == 2
+    assert state.get(obj1, "feat4") == 6
+    with pytest.raises(ValueError):
+        state.get(obj3, "feat3")  # feature not in list
+    assert list(state.vec([obj3, obj1])) == [1, 2, 5, 6, 7]
+    assert state.vec([]).shape == (0, )
+    assert state.get_objects(type1) == [obj3, obj7]
+    # Feature vectors are read-only views, so reading them does not copy.
+    with pytest.raises(ValueError):
+        state[obj3][0] = 100
+    with pytest.raises(ValueError):
+        state.data[obj3][0] = 100
+    with pytest.raises(ValueError):
+        state.get_array()[0] = 100
+    assert list(state.get_array()) == [5, 6, 7, 1, 2, 3, 4]
+    view = state[obj3]
+    state.set(obj3, "feat1", 100)
+    assert view[0] == 100
+    state.data[obj3] = [1, 2]
+    assert list(view) == [1, 2]
+    # Copies share the array until one of them is modified.
+    state = ArrayState({obj3: [1, 2], obj7: [3, 4], obj1: [5, 6, 7]})
+    state2 = state.copy()
+    assert isinstance(state2, ArrayState)
+    assert state.allclose(state2)
+    assert state[obj3][1] == state2.data[obj3][1] == 2
+    assert np.shares_memory(state.get_array(), state2.get_array())
+    state2.set(obj3, "feat2", 122)
+    assert state2.get(obj3, "feat2") == 122
+    assert state.get(obj3, "feat2") == 2
+    state.set(obj7, "feat1", 33)
+    assert state.get(obj7, "feat1") == 33
+    assert state2.get(obj7, "feat1") == 3
+    state.set(obj7, "feat1", 3)
+    state3 = state2.copy()
+    state3.data[obj3] = [1, 2]
+    assert state3.allclose(state)
+    assert not state2.allclose(state)
+    # Adding and removing objects.
+    state3.data[obj2] = np.array([8, 9, 10])
+    assert list(state3) == [obj1, obj2, obj3, obj7]
+    assert list(state3.vec([obj2])) == [8, 9, 10]
+    assert not state3.allclose(state)
+    del state3.data[obj2]
+    assert state3.allclose(state)
+    assert list(state2) == [obj1, obj3, obj7]
+    # Comparisons with dict-backed states.
+    dict_state = State({obj3: [1, 2], obj7: [3, 4], obj1: [5, 6, 7]})
+    assert state.allclose(dict_state)
+    assert dict_state.allclose(state)
+    assert not state2.allclose(dict_state)
+    assert "obj7" in state.pretty_str()
+    # Array-backed subclasses.
+    state_with_sim = ArrayState({obj3: [1, 2]}, simulator_state="dummy")
+    assert state_with_sim.copy().simulator_state == "dummy"
+    with pytest.raises(NotImplementedError):
+        state_with_sim.allclose(state)
+
+    class _ArrayPyBulletState(utils.PyBulletState, ArrayState):
+        """An array-backed PyBulletState."""
+
+    joints = [0.1, 0.2]
+    pb_state = _ArrayPyBulletState({obj3: [1, 2]}, simulator_state=joints)
+    pb_state2 = pb_state.copy()
+    assert isinstance(pb_state2, _ArrayPyBulletState)
+    assert pb_state2.joint_positions == joints
+    assert pb_state2.joint_positions is not joints
+    pb_state2.set(obj3, "feat1", 5)
+    assert pb_state.get(obj3, "feat1") == 1
+    assert not pb_state.allclose(pb_state2)
+    pb_state2.set(obj3, "feat1", 1)
+    assert pb_state.allclose(pb_state2)
+    pb_state3 = utils.PyBulletState(pb_state.data, simulator_state=joints)
+    assert pb_state3.allclose(pb_state)
+
+    class _ArrayStateWithCache(utils.StateWithCache, ArrayState):
+        """An array-backed StateWithCache."""
+
+    cache = {"key": {}}
+    cache_state = _ArrayStateWithCache({obj3: [1, 2]}, simulator_state=cache)
+    cache_state2 = cache_state.copy()
+    assert isinstance(cache_state2, _ArrayStateWithCache)
+    assert cache_state2.cache is cache
+    assert cache_state.allclose(cache_state2)
+    # Constructing from the data of another ArrayState copies its array.
+    state_from_data = _ArrayStateWithCache(cache_state.data, cache)
+    state_from_data.set(obj3, "feat1", 7)
+    assert cache_state.get(obj3, "feat1") == 1
+    # Pickling rebuilds the data view.
+    unpickled_state = pkl.loads(pkl.dumps(state2))
+    assert unpickled_state.allclose(state2)
+    unpickled_state.set(obj3, "feat2", 5)
+    assert unpickled_state.get(obj3, "feat2") == 5
+    assert unpickled_state[obj3][1] == 5
+    assert state2.get(obj3, "feat2") == 122
+    # States that share an array still copy it on write after unpickling.
+    state4 = state2.copy()
+    unpickled_state2, unpickled_state4 = pkl.loads(pkl.dumps((state2, state4)))
+    unpickled_state4.set(obj3, "feat2", 7)
+    assert unpickled_state2.get(obj3, "feat2") == 122
+    assert unpickled_state4.get(obj3, "feat2") == 7
+
+
 def test_predicate_and_atom():
     """Tests for Predicate, LiftedAtom, GroundAtom classes."""
     # Predicates
@@ -639,6 +762,31 @@ def test_operators_and_nsrts(state):
     assert ground_nsrt4 < ground_nsrt2
     assert ground_nsrt2 > ground_nsrt4
     ground_nsrt.sample_option(state, set(), np.random.default_rng(123))
+    options = ground_nsrt.sample_options(state, set(),
+                                         np.random.default_rng(123), 3)
+    assert len(options) == 3
+    assert all(o.parent == parameterized_option for o in options)
+
+    # Test a sampler that declares a batch API.
+    class _BatchSampler:
+        """A sampler with a sample_batch method."""
+
+        def __call__(self, s, g, rng, objs):
+            raise AssertionError("Should not be called.")
+
+        def sample_batch(self, s, g, rng, objs, num_samples):
+            """Returns out-of-bounds samples, which should be clipped."""
+            del s, g, rng, objs  # unused
+            return np.full((num_samples, 2), 100.0)
+
+    batch_nsrt = NSRT("Pick", parameters, preconditions, add_effects,
+                      delete_effects, ignore_effects, parameterized_option, [],
+                      _BatchSampler())
+    batch_ground_nsrt = batch_nsrt.ground([cup, plate])
+    options = batch_ground_nsrt.sample_options(state, set(),
+                                               np.random.default_rng(123), 2)
+    assert len(options) == 2
+    assert all(np.allclose(o.params, [10.0, 10.0]) for o in options)
     filtered_nsrt = nsrt.filter_predicates({on})
     assert len(filtered_nsrt.parameters) == 2
     assert len(filtered_nsrt.preconditions) == 0
@@ -1,6 +1,8 @@
 """Test cases for utils."""
 import os
+import tempfile
 import time
+from dataclasses import dataclass
 from typing import Iterator, Optional, Tuple
 from typing import Type as TypingType
 
@@ -11,18 +13,21 @@ from gym.spaces import Box
 
 from predicators import utils
 from predicators.envs.ball_and_cup_sticky_table import BallAndCupStickyTableEnv
+from predicators.envs.blocks import BlocksEnv
 from predicators.envs.cover import CoverEnv, CoverMultistepOptions
 from predicators.envs.pddl_env import ProceduralTasksGripperPDDLEnv, \
     ProceduralTasksSpannerPDDLEnv
 from predicators.ground_truth_models import _get_predicates_by_names, \
     get_gt_nsrts, get_gt_options
 from predicators.nsrt_learning.segmentation import segment_trajectory
+from predicators.planning import task_plan, task_plan_grounding
 from predicators.settings import CFG
 from predicators.structs import NSRT, Action, DefaultState, DummyOption, \
     GroundAtom, LowLevelTrajectory, ParameterizedOption, Predicate, Segment, \
     State, STRIPSOperator, Type, Variable
-from predicators.utils import GoalCountHeuristic, _PyperplanHeuristicWrapper, \
-    _TaskPlanningHeuristic
+from predicators.utils import GoalCountHeuristic, HAddHeuristic, \
+    HFFHeuristic, HMaxHeuristic, LMCutHeuristic, _NativeRelaxationHeuristic, \
+    _PyperplanHeuristicWrapper, _RelaxedTask, _TaskPlanningHeuristic
 
 
 @pytest.mark.parametrize("max_groundings,exp_num_true,exp_num_false",
@@ -1076,6 +1081,181 @@ def test_abstract():
     assert not utils.abstract(state, {wrapped_pred1, wrapped_pred2})
 
 
+def test_abstract_states():
+    """Tests for abstract_states() and Predicate.holds_batch()."""
+    cup_type = Type("cup_type", ["feat1"])
+    plate_type = Type("plate_type", ["feat1", "feat2"])
+
+    def _classifier1(state, objects):
+        cup, plate = objects
+        return state[cup][0] + state[plate][0] < 2
+
+    class _BatchClassifier:
+        """A classifier that declares a vectorized API."""
+
+        def __init__(self):
+            self.num_batch_calls = 0
+
+        def __call__(self, state, objects):
+            raise AssertionError("Should not be called.")
+
+        def classify_batch(self, states, choices):
+            """Classify all choices in all states."""
+            self.num_batch_calls += 1
+            return np.array([[s[o[0]][1] > 1.1 for o in choices]
+                             for s in states])
+
+    batch_classifier = _BatchClassifier()
+    pred1 = Predicate("On", [cup_type, plate_type], _classifier1)
+    pred2 = Predicate("High", [plate_type], batch_classifier)
+    pred3 = Predicate("Nullary", [], lambda s, o: len(list(s)) > 2)
+    cup = cup_type("cup")
+    plate1 = plate_type("plate1")
+    plate2 = plate_type("plate2")
+    states = [
+        State({
+            cup: [0.5],
+            plate1: [1.0, 1.2],
+            plate2: [-9.0, 1.0]
+        }),
+        State({
+            cup: [1.5],
+            plate1: [1.0, 1.0],
+            plate2: [-9.0, 1.5]
+        }),
+        State({
+            cup: [1.5],
+            plate1: [1.0, 1.5]
+        }),
+        State({
+            cup: [0.5],
+            plate1: [1.0, 1.2],
+            plate2: [-9.0, 1.0]
+        }),
+    ]
+    preds = {pred1, pred2, pred3}
+    atoms_seq = utils.abstract_states(states, preds)
+    # The first, second, and fourth states share one batch call.
+    assert batch_classifier.num_batch_calls == 2
+    assert atoms_seq[0] == {
+        pred1([cup, plate1]),
+        pred1([cup, plate2]),
+        pred2([plate1]),
+        GroundAtom(pred3, [])
+    }
+    assert atoms_seq[2] == {pred2([plate1])}
+    assert atoms_seq[3] == atoms_seq[0]
+    pred2 = Predicate("High", [plate_type], lambda s, o: s[o[0]][1] > 1.1)
+    preds = {pred1, pred2, pred3}
+    assert utils.abstract_states(states, preds) == \
+        [utils.abstract(s, preds) for s in states]
+    assert utils.abstract_states([], preds) == []
+    holds = pred1.holds_batch(states[:2], [[cup, plate1], [cup, plate2]])
+    assert holds.shape == (2, 2)
+    assert holds.tolist() == [[True, True], [False, True]]
+    assert pred1.holds_batch([], [[cup, plate1]]).shape == (0, 1)
+    with pytest.raises(AssertionError):
+        pred1.holds_batch(states, [[plate1, cup]])  # wrong types
+
+
+def test_ground_atom_cache():
+    """Tests for GroundAtomCache."""
+    cup_type = Type("cup_type", ["feat1"])
+    plate_type = Type("plate_type", ["feat1"])
+    cup = cup_type("cup")
+    plate1 = plate_type("plate1")
+    plate2 = plate_type("plate2")
+    num_calls = 0
+
+    def _classifier(state, objects):
+        nonlocal num_calls
+        num_calls += 1
+        cup, plate = objects
+        return state[cup][0] + state[plate][0] < 2
+
+    pred1 = Predicate("On", [cup_type, plate_type], _classifier)
+    pred2 = Predicate("Hot", [cup_type], lambda s, o: s[o[0]][0] > 0.75)
+    pred3 = Predicate("Empty", [], lambda s, o: len(list(s)) < 3)
+    state_seqs = [
+        [
+            State({
+                cup: [0.5],
+                plate1: [1.0],
+                plate2: [2.0]
+            }),
+            State({
+                cup: [1.5],
+                plate1: [0.0],
+                plate2: [2.0]
+            }),
+            # The objects can change within a sequence.
+            State({
+                cup: [1.0],
+                plate1: [0.5]
+            }),
+        ],
+        [],
+        [State({
+            cup: [0.0],
+            plate2: [3.0]
+        })],
+    ]
+    preds = {pred1, pred2, pred3}
+    expected = [utils.abstract_states(seq, preds) for seq in state_seqs]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = utils.GroundAtomCache(state_seqs, cache_dir)
+        assert cache.abstract_states(preds) == expected
+        assert cache.num_hits == 0
+        assert cache.num_misses == 3
+        # A new cache for the same state sequences reuses the truth tables.
+        expected_pred1 = [
+            utils.abstract_states(seq, {pred1}) for seq in state_seqs
+        ]
+        num_calls = 0
+        cache = utils.GroundAtomCache(state_seqs, cache_dir)
+        assert cache.abstract_states({pred1}) == expected_pred1
+        assert num_calls == 0
+        assert cache.num_hits == 1
+        # New predicates can be added incrementally.
+        pred4 = Predicate("Cold", [cup_type], lambda s, o: s[o[0]][0] < 0.75)
+        atoms_seqs = cache.abstract_states({pred2, pred4})
+        assert cache.num_hits == 2
+        assert cache.num_misses == 1
+        assert atoms_seqs[0][0] == {pred4([cup])}
+        assert atoms_seqs[2][0] == {pred4([cup])}
+        # Predicates with the same name and types but different classifiers
+        # do not share truth tables, even if their constants only differ
+        # beyond the precision used in predicate names.
+        other_pred2 = Predicate("Hot", [cup_type],
+                                lambda s, o: s[o[0]][0] > 1.25)
+        assert cache.abstract_states({other_pred2}) == [
+            utils.abstract_states(seq, {other_pred2}) for seq in state_seqs
+        ]
+        assert cache.num_misses == 2
+
+        @dataclass(frozen=True)
+        class _ThresholdClassifier:
+            threshold: float
+
+            def __call__(self, s, o):
+                return s[o[0]][0] > self.threshold
+
+        for threshold in [0.25, 0.2501, 0.2501]:
+            pred5 = Predicate("Warm", [cup_type],
+                              _ThresholdClassifier(threshold))
+            atoms_seqs = cache.abstract_states({pred5})
+            assert atoms_seqs[0][0] == {pred5([cup])}
+        assert cache.num_hits == 3
+        assert cache.num_misses == 4
+        # Different state sequences do not share truth tables.
+        state_seqs[2][0].set(cup, "feat1", 1.0)
+        cache = utils.GroundAtomCache(state_seqs, cache_dir)
+        atoms_seqs = cache.abstract_states({pred2})
+        assert cache.num_misses == 1
+        assert atoms_seqs[2][0] == {pred2([cup])}
+        assert len(os.listdir(cache_dir)) == 2
+
+
 def test_create_new_variables():
     """Tests for create_new_variables()."""
     cup_type = Type("cup", ["feat1"])
@@ -1687,6 +1867,103 @@ def test_nsrt_methods():
     assert types == {"plate_type": plate_type, "cup_type": cup_type}
 
 
+def test_all_ground_nsrts_with_static_pruning():
+    """Tests for all_ground_nsrts_with_static_pruning()."""
+    robot_type = Type("robot_type", ["feat1"])
+    room_type = Type("room_type", ["feat1"])
+    at = Predicate("At", [robot_type, room_type], lambda s, o: True)
+    connected = Predicate("Connected", [room_type, room_type],
+                          lambda s, o: True)
+    is_lit = Predicate("IsLit", [room_type], lambda s, o: True)
+    robot_var = robot_type("?robot")
+    from_var = room_type("?from")
+    to_var = room_type("?to")
+    option = utils.SingletonParameterizedOption("Move",
+                                                lambda s, m, o, p: Action(p),
+                                                types=[robot_type])
+    move_nsrt = NSRT("Move", [robot_var, from_var, to_var], {
+        at([robot_var, from_var]),
+        connected([from_var, to_var]),
+        is_lit([to_var])
+    }, {at([robot_var, to_var])}, {at([robot_var, from_var])}, set(), option,
+                     [robot_var], utils.null_sampler)
+    # Test a static precondition with a repeated variable, and a parameter
+    # that is not in any static precondition.
+    wait_nsrt = NSRT("Wait", [robot_var, from_var, to_var],
+                     {at([robot_var, from_var]),
+                      connected([to_var, to_var])}, set(), set(), set(),
+                     option, [robot_var], utils.null_sampler)
+    nsrts = {move_nsrt, wait_nsrt}
+    robot = robot_type("robot")
+    rooms = [room_type(f"room{i}") for i in range(4)]
+    objects = [robot] + rooms
+    init_atoms = {
+        at([robot, rooms[0]]),
+        connected([rooms[0], rooms[1]]),
+        connected([rooms[1], rooms[2]]),
+        connected([rooms[2], rooms[2]]),
+        connected([rooms[2], rooms[3]]),
+        is_lit([rooms[1]]),
+        is_lit([rooms[2]]),
+    }
+    ground_nsrts = utils.all_ground_nsrts_with_static_pruning(
+        nsrts, objects, init_atoms)
+    static_atoms = {a for a in init_atoms if a.predicate != at}
+    expected_ground_nsrts = [
+        ground_nsrt for nsrt in sorted(nsrts)
+        for ground_nsrt in utils.all_ground_nsrts(nsrt, objects)
+        if {a
+            for a in ground_nsrt.preconditions
+            if a.predicate != at}.issubset(static_atoms)
+    ]
+    assert ground_nsrts == expected_ground_nsrts
+    assert [n.objects for n in ground_nsrts if n.name == "Move"] == [
+        (robot, rooms[0], rooms[1]),
+        (robot, rooms[1], rooms[2]),
+        (robot, rooms[2], rooms[2]),
+    ]
+    assert len([n for n in ground_nsrts if n.name == "Wait"]) == 4
+    # Test caching the groundings.
+    cache = utils.StaticPruningGroundingCache()
+    ground_nsrts = utils.all_ground_nsrts_with_static_pruning(
+        nsrts, objects, init_atoms, cache)
+    assert ground_nsrts == expected_ground_nsrts
+    assert all(n1 is n2
+               for n1, n2 in zip(
+                   utils.all_ground_nsrts_with_static_pruning(
+                       nsrts, objects, init_atoms, cache), ground_nsrts))
+    # An NSRT that only differs in its sampler is equal to the original one,
+    # but its groundings are not served from the cache.
+    new_sampler = lambda s, g, rng, objs: np.ones(1, dtype=np.float32)
+    new_move_nsrt = NSRT("Move", [robot_var, from_var, to_var],
+                         move_nsrt.preconditions, move_nsrt.add_effects,
+                         move_nsrt.delete_effects, set(), option, [robot_var],
+                         new_sampler)
+    assert new_move_nsrt == move_nsrt
+    new_ground_nsrts = utils.all_ground_nsrts_with_static_pruning(
+        {new_move_nsrt, wait_nsrt}, objects, init_atoms, cache)
+    assert new_ground_nsrts == ground_nsrts
+    assert all(n.parent is new_move_nsrt for n in new_ground_nsrts
+               if n.name == "Move")
+    # The entries of the replaced NSRT are discarded.
+    assert len(cache._groundings) == 2  # pylint: disable=protected-access
+    # If a static precondition has no initial atoms, nothing is grounded.
+    assert not utils.all_ground_nsrts_with_static_pruning(
+        {move_nsrt}, objects, {at([robot, rooms[0]])})
+    # If a predicate is in some NSRT's effects, it is not static.
+    light_nsrt = NSRT("Light", [robot_var, to_var],
+                      {at([robot_var, to_var])}, {is_lit([to_var])}, set(),
+                      set(), option, [robot_var], utils.null_sampler)
+    ground_nsrts = utils.all_ground_nsrts_with_static_pruning(
+        {move_nsrt, light_nsrt}, objects, init_atoms)
+    assert [n.objects for n in ground_nsrts if n.name == "Move"] == [
+        (robot, rooms[0], rooms[1]),
+        (robot, rooms[1], rooms[2]),
+        (robot, rooms[2], rooms[2]),
+        (robot, rooms[2], rooms[3]),
+    ]
+
+
 def test_all_ground_operators():
     """Tests for all_ground_operators()."""
     cup_type = Type("cup_type", ["feat1"])
@@ -1945,6 +2222,73 @@ def test_get_reachable_atoms():
     }
 
 
+def test_relaxed_reachability():
+    """Tests for RelaxedReachability."""
+    obj_type = Type("obj_type", ["feat1"])
+    P, Q, R, S = [
+        Predicate(name, [obj_type], lambda s, o: True)
+        for name in ["P", "Q", "R", "S"]
+    ]
+    var = obj_type("?x")
+    nsrts = [
+        NSRT(f"Op{i}", [var], {pred([var])
+                               for pred in pre}, {pred([var])
+                                                  for pred in add}, set(),
+             set(), None, [], None)
+        for i, (pre, add) in enumerate([([P], [Q]), ([Q], [R]), ([S],
+                                                                 [R]), ([],
+                                                                        [])])
+    ]
+    obj = obj_type("obj")
+    ground_ops = [nsrt.ground([obj]) for nsrt in nsrts]
+    init_atoms = {P([obj])}
+    reachability = utils.RelaxedReachability(ground_ops, init_atoms)
+    assert reachability.ground_ops == ground_ops
+    assert reachability.reachable_atoms == {P([obj]), Q([obj]), R([obj])}
+    assert [reachability.is_reachable(i)
+            for i in range(4)] == [True, True, False, True]
+
+    def _update(idx, **kwargs):
+        op = ground_ops[idx]
+        kwargs = {k: getattr(op, k) | v for k, v in kwargs.items()}
+        ground_ops[idx] = op.copy_with(**kwargs)
+        reachability.update(ground_ops)
+        assert reachability.ground_ops == ground_ops
+        reachable_atoms = utils.get_reachable_atoms(ground_ops, init_atoms)
+        assert reachability.reachable_atoms == reachable_atoms
+        assert [reachability.is_reachable(i) for i in range(4)] == [
+            op.preconditions.issubset(reachable_atoms) for op in ground_ops
+        ]
+        return reachable_atoms
+
+    # Adding an add effect to an operator that fired.
+    assert S([obj]) in _update(3, add_effects={S([obj])})
+    assert reachability.is_reachable(2)
+    # Adding an add effect that was already reachable.
+    _update(0, add_effects={R([obj])})
+    # Adding a precondition that was reachable before the operator fired.
+    _update(1, preconditions={P([obj])})
+    # Adding a precondition that was only reachable after the operator fired.
+    _update(0, preconditions={R([obj])})
+    # Removing an add effect from an operator that fired.
+    ground_ops[3] = ground_ops[3].copy_with(add_effects=set())
+    reachability.update(ground_ops)
+    assert reachability.reachable_atoms == {P([obj])}
+    assert not any(reachability.is_reachable(i) for i in range(3))
+    # Removing and adding preconditions of operators that did not fire.
+    ground_ops[1] = ground_ops[1].copy_with(
+        preconditions=ground_ops[1].preconditions | {S([obj])})
+    ground_ops[2] = ground_ops[2].copy_with(preconditions=set())
+    reachability.update(ground_ops)
+    assert reachability.reachable_atoms == {P([obj]), Q([obj]), R([obj])}
+    assert [reachability.is_reachable(i)
+            for i in range(4)] == [True, False, True, True]
+    # Changing the number of operators.
+    reachability.update(ground_ops[1:])
+    assert reachability.reachable_atoms == {P([obj]), R([obj])}
+    assert not reachability.is_reachable(0)
+
+
 def test_nsrt_application():
     """Tests for get_applicable_operators() and apply_operator() with a
     _GroundNSRT."""
@@ -2174,6 +2518,91 @@ def test_operator_application():
     assert next_atoms == {pred1([cup1, plate1]), pred2([cup1, plate1])}
 
 
+def test_successor_generator():
+    """Tests for SuccessorGenerator."""
+    cup_type = Type("cup_type", ["feat1"])
+    plate_type = Type("plate_type", ["feat1"])
+    pred1 = Predicate("Pred1", [cup_type, plate_type], lambda s, o: True)
+    pred2 = Predicate("Pred2", [cup_type, plate_type], lambda s, o: True)
+    pred3 = Predicate("Pred3", [cup_type], lambda s, o: True)
+    cup_var = cup_type("?cup")
+    plate_var = plate_type("?plate")
+    parameters = [cup_var, plate_var]
+    op1 = STRIPSOperator("Pick", parameters, {pred1([cup_var, plate_var])},
+                         {pred2([cup_var, plate_var])}, set(), set())
+    op2 = STRIPSOperator(
+        "Place", parameters,
+        {pred1([cup_var, plate_var]),
+         pred2([cup_var, plate_var])}, set(), {pred1([cup_var, plate_var])},
+        set())
+    op3 = STRIPSOperator("Wipe", [cup_var], set(), {pred3([cup_var])}, set(),
+                         set())
+    cup1 = cup_type("cup1")
+    cup2 = cup_type("cup2")
+    plate1 = plate_type("plate1")
+    plate2 = plate_type("plate2")
+    objects = {cup1, cup2, plate1, plate2}
+    ground_ops = sorted(
+        set(utils.all_ground_operators(op1, objects))
+        | set(utils.all_ground_operators(op2, objects))
+        | set(utils.all_ground_operators(op3, objects)))
+    all_atoms = sorted({
+        atom
+        for op in ground_ops for atom in op.preconditions | op.add_effects
+    })
+    atom_to_bit = {atom: 1 << i for i, atom in enumerate(all_atoms)}
+    successor_generator = utils.SuccessorGenerator(ground_ops,
+                                                   atom_to_bit.__getitem__)
+    assert successor_generator.ground_ops == ground_ops
+    # The result should match checking every ground operator, in order.
+    for atoms in [
+            set(),
+        {pred1([cup1, plate1])},
+        {pred1([cup1, plate1]), pred2([cup1, plate1])},
+        {pred1([cup1, plate1]), pred2([cup1, plate2])},
+        {pred3([cup2])},
+            set(all_atoms),
+    ]:
+        expected = [op for op in ground_ops if op.preconditions <= atoms]
+        assert list(utils.get_applicable_operators(successor_generator,
+                                                   atoms)) == expected
+        bitset = sum(atom_to_bit[atom] for atom in atoms)
+        assert [
+            ground_ops[idx] for idx in
+            successor_generator.get_applicable_operator_idxs_for_bitset(bitset)
+        ] == expected
+        assert list(
+            utils.get_successors_from_ground_ops(
+                atoms, successor_generator, unique=False)) == [
+                    utils.apply_operator(op, atoms) for op in expected
+                ]
+    # Only the operators without preconditions are applicable in the empty
+    # state.
+    applicable = list(successor_generator.get_applicable_operators(set()))
+    assert {op.name for op in applicable} == {"Wipe"}
+    # Modifying the returned indices should not affect later queries.
+    successor_generator.get_applicable_operator_idxs(set())[:] = -1
+    assert list(successor_generator.get_applicable_operators(
+        set())) == applicable
+    # Test without any precondition-free operators.
+    successor_generator = utils.SuccessorGenerator(
+        [op for op in ground_ops if op.name != "Wipe"])
+    assert not list(successor_generator.get_applicable_operators(set()))
+    assert not list(
+        successor_generator.get_applicable_operators({pred3([cup1])}))
+    applicable = list(
+        successor_generator.get_applicable_operators(
+            {pred1([cup2, plate2]),
+             pred2([cup2, plate2])}))
+    assert [(op.name, op.objects) for op in applicable] == \
+        [("Pick", [cup2, plate2]), ("Place", [cup2, plate2])]
+    # Test sampling from a SuccessorGenerator.
+    rng = np.random.default_rng(123)
+    state = State({cup1: [0.0], cup2: [0.0], plate1: [0.0], plate2: [0.0]})
+    assert utils.sample_applicable_ground_nsrt(state, successor_generator,
+                                               set(), rng) is None
+
+
 @pytest.mark.parametrize("heuristic_name, expected_heuristic_cls", [
     ("hadd", _PyperplanHeuristicWrapper),
     ("hmax", _PyperplanHeuristicWrapper),
@@ -2181,6 +2610,10 @@ def test_operator_application():
     ("hsa", _PyperplanHeuristicWrapper),
     ("lmcut", _PyperplanHeuristicWrapper),
     ("goal_count", GoalCountHeuristic),
+    ("native_hadd", HAddHeuristic),
+    ("native_hmax", HMaxHeuristic),
+    ("native_hff", HFFHeuristic),
+    ("native_lmcut", LMCutHeuristic),
 ])
 def test_create_task_planning_heuristic(
         heuristic_name: str,
@@ -2206,6 +2639,85 @@ def test_create_task_planning_heuristic_base_class():
         base_heuristic(set())
 
 
+def test_native_relaxation_heuristics():
+    """Tests for the native relaxation heuristics."""
+    utils.reset_config({"env": "blocks", "num_test_tasks": 2})
+    env = BlocksEnv()
+    nsrts = get_gt_nsrts(env.get_name(), env.predicates,
+                         get_gt_options(env.get_name()))
+    tasks = env.get_test_tasks()
+    for task in tasks:
+        init_atoms = utils.abstract(task.init, env.predicates)
+        objects = set(task.init)
+        ground_nsrts, reachable_atoms = task_plan_grounding(
+            init_atoms, objects, nsrts)
+        pyperplan_heuristic = utils.create_task_planning_heuristic(
+            "lmcut", init_atoms, task.goal, ground_nsrts, env.predicates,
+            objects)
+        skeleton, atoms_sequence, _ = next(
+            task_plan(init_atoms, task.goal, ground_nsrts, reachable_atoms,
+                      pyperplan_heuristic, 123, 10.0, 1))
+        # Test on the states in an optimal plan and their successors.
+        all_atoms = []
+        for atoms in atoms_sequence:
+            all_atoms.append(atoms)
+            all_atoms.extend(
+                utils.get_successors_from_ground_ops(atoms, ground_nsrts))
+        heuristics = {
+            name: utils.create_task_planning_heuristic(name, init_atoms,
+                                                       task.goal, ground_nsrts,
+                                                       env.predicates, objects)
+            for name in [
+                "hadd", "hmax", "lmcut", "native_hadd", "native_hmax",
+                "native_hff", "native_lmcut"
+            ]
+        }
+        for atoms in all_atoms:
+            # The values of hadd, hmax, and lmcut should match pyperplan's.
+            for name in ["hadd", "hmax", "lmcut"]:
+                assert heuristics[name](atoms) == \
+                    heuristics["native_" + name](atoms)
+            # The value of hff depends on tie-breaking, so just check bounds.
+            hff = heuristics["native_hff"](atoms)
+            assert heuristics["native_hmax"](atoms) <= hff
+            assert hff <= heuristics["native_hadd"](atoms)
+            assert (hff == 0) == task.goal.issubset(atoms)
+        # LM-cut is admissible.
+        for i, atoms in enumerate(atoms_sequence):
+            assert heuristics["native_lmcut"](atoms) <= len(skeleton) - i
+    # The remaining tests use the last task, whose atoms, ground NSRTs, and
+    # plan were computed last in the loop above.
+    task = tasks[-1]
+    # Test unreachable goals.
+    unreachable_pred = Predicate("Unreachable", [], lambda s, o: False)
+    goal = task.goal | {GroundAtom(unreachable_pred, [])}
+    for name in ["native_hadd", "native_hmax", "native_hff", "native_lmcut"]:
+        heuristic = utils.create_task_planning_heuristic(
+            name, init_atoms, goal, ground_nsrts, env.predicates, objects)
+        assert heuristic(init_atoms) == float("inf")
+    # Test an empty goal and atoms that are not in the relaxed task.
+    for name in ["native_hadd", "native_hmax", "native_hff", "native_lmcut"]:
+        heuristic = utils.create_task_planning_heuristic(
+            name, init_atoms, set(), ground_nsrts, env.predicates, objects)
+        assert heuristic(init_atoms) == 0
+        assert heuristic(set()) == 0
+    # Test the bounded cache.
+    utils.reset_config({"sesame_heuristic_cache_size": 2})
+    heuristic = utils.create_task_planning_heuristic("native_hadd", init_atoms,
+                                                     task.goal, ground_nsrts,
+                                                     env.predicates, objects)
+    assert isinstance(heuristic, _NativeRelaxationHeuristic)
+    h_values = [heuristic(atoms) for atoms in atoms_sequence]
+    assert len(heuristic._cache) == 2  # pylint: disable=protected-access
+    assert [heuristic(atoms) for atoms in atoms_sequence] == h_values
+    # Test the base class.
+    relaxed_task = _RelaxedTask.from_ground_ops(set(), set(), set())
+    base_heuristic = _NativeRelaxationHeuristic("base", set(), set(), set(),
+                                                relaxed_task)
+    with pytest.raises(NotImplementedError):
+        base_heuristic(set())
+
+
 def test_goal_count_heuristic():
     """Test the goal count heuristic."""
     # Create predicate and objects
@@ -2892,6 +3404,24 @@ def test_run_hill_climbing():
                                     parallelize=parallelize,
                                     timeout=0.0)
 
+    # Test batch_heuristic, which should be called once per depth.
+    batch_sizes = []
+
+    def _batch_heuristic(states):
+        batch_sizes.append(len(states))
+        return [_local_minimum_grid_heuristic_fn(s) for s in states]
+
+    state_sequence, _, heuristics = utils.run_hill_climbing(
+        initial_state,
+        _grid_check_goal_fn,
+        _grid_successor_fn,
+        _local_minimum_grid_heuristic_fn,
+        enforced_depth=1,
+        batch_heuristic=_batch_heuristic)
+    assert state_sequence[-1] == (4, 4)
+    assert heuristics[-1] == 0.0
+    assert batch_sizes[:2] == [2, 3]
+
     # Test early_termination_heuristic_thresh with very high value.
     initial_state = (0, 0)
     state_sequence, action_sequence, heuristics = utils.run_hill_climbing(
@@ -3321,3 +3851,98 @@ def test_oracle_feature_selection():
         utils.construct_active_sampler_input(state, [robot, cup], params,
                                              NavigateToCup)
     assert "Oracle feature selection" in str(e)
+
+
+def test_rrt_nearest_neighbors():
+    """Tests for nearest neighbor queries in RRT trees."""
+    rng = np.random.default_rng(123)
+    distance_fn = lambda x, y: np.sum(np.subtract(x, y)**2)
+    # pylint: disable=protected-access
+    root = utils._RRTNode(rng.uniform(size=2))
+    scan_tree = utils._RRTTree(root, distance_fn, None)
+    indexed_tree = utils._RRTTree(root, distance_fn, lambda pt: pt)
+    for _ in range(200):
+        node = utils._RRTNode(rng.uniform(size=2), parent=root)
+        scan_tree.add(node)
+        indexed_tree.add(node)
+        pt = rng.uniform(size=2)
+        assert scan_tree.nearest(pt) is indexed_tree.nearest(pt)
+    assert len(scan_tree) == len(indexed_tree) == 201
+    # Test that both RRT variants find paths with an embed_fn.
+    num_interp = 10
+
+    def _extend_fn(pt1, pt2):
+        for i in range(1, num_interp + 1):
+            yield pt1 * (1 - i / num_interp) + pt2 * i / num_interp
+
+    def _collision_fn(pt):
+        # A wall in the middle of the unit square, with a gap at the top.
+        return 0.45 < pt[0] < 0.55 and pt[1] < 0.8
+
+    for cls in [utils.RRT, utils.BiRRT]:
+        rrt = cls(lambda _: rng.uniform(size=2),
+                  _extend_fn,
+                  _collision_fn,
+                  distance_fn,
+                  rng,
+                  num_attempts=10,
+                  num_iters=200,
+                  smooth_amt=10,
+                  embed_fn=lambda pt: pt)
+        path = rrt.query(np.array([0.1, 0.1]),
+                         np.array([0.9, 0.1]),
+                         sample_goal_eps=0.1)
+        assert path is not None
+        assert np.allclose(path[0], [0.1, 0.1])
+        assert np.allclose(path[-1], [0.9, 0.1])
+        assert not any(_collision_fn(pt) for pt in path)
+
+
+def test_rrt_edge_collision_fn():
+    """Tests for checking RRT edges in batches."""
+    assert not utils.get_bisection_order(0)
+    assert utils.get_bisection_order(1) == [0]
+    assert utils.get_bisection_order(7) == [6, 3, 1, 5, 0, 2, 4]
+    for num in range(20):
+        assert sorted(utils.get_bisection_order(num)) == list(range(num))
+    rng = np.random.default_rng(123)
+    distance_fn = lambda x, y: np.sum(np.subtract(x, y)**2)
+    num_interp = 10
+
+    def _extend_fn(pt1, pt2):
+        for i in range(1, num_interp + 1):
+            yield pt1 * (1 - i / num_interp) + pt2 * i / num_interp
+
+    def _collision_fn(pt):
+        # A wall in the middle of the unit square, with a gap at the top.
+        return 0.45 < pt[0] < 0.55 and pt[1] < 0.8
+
+    edge_lengths = []
+
+    def _edge_collision_fn(pts):
+        edge_lengths.append(len(pts))
+        return any(_collision_fn(pt) for pt in pts)
+
+    for cls in [utils.RRT, utils.BiRRT]:
+        for edge_collision_fn in [None, _edge_collision_fn]:
+            rrt = cls(lambda _: rng.uniform(size=2),
+                      _extend_fn,
+                      _collision_fn,
+                      distance_fn,
+                      rng,
+                      num_attempts=10,
+                      num_iters=200,
+                      smooth_amt=10,
+                      edge_collision_fn=edge_collision_fn)
+            path = rrt.query(np.array([0.1, 0.1]),
+                             np.array([0.9, 0.1]),
+                             sample_goal_eps=0.1)
+            assert path is not None
+            assert np.allclose(path[0], [0.1, 0.1])
+            assert np.allclose(path[-1], [0.9, 0.1])
+            assert not any(_collision_fn(pt) for pt in path)
+            # Test a direct path.
+            path = rrt.query(np.array([0.1, 0.1]), np.array([0.2, 0.1]))
+            assert len(path) == num_interp + 1
+    assert edge_lengths
+    assert all(length == num_interp for length in edge_lengths)